@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Trace 分析工具
+
+读取链路追踪导出的 JSONL 文件（默认 logs/traces.jsonl 及其轮转文件 .1），输出：
+- 最慢的 N 个 trace，每个按 span 树展示耗时和自身耗时（不含子 span）
+- 按 span 名称汇总的次数、总耗时、p50、p95
+
+用法：
+    python analyze_traces.py                         # 最慢的 10 个 trace
+    python analyze_traces.py --top 20
+    python analyze_traces.py --name update           # 只看更新（job、publish_job 同理）
+    python analyze_traces.py --handler /search       # 只看某个命令/回调
+    python analyze_traces.py --since 60              # 只看最近 60 分钟
+    python analyze_traces.py --file /path/to/traces.jsonl
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, List
+
+DEFAULT_FILE = 'logs/traces.jsonl'
+
+
+def load_traces(path: str) -> List[Dict]:
+    """读取 trace 文件（包括轮转出的 .1 文件），跳过损坏的行"""
+    traces = []
+    for candidate in (path + '.1', path):
+        if not os.path.exists(candidate):
+            continue
+        with open(candidate, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    traces.append(json.loads(line))
+                except ValueError:
+                    continue
+    return traces
+
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def self_times(trace: Dict) -> Dict[int, float]:
+    """
+    计算每个 span 的自身耗时（去掉直接子 span 的耗时，根 span 的 ID 记为 -1）
+
+    Returns:
+        Dict[int, float]: span ID -> 自身耗时（毫秒）
+    """
+    result = {-1: trace['duration_ms']}
+    for span in trace['spans']:
+        result[span['id']] = span['duration_ms'] or 0.0
+    for span in trace['spans']:
+        parent = span['parent'] if span['parent'] else -1
+        if parent in result:
+            result[parent] -= span['duration_ms'] or 0.0
+    return {key: max(0.0, value) for key, value in result.items()}
+
+
+def format_trace(trace: Dict) -> Iterable[str]:
+    """把一个 trace 格式化为缩进的 span 树"""
+    started = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(trace['start']))
+    attrs = ' '.join(f"{k}={v}" for k, v in trace['attrs'].items() if v is not None)
+    error = f"  ❌ {trace['error']}" if trace.get('error') else ''
+    yield f"{trace['duration_ms']:9.1f} ms  {trace['name']} {attrs}  [{trace['trace_id']}] {started}{error}"
+
+    own = self_times(trace)
+    children = defaultdict(list)
+    for span in trace['spans']:
+        # 根 span 的 ID 为 0，子 span 的 parent 为 0 时挂到根下
+        children[span['parent'] if span['parent'] else -1].append(span)
+
+    def walk(parent_id: int, depth: int):
+        for span in children.get(parent_id, ()):
+            duration = f"{span['duration_ms']:9.1f}" if span['duration_ms'] is not None else '   未结束'
+            mark = f"  ❌ {span['error']}" if span.get('error') else ''
+            yield (f"  {duration} ms {'  ' * depth}├ {span['name']} "
+                   f"(+{span['offset_ms']:.1f} ms，自身 {own[span['id']]:.1f} ms){mark}")
+            yield from walk(span['id'], depth + 1)
+
+    yield from walk(-1, 0)
+    yield f"  {own[-1]:9.1f} ms   （根 span 自身耗时）"
+    if trace.get('dropped_spans'):
+        yield f"  … 另有 {trace['dropped_spans']} 个 span 超出上限未记录"
+
+
+def summarize(traces: List[Dict]) -> List[tuple]:
+    """
+    按 span 名称汇总耗时
+
+    Returns:
+        List[tuple]: (名称, 次数, 总耗时, p50, p95)，按总耗时降序
+    """
+    durations = defaultdict(list)
+    for trace in traces:
+        for span in trace['spans']:
+            if span['duration_ms'] is not None:
+                durations[span['name']].append(span['duration_ms'])
+    rows = [
+        (name, len(values), sum(values), _percentile(values, 0.5), _percentile(values, 0.95))
+        for name, values in durations.items()
+    ]
+    return sorted(rows, key=lambda row: row[2], reverse=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='分析链路追踪导出的 trace 文件')
+    parser.add_argument('--file', default=None, help=f'trace 文件（默认读取配置 TRACE_FILE，即 {DEFAULT_FILE}）')
+    parser.add_argument('--top', type=int, default=10, help='显示最慢的 N 个 trace')
+    parser.add_argument('--name', help='只看指定名称的 trace（update、job、publish_job）')
+    parser.add_argument('--handler', help='只看指定命令/回调的更新（如 /search、callback:delete_post）')
+    parser.add_argument('--since', type=float, help='只看最近 N 分钟')
+    args = parser.parse_args()
+
+    path = args.file or os.getenv('TRACE_FILE') or DEFAULT_FILE
+    traces = load_traces(path)
+    if args.name:
+        traces = [t for t in traces if t['name'] == args.name]
+    if args.handler:
+        traces = [t for t in traces if t['attrs'].get('handler') == args.handler]
+    if args.since:
+        cutoff = time.time() - args.since * 60
+        traces = [t for t in traces if t['start'] >= cutoff]
+    if not traces:
+        print(f"没有找到 trace: {path}")
+        sys.exit(1)
+
+    traces.sort(key=lambda t: t['duration_ms'], reverse=True)
+    root_durations = [t['duration_ms'] for t in traces]
+    print(f"共 {len(traces)} 个 trace，p50 {_percentile(root_durations, 0.5):.1f} ms，"
+          f"p95 {_percentile(root_durations, 0.95):.1f} ms，最大 {root_durations[0]:.1f} ms")
+    print()
+    print(f"最慢的 {min(args.top, len(traces))} 个 trace:")
+    for trace in traces[:args.top]:
+        print()
+        for line in format_trace(trace):
+            print(line)
+
+    print()
+    print("按 span 汇总:")
+    print(f"  {'名称':<32}{'次数':>8}{'总耗时(ms)':>14}{'p50(ms)':>10}{'p95(ms)':>10}")
+    for name, count, total, p50, p95 in summarize(traces):
+        print(f"  {name:<32}{count:>8}{total:>14.1f}{p50:>10.1f}{p95:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+PTB 持久化基准测试
+
+对比 SqlitePersistence（utils/persistence.py）与 PTB 自带的 PicklePersistence：
+
+- 启动载入：读取 user_data 和会话状态的耗时（SqlitePersistence 只载入最近活跃的条目，
+  其余按需读回；PicklePersistence 读取整个文件）
+- 每个持久化周期的写入：PTB 把本周期发来更新的用户全部交给持久化，其中只有一部分数据有变化；
+  分别测量提交这些条目并写入的耗时（PicklePersistence 使用默认设置，每个有变化的条目都重写整个文件）
+
+用法：
+    python benchmarks/bench_persistence.py                 # 默认 20000 个用户，其中 10% 最近活跃
+    python benchmarks/bench_persistence.py --users 100000 --active 0.05 --dirty 500
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from telegram.ext import PicklePersistence  # noqa: E402
+
+from database import ptb_state, session_data  # noqa: E402
+from database.db_manager import get_db, init_db  # noqa: E402
+from utils.persistence import SqlitePersistence  # noqa: E402
+
+NAME = 'submission_conversation'
+LOAD_WINDOW = 1800
+
+
+def _user_data(user_id: int) -> dict:
+    return {
+        'search_mode': random.choice(['title', 'tag', 'user']),
+        'time_filter': random.choice(['all', 'week', 'month']),
+        'last_query': f"query {user_id} " + 'x' * random.randint(0, 60),
+    }
+
+
+async def build(db_path: str, users: int, active: float, conversations: int):
+    """按迁移建库并写入用户数据（active 比例的用户在载入窗口内）"""
+    now = time.time()
+    with patch('database.db_manager.DB_PATH', db_path):
+        await init_db()
+        persistence = SqlitePersistence()
+        async with get_db() as conn:
+            recent = [(user_id, persistence._dumps(('user', user_id), _user_data(user_id))[1])
+                      for user_id in range(1, int(users * active) + 1)]
+            old = [(user_id, persistence._dumps(('user', user_id), _user_data(user_id))[1])
+                   for user_id in range(int(users * active) + 1, users + 1)]
+            await session_data.save_many(conn, session_data.KIND_USER, recent, now=now)
+            await session_data.save_many(conn, session_data.KIND_USER, old, now=now - 86400)
+            await ptb_state.save_conversations(
+                conn, NAME, {(user_id, user_id): random.randint(0, 13) for user_id in range(1, conversations + 1)}
+            )
+
+
+async def bench_sqlite(db_path: str, dirty: int, changed: float, runs: int):
+    with patch('database.db_manager.DB_PATH', db_path):
+        started = time.perf_counter()
+        persistence = SqlitePersistence(load_window=LOAD_WINDOW)
+        user_data = await persistence.get_user_data()
+        conversations = await persistence.get_conversations(NAME)
+        load = time.perf_counter() - started
+
+        cycles = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            for user_id in random.sample(sorted(user_data), min(dirty, len(user_data))):
+                if random.random() < changed:
+                    user_data[user_id]['time_filter'] = str(random.random())
+                await persistence.update_user_data(user_id, user_data[user_id])
+            # 直接写入，不计后台写入任务合并变更的等待时间
+            await persistence._write()
+            cycles.append(time.perf_counter() - started)
+        return load, len(user_data), len(conversations), cycles
+
+
+async def bench_pickle(file_path: str, db_path: str, dirty: int, changed: float, runs: int):
+    # 用相同的数据构建 PicklePersistence 文件
+    with patch('database.db_manager.DB_PATH', db_path):
+        persistence = SqlitePersistence(load_window=10 ** 9)
+        all_users = await persistence.get_user_data()
+        states = await persistence.get_conversations(NAME)
+    writer = PicklePersistence(file_path, update_interval=60, on_flush=True)
+    for user_id, data in all_users.items():
+        await writer.update_user_data(user_id, data)
+    for key, state in states.items():
+        await writer.update_conversation(NAME, key, state)
+    await writer.flush()
+
+    started = time.perf_counter()
+    reader = PicklePersistence(file_path, update_interval=60)
+    user_data = await reader.get_user_data()
+    conversations = await reader.get_conversations(NAME)
+    load = time.perf_counter() - started
+
+    cycles = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        for user_id in random.sample(sorted(user_data), min(dirty, len(user_data))):
+            if random.random() < changed:
+                user_data[user_id]['time_filter'] = str(random.random())
+            await reader.update_user_data(user_id, dict(user_data[user_id]))
+        await reader.flush()
+        cycles.append(time.perf_counter() - started)
+    return load, len(user_data), len(conversations), cycles
+
+
+def _ms(values):
+    values = sorted(values)
+    return sum(values) / len(values) * 1000, values[int(len(values) * 0.95) - 1] * 1000 if len(values) > 1 else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='PTB 持久化基准测试')
+    parser.add_argument('--users', type=int, default=20000, help='用户数量')
+    parser.add_argument('--active', type=float, default=0.1, help='最近活跃（启动时载入）的用户比例')
+    parser.add_argument('--conversations', type=int, default=200, help='未完成的投稿会话数')
+    parser.add_argument('--dirty', type=int, default=200, help='每个持久化周期发来更新的用户数')
+    parser.add_argument('--changed', type=float, default=0.2, help='其中数据有变化的比例')
+    parser.add_argument('--runs', type=int, default=5, help='测量的持久化周期数')
+    args = parser.parse_args()
+    random.seed(42)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'bench.db')
+        asyncio.run(build(db_path, args.users, args.active, args.conversations))
+        sqlite_result = asyncio.run(bench_sqlite(db_path, args.dirty, args.changed, args.runs))
+        pickle_result = asyncio.run(
+            bench_pickle(os.path.join(tmp, 'bench.pickle'), db_path, args.dirty, args.changed, args.runs)
+        )
+        pickle_size = os.path.getsize(os.path.join(tmp, 'bench.pickle'))
+
+    print(f"用户数: {args.users}（最近活跃 {args.active:.0%}），未完成会话: {args.conversations}，"
+          f"每周期 {args.dirty} 个用户（{args.changed:.0%} 有变化），pickle 文件 {pickle_size / 1048576:.1f} MB\n")
+    print(f"{'':<20}{'启动载入 (ms)':>14}{'载入用户':>10}{'载入会话':>10}{'周期平均 (ms)':>14}{'周期 p95 (ms)':>14}")
+    for name, (load, users, conversations, cycles) in (
+        ('SqlitePersistence', sqlite_result), ('PicklePersistence', pickle_result)
+    ):
+        avg, p95 = _ms(cycles)
+        print(f"{name:<20}{load * 1000:>14.1f}{users:>10}{conversations:>10}{avg:>14.2f}{p95:>14.2f}")
+
+
+if __name__ == '__main__':
+    main()
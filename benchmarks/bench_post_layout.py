@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+published_posts 冷热字段拆分基准测试
+
+分别构建两种布局的数据库并执行热点查询：
+- wide：大字段（caption、note、link、file_ids）仍在 published_posts 中（迁移 6 之前）
+- split：大字段在 post_content 表中（当前布局）
+
+输出 published_posts 的页数、每页行数、SQLite page cache（DB_CACHE_KB）能覆盖的比例，
+以及各查询在新连接（page cache 为空）和复用连接（page cache 已预热）下的耗时。
+
+用法：
+    python benchmarks/bench_post_layout.py              # 默认 50000 篇帖子
+    python benchmarks/bench_post_layout.py --posts 10000 --runs 50
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from config.settings import DB_CACHE_KB  # noqa: E402
+from database import migrations  # noqa: E402
+from utils import leaderboard  # noqa: E402
+
+USERS = 2000
+TAGS = [f"tag{i}" for i in range(200)]
+NOW = time.time()
+
+
+def _board_sql_wide(windowed: bool) -> str:
+    columns = ', '.join(leaderboard.BOARD_FIELDS)
+    window_filter = ' AND publish_time > ?' if windowed else ''
+    return (f"SELECT {columns} FROM published_posts WHERE is_deleted = 0{window_filter} "
+            "ORDER BY heat_score DESC LIMIT ?")
+
+
+# 查询名称 -> (wide SQL, split SQL, 参数生成函数)
+QUERIES = {
+    '/hot 全部': (_board_sql_wide(False), leaderboard._board_sql(False), lambda: (leaderboard.BOARD_SIZE,)),
+    '/hot 本周': (_board_sql_wide(True), leaderboard._board_sql(True),
+                lambda: (NOW - 7 * 86400, leaderboard.BOARD_SIZE)),
+    '统计任务选帖': (
+        "SELECT message_id, publish_time, last_update FROM published_posts "
+        "WHERE publish_time > ? AND is_deleted = 0",
+    ) * 2 + (lambda: (NOW - 30 * 86400,),),
+    '/myposts': (
+        "SELECT message_id, title, tags, publish_time, views, forwards, heat_score FROM published_posts "
+        "WHERE user_id = ? AND is_deleted = 0 ORDER BY publish_time DESC LIMIT ?",
+    ) * 2 + (lambda: (random.randint(1, USERS), 10),),
+    '按标签列表': (
+        "SELECT p.message_id, p.title, p.publish_time, p.views, p.heat_score FROM post_tags AS pt "
+        "JOIN published_posts AS p ON p.message_id = pt.message_id "
+        "WHERE pt.tag_id = ? AND p.is_deleted = 0 ORDER BY pt.message_id DESC LIMIT 10",
+    ) * 2 + (lambda: (random.randint(1, len(TAGS)),),),
+}
+
+
+def _fake_post(message_id: int):
+    """生成一篇体积接近真实数据的帖子"""
+    tags = ' '.join(f"#{tag}" for tag in random.sample(TAGS, 3))
+    title = f"帖子标题 {message_id} " + "文" * random.randint(5, 20)
+    note = "简介内容" * random.randint(20, 60)
+    link = f"https://example.com/resource/{message_id}"
+    caption = f"{title}\n\n{note}\n\n{link}\n\n{tags}"
+    file_ids = json.dumps([f"type:photo,id:{'A' * 70}{message_id}{i}" for i in range(random.randint(1, 4))])
+    publish_time = NOW - random.random() * 90 * 86400
+    return {
+        'message_id': message_id, 'user_id': random.randint(1, USERS), 'username': f"user{message_id % USERS}",
+        'title': title, 'tags': tags, 'link': link, 'note': note, 'content_type': 'photo',
+        'file_ids': file_ids, 'caption': caption, 'filename': '', 'publish_time': publish_time,
+        'views': random.randint(0, 5000), 'forwards': random.randint(0, 50), 'reactions': random.randint(0, 50),
+        'heat_score': random.random() * 1000, 'last_update': publish_time, 'related_message_ids': None,
+        'is_deleted': 0,
+    }
+
+
+async def build(db_path: str, layout: str, posts: int):
+    """按指定布局建库并写入帖子"""
+    from database.db_manager import get_db, init_db
+    from database import post_tags
+
+    versions = migrations.MIGRATIONS if layout == 'split' else tuple(m for m in migrations.MIGRATIONS if m.version < 6)
+    random.seed(42)
+    rows = [_fake_post(i) for i in range(1, posts + 1)]
+
+    with patch('database.db_manager.DB_PATH', db_path), \
+            patch.object(migrations, 'MIGRATIONS', versions), \
+            patch.object(migrations, 'LATEST_VERSION', versions[-1].version):
+        await init_db()
+        async with get_db() as conn:
+            hot = [name for name, _ in migrations.PUBLISHED_POSTS_COLUMNS]
+            if layout == 'split':
+                hot = [name for name in hot if name not in migrations.MOVED_POST_COLUMNS]
+            await conn.executemany(
+                f"INSERT INTO published_posts ({', '.join(hot)}) VALUES ({', '.join('?' * len(hot))})",
+                [tuple(row[name] for name in hot) for row in rows]
+            )
+            if layout == 'split':
+                cold = migrations.post_content.CONTENT_COLUMNS
+                await conn.executemany(
+                    f"INSERT INTO post_content (message_id, {', '.join(cold)}) VALUES (?, {', '.join('?' * len(cold))})",
+                    [(row['message_id'], *(row[name] for name in cold)) for row in rows]
+                )
+            for start in range(0, posts, 1000):
+                await post_tags.backfill(conn, start, 1000)
+        async with get_db() as conn:
+            await conn.execute("VACUUM")
+
+
+def table_pages(conn) -> int:
+    try:
+        return conn.execute("SELECT COUNT(*) FROM dbstat WHERE name = 'published_posts'").fetchone()[0]
+    except sqlite3.OperationalError:
+        return 0
+
+
+def _connect(db_path: str):
+    conn = sqlite3.connect(db_path)
+    conn.execute(f"PRAGMA cache_size={-int(DB_CACHE_KB)}")
+    return conn
+
+
+def measure(db_path: str, layout: str, runs: int) -> dict:
+    """返回 {查询名称: (冷 page cache 中位数 ms, 热 page cache 中位数 ms, 热 p95 ms)}"""
+    column = 0 if layout == 'wide' else 1
+    results = {}
+    warm = _connect(db_path)
+    for name, query in QUERIES.items():
+        sql, make_params = query[column], query[2]
+        random.seed(7)
+        cold_times = []
+        for _ in range(max(runs // 10, 5)):
+            conn = _connect(db_path)
+            start = time.perf_counter()
+            conn.execute(sql, make_params()).fetchall()
+            cold_times.append((time.perf_counter() - start) * 1000)
+            conn.close()
+        warm_times = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            warm.execute(sql, make_params()).fetchall()
+            warm_times.append((time.perf_counter() - start) * 1000)
+        warm_times.sort()
+        results[name] = (statistics.median(cold_times), statistics.median(warm_times),
+                         warm_times[int(len(warm_times) * 0.95) - 1])
+    warm.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='published_posts 冷热字段拆分基准测试')
+    parser.add_argument('--posts', type=int, default=50000, help='帖子数量')
+    parser.add_argument('--runs', type=int, default=200, help='每个查询执行次数')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        report = {}
+        for layout in ('wide', 'split'):
+            db_path = os.path.join(tmp, f'{layout}.db')
+            asyncio.run(build(db_path, layout, args.posts))
+            conn = sqlite3.connect(db_path)
+            page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+            pages = table_pages(conn)
+            conn.close()
+            report[layout] = (pages, page_size, measure(db_path, layout, args.runs))
+
+    cache_bytes = DB_CACHE_KB * 1024
+    print(f"帖子数: {args.posts}，page cache: {DB_CACHE_KB} KB\n")
+    for layout, (pages, page_size, _) in report.items():
+        if pages:
+            coverage = min(cache_bytes / page_size / pages, 1.0)
+            print(f"[{layout}] published_posts: {pages} 页 ({pages * page_size / 1048576:.1f} MB)，"
+                  f"每页 {args.posts / pages:.1f} 行，page cache 可覆盖 {coverage:.0%}")
+    print()
+    print(f"{'查询':<12}{'wide 冷':>10}{'split 冷':>10}{'wide 热':>10}{'split 热':>10}{'wide p95':>10}{'split p95':>10}  (ms)")
+    for name in QUERIES:
+        wide, split = report['wide'][2][name], report['split'][2][name]
+        print(f"{name:<12}{wide[0]:>10.3f}{split[0]:>10.3f}{wide[1]:>10.3f}{split[1]:>10.3f}{wide[2]:>10.3f}{split[2]:>10.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Webhook 接收路径压测
+
+在本机启动 WebhookServer（Application 用只消费更新队列的桩代替），并发推送频道消息更新，
+输出每秒请求数、应答延迟分位数以及接收、重复、饱和拒绝的请求数。
+客户端和服务器运行在同一个事件循环中，结果偏保守。
+
+用法：
+    python benchmarks/bench_webhook.py                        # 默认 20000 个请求、并发 64
+    python benchmarks/bench_webhook.py --requests 50000 --concurrency 128
+    python benchmarks/bench_webhook.py --duplicates 0.1       # 10% 的请求为重复投递
+    python benchmarks/bench_webhook.py --stdlib-json          # 使用标准库 json 解析对比
+    python benchmarks/bench_webhook.py --consumer-delay 0.001 # Application 处理变慢，观察 503 背压
+"""
+import argparse
+import asyncio
+import json
+import random
+import socket
+import statistics
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+import aiohttp
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils import webhook_server  # noqa: E402
+from utils.webhook_server import WebhookServer  # noqa: E402
+
+SECRET = 'bench-secret'
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _payload(update_id: int) -> bytes:
+    return json.dumps({
+        'update_id': update_id,
+        'channel_post': {
+            'message_id': update_id, 'date': int(time.time()),
+            'chat': {'id': -1001234567890, 'type': 'channel', 'title': 'bench'},
+            'caption': '标题 #tag1 #tag2 ' + 'x' * 200,
+            'photo': [{'file_id': f'photo{update_id}', 'file_unique_id': f'u{update_id}',
+                       'width': 1280, 'height': 720}],
+        },
+    }, ensure_ascii=False).encode()
+
+
+async def _drain(queue: asyncio.Queue, delay: float):
+    while True:
+        await queue.get()
+        if delay:
+            await asyncio.sleep(delay)
+
+
+async def run(args):
+    if args.stdlib_json:
+        webhook_server._json_loads = json.loads
+    application = SimpleNamespace(bot=None, update_queue=asyncio.Queue())
+    port = _free_port()
+    server = WebhookServer(application, port=port, path='/webhook', secret_token=SECRET, max_queue=args.max_queue)
+    await server.start()
+    drainer = asyncio.create_task(_drain(application.update_queue, args.consumer_delay))
+
+    update_ids = list(range(1, args.requests + 1))
+    for i in range(len(update_ids)):
+        if random.random() < args.duplicates and i > 0:
+            update_ids[i] = update_ids[random.randrange(max(0, i - 100), i)]
+    bodies = [_payload(update_id) for update_id in update_ids]
+    latencies = []
+    statuses = {}
+    url = f'http://127.0.0.1:{port}/webhook'
+    headers = {webhook_server.SECRET_TOKEN_HEADER: SECRET, 'Content-Type': 'application/json'}
+    next_index = iter(range(len(bodies)))
+
+    async def worker(session):
+        for i in next_index:
+            started = time.perf_counter()
+            async with session.post(url, data=bodies[i], headers=headers) as response:
+                await response.read()
+                statuses[response.status] = statuses.get(response.status, 0) + 1
+            latencies.append(time.perf_counter() - started)
+
+    connector = aiohttp.TCPConnector(limit=args.concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(session) for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+
+    drainer.cancel()
+    await server.stop()
+
+    latencies.sort()
+    stats = server.get_stats()
+    print(f"JSON 解析: {'json' if args.stdlib_json else webhook_server._json_loads.__module__}")
+    print(f"请求数: {len(latencies)}，并发: {args.concurrency}，耗时: {elapsed:.2f} 秒")
+    print(f"吞吐: {len(latencies) / elapsed:,.0f} 请求/秒")
+    print(f"延迟: p50 {statistics.median(latencies) * 1000:.2f} ms，"
+          f"p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:.2f} ms，最大 {latencies[-1] * 1000:.2f} ms")
+    print(f"状态码: {dict(sorted(statuses.items()))}")
+    print(f"接收 {stats['accepted']}，重复 {stats['duplicates']}，饱和拒绝 {stats['rejected']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Webhook 接收路径压测')
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--duplicates', type=float, default=0.0, help='重复投递的比例')
+    parser.add_argument('--max-queue', type=int, default=webhook_server.DEFAULT_MAX_QUEUE)
+    parser.add_argument('--consumer-delay', type=float, default=0.0, help='模拟每个更新的处理耗时（秒）')
+    parser.add_argument('--stdlib-json', action='store_true', help='使用标准库 json 代替 orjson')
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
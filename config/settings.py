@@ -133,6 +133,8 @@ _webhook_port = get_env_or_config('WEBHOOK_PORT', 'WEBHOOK', 'PORT')
 WEBHOOK_PORT = int(_webhook_port) if _webhook_port else get_config_int('WEBHOOK', 'PORT', 8080)
 WEBHOOK_PATH = get_env_or_config('WEBHOOK_PATH', 'WEBHOOK', 'PATH', fallback='/webhook')
 WEBHOOK_SECRET_TOKEN = get_env_or_config('WEBHOOK_SECRET_TOKEN', 'WEBHOOK', 'SECRET_TOKEN', fallback='')
+_webhook_max_queue = get_env_or_config('WEBHOOK_MAX_QUEUE', 'WEBHOOK', 'MAX_QUEUE')
+WEBHOOK_MAX_QUEUE = int(_webhook_max_queue) if _webhook_max_queue else get_config_int('WEBHOOK', 'MAX_QUEUE', 1000)  # 待处理更新上限，超过时返回 503
 
 # 搜索引擎配置
 SEARCH_INDEX_DIR = get_env_or_config('SEARCH_INDEX_DIR', 'SEARCH', 'INDEX_DIR', fallback='data/search_index')
@@ -151,6 +153,122 @@ else:
 # 数据库配置
 _db_cache_kb = get_env_or_config('DB_CACHE_KB', 'DB', 'CACHE_SIZE_KB')
 DB_CACHE_KB = int(_db_cache_kb) if _db_cache_kb else get_config_int('DB', 'CACHE_SIZE_KB', 4096)  # SQLite page cache，单位KB
+_db_profile_queries_env = os.getenv('DB_PROFILE_QUERIES')
+if _db_profile_queries_env is not None:
+    DB_PROFILE_QUERIES = _db_profile_queries_env.lower() in ('true', '1', 'yes')
+else:
+    DB_PROFILE_QUERIES = get_config_bool('DB', 'PROFILE_QUERIES', True)  # 按语句统计耗时（/sqlstats）
+_db_slow_query_ms = get_env_or_config('DB_SLOW_QUERY_MS', 'DB', 'SLOW_QUERY_MS')
+DB_SLOW_QUERY_MS = int(_db_slow_query_ms) if _db_slow_query_ms else get_config_int('DB', 'SLOW_QUERY_MS', 100)
+_db_maintenance_interval = get_env_or_config('DB_MAINTENANCE_INTERVAL', 'DB', 'MAINTENANCE_INTERVAL')
+DB_MAINTENANCE_INTERVAL = int(_db_maintenance_interval) if _db_maintenance_interval else get_config_int('DB', 'MAINTENANCE_INTERVAL', 600)  # 秒
+_db_wal_checkpoint_mb = get_env_or_config('DB_WAL_CHECKPOINT_MB', 'DB', 'WAL_CHECKPOINT_MB')
+DB_WAL_CHECKPOINT_MB = int(_db_wal_checkpoint_mb) if _db_wal_checkpoint_mb else get_config_int('DB', 'WAL_CHECKPOINT_MB', 16)
+_db_vacuum_idle = get_env_or_config('DB_VACUUM_IDLE_SECONDS', 'DB', 'VACUUM_IDLE_SECONDS')
+DB_VACUUM_IDLE_SECONDS = int(_db_vacuum_idle) if _db_vacuum_idle else get_config_int('DB', 'VACUUM_IDLE_SECONDS', 60)
+_db_vacuum_step = get_env_or_config('DB_VACUUM_STEP_PAGES', 'DB', 'VACUUM_STEP_PAGES')
+DB_VACUUM_STEP_PAGES = int(_db_vacuum_step) if _db_vacuum_step else get_config_int('DB', 'VACUUM_STEP_PAGES', 256)
+
+# 归档配置：已删除（以及超过保留期限）的帖子定期移到归档数据库
+ARCHIVE_DB_PATH = get_env_or_config('ARCHIVE_DB_PATH', 'ARCHIVE', 'DB_PATH') or \
+    os.path.splitext(DB_PATH)[0] + '_archive.db'
+_archive_retention = get_env_or_config('ARCHIVE_RETENTION_DAYS', 'ARCHIVE', 'RETENTION_DAYS')
+ARCHIVE_RETENTION_DAYS = int(_archive_retention) if _archive_retention else get_config_int('ARCHIVE', 'RETENTION_DAYS', 0)  # 0 表示只归档已删除的帖子
+_archive_batch = get_env_or_config('ARCHIVE_BATCH_SIZE', 'ARCHIVE', 'BATCH_SIZE')
+ARCHIVE_BATCH_SIZE = int(_archive_batch) if _archive_batch else get_config_int('ARCHIVE', 'BATCH_SIZE', 500)
+_archive_interval = get_env_or_config('ARCHIVE_INTERVAL', 'ARCHIVE', 'INTERVAL')
+ARCHIVE_INTERVAL = int(_archive_interval) if _archive_interval else get_config_int('ARCHIVE', 'INTERVAL', 3600)  # 秒
+
+# 发布队列配置：确认投稿后写入队列，由后台工作协程发送到频道
+_publish_workers = get_env_or_config('PUBLISH_WORKERS', 'PUBLISH', 'WORKERS')
+PUBLISH_WORKERS = int(_publish_workers) if _publish_workers else get_config_int('PUBLISH', 'WORKERS', 2)
+_publish_max_attempts = get_env_or_config('PUBLISH_MAX_ATTEMPTS', 'PUBLISH', 'MAX_ATTEMPTS')
+PUBLISH_MAX_ATTEMPTS = int(_publish_max_attempts) if _publish_max_attempts else get_config_int('PUBLISH', 'MAX_ATTEMPTS', 5)
+_publish_retry_delay = get_env_or_config('PUBLISH_RETRY_DELAY', 'PUBLISH', 'RETRY_DELAY')
+PUBLISH_RETRY_DELAY = int(_publish_retry_delay) if _publish_retry_delay else get_config_int('PUBLISH', 'RETRY_DELAY', 30)  # 秒，之后每次翻倍
+
+# 指标：Prometheus 文本格式的 /metrics 端点（Webhook 模式在 Webhook 端口，Polling 模式在健康检查端口）
+_metrics_env = os.getenv('METRICS_ENABLED')
+if _metrics_env is not None:
+    METRICS_ENABLED = _metrics_env.lower() in ('true', '1', 'yes')
+else:
+    METRICS_ENABLED = get_config_bool('METRICS', 'ENABLED', True)
+METRICS_TOKEN = get_env_or_config('METRICS_TOKEN', 'METRICS', 'TOKEN', fallback='')  # 设置后抓取需带 Authorization: Bearer <token>
+
+# 链路追踪：每个更新一个 trace，抽样及慢请求导出到本地 JSONL 文件（用 analyze_traces.py 分析）
+_tracing_env = os.getenv('TRACING_ENABLED')
+if _tracing_env is not None:
+    TRACING_ENABLED = _tracing_env.lower() in ('true', '1', 'yes')
+else:
+    TRACING_ENABLED = get_config_bool('TRACING', 'ENABLED', True)
+_trace_sample_rate = get_env_or_config('TRACE_SAMPLE_RATE', 'TRACING', 'SAMPLE_RATE')
+TRACE_SAMPLE_RATE = float(_trace_sample_rate) if _trace_sample_rate else 0.01
+_trace_slow_threshold = get_env_or_config('TRACE_SLOW_THRESHOLD', 'TRACING', 'SLOW_THRESHOLD')
+TRACE_SLOW_THRESHOLD = float(_trace_slow_threshold) if _trace_slow_threshold else 2.0  # 秒，超过即导出
+TRACE_FILE = get_env_or_config('TRACE_FILE', 'TRACING', 'FILE', fallback='logs/traces.jsonl')
+_trace_file_max_mb = get_env_or_config('TRACE_FILE_MAX_MB', 'TRACING', 'MAX_MB')
+TRACE_FILE_MAX_MB = float(_trace_file_max_mb) if _trace_file_max_mb else 20.0
+
+# 事件循环延迟监控：调度延迟超过阈值时记录阻塞位置（日志、指标、/debug）
+_loop_monitor_env = os.getenv('LOOP_MONITOR_ENABLED')
+if _loop_monitor_env is not None:
+    LOOP_MONITOR_ENABLED = _loop_monitor_env.lower() in ('true', '1', 'yes')
+else:
+    LOOP_MONITOR_ENABLED = get_config_bool('LOOP_MONITOR', 'ENABLED', True)
+_loop_lag_threshold = get_env_or_config('LOOP_LAG_THRESHOLD', 'LOOP_MONITOR', 'THRESHOLD')
+LOOP_LAG_THRESHOLD = float(_loop_lag_threshold) if _loop_lag_threshold else 0.1  # 秒
+
+# 内存调控：RSS 接近上限时淘汰缓存、调低 SQLite page cache、回收内存（/memory 查看）
+_memory_limit_mb = get_env_or_config('MEMORY_LIMIT_MB', 'MEMORY', 'LIMIT_MB')
+MEMORY_LIMIT_MB = int(_memory_limit_mb) if _memory_limit_mb else get_config_int('MEMORY', 'LIMIT_MB', 0)  # 0 表示读取容器限制
+_memory_soft_percent = get_env_or_config('MEMORY_SOFT_PERCENT', 'MEMORY', 'SOFT_PERCENT')
+MEMORY_SOFT_PERCENT = float(_memory_soft_percent) if _memory_soft_percent else 80.0
+_memory_hard_percent = get_env_or_config('MEMORY_HARD_PERCENT', 'MEMORY', 'HARD_PERCENT')
+MEMORY_HARD_PERCENT = float(_memory_hard_percent) if _memory_hard_percent else 90.0
+_memory_check_interval = get_env_or_config('MEMORY_CHECK_INTERVAL', 'MEMORY', 'CHECK_INTERVAL')
+MEMORY_CHECK_INTERVAL = int(_memory_check_interval) if _memory_check_interval else get_config_int('MEMORY', 'CHECK_INTERVAL', 30)  # 秒
+_memory_tracemalloc_env = os.getenv('MEMORY_TRACEMALLOC')
+if _memory_tracemalloc_env is not None:
+    MEMORY_TRACEMALLOC = _memory_tracemalloc_env.lower() in ('true', '1', 'yes')
+else:
+    MEMORY_TRACEMALLOC = get_config_bool('MEMORY', 'TRACEMALLOC', False)
+
+# 会话数据（PTB user_data / chat_data）：内存中只保留最近活跃的条目，其余溢出到数据库
+_session_max_entries = get_env_or_config('SESSION_MAX_ENTRIES', 'SESSION', 'MAX_ENTRIES')
+SESSION_MAX_ENTRIES = int(_session_max_entries) if _session_max_entries else get_config_int('SESSION', 'MAX_ENTRIES', 2000)
+_session_idle_ttl = get_env_or_config('SESSION_IDLE_TTL', 'SESSION', 'IDLE_TTL')
+SESSION_IDLE_TTL = int(_session_idle_ttl) if _session_idle_ttl else get_config_int('SESSION', 'IDLE_TTL', 1800)  # 秒
+_session_retention_days = get_env_or_config('SESSION_RETENTION_DAYS', 'SESSION', 'RETENTION_DAYS')
+SESSION_RETENTION_DAYS = int(_session_retention_days) if _session_retention_days else get_config_int('SESSION', 'RETENTION_DAYS', 30)
+# 持久化投稿会话状态、user_data / chat_data 和 bot_data（保存到数据库，重启后继续）
+_session_persistence_env = os.getenv('SESSION_PERSISTENCE')
+if _session_persistence_env is not None:
+    SESSION_PERSISTENCE = _session_persistence_env.lower() in ('true', '1', 'yes')
+else:
+    SESSION_PERSISTENCE = get_config_bool('SESSION', 'PERSISTENCE', True)
+_session_persistence_interval = get_env_or_config('SESSION_PERSISTENCE_INTERVAL', 'SESSION', 'PERSISTENCE_INTERVAL')
+SESSION_PERSISTENCE_INTERVAL = int(_session_persistence_interval) if _session_persistence_interval else get_config_int('SESSION', 'PERSISTENCE_INTERVAL', 30)  # 秒
+
+# 并发处理更新：不同用户的更新并发处理，同一用户的更新按顺序处理（1 表示逐个处理）
+_concurrent_updates = get_env_or_config('CONCURRENT_UPDATES', 'BOT', 'CONCURRENT_UPDATES')
+CONCURRENT_UPDATES = int(_concurrent_updates) if _concurrent_updates else get_config_int('BOT', 'CONCURRENT_UPDATES', 32)
+_max_pending_updates = get_env_or_config('MAX_PENDING_UPDATES', 'BOT', 'MAX_PENDING_UPDATES')
+MAX_PENDING_UPDATES = int(_max_pending_updates) if _max_pending_updates else get_config_int('BOT', 'MAX_PENDING_UPDATES', 1000)  # 排队和处理中的更新总数上限
+
+# Telegram API 全局限流：全局与按会话的令牌桶，交互 > 发布 > 后台任务
+_rate_limit_env = os.getenv('RATE_LIMIT_ENABLED')
+if _rate_limit_env is not None:
+    RATE_LIMIT_ENABLED = _rate_limit_env.lower() in ('true', '1', 'yes')
+else:
+    RATE_LIMIT_ENABLED = get_config_bool('RATE_LIMIT', 'ENABLED', True)
+_rate_limit_global = get_env_or_config('RATE_LIMIT_GLOBAL_PER_SECOND', 'RATE_LIMIT', 'GLOBAL_PER_SECOND')
+RATE_LIMIT_GLOBAL_PER_SECOND = float(_rate_limit_global) if _rate_limit_global else 30.0
+_rate_limit_chat = get_env_or_config('RATE_LIMIT_CHAT_PER_SECOND', 'RATE_LIMIT', 'CHAT_PER_SECOND')
+RATE_LIMIT_CHAT_PER_SECOND = float(_rate_limit_chat) if _rate_limit_chat else 1.0
+_rate_limit_group = get_env_or_config('RATE_LIMIT_GROUP_PER_MINUTE', 'RATE_LIMIT', 'GROUP_PER_MINUTE')
+RATE_LIMIT_GROUP_PER_MINUTE = float(_rate_limit_group) if _rate_limit_group else 20.0
+_rate_limit_retries = get_env_or_config('RATE_LIMIT_MAX_RETRIES', 'RATE_LIMIT', 'MAX_RETRIES')
+RATE_LIMIT_MAX_RETRIES = int(_rate_limit_retries) if _rate_limit_retries else get_config_int('RATE_LIMIT', 'MAX_RETRIES', 3)
 
 # 验证必要配置
 if not TOKEN:
@@ -0,0 +1,203 @@
+"""
+帖子归档模块
+
+published_posts 中被删除的帖子只是标记 is_deleted = 1，会一直留在表和索引中。
+归档任务定期把这些帖子（以及可选的、发布超过保留期限的帖子）分批移到
+单独的归档数据库（ATTACH 为 archive），主库只保留仍然有效的内容：
+
+1. 复制：帖子行和 post_content 写入归档库（INSERT OR REPLACE，可重复执行），提交
+2. 删除：只删除归档库中已存在的帖子，提交；删除触发器同时清理内容、标签关联和用户聚合
+
+WAL 模式下跨库事务不保证原子性，分两步提交保证任何时候中断都不会丢数据，
+最坏情况是下次重新复制同一批帖子。
+
+归档库中的帖子不参与排行、统计和搜索，管理员可通过 /archived 查询。
+"""
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import List, Optional, Tuple
+
+from config.settings import ARCHIVE_DB_PATH
+from database.db_manager import get_db
+from database.migrations import PUBLISHED_POSTS_COLUMNS, MOVED_POST_COLUMNS
+from database.post_content import CONTENT_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_SCHEMA = 'archive'
+
+# 归档帖子表的字段：与 published_posts 相同（大字段在归档库的 post_content 中），另加归档时间
+ARCHIVE_POST_COLUMNS = tuple(
+    (name, decl) for name, decl in PUBLISHED_POSTS_COLUMNS if name not in MOVED_POST_COLUMNS
+) + (('archived_at', 'REAL'),)
+
+_POST_NAMES = ', '.join(name for name, _ in ARCHIVE_POST_COLUMNS if name != 'archived_at')
+_CONTENT_NAMES = ', '.join(('message_id',) + CONTENT_COLUMNS)
+
+
+async def ensure_schema(conn, schema: str = ARCHIVE_SCHEMA):
+    """
+    在归档库中创建表和索引
+
+    Args:
+        conn: 已 ATTACH 归档库的数据库连接
+        schema: 归档库的 schema 名
+    """
+    columns = ', '.join(f'{name} {decl}' for name, decl in ARCHIVE_POST_COLUMNS)
+    await conn.execute(f'CREATE TABLE IF NOT EXISTS {schema}.published_posts ({columns})')
+    await conn.execute(
+        f'CREATE INDEX IF NOT EXISTS {schema}.idx_archive_user_time ON published_posts(user_id, publish_time DESC)'
+    )
+    await conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS {schema}.post_content (
+            message_id INTEGER PRIMARY KEY,
+            link TEXT,
+            note TEXT,
+            file_ids TEXT,
+            caption TEXT
+        )
+    ''')
+
+
+@asynccontextmanager
+async def get_archive_db(archive_path: Optional[str] = None):
+    """
+    主库连接，并以 archive 为名附加归档库
+
+    Args:
+        archive_path: 归档库路径，默认 ARCHIVE_DB_PATH
+
+    Yields:
+        aiosqlite.Connection: 数据库连接对象
+    """
+    async with get_db() as conn:
+        await conn.execute(f"ATTACH DATABASE ? AS {ARCHIVE_SCHEMA}", (archive_path or ARCHIVE_DB_PATH,))
+        await conn.execute(f"PRAGMA {ARCHIVE_SCHEMA}.journal_mode=WAL")
+        await ensure_schema(conn)
+        await conn.commit()
+        yield conn
+
+
+async def _select_batch(conn, limit: int, cutoff: Optional[float]) -> Tuple[List[int], List[int]]:
+    """选出一批待归档的帖子：先取已删除的，不足时再取超过保留期限的"""
+    cursor = await conn.execute(
+        "SELECT message_id FROM published_posts WHERE is_deleted = 1 ORDER BY message_id LIMIT ?",
+        (limit,)
+    )
+    deleted = [row[0] for row in await cursor.fetchall()]
+    aged = []
+    if cutoff is not None and len(deleted) < limit:
+        cursor = await conn.execute(
+            "SELECT message_id FROM published_posts WHERE is_deleted = 0 AND publish_time < ? "
+            "ORDER BY publish_time LIMIT ?",
+            (cutoff, limit - len(deleted))
+        )
+        aged = [row[0] for row in await cursor.fetchall()]
+    return deleted, aged
+
+
+async def archive_batch(conn, limit: int, cutoff: Optional[float] = None) -> Tuple[List[int], List[int]]:
+    """
+    归档一批帖子（复制与删除分别提交）
+
+    Args:
+        conn: 通过 get_archive_db 获得的连接
+        limit: 本批最多归档的帖子数
+        cutoff: 发布时间早于该时间戳的未删除帖子也归档，None 表示只归档已删除的帖子
+
+    Returns:
+        Tuple[List[int], List[int]]: (已删除帖子的消息ID, 超过保留期限帖子的消息ID)
+    """
+    deleted, aged = await _select_batch(conn, limit, cutoff)
+    message_ids = deleted + aged
+    if not message_ids:
+        return [], []
+    placeholders = ','.join('?' * len(message_ids))
+
+    # 1. 复制到归档库
+    await conn.execute(
+        f"INSERT OR REPLACE INTO {ARCHIVE_SCHEMA}.published_posts ({_POST_NAMES}, archived_at) "
+        f"SELECT {_POST_NAMES}, ? FROM main.published_posts WHERE message_id IN ({placeholders})",
+        (time.time(), *message_ids)
+    )
+    await conn.execute(
+        f"INSERT OR REPLACE INTO {ARCHIVE_SCHEMA}.post_content ({_CONTENT_NAMES}) "
+        f"SELECT {_CONTENT_NAMES} FROM main.post_content WHERE message_id IN ({placeholders})",
+        message_ids
+    )
+    await conn.commit()
+
+    # 2. 从主库删除（只删除确认已写入归档库的帖子）
+    await conn.execute(
+        f"DELETE FROM main.published_posts WHERE message_id IN ({placeholders}) "
+        f"AND message_id IN (SELECT message_id FROM {ARCHIVE_SCHEMA}.published_posts)",
+        message_ids
+    )
+    await conn.execute(
+        f"DELETE FROM main.post_stats_history WHERE message_id IN ({placeholders})",
+        message_ids
+    )
+    await conn.commit()
+    return deleted, aged
+
+
+async def get_archived_post(conn, message_id: int):
+    """
+    读取归档的帖子
+
+    Args:
+        conn: 通过 get_archive_db 获得的连接
+        message_id: 帖子消息ID
+
+    Returns:
+        帖子行（含 note、link），不存在时返回 None
+    """
+    cursor = await conn.execute('''
+        SELECT p.*, c.note, c.link
+        FROM archive.published_posts AS p
+        LEFT JOIN archive.post_content AS c ON c.message_id = p.message_id
+        WHERE p.message_id = ?
+    ''', (int(message_id),))
+    return await cursor.fetchone()
+
+
+async def get_archived_user_posts(conn, user_id: int, limit: int = 10) -> list:
+    """
+    读取用户最近的归档帖子
+
+    Args:
+        conn: 通过 get_archive_db 获得的连接
+        user_id: 用户ID
+        limit: 返回数量
+
+    Returns:
+        list: 帖子行，按发布时间倒序
+    """
+    cursor = await conn.execute(
+        "SELECT message_id, title, publish_time, views, is_deleted, archived_at FROM archive.published_posts "
+        "WHERE user_id = ? ORDER BY publish_time DESC LIMIT ?",
+        (int(user_id), limit)
+    )
+    return await cursor.fetchall()
+
+
+async def get_archive_stats(conn) -> dict:
+    """
+    统计主库与归档库的帖子数
+
+    Args:
+        conn: 通过 get_archive_db 获得的连接
+
+    Returns:
+        dict: live（有效帖子）、pending（待归档的已删除帖子）、archived（归档帖子）
+    """
+    stats = {}
+    for key, sql in (
+        ('live', "SELECT COUNT(*) FROM main.published_posts WHERE is_deleted = 0"),
+        ('pending', "SELECT COUNT(*) FROM main.published_posts WHERE is_deleted = 1"),
+        ('archived', "SELECT COUNT(*) FROM archive.published_posts"),
+    ):
+        cursor = await conn.execute(sql)
+        stats[key] = (await cursor.fetchone())[0]
+    return stats
@@ -2,14 +2,47 @@
 数据库管理模块
 """
 import logging
+import time
 from datetime import datetime
 from contextlib import asynccontextmanager
 import aiosqlite
 
 from config.settings import DB_PATH, TIMEOUT, DB_CACHE_KB
+from database import migrations, publish_outbox
+from database.sql_profiler import profile_connection
+from utils import metrics, tracing
 
 logger = logging.getLogger(__name__)
 
+DB_ACQUIRE_SECONDS = metrics.histogram('telesubmit_db_acquire_seconds', '打开数据库连接并设置参数的耗时（秒）')
+DB_SESSION_SECONDS = metrics.histogram(
+    'telesubmit_db_session_seconds', '一次 get_db 会话（查询和提交）的耗时（秒）', ('result',)
+)
+
+# 最近一次通过 get_db 访问数据库的时间（monotonic），维护任务据此判断数据库是否空闲
+_last_activity = 0.0
+
+
+def seconds_since_activity() -> float:
+    """距最近一次通过 get_db 访问数据库的秒数"""
+    return time.monotonic() - _last_activity
+
+
+# 新连接的 SQLite page cache（KB），内存紧张时由内存调控临时调低
+_page_cache_kb = DB_CACHE_KB
+
+
+def set_page_cache_kb(kb=None):
+    """设置之后新建连接的 page cache 大小（None 恢复为 DB_CACHE_KB 配置）"""
+    global _page_cache_kb
+    _page_cache_kb = DB_CACHE_KB if kb is None else kb
+
+
+def get_page_cache_kb() -> int:
+    """当前新连接使用的 page cache 大小（KB）"""
+    return _page_cache_kb
+
+
 @asynccontextmanager
 async def get_db():
     """
@@ -18,91 +51,47 @@ async def get_db():
     Yields:
         aiosqlite.Connection: 数据库连接对象
     """
-    conn = await aiosqlite.connect(DB_PATH)
-    conn.row_factory = aiosqlite.Row
-    # 优化 SQLite 运行参数，降低 I/O 延迟
-    try:
-        await conn.execute("PRAGMA journal_mode=WAL;")
-        await conn.execute("PRAGMA synchronous=NORMAL;")
-        await conn.execute("PRAGMA temp_store=MEMORY;")
-        # 通过负值设置 KB 为单位的 page cache 大小（默认为 4MB，可通过 DB_CACHE_KB 配置）
-        await conn.execute(f"PRAGMA cache_size={-int(DB_CACHE_KB)};")
-    except Exception:
-        pass
-    try:
-        yield conn
-        await conn.commit()
-    except Exception as e:
-        await conn.rollback()
-        raise e
-    finally:
-        await conn.close()
+    global _last_activity
+    with tracing.span('db'):
+        _last_activity = started = time.monotonic()
+        conn = await aiosqlite.connect(DB_PATH)
+        conn.row_factory = aiosqlite.Row
+        # 优化 SQLite 运行参数，降低 I/O 延迟
+        try:
+            await conn.execute("PRAGMA journal_mode=WAL;")
+            await conn.execute("PRAGMA synchronous=NORMAL;")
+            await conn.execute("PRAGMA temp_store=MEMORY;")
+            # 通过负值设置 KB 为单位的 page cache 大小（默认为 4MB，可通过 DB_CACHE_KB 配置）
+            await conn.execute(f"PRAGMA cache_size={-int(_page_cache_kb)};")
+        except Exception:
+            pass
+        acquired = time.monotonic()
+        DB_ACQUIRE_SECONDS.observe(acquired - started)
+        result = 'commit'
+        try:
+            yield profile_connection(conn)
+            await conn.commit()
+        except Exception as e:
+            result = 'rollback'
+            await conn.rollback()
+            raise e
+        finally:
+            await conn.close()
+            _last_activity = time.monotonic()
+            DB_SESSION_SECONDS.labels(result).observe(_last_activity - acquired)
 
-async def init_db():
+async def init_db() -> bool:
     """
-    初始化数据库
+    初始化数据库（执行尚未应用的 schema 迁移）
+
+    Returns:
+        bool: 是否有待执行的后台回填（由调用方通过 migrations.run_backfills 在后台执行）
     """
     try:
         async with get_db() as conn:
-            # 临时投稿数据表
-            await conn.execute('''
-                CREATE TABLE IF NOT EXISTS submissions (
-                    user_id INTEGER PRIMARY KEY,
-                    timestamp REAL,
-                    mode TEXT,
-                    image_id TEXT,
-                    document_id TEXT,
-                    tags TEXT,
-                    link TEXT,
-                    title TEXT,
-                    note TEXT,
-                    spoiler TEXT,
-                    username TEXT
-                )
-            ''')
-            
-            # 已发布帖子表（用于热度统计和搜索）
-            await conn.execute('''
-                CREATE TABLE IF NOT EXISTS published_posts (
-                    message_id INTEGER PRIMARY KEY,
-                    user_id INTEGER,
-                    username TEXT,
-                    title TEXT,
-                    tags TEXT,
-                    link TEXT,
-                    note TEXT,
-                    content_type TEXT,
-                    file_ids TEXT,
-                    caption TEXT,
-                    filename TEXT,
-                    publish_time REAL,
-                    views INTEGER DEFAULT 0,
-                    forwards INTEGER DEFAULT 0,
-                    reactions INTEGER DEFAULT 0,
-                    heat_score REAL DEFAULT 0,
-                    last_update REAL,
-                    related_message_ids TEXT,
-                    is_deleted INTEGER DEFAULT 0
-                )
-            ''')
-            
-            # 添加 is_deleted 字段（如果表已存在但没有该字段）
-            try:
-                await conn.execute('ALTER TABLE published_posts ADD COLUMN is_deleted INTEGER DEFAULT 0')
-                logger.info("已添加 is_deleted 字段到 published_posts 表")
-            except Exception:
-                # 字段已存在，忽略错误
-                pass
-            
-            # 创建索引以提升查询性能
-            await conn.execute('CREATE INDEX IF NOT EXISTS idx_heat_score ON published_posts(heat_score DESC)')
-            await conn.execute('CREATE INDEX IF NOT EXISTS idx_publish_time ON published_posts(publish_time DESC)')
-            await conn.execute('CREATE INDEX IF NOT EXISTS idx_user_id ON published_posts(user_id)')
-            await conn.execute('CREATE INDEX IF NOT EXISTS idx_tags ON published_posts(tags)')
-            await conn.execute('CREATE INDEX IF NOT EXISTS idx_is_deleted ON published_posts(is_deleted)')
-            
-            await conn.commit()
+            has_backfills = await migrations.migrate(conn)
             logger.info("数据库初始化完成")
+            return has_backfills
     except Exception as e:
         logger.error(f"初始化数据库时出错: {e}")
         raise
@@ -127,6 +116,7 @@ async def cleanup_old_data():
             c = await conn.cursor()
             cutoff = datetime.now().timestamp() - TIMEOUT
             await c.execute("DELETE FROM submissions WHERE timestamp < ?", (cutoff,))
+            await publish_outbox.purge_finished(conn, datetime.now().timestamp() - publish_outbox.RETENTION_SECONDS)
             logger.info("已清理过期数据")
     except Exception as e:
         logger.error(f"清理过期数据失败: {e}")
\ No newline at end of file
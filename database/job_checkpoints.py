@@ -0,0 +1,82 @@
+"""
+定时任务断点模块
+
+耗时较长的定时任务（如帖子统计刷新）分批提交结果，并把本轮的进度
+记录在 job_checkpoints 表中，与该批结果在同一事务中提交；
+任务中途退出后，下次执行时读取断点，跳过本轮已经处理过的数据。
+任务正常结束时删除断点。
+"""
+import logging
+import time
+from typing import NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class Checkpoint(NamedTuple):
+    """任务断点：本轮开始时间、已处理数量、最后更新时间"""
+    started_at: float
+    position: int
+    updated_at: float
+
+
+async def ensure_schema(conn):
+    """
+    创建断点表
+
+    Args:
+        conn: 数据库连接
+    """
+    await conn.execute('''
+        CREATE TABLE IF NOT EXISTS job_checkpoints (
+            name TEXT PRIMARY KEY,
+            started_at REAL NOT NULL,
+            position INTEGER NOT NULL DEFAULT 0,
+            updated_at REAL NOT NULL
+        )
+    ''')
+
+
+async def get_checkpoint(conn, name: str) -> Optional[Checkpoint]:
+    """
+    读取任务断点
+
+    Args:
+        conn: 数据库连接
+        name: 任务名称
+
+    Returns:
+        Optional[Checkpoint]: 未完成的一轮的断点，没有时返回 None
+    """
+    cursor = await conn.execute(
+        "SELECT started_at, position, updated_at FROM job_checkpoints WHERE name = ?", (name,)
+    )
+    row = await cursor.fetchone()
+    return Checkpoint(*row) if row else None
+
+
+async def save_checkpoint(conn, name: str, started_at: float, position: int):
+    """
+    保存任务断点（与该批结果在同一事务中提交）
+
+    Args:
+        conn: 数据库连接
+        name: 任务名称
+        started_at: 本轮开始时间
+        position: 本轮已处理的数量
+    """
+    await conn.execute(
+        "INSERT OR REPLACE INTO job_checkpoints (name, started_at, position, updated_at) VALUES (?, ?, ?, ?)",
+        (name, started_at, position, time.time())
+    )
+
+
+async def clear_checkpoint(conn, name: str):
+    """
+    删除任务断点（本轮正常结束时调用）
+
+    Args:
+        conn: 数据库连接
+        name: 任务名称
+    """
+    await conn.execute("DELETE FROM job_checkpoints WHERE name = ?", (name,))
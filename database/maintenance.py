@@ -0,0 +1,207 @@
+"""
+数据库在线维护模块
+
+由定时任务在进程内执行，代替停机运行 optimize_database.py 的全量 VACUUM：
+
+1. 查询规划统计：SQLite 3.46 以上执行 PRAGMA optimize（检查全部表）；
+   旧版本的 optimize 只分析本连接查询过的表，因此改为执行有行数上限的 ANALYZE
+2. WAL 检查点：WAL 文件超过 DB_WAL_CHECKPOINT_MB 时执行 PASSIVE 检查点，
+   全部帧写回后再 TRUNCATE 截断文件
+3. 增量 vacuum：数据库空闲（DB_VACUUM_IDLE_SECONDS 内没有 get_db 访问）时，
+   每步回收 DB_VACUUM_STEP_PAGES 个空闲页，有新的访问即停止
+
+最近一次维护的 WAL 大小、检查点耗时等记录在内存中，/debug 中显示。
+"""
+import asyncio
+import logging
+import os
+import sqlite3
+import time
+from typing import Optional
+
+import aiosqlite
+
+from config.settings import DB_WAL_CHECKPOINT_MB, DB_VACUUM_IDLE_SECONDS, DB_VACUUM_STEP_PAGES
+from database import db_manager
+
+logger = logging.getLogger(__name__)
+
+# ANALYZE 每个索引最多检查的行数（近似统计，耗时与表大小无关）
+ANALYSIS_LIMIT = 1000
+
+# 每次维护最多执行的增量 vacuum 步数，以及步与步之间的间隔（秒）
+VACUUM_MAX_STEPS = 40
+VACUUM_STEP_PAUSE = 0.2
+
+# 数据库文件不超过该大小时自动转换为增量 vacuum 模式（转换需要一次全量 VACUUM）
+AUTO_VACUUM_CONVERT_MAX_BYTES = 32 * 1024 * 1024
+
+# PRAGMA auto_vacuum 的取值
+AUTO_VACUUM_INCREMENTAL = 2
+
+_last_report = None
+_convert_warned = False
+
+
+def get_last_report() -> Optional[dict]:
+    """最近一次维护的结果，尚未执行过时返回 None"""
+    return _last_report
+
+
+def wal_size(db_path: str) -> int:
+    """WAL 文件大小（字节），不存在时为 0"""
+    try:
+        return os.path.getsize(db_path + '-wal')
+    except OSError:
+        return 0
+
+
+async def _pragma_value(conn, pragma: str):
+    cursor = await conn.execute(f"PRAGMA {pragma}")
+    return (await cursor.fetchone())[0]
+
+
+async def refresh_statistics(conn):
+    """
+    更新查询规划器使用的统计信息（sqlite_stat1）
+
+    Args:
+        conn: 数据库连接
+    """
+    await conn.execute(f"PRAGMA analysis_limit={ANALYSIS_LIMIT}")
+    if sqlite3.sqlite_version_info >= (3, 46, 0):
+        await conn.execute("PRAGMA optimize=0x10002")
+    else:
+        await conn.execute("ANALYZE")
+    await conn.commit()
+
+
+async def checkpoint(conn, db_path: str, threshold_bytes: int) -> Optional[dict]:
+    """
+    WAL 超过阈值时执行检查点
+
+    Args:
+        conn: 数据库连接
+        db_path: 数据库路径
+        threshold_bytes: WAL 大小阈值
+
+    Returns:
+        检查点结果（模式、WAL 大小、帧数、耗时），未达到阈值时返回 None
+    """
+    wal_bytes = wal_size(db_path)
+    if wal_bytes < threshold_bytes:
+        return None
+
+    start = time.perf_counter()
+    cursor = await conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+    busy, frames, checkpointed = await cursor.fetchone()
+    mode = 'PASSIVE'
+    if not busy and frames == checkpointed:
+        # 全部帧已写回主库：截断 WAL 文件，释放磁盘空间
+        cursor = await conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        busy, frames, checkpointed = await cursor.fetchone()
+        mode = 'TRUNCATE'
+    elapsed_ms = (time.perf_counter() - start) * 1000
+
+    if busy or checkpointed < frames:
+        logger.warning(f"WAL 检查点未完成（{checkpointed}/{frames} 帧），可能有长时间运行的读事务")
+    return {
+        'mode': mode,
+        'wal_bytes': wal_bytes,
+        'frames': frames,
+        'checkpointed': checkpointed,
+        'ms': elapsed_ms,
+    }
+
+
+async def ensure_incremental_vacuum(conn, db_path: str) -> bool:
+    """
+    确认数据库处于增量 vacuum 模式，小数据库直接转换
+
+    Args:
+        conn: 数据库连接
+        db_path: 数据库路径
+
+    Returns:
+        bool: 是否可以执行增量 vacuum
+    """
+    global _convert_warned
+    if await _pragma_value(conn, "auto_vacuum") == AUTO_VACUUM_INCREMENTAL:
+        return True
+    if os.path.getsize(db_path) > AUTO_VACUUM_CONVERT_MAX_BYTES:
+        if not _convert_warned:
+            logger.warning("数据库未启用增量 vacuum，请在停机时运行一次 optimize_database.py 完成转换")
+            _convert_warned = True
+        return False
+    await conn.execute(f"PRAGMA auto_vacuum={AUTO_VACUUM_INCREMENTAL}")
+    await conn.execute("VACUUM")
+    logger.info("数据库已转换为增量 vacuum 模式")
+    return await _pragma_value(conn, "auto_vacuum") == AUTO_VACUUM_INCREMENTAL
+
+
+async def incremental_vacuum(conn, step_pages: int = DB_VACUUM_STEP_PAGES,
+                             idle_seconds: float = DB_VACUUM_IDLE_SECONDS) -> int:
+    """
+    数据库空闲时分步回收空闲页
+
+    Args:
+        conn: 数据库连接（已处于增量 vacuum 模式）
+        step_pages: 每步回收的页数
+        idle_seconds: 距最近一次访问超过该秒数才视为空闲
+
+    Returns:
+        int: 回收的页数
+    """
+    freed = 0
+    for _ in range(VACUUM_MAX_STEPS):
+        if db_manager.seconds_since_activity() < idle_seconds:
+            break
+        before = await _pragma_value(conn, "freelist_count")
+        if before == 0:
+            break
+        # incremental_vacuum 每回收一页产生一行结果，executescript 才会执行到底
+        await conn.executescript(f"PRAGMA incremental_vacuum({int(step_pages)});")
+        freed += before - await _pragma_value(conn, "freelist_count")
+        await asyncio.sleep(VACUUM_STEP_PAUSE)
+    return freed
+
+
+async def run_maintenance(db_path: Optional[str] = None) -> Optional[dict]:
+    """
+    执行一次数据库维护
+
+    Args:
+        db_path: 数据库路径，默认主数据库
+
+    Returns:
+        维护结果，出错时返回 None
+    """
+    global _last_report
+    db_path = db_path or db_manager.DB_PATH
+    report = {'time': time.time(), 'wal_bytes': wal_size(db_path)}
+    try:
+        async with aiosqlite.connect(db_path) as conn:
+            start = time.perf_counter()
+            await refresh_statistics(conn)
+            report['analyze_ms'] = (time.perf_counter() - start) * 1000
+
+            report['vacuumed_pages'] = 0
+            if await ensure_incremental_vacuum(conn, db_path):
+                report['vacuumed_pages'] = await incremental_vacuum(conn)
+            report['freelist_pages'] = await _pragma_value(conn, "freelist_count")
+
+            report['checkpoint'] = await checkpoint(conn, db_path, DB_WAL_CHECKPOINT_MB * 1024 * 1024)
+    except Exception as e:
+        logger.error(f"数据库维护失败: {e}", exc_info=True)
+        return None
+
+    report['wal_bytes_after'] = wal_size(db_path)
+    _last_report = report
+    ckpt = report['checkpoint']
+    logger.info(
+        f"数据库维护完成：WAL {report['wal_bytes'] / 1048576:.1f}MB -> {report['wal_bytes_after'] / 1048576:.1f}MB，"
+        f"统计更新 {report['analyze_ms']:.0f}ms，"
+        + (f"检查点 {ckpt['mode']} {ckpt['ms']:.0f}ms，" if ckpt else "")
+        + f"回收 {report['vacuumed_pages']} 页，剩余空闲页 {report['freelist_pages']}"
+    )
+    return report
@@ -0,0 +1,415 @@
+"""
+数据库 schema 迁移模块
+
+schema 的每一次变更都登记为一个带版本号的迁移，按版本顺序执行，
+已执行的版本记录在 schema_version 表中：
+
+- 每个迁移在单独的事务中执行，并且是幂等的（CREATE ... IF NOT EXISTS、
+  按 PRAGMA table_info 补列），中途失败重启后可以安全重跑
+- schema 已是最新时，启动只需读取一次版本号
+- 耗时的数据回填不在迁移中同步执行：迁移只登记到 schema_backfills 表，
+  由 run_backfills() 在后台按主键分批处理，每批连同进度一起提交，
+  进程重启后从上次的位置继续
+
+新增 schema 变更时在 MIGRATIONS 末尾追加迁移，不要修改已发布的迁移。
+"""
+import asyncio
+import logging
+import sqlite3
+import time
+from typing import Awaitable, Callable, Dict, NamedTuple, Optional
+
+from database import (
+    stats_history, user_stats, post_tags, post_content, job_checkpoints, post_messages, publish_outbox,
+    session_data, ptb_state
+)
+
+logger = logging.getLogger(__name__)
+
+# 后台回填每批处理的行数，以及两批之间的间隔（让出数据库给正常请求）
+BACKFILL_BATCH_SIZE = 1000
+BACKFILL_PAUSE_SECONDS = 0.5
+
+# 已发布帖子表最初的完整字段定义（迁移 1），旧数据库缺少的字段由迁移补齐；
+# 其中的大字段已由迁移 6 移到 post_content 表，related_message_ids 已由迁移 9 转换为 post_messages 表
+PUBLISHED_POSTS_COLUMNS = (
+    ('message_id', 'INTEGER PRIMARY KEY'),
+    ('user_id', 'INTEGER'),
+    ('username', 'TEXT'),
+    ('title', 'TEXT'),
+    ('tags', 'TEXT'),
+    ('link', 'TEXT'),
+    ('note', 'TEXT'),
+    ('content_type', 'TEXT'),
+    ('file_ids', 'TEXT'),
+    ('caption', 'TEXT'),
+    ('filename', 'TEXT'),
+    ('publish_time', 'REAL'),
+    ('views', 'INTEGER DEFAULT 0'),
+    ('forwards', 'INTEGER DEFAULT 0'),
+    ('reactions', 'INTEGER DEFAULT 0'),
+    ('heat_score', 'REAL DEFAULT 0'),
+    ('last_update', 'REAL'),
+    ('related_message_ids', 'TEXT'),
+    ('is_deleted', 'INTEGER DEFAULT 0'),
+)
+
+# 后续迁移从 published_posts 移出的字段
+MOVED_POST_COLUMNS = post_content.CONTENT_COLUMNS + (post_messages.LEGACY_COLUMN,)
+
+# published_posts 的索引，每个索引对应处理器中的一类查询
+POST_INDEXES = {
+    # /myposts、/searchuser：WHERE user_id = ? AND is_deleted = 0 ORDER BY publish_time DESC
+    'idx_posts_user_time': 'published_posts(user_id, publish_time DESC) WHERE is_deleted = 0',
+    # 用户最热帖子（user_post_stats 触发器）：WHERE user_id = ? AND is_deleted = 0 ORDER BY heat_score DESC
+    'idx_posts_user_heat': 'published_posts(user_id, heat_score DESC, message_id DESC) WHERE is_deleted = 0',
+    # 热门排行：WHERE is_deleted = 0 ORDER BY heat_score DESC LIMIT ?
+    'idx_posts_live_heat': 'published_posts(heat_score DESC) WHERE is_deleted = 0',
+    # 统计任务和按时间窗口的排行：WHERE is_deleted = 0 AND publish_time > ?
+    'idx_posts_live_time': 'published_posts(publish_time) WHERE is_deleted = 0',
+}
+
+# 迁移 7 加入的索引
+DELETED_POST_INDEXES = {
+    # 归档任务：WHERE is_deleted = 1 ORDER BY message_id（归档后只剩少量待归档的行）
+    'idx_posts_deleted': 'published_posts(message_id) WHERE is_deleted = 1',
+}
+
+# 已被取代、迁移时删除的旧索引
+LEGACY_POST_INDEXES = ('idx_heat_score', 'idx_publish_time', 'idx_user_id', 'idx_tags', 'idx_is_deleted')
+# 旧版 optimize_database.py 创建的单列索引（迁移 13 删除）
+LEGACY_SCRIPT_POST_INDEXES = (
+    'idx_published_posts_user_id', 'idx_published_posts_publish_time', 'idx_published_posts_heat_score',
+    'idx_published_posts_message_id', 'idx_published_posts_username',
+)
+
+
+class Migration(NamedTuple):
+    """一次 schema 变更"""
+    version: int
+    description: str
+    apply: Callable[..., Awaitable[None]]
+
+
+async def _table_columns(conn, table: str) -> list:
+    cursor = await conn.execute(f"PRAGMA table_info({table})")
+    return [row[1] for row in await cursor.fetchall()]
+
+
+async def _add_missing_columns(conn, table: str, columns):
+    """为旧表补齐缺少的字段（主键字段无法通过 ALTER TABLE 添加，跳过）"""
+    existing = set(await _table_columns(conn, table))
+    for name, decl in columns:
+        if name in existing or 'PRIMARY KEY' in decl:
+            continue
+        await conn.execute(f'ALTER TABLE {table} ADD COLUMN {name} {decl}')
+        logger.info(f"已添加 {name} 字段到 {table} 表")
+
+
+async def _drop_columns(conn, table: str, columns, column_defs, recreate):
+    """
+    删除表中的字段
+
+    SQLite 3.35+ 直接使用 ALTER TABLE DROP COLUMN；更早的版本按官方推荐的步骤
+    重建表：建新表、复制数据、删除旧表、改名，再由 recreate(conn) 重建索引和触发器。
+
+    Args:
+        conn: 数据库连接（处于迁移事务中）
+        table: 表名
+        columns: 要删除的字段
+        column_defs: 表的完整字段定义 (name, decl)
+        recreate: 重建该表上索引和触发器的协程函数
+    """
+    if sqlite3.sqlite_version_info >= (3, 35, 0):
+        for name in columns:
+            await conn.execute(f'ALTER TABLE {table} DROP COLUMN {name}')
+        return
+
+    existing = await _table_columns(conn, table)
+    keep = [(name, decl) for name, decl in column_defs if name not in columns and name in existing]
+    names = ', '.join(name for name, _ in keep)
+    defs = ', '.join(f'{name} {decl}' for name, decl in keep)
+    await conn.execute(f'CREATE TABLE {table}_new ({defs})')
+    await conn.execute(f'INSERT INTO {table}_new ({names}) SELECT {names} FROM {table}')
+    await conn.execute(f'DROP TABLE {table}')
+    # 其他表上的触发器引用了原表名，改名时不能按新规则校验/改写这些引用
+    await conn.execute('PRAGMA legacy_alter_table = ON')
+    try:
+        await conn.execute(f'ALTER TABLE {table}_new RENAME TO {table}')
+    finally:
+        await conn.execute('PRAGMA legacy_alter_table = OFF')
+    await recreate(conn)
+
+
+async def _has_posts(conn) -> bool:
+    cursor = await conn.execute("SELECT EXISTS (SELECT 1 FROM published_posts)")
+    row = await cursor.fetchone()
+    return bool(row[0])
+
+
+async def _create_base_tables(conn):
+    # 临时投稿数据表
+    await conn.execute('''
+        CREATE TABLE IF NOT EXISTS submissions (
+            user_id INTEGER PRIMARY KEY,
+            timestamp REAL,
+            mode TEXT,
+            image_id TEXT,
+            document_id TEXT,
+            tags TEXT,
+            link TEXT,
+            title TEXT,
+            note TEXT,
+            spoiler TEXT,
+            username TEXT
+        )
+    ''')
+    # 已发布帖子表（用于热度统计和搜索）
+    columns = ',\n'.join(f'{name} {decl}' for name, decl in PUBLISHED_POSTS_COLUMNS)
+    await conn.execute(f'CREATE TABLE IF NOT EXISTS published_posts ({columns})')
+    # 旧版本数据库缺少后来加入的字段（filename、is_deleted 等）
+    await _add_missing_columns(conn, 'published_posts', PUBLISHED_POSTS_COLUMNS)
+
+
+async def _create_post_indexes(conn):
+    # 几乎所有查询都只关心未删除的帖子，因此使用 is_deleted = 0 的部分索引，
+    # 已删除的帖子不占索引空间，也不需要单独的 is_deleted 索引
+    for index_name, index_sql in POST_INDEXES.items():
+        await conn.execute(f'CREATE INDEX IF NOT EXISTS {index_name} ON {index_sql}')
+    # 旧版本的单列索引已被上面的复合/部分索引取代
+    for index_name in LEGACY_POST_INDEXES:
+        await conn.execute(f'DROP INDEX IF EXISTS {index_name}')
+
+
+async def _create_deleted_post_indexes(conn):
+    for index_name, index_sql in DELETED_POST_INDEXES.items():
+        await conn.execute(f'CREATE INDEX IF NOT EXISTS {index_name} ON {index_sql}')
+
+
+async def _drop_script_post_indexes(conn):
+    # 与 POST_INDEXES 重复且写入开销大，查询计划器可能选中它们而不用部分索引
+    for index_name in LEGACY_SCRIPT_POST_INDEXES:
+        await conn.execute(f'DROP INDEX IF EXISTS {index_name}')
+
+
+async def _create_stats_history(conn):
+    await stats_history.ensure_schema(conn)
+
+
+async def _create_user_stats(conn):
+    if await user_stats.ensure_schema(conn) and await _has_posts(conn):
+        await schedule_backfill(conn, 'user_post_stats')
+
+
+async def _create_post_tags(conn):
+    if await post_tags.ensure_schema(conn) and await _has_posts(conn):
+        await schedule_backfill(conn, 'post_tags')
+
+
+async def _recreate_post_dependents(conn):
+    """重建 published_posts 上的索引和触发器（表重建后调用）"""
+    await _create_post_indexes(conn)
+    await _create_deleted_post_indexes(conn)
+    await user_stats.ensure_schema(conn)
+    await post_tags.ensure_schema(conn)
+    await post_content.ensure_schema(conn)
+    await post_messages.ensure_schema(conn)
+
+
+async def _split_post_content(conn):
+    await post_content.ensure_schema(conn)
+    present = [name for name in await _table_columns(conn, 'published_posts') if name in post_content.CONTENT_COLUMNS]
+    if not present:
+        return
+    columns = ', '.join(present)
+    await conn.execute(
+        f'INSERT OR IGNORE INTO post_content (message_id, {columns}) SELECT message_id, {columns} FROM published_posts'
+    )
+    await _drop_columns(conn, 'published_posts', present, PUBLISHED_POSTS_COLUMNS, _recreate_post_dependents)
+
+
+async def _create_job_checkpoints(conn):
+    await job_checkpoints.ensure_schema(conn)
+
+
+async def _normalize_related_messages(conn):
+    await post_messages.ensure_schema(conn)
+    if post_messages.LEGACY_COLUMN not in await _table_columns(conn, 'published_posts'):
+        return
+    converted = await post_messages.convert_legacy_column(conn)
+    logger.info(f"已转换 {converted} 条关联消息记录")
+    await _drop_columns(conn, 'published_posts', [post_messages.LEGACY_COLUMN], PUBLISHED_POSTS_COLUMNS,
+                        _recreate_post_dependents)
+
+
+async def _create_publish_outbox(conn):
+    await publish_outbox.ensure_schema(conn)
+
+
+async def _create_session_data(conn):
+    await session_data.ensure_schema(conn)
+
+
+async def _create_ptb_state(conn):
+    await ptb_state.ensure_schema(conn)
+
+
+# 按版本顺序排列，只能在末尾追加
+MIGRATIONS = (
+    Migration(1, "创建 submissions / published_posts 表并补齐旧表字段", _create_base_tables),
+    Migration(2, "published_posts 复合部分索引", _create_post_indexes),
+    Migration(3, "帖子统计时间序列表", _create_stats_history),
+    Migration(4, "用户投稿聚合表", _create_user_stats),
+    Migration(5, "规范化标签表", _create_post_tags),
+    Migration(6, "帖子大字段移到 post_content 表", _split_post_content),
+    Migration(7, "已删除帖子索引（归档任务使用）", _create_deleted_post_indexes),
+    Migration(8, "定时任务断点表", _create_job_checkpoints),
+    Migration(9, "关联消息 JSON 字段转换为 post_messages 表", _normalize_related_messages),
+    Migration(10, "投稿发布队列表", _create_publish_outbox),
+    Migration(11, "会话数据溢出表", _create_session_data),
+    Migration(12, "会话处理器状态和 bot_data 持久化表", _create_ptb_state),
+    Migration(13, "删除 optimize_database.py 创建的单列索引", _drop_script_post_indexes),
+)
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+# 后台回填任务：名称 -> backfill(conn, after_key, limit)，
+# 处理主键大于 after_key 的一批数据，返回本批最后一个主键，全部完成时返回 None
+BACKFILLS: Dict[str, Callable[..., Awaitable[Optional[int]]]] = {
+    'user_post_stats': user_stats.backfill,
+    'post_tags': post_tags.backfill,
+}
+
+
+async def _read_state(conn):
+    """读取当前 schema 版本和是否有未完成的回填（一次查询）"""
+    try:
+        cursor = await conn.execute(
+            "SELECT (SELECT MAX(version) FROM schema_version), EXISTS (SELECT 1 FROM schema_backfills)"
+        )
+    except sqlite3.OperationalError:
+        # 迁移系统引入之前的数据库或全新数据库
+        return 0, False
+    row = await cursor.fetchone()
+    return row[0] or 0, bool(row[1])
+
+
+async def schedule_backfill(conn, name: str):
+    """
+    登记一个后台回填任务（在迁移中调用）
+
+    Args:
+        conn: 数据库连接
+        name: BACKFILLS 中的回填名称
+    """
+    await conn.execute("INSERT OR IGNORE INTO schema_backfills (name) VALUES (?)", (name,))
+
+
+async def migrate(conn) -> bool:
+    """
+    执行尚未应用的迁移
+
+    Args:
+        conn: 数据库连接
+
+    Returns:
+        bool: 是否有待执行的后台回填
+    """
+    version, has_backfills = await _read_state(conn)
+    if version >= LATEST_VERSION:
+        return has_backfills
+
+    await conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT,
+            applied_at REAL
+        )
+    ''')
+    await conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_backfills (
+            name TEXT PRIMARY KEY,
+            last_key INTEGER,
+            started_at REAL
+        )
+    ''')
+    await conn.commit()
+
+    for migration in MIGRATIONS:
+        if migration.version <= version:
+            continue
+        await conn.execute("BEGIN")
+        try:
+            await migration.apply(conn)
+            await conn.execute(
+                "INSERT INTO schema_version (version, description, applied_at) VALUES (?, ?, ?)",
+                (migration.version, migration.description, time.time())
+            )
+            await conn.commit()
+        except Exception:
+            await conn.rollback()
+            logger.error(f"数据库迁移 {migration.version}（{migration.description}）失败")
+            raise
+        logger.info(f"已应用数据库迁移 {migration.version}: {migration.description}")
+
+    _, has_backfills = await _read_state(conn)
+    return has_backfills
+
+
+async def run_backfill_step(conn, batch_size: int = BACKFILL_BATCH_SIZE) -> bool:
+    """
+    执行一批后台回填，并在同一事务中记录进度
+
+    Args:
+        conn: 数据库连接
+        batch_size: 本批处理的行数
+
+    Returns:
+        bool: 是否还有未完成的回填
+    """
+    cursor = await conn.execute("SELECT name, last_key FROM schema_backfills ORDER BY name LIMIT 1")
+    row = await cursor.fetchone()
+    if row is None:
+        return False
+    name, last_key = row[0], row[1]
+
+    backfill = BACKFILLS.get(name)
+    if backfill is None:
+        logger.warning(f"未知的回填任务 {name}，已移除")
+        await conn.execute("DELETE FROM schema_backfills WHERE name = ?", (name,))
+        return True
+
+    if last_key is None:
+        logger.info(f"开始后台回填 {name}")
+        await conn.execute("UPDATE schema_backfills SET started_at = ? WHERE name = ?", (time.time(), name))
+    next_key = await backfill(conn, last_key, batch_size)
+    if next_key is None:
+        await conn.execute("DELETE FROM schema_backfills WHERE name = ?", (name,))
+        logger.info(f"后台回填 {name} 完成")
+    else:
+        await conn.execute("UPDATE schema_backfills SET last_key = ? WHERE name = ?", (next_key, name))
+    return True
+
+
+async def run_backfills(batch_size: int = BACKFILL_BATCH_SIZE, pause: float = BACKFILL_PAUSE_SECONDS):
+    """
+    在后台执行全部未完成的回填，直到完成
+
+    每批使用独立的连接和事务，中断后下次启动从记录的进度继续。
+
+    Args:
+        batch_size: 每批处理的行数
+        pause: 两批之间的间隔（秒）
+    """
+    from database.db_manager import get_db
+
+    while True:
+        try:
+            async with get_db() as conn:
+                remaining = await run_backfill_step(conn, batch_size)
+        except Exception as e:
+            logger.error(f"后台回填失败，将在下次启动时继续: {e}", exc_info=True)
+            return
+        if not remaining:
+            return
+        await asyncio.sleep(pause)
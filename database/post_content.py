@@ -0,0 +1,64 @@
+"""
+帖子正文内容模块
+
+published_posts 上的热点查询（热门排行、统计任务、用户/标签列表）只需要
+标题、时间和统计数字，但 caption（重复了标题、简介和标签）、file_ids（JSON）、
+note、link 占据了每行的大部分空间，使每页能容纳的行数变少，
+同样大小的 page cache 能覆盖的帖子也更少。
+
+这些体积大、只在展示单个帖子或重建搜索索引时读取的字段保存在
+post_content 表中，以 message_id 与 published_posts 一一对应；
+帖子行被物理删除时由触发器一并删除。
+"""
+import logging
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# 从 published_posts 移到 post_content 的字段
+CONTENT_COLUMNS = ('link', 'note', 'file_ids', 'caption')
+
+
+async def ensure_schema(conn):
+    """
+    创建内容表和级联删除触发器
+
+    Args:
+        conn: 数据库连接
+    """
+    await conn.execute('''
+        CREATE TABLE IF NOT EXISTS post_content (
+            message_id INTEGER PRIMARY KEY,
+            link TEXT,
+            note TEXT,
+            file_ids TEXT,
+            caption TEXT
+        )
+    ''')
+    await conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_post_content_cascade
+        AFTER DELETE ON published_posts
+        BEGIN
+            DELETE FROM post_content WHERE message_id = OLD.message_id;
+        END
+    ''')
+
+
+async def save_content(conn, message_id: int, link: Optional[str] = None, note: Optional[str] = None,
+                       file_ids: Optional[str] = None, caption: Optional[str] = None):
+    """
+    写入帖子内容（与 published_posts 的插入在同一事务中调用）
+
+    Args:
+        conn: 数据库连接
+        message_id: 帖子消息ID
+        link: 链接
+        note: 简介
+        file_ids: 媒体/文档 file_id 列表（JSON）
+        caption: 频道消息的完整说明文本
+    """
+    await conn.execute(
+        "INSERT OR REPLACE INTO post_content (message_id, link, note, file_ids, caption) VALUES (?, ?, ?, ?, ?)",
+        (int(message_id), link, note, file_ids, caption)
+    )
+
@@ -0,0 +1,166 @@
+"""
+帖子关联消息模块
+
+一个帖子在频道中可能由多条消息组成（多组媒体、媒体加文档），
+published_posts 中的一行对应主消息，其余消息记录在 post_messages 表中：
+
+- message_id 为主键：由任意一条消息查所属帖子（频道监听去重、按消息删除）
+- (main_id, position) 索引：按顺序列出帖子的全部关联消息（删除、统计刷新）
+
+取代了原先 published_posts.related_message_ids 中的 JSON 列表（迁移 9 转换并删除该字段）。
+帖子行被物理删除时由触发器一并删除关联消息。
+"""
+import json
+import logging
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 由本表取代、迁移后从 published_posts 删除的字段
+LEGACY_COLUMN = 'related_message_ids'
+
+
+async def ensure_schema(conn):
+    """
+    创建关联消息表、索引和级联删除触发器
+
+    Args:
+        conn: 数据库连接
+    """
+    await conn.execute('''
+        CREATE TABLE IF NOT EXISTS post_messages (
+            message_id INTEGER PRIMARY KEY,
+            main_id INTEGER NOT NULL,
+            position INTEGER NOT NULL
+        )
+    ''')
+    await conn.execute('CREATE INDEX IF NOT EXISTS idx_post_messages_main ON post_messages(main_id, position)')
+    await conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_post_messages_cascade
+        AFTER DELETE ON published_posts
+        BEGIN
+            DELETE FROM post_messages WHERE main_id = OLD.message_id;
+        END
+    ''')
+
+
+async def set_post_messages(conn, main_id: int, message_ids: Iterable[int]):
+    """
+    写入帖子的关联消息（与 published_posts 的插入在同一事务中调用）
+
+    Args:
+        conn: 数据库连接
+        main_id: 主消息ID
+        message_ids: 帖子的全部消息ID（按发送顺序，可以包含主消息本身）
+    """
+    main_id = int(main_id)
+    related = [int(mid) for mid in dict.fromkeys(message_ids) if int(mid) != main_id]
+    await conn.execute("DELETE FROM post_messages WHERE main_id = ?", (main_id,))
+    if related:
+        await conn.executemany(
+            "INSERT OR REPLACE INTO post_messages (message_id, main_id, position) VALUES (?, ?, ?)",
+            [(mid, main_id, position) for position, mid in enumerate(related, 1)]
+        )
+
+
+async def add_post_message(conn, main_id: int, message_id: int):
+    """
+    在帖子末尾追加一条关联消息
+
+    Args:
+        conn: 数据库连接
+        main_id: 主消息ID
+        message_id: 关联消息ID
+    """
+    await conn.execute(
+        "INSERT OR IGNORE INTO post_messages (message_id, main_id, position) "
+        "SELECT ?, ?, COALESCE(MAX(position), 0) + 1 FROM post_messages WHERE main_id = ?",
+        (int(message_id), int(main_id), int(main_id))
+    )
+
+
+async def get_related_ids(conn, main_id: int) -> List[int]:
+    """
+    获取帖子的关联消息ID（不含主消息）
+
+    Args:
+        conn: 数据库连接
+        main_id: 主消息ID
+
+    Returns:
+        List[int]: 按发送顺序排列的消息ID
+    """
+    cursor = await conn.execute(
+        "SELECT message_id FROM post_messages WHERE main_id = ? ORDER BY position", (int(main_id),)
+    )
+    return [row[0] for row in await cursor.fetchall()]
+
+
+async def get_related_map(conn, main_ids: Iterable[int]) -> Dict[int, List[int]]:
+    """
+    批量获取多个帖子的关联消息ID
+
+    Args:
+        conn: 数据库连接
+        main_ids: 主消息ID列表
+
+    Returns:
+        Dict[int, List[int]]: 主消息ID -> 关联消息ID列表（没有关联消息的帖子不在结果中）
+    """
+    ids = [int(mid) for mid in main_ids]
+    related: Dict[int, List[int]] = {}
+    # 分批查询，避免超过 SQLite 的参数个数上限
+    for start in range(0, len(ids), 500):
+        chunk = ids[start:start + 500]
+        cursor = await conn.execute(
+            f"SELECT main_id, message_id FROM post_messages WHERE main_id IN ({','.join('?' * len(chunk))}) "
+            "ORDER BY main_id, position",
+            chunk
+        )
+        for main_id, message_id in await cursor.fetchall():
+            related.setdefault(main_id, []).append(message_id)
+    return related
+
+
+async def resolve_main_id(conn, message_id: int) -> Optional[int]:
+    """
+    由关联消息ID查所属帖子的主消息ID
+
+    Args:
+        conn: 数据库连接
+        message_id: 频道消息ID
+
+    Returns:
+        Optional[int]: 主消息ID；该消息不是任何帖子的关联消息时返回 None
+    """
+    cursor = await conn.execute("SELECT main_id FROM post_messages WHERE message_id = ?", (int(message_id),))
+    row = await cursor.fetchone()
+    return row[0] if row else None
+
+
+async def convert_legacy_column(conn) -> int:
+    """
+    把 published_posts.related_message_ids 中的 JSON 列表转换为关联消息行（迁移 9）
+
+    Args:
+        conn: 数据库连接
+
+    Returns:
+        int: 写入的关联消息数
+    """
+    cursor = await conn.execute(
+        f"SELECT message_id, {LEGACY_COLUMN} FROM published_posts WHERE {LEGACY_COLUMN} IS NOT NULL"
+    )
+    rows = []
+    for main_id, related_json in await cursor.fetchall():
+        try:
+            related = json.loads(related_json) or []
+        except (json.JSONDecodeError, TypeError):
+            logger.warning(f"解析帖子 {main_id} 的关联消息ID失败: {related_json}")
+            continue
+        related = [int(mid) for mid in dict.fromkeys(related) if str(mid).lstrip('-').isdigit() and int(mid) != main_id]
+        rows.extend((mid, main_id, position) for position, mid in enumerate(related, 1))
+    await conn.executemany(
+        "INSERT OR IGNORE INTO post_messages (message_id, main_id, position) VALUES (?, ?, ?)", rows
+    )
+    return len(rows)
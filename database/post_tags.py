@@ -0,0 +1,270 @@
+"""
+规范化标签模块
+
+published_posts.tags 是自由文本（旧数据为 JSON 列表，新数据为 '#a #b'），
+无法建立索引。这里维护两张规范化的表：
+
+- tags(id, name, post_count)：标签字典，post_count 为使用该标签的未删除帖子数
+- post_tags(tag_id, message_id)：帖子与标签的关联，另有 (message_id, tag_id) 反向索引
+
+写入帖子时由 set_post_tags 同步关联；post_count 由触发器在关联增删、
+帖子删除/恢复时增量维护。/tags 和按标签搜索因此都是索引查询。
+"""
+import json
+import logging
+from typing import Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 回填时每批处理的帖子数
+BACKFILL_BATCH_SIZE = 1000
+
+_TRIGGERS = (
+    # 新增关联：帖子未删除时计数 +1
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_post_tags_insert
+    AFTER INSERT ON post_tags
+    BEGIN
+        UPDATE tags SET post_count = post_count + 1
+        WHERE id = NEW.tag_id
+          AND EXISTS (SELECT 1 FROM published_posts WHERE message_id = NEW.message_id AND is_deleted = 0);
+    END
+    ''',
+    # 删除关联：帖子未删除时计数 -1
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_post_tags_delete
+    AFTER DELETE ON post_tags
+    BEGIN
+        UPDATE tags SET post_count = post_count - 1
+        WHERE id = OLD.tag_id
+          AND EXISTS (SELECT 1 FROM published_posts WHERE message_id = OLD.message_id AND is_deleted = 0);
+    END
+    ''',
+    # 帖子删除/恢复：调整该帖子所有标签的计数
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_post_tags_soft_delete
+    AFTER UPDATE OF is_deleted ON published_posts
+    WHEN OLD.is_deleted IS NOT NEW.is_deleted
+    BEGIN
+        UPDATE tags SET post_count = post_count + (CASE WHEN NEW.is_deleted = 0 THEN 1 ELSE -1 END)
+        WHERE id IN (SELECT tag_id FROM post_tags WHERE message_id = NEW.message_id);
+    END
+    ''',
+    # 物理删除帖子：先删除关联（在帖子行仍存在时，计数才能正确扣减）
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_post_tags_cascade
+    BEFORE DELETE ON published_posts
+    BEGIN
+        DELETE FROM post_tags WHERE message_id = OLD.message_id;
+    END
+    ''',
+)
+
+
+def parse_tags(raw) -> List[str]:
+    """
+    解析帖子的标签文本为规范化的标签列表
+
+    兼容 JSON 列表（旧数据）和空格分隔的 '#a #b'（当前格式），
+    去掉 # 前缀、转为小写并按出现顺序去重。
+
+    Args:
+        raw: tags 字段的原始值
+
+    Returns:
+        List[str]: 标签名列表（不含 #）
+    """
+    if not raw:
+        return []
+    items = None
+    if isinstance(raw, str):
+        try:
+            parsed = json.loads(raw)
+            if isinstance(parsed, list):
+                items = [str(item) for item in parsed]
+        except (json.JSONDecodeError, TypeError, ValueError):
+            pass
+        if items is None:
+            items = raw.split()
+    else:
+        items = [str(item) for item in raw]
+
+    names = []
+    for item in items:
+        name = item.strip().lstrip('#').lower()
+        if name:
+            names.append(name)
+    return list(dict.fromkeys(names))
+
+
+async def ensure_schema(conn):
+    """
+    创建标签表、索引和计数触发器
+
+    已有帖子的回填由迁移登记为后台任务（见 backfill）。
+
+    Args:
+        conn: 数据库连接
+
+    Returns:
+        bool: 关联表是否为本次新建
+    """
+    cursor = await conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'post_tags'"
+    )
+    exists = await cursor.fetchone() is not None
+
+    await conn.execute('''
+        CREATE TABLE IF NOT EXISTS tags (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE,
+            post_count INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    await conn.execute('''
+        CREATE TABLE IF NOT EXISTS post_tags (
+            tag_id INTEGER NOT NULL,
+            message_id INTEGER NOT NULL,
+            PRIMARY KEY (tag_id, message_id)
+        ) WITHOUT ROWID
+    ''')
+    # 按帖子查标签（重新同步、删除帖子时使用）
+    await conn.execute('CREATE INDEX IF NOT EXISTS idx_post_tags_message ON post_tags(message_id, tag_id)')
+    # 标签云按使用次数排序
+    await conn.execute('CREATE INDEX IF NOT EXISTS idx_tags_post_count ON tags(post_count DESC)')
+    for sql in _TRIGGERS:
+        await conn.execute(sql)
+
+    return not exists
+
+
+async def _link_tags(conn, rows: Iterable[Tuple[int, List[str]]]):
+    """为一批帖子写入标签关联（不删除已有关联）"""
+    rows = [(int(mid), names) for mid, names in rows if names]
+    if not rows:
+        return
+    names = {name for _, names in rows for name in names}
+    await conn.executemany("INSERT OR IGNORE INTO tags (name) VALUES (?)", [(name,) for name in names])
+    await conn.executemany(
+        "INSERT OR IGNORE INTO post_tags (tag_id, message_id) SELECT id, ? FROM tags WHERE name = ?",
+        [(mid, name) for mid, names in rows for name in names]
+    )
+
+
+async def set_post_tags(conn, message_id: int, raw_tags) -> List[str]:
+    """
+    同步单个帖子的标签关联（写入帖子后调用）
+
+    Args:
+        conn: 数据库连接
+        message_id: 帖子消息ID
+        raw_tags: tags 字段的原始值
+
+    Returns:
+        List[str]: 规范化后的标签名列表
+    """
+    names = parse_tags(raw_tags)
+    await conn.execute("DELETE FROM post_tags WHERE message_id = ?", (int(message_id),))
+    await _link_tags(conn, [(message_id, names)])
+    return names
+
+
+async def rebuild(conn) -> int:
+    """
+    从 published_posts.tags 全量重建标签关联和计数
+
+    按 message_id 分批读取，避免一次性加载全部帖子。
+
+    Args:
+        conn: 数据库连接
+
+    Returns:
+        int: 含有标签的帖子数
+    """
+    await conn.execute("DELETE FROM post_tags")
+    await conn.execute("DELETE FROM tags")
+
+    last_id = None
+    while True:
+        last_id = await backfill(conn, last_id, BACKFILL_BATCH_SIZE)
+        if last_id is None:
+            break
+
+    cursor = await conn.execute("SELECT COUNT(DISTINCT message_id) FROM post_tags")
+    row = await cursor.fetchone()
+    return row[0]
+
+
+async def backfill(conn, after_message_id: Optional[int], limit: int) -> Optional[int]:
+    """
+    为一批帖子写入标签关联（后台迁移任务，rebuild 也按批调用）
+
+    只追加关联（INSERT OR IGNORE），与发布时的 set_post_tags 并发执行也不会重复计数。
+
+    Args:
+        conn: 数据库连接
+        after_message_id: 上一批最后一个消息ID，首批为 None
+        limit: 本批帖子数
+
+    Returns:
+        Optional[int]: 本批最后一个消息ID，没有更多帖子时返回 None
+    """
+    cursor = await conn.execute(
+        "SELECT message_id, tags FROM published_posts WHERE message_id > ? ORDER BY message_id LIMIT ?",
+        (after_message_id if after_message_id is not None else -(2 ** 63), limit)
+    )
+    rows = await cursor.fetchall()
+    if not rows:
+        return None
+    await _link_tags(conn, [(row[0], parse_tags(row[1])) for row in rows])
+    return rows[-1][0]
+
+
+async def get_tag_counts(conn, limit: int = 20) -> List[Tuple[str, int]]:
+    """
+    获取使用次数最多的标签
+
+    Args:
+        conn: 数据库连接
+        limit: 返回数量
+
+    Returns:
+        List[Tuple[str, int]]: (标签名, 未删除帖子数)，按次数降序
+    """
+    cursor = await conn.execute(
+        "SELECT name, post_count FROM tags WHERE post_count > 0 ORDER BY post_count DESC LIMIT ?",
+        (limit,)
+    )
+    return [(row[0], row[1]) for row in await cursor.fetchall()]
+
+
+async def get_tag_posts(conn, tag: str, limit: int = 10) -> Tuple[int, list]:
+    """
+    按标签获取最新的未删除帖子
+
+    Args:
+        conn: 数据库连接
+        tag: 标签名（可带 #，大小写不敏感）
+        limit: 返回数量
+
+    Returns:
+        Tuple[int, list]: (该标签的帖子总数, 帖子行列表，按消息ID降序即发布时间倒序)
+    """
+    names = parse_tags(tag)
+    if not names:
+        return 0, []
+    cursor = await conn.execute("SELECT id, post_count FROM tags WHERE name = ?", (names[0],))
+    row = await cursor.fetchone()
+    if row is None:
+        return 0, []
+    tag_id, total = row[0], row[1]
+
+    cursor = await conn.execute('''
+        SELECT p.message_id, p.title, p.publish_time, p.views, p.heat_score
+        FROM post_tags AS pt
+        JOIN published_posts AS p ON p.message_id = pt.message_id
+        WHERE pt.tag_id = ? AND p.is_deleted = 0
+        ORDER BY pt.message_id DESC
+        LIMIT ?
+    ''', (tag_id, limit))
+    return total, await cursor.fetchall()
@@ -0,0 +1,111 @@
+"""
+PTB 持久化状态模块
+
+保存会话处理器（ConversationHandler）的状态和 bot_data，供 utils/persistence.py 使用；
+user_data / chat_data 保存在 session_data 表中（见 database/session_data.py）。
+
+- ptb_conversations：每个会话一行，键和状态以 JSON 保存
+- ptb_data：bot_data 等整体保存的数据，pickle 后按名称保存
+"""
+import json
+import logging
+import time
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+BOT_DATA = 'bot_data'
+
+
+async def ensure_schema(conn):
+    """
+    创建持久化状态表
+
+    Args:
+        conn: 数据库连接
+    """
+    await conn.execute('''
+        CREATE TABLE IF NOT EXISTS ptb_conversations (
+            name TEXT NOT NULL,
+            key TEXT NOT NULL,
+            state TEXT NOT NULL,
+            updated_at REAL NOT NULL,
+            PRIMARY KEY (name, key)
+        ) WITHOUT ROWID
+    ''')
+    await conn.execute('''
+        CREATE TABLE IF NOT EXISTS ptb_data (
+            name TEXT PRIMARY KEY,
+            data BLOB NOT NULL,
+            updated_at REAL NOT NULL
+        )
+    ''')
+
+
+def encode_key(key: Tuple) -> str:
+    """会话键（(chat_id, user_id) 等）编码为 JSON 文本"""
+    return json.dumps(list(key), separators=(',', ':'))
+
+
+async def load_conversations(conn, name: str) -> Dict[Tuple, Any]:
+    """
+    读取一个会话处理器的全部会话状态
+
+    Returns:
+        Dict[Tuple, Any]: 会话键 -> 状态
+    """
+    cursor = await conn.execute("SELECT key, state FROM ptb_conversations WHERE name = ?", (name,))
+    return {tuple(json.loads(row[0])): json.loads(row[1]) for row in await cursor.fetchall()}
+
+
+async def save_conversations(conn, name: str, states: Dict[Tuple, Any], now: Optional[float] = None) -> int:
+    """
+    写入会话状态（状态为 None 时删除该会话）
+
+    Args:
+        conn: 数据库连接
+        name: 会话处理器名称
+        states: 会话键 -> 新状态
+
+    Returns:
+        int: 写入（或删除）的会话数
+    """
+    now = time.time() if now is None else now
+    updates = [(name, encode_key(key), json.dumps(state), now) for key, state in states.items() if state is not None]
+    deletes = [(name, encode_key(key)) for key, state in states.items() if state is None]
+    if updates:
+        await conn.executemany(
+            "INSERT OR REPLACE INTO ptb_conversations (name, key, state, updated_at) VALUES (?, ?, ?, ?)", updates
+        )
+    if deletes:
+        await conn.executemany("DELETE FROM ptb_conversations WHERE name = ? AND key = ?", deletes)
+    return len(updates) + len(deletes)
+
+
+async def load_data(conn, name: str) -> Optional[bytes]:
+    """
+    读取整体保存的数据
+
+    Returns:
+        Optional[bytes]: 序列化的数据，不存在时返回 None
+    """
+    cursor = await conn.execute("SELECT data FROM ptb_data WHERE name = ?", (name,))
+    row = await cursor.fetchone()
+    return row[0] if row else None
+
+
+async def save_data(conn, items: Iterable[Tuple[str, bytes]], now: Optional[float] = None) -> int:
+    """
+    写入整体保存的数据
+
+    Args:
+        items: (名称, 序列化的数据)
+
+    Returns:
+        int: 写入的条数
+    """
+    now = time.time() if now is None else now
+    rows = [(name, data, now) for name, data in items]
+    if rows:
+        await conn.executemany("INSERT OR REPLACE INTO ptb_data (name, data, updated_at) VALUES (?, ?, ?)", rows)
+    return len(rows)
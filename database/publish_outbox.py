@@ -0,0 +1,285 @@
+"""
+投稿发布队列（outbox）模块
+
+用户确认投稿时，处理器只把投稿快照写入 publish_outbox 表（与删除临时投稿数据
+在同一事务中提交）并立即返回，由后台工作协程领取任务、发送到频道：
+
+- idempotency_key 唯一：重复点击发布按钮只会生成一个任务
+- 任务按阶段推进（发送媒体 -> 发送文档 -> 入库 -> 通知），每完成一个阶段就记录
+  阶段和已发送的消息ID，失败重试或进程重启后从未完成的阶段继续，不会重复发送已完成的部分
+- 失败的任务按指数退避重新排队，超过最大尝试次数后标记为 failed
+- 进程重启时，上次运行中（running）的任务重新排队
+"""
+import json
+import logging
+import time
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+# 任务状态
+STATUS_PENDING = 'pending'
+STATUS_RUNNING = 'running'
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+
+# 发布阶段（按执行顺序）
+STAGE_MEDIA = 'media'
+STAGE_DOCUMENTS = 'documents'
+STAGE_SAVE = 'save'
+STAGE_NOTIFY = 'notify'
+
+# last_error 最多保存的字符数
+MAX_ERROR_LENGTH = 500
+# 已结束（完成或最终失败）的任务保留时间（秒）
+RETENTION_SECONDS = 7 * 86400
+
+
+class OutboxJob(NamedTuple):
+    """已领取的发布任务"""
+    id: int
+    idempotency_key: str
+    user_id: int
+    chat_id: Optional[int]
+    progress_message_id: Optional[int]
+    payload: dict
+    stage: str
+    main_message_id: Optional[int]
+    message_ids: List[int]
+    attempts: int
+
+
+_JOB_COLUMNS = ('id, idempotency_key, user_id, chat_id, progress_message_id, payload, stage, '
+                'main_message_id, message_ids, attempts')
+
+
+def _to_job(row) -> OutboxJob:
+    (job_id, key, user_id, chat_id, progress_message_id, payload, stage,
+     main_message_id, message_ids, attempts) = tuple(row)
+    return OutboxJob(
+        job_id, key, user_id, chat_id, progress_message_id, json.loads(payload), stage,
+        main_message_id, json.loads(message_ids) if message_ids else [], attempts
+    )
+
+
+async def ensure_schema(conn):
+    """
+    创建发布队列表和索引
+
+    Args:
+        conn: 数据库连接
+    """
+    await conn.execute('''
+        CREATE TABLE IF NOT EXISTS publish_outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            idempotency_key TEXT NOT NULL UNIQUE,
+            user_id INTEGER NOT NULL,
+            chat_id INTEGER,
+            progress_message_id INTEGER,
+            payload TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            stage TEXT NOT NULL DEFAULT 'media',
+            main_message_id INTEGER,
+            message_ids TEXT,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at REAL NOT NULL,
+            last_error TEXT,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL
+        )
+    ''')
+    # 领取任务：WHERE status = 'pending' AND next_attempt_at <= ? ORDER BY next_attempt_at, id；
+    # 启动恢复、按状态计数、清理已结束的任务也按 status 前缀使用该索引
+    await conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_publish_outbox_due ON publish_outbox(status, next_attempt_at)"
+    )
+
+
+async def enqueue(conn, idempotency_key: str, user_id: int, chat_id: Optional[int], payload: dict,
+                  progress_message_id: Optional[int] = None):
+    """
+    写入发布任务（同一 idempotency_key 只会写入一次）
+
+    Args:
+        conn: 数据库连接
+        idempotency_key: 幂等键
+        user_id: 投稿用户ID
+        chat_id: 接收进度通知的会话ID
+        payload: 投稿快照
+        progress_message_id: 展示发布进度的消息ID（工作协程编辑这条消息汇报进度）
+
+    Returns:
+        tuple: (任务ID, 是否为新任务)
+    """
+    now = time.time()
+    cursor = await conn.execute(
+        "INSERT OR IGNORE INTO publish_outbox "
+        "(idempotency_key, user_id, chat_id, progress_message_id, payload, next_attempt_at, created_at, updated_at) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        (idempotency_key, user_id, chat_id, progress_message_id, json.dumps(payload, ensure_ascii=False),
+         now, now, now)
+    )
+    if cursor.rowcount:
+        return cursor.lastrowid, True
+    cursor = await conn.execute("SELECT id FROM publish_outbox WHERE idempotency_key = ?", (idempotency_key,))
+    row = await cursor.fetchone()
+    return row[0], False
+
+
+async def queue_position(conn, job_id: int) -> int:
+    """
+    待处理任务在队列中的位置（从 1 开始）
+
+    Args:
+        conn: 数据库连接
+        job_id: 任务ID
+    """
+    cursor = await conn.execute(
+        "SELECT COUNT(*) FROM publish_outbox WHERE status = 'pending' AND id <= ?", (job_id,)
+    )
+    return (await cursor.fetchone())[0]
+
+
+async def claim_next(conn, now: Optional[float] = None) -> Optional[OutboxJob]:
+    """
+    领取一个到期的待处理任务（状态改为 running，尝试次数加 1）
+
+    多个工作协程并发领取时，通过 status = 'pending' 条件更新保证同一任务只被领取一次。
+
+    Args:
+        conn: 数据库连接
+        now: 当前时间戳，默认取 time.time()
+
+    Returns:
+        Optional[OutboxJob]: 领取到的任务，没有到期任务时返回 None
+    """
+    now = time.time() if now is None else now
+    while True:
+        cursor = await conn.execute(
+            "SELECT id FROM publish_outbox WHERE status = 'pending' AND next_attempt_at <= ? "
+            "ORDER BY next_attempt_at, id LIMIT 1",
+            (now,)
+        )
+        row = await cursor.fetchone()
+        if not row:
+            return None
+        cursor = await conn.execute(
+            "UPDATE publish_outbox SET status = 'running', attempts = attempts + 1, updated_at = ? "
+            "WHERE id = ? AND status = 'pending'",
+            (now, row[0])
+        )
+        if cursor.rowcount:
+            cursor = await conn.execute(f"SELECT {_JOB_COLUMNS} FROM publish_outbox WHERE id = ?", (row[0],))
+            return _to_job(await cursor.fetchone())
+
+
+async def advance(conn, job_id: int, stage: str, main_message_id: Optional[int], message_ids: Iterable[int]):
+    """
+    记录任务已完成到的阶段和已发送的消息
+
+    Args:
+        conn: 数据库连接
+        job_id: 任务ID
+        stage: 下一个待执行的阶段
+        main_message_id: 频道主消息ID
+        message_ids: 已发送的全部消息ID
+    """
+    await conn.execute(
+        "UPDATE publish_outbox SET stage = ?, main_message_id = ?, message_ids = ?, updated_at = ? WHERE id = ?",
+        (stage, main_message_id, json.dumps(list(message_ids)), time.time(), job_id)
+    )
+
+
+async def complete(conn, job_id: int):
+    """
+    标记任务完成
+
+    Args:
+        conn: 数据库连接
+        job_id: 任务ID
+    """
+    await conn.execute(
+        "UPDATE publish_outbox SET status = 'done', last_error = NULL, updated_at = ? WHERE id = ?",
+        (time.time(), job_id)
+    )
+
+
+async def reschedule(conn, job_id: int, delay: float, error: str):
+    """
+    任务失败后重新排队
+
+    Args:
+        conn: 数据库连接
+        job_id: 任务ID
+        delay: 距下次尝试的秒数
+        error: 失败原因
+    """
+    now = time.time()
+    await conn.execute(
+        "UPDATE publish_outbox SET status = 'pending', next_attempt_at = ?, last_error = ?, updated_at = ? "
+        "WHERE id = ?",
+        (now + delay, error[:MAX_ERROR_LENGTH], now, job_id)
+    )
+
+
+async def fail(conn, job_id: int, error: str):
+    """
+    标记任务最终失败（不再重试）
+
+    Args:
+        conn: 数据库连接
+        job_id: 任务ID
+        error: 失败原因
+    """
+    await conn.execute(
+        "UPDATE publish_outbox SET status = 'failed', last_error = ?, updated_at = ? WHERE id = ?",
+        (error[:MAX_ERROR_LENGTH], time.time(), job_id)
+    )
+
+
+async def recover_running(conn) -> int:
+    """
+    把上次运行中断的任务重新排队（启动工作协程前调用）
+
+    Args:
+        conn: 数据库连接
+
+    Returns:
+        int: 重新排队的任务数
+    """
+    cursor = await conn.execute(
+        "UPDATE publish_outbox SET status = 'pending', next_attempt_at = ?, updated_at = ? WHERE status = 'running'",
+        (time.time(), time.time())
+    )
+    return cursor.rowcount
+
+
+async def get_status_counts(conn) -> Dict[str, int]:
+    """
+    各状态的任务数
+
+    Args:
+        conn: 数据库连接
+
+    Returns:
+        Dict[str, int]: 状态 -> 任务数
+    """
+    cursor = await conn.execute("SELECT status, COUNT(*) FROM publish_outbox GROUP BY status")
+    return {status: count for status, count in await cursor.fetchall()}
+
+
+async def purge_finished(conn, before: float) -> int:
+    """
+    删除较早结束（完成或最终失败）的任务
+
+    Args:
+        conn: 数据库连接
+        before: 删除在该时间戳之前结束的任务
+
+    Returns:
+        int: 删除的任务数
+    """
+    cursor = await conn.execute(
+        "DELETE FROM publish_outbox WHERE status IN ('done', 'failed') AND updated_at < ?", (before,)
+    )
+    return cursor.rowcount
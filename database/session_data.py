@@ -0,0 +1,129 @@
+"""
+会话数据溢出模块
+
+PTB 的 user_data / chat_data 只在内存中保留最近活跃的条目（见 utils/session_store.py），
+长时间未访问或超出条目上限的条目序列化（pickle）后写入 session_data 表，
+对应用户或会话再次发来更新时按需读回。超过保留期的条目定期删除。
+
+启用持久化（utils/persistence.py）时，修改过的条目也定期写入该表，重启后保留。
+"""
+import logging
+import time
+from typing import Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 条目类型
+KIND_USER = 'user'
+KIND_CHAT = 'chat'
+
+# 溢出条目保留时间（秒），超过后视为会话已结束
+RETENTION_SECONDS = 30 * 86400
+
+
+async def ensure_schema(conn):
+    """
+    创建会话数据表
+
+    Args:
+        conn: 数据库连接
+    """
+    await conn.execute('''
+        CREATE TABLE IF NOT EXISTS session_data (
+            kind TEXT NOT NULL,
+            id INTEGER NOT NULL,
+            data BLOB NOT NULL,
+            updated_at REAL NOT NULL,
+            PRIMARY KEY (kind, id)
+        ) WITHOUT ROWID
+    ''')
+    await conn.execute("CREATE INDEX IF NOT EXISTS idx_session_data_updated ON session_data(updated_at)")
+
+
+async def load_ids(conn, kind: str) -> List[int]:
+    """
+    读取已溢出条目的 ID（启动时建立内存索引，未溢出的 ID 不查询数据库）
+
+    Args:
+        conn: 数据库连接
+        kind: 条目类型
+    """
+    cursor = await conn.execute("SELECT id FROM session_data WHERE kind = ?", (kind,))
+    return [row[0] for row in await cursor.fetchall()]
+
+
+async def load_recent(conn, kind: str, since: float) -> List[Tuple[int, bytes]]:
+    """
+    读取 since 之后写入的条目（启用持久化时，启动时只把最近活跃的条目载入内存）
+
+    Args:
+        conn: 数据库连接
+        kind: 条目类型
+        since: 时间戳
+    """
+    cursor = await conn.execute(
+        "SELECT id, data FROM session_data WHERE kind = ? AND updated_at >= ?", (kind, since)
+    )
+    return [(row[0], row[1]) for row in await cursor.fetchall()]
+
+
+async def load(conn, kind: str, key: int) -> Optional[bytes]:
+    """
+    读取一个已溢出的条目
+
+    Returns:
+        Optional[bytes]: 序列化的数据，不存在时返回 None
+    """
+    cursor = await conn.execute("SELECT data FROM session_data WHERE kind = ? AND id = ?", (kind, key))
+    row = await cursor.fetchone()
+    return row[0] if row else None
+
+
+async def save_many(conn, kind: str, items: Iterable[Tuple[int, bytes]], now: Optional[float] = None) -> int:
+    """
+    写入溢出的条目（已存在时覆盖）
+
+    Args:
+        conn: 数据库连接
+        kind: 条目类型
+        items: (ID, 序列化的数据)
+
+    Returns:
+        int: 写入的条目数
+    """
+    now = time.time() if now is None else now
+    rows = [(kind, key, data, now) for key, data in items]
+    if rows:
+        await conn.executemany(
+            "INSERT OR REPLACE INTO session_data (kind, id, data, updated_at) VALUES (?, ?, ?, ?)", rows
+        )
+    return len(rows)
+
+
+async def delete_many(conn, kind: str, keys: Iterable[int]) -> int:
+    """
+    删除条目（条目在内存中被清空或删除时）
+
+    Returns:
+        int: 请求删除的条目数
+    """
+    rows = [(kind, key) for key in keys]
+    if rows:
+        await conn.executemany("DELETE FROM session_data WHERE kind = ? AND id = ?", rows)
+    return len(rows)
+
+
+async def purge_expired(conn, now: Optional[float] = None,
+                        retention: float = RETENTION_SECONDS) -> List[Tuple[str, int]]:
+    """
+    删除超过保留期的条目
+
+    Returns:
+        List[Tuple[str, int]]: 被删除的 (类型, ID)
+    """
+    cutoff = (time.time() if now is None else now) - retention
+    cursor = await conn.execute("SELECT kind, id FROM session_data WHERE updated_at < ?", (cutoff,))
+    expired = [(row[0], row[1]) for row in await cursor.fetchall()]
+    if expired:
+        await conn.execute("DELETE FROM session_data WHERE updated_at < ?", (cutoff,))
+    return expired
@@ -0,0 +1,312 @@
+"""
+SQL 语句分析
+
+get_db() 返回的连接经 ProfiledConnection 包装，记录每条语句（规范化后，字面量替换为 ?，
+IN / VALUES 中的 (?, ?, ...) 列表合并）的调用次数、总耗时/平均/p99（执行 + 取结果）和返回行数：
+
+- 超过 DB_SLOW_QUERY_MS 的语句记录慢查询日志，并附带 EXPLAIN QUERY PLAN（每条语句每 10 分钟最多抓取一次）
+- /sqlstats 命令查看耗时最多的语句
+- /metrics 按操作和表汇总语句数、耗时、行数和慢查询数（按语句的明细不进入指标，避免序列过多）
+"""
+import collections
+import logging
+import re
+import time
+from typing import Any, Deque, Dict, List, Optional
+
+import aiosqlite
+from aiosqlite.context import Result
+
+from config.settings import DB_PROFILE_QUERIES, DB_SLOW_QUERY_MS
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+SQL_STATEMENTS = metrics.counter('telesubmit_sql_statements_total', '执行的 SQL 语句数', ('op', 'table'))
+SQL_SECONDS = metrics.counter('telesubmit_sql_seconds_total', 'SQL 语句执行和取结果的总耗时（秒）', ('op', 'table'))
+SQL_ROWS = metrics.counter('telesubmit_sql_rows_total', 'SQL 语句返回的行数', ('op', 'table'))
+SQL_SLOW = metrics.counter('telesubmit_sql_slow_total', '慢查询次数', ('op', 'table'))
+
+# 每条语句保留的最近调用数（用于 p99）
+RECENT_CALLS = 256
+# 同一条语句重新抓取查询计划的间隔（秒）
+PLAN_TTL = 600
+# 规范化结果缓存的原始语句数
+_NORMALIZE_CACHE_SIZE = 2048
+# 可以抓取查询计划的语句类型
+_PLANNABLE = re.compile(r'(?:SELECT|WITH|INSERT|UPDATE|DELETE|REPLACE)$')
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_SPACES = re.compile(r'\s+')
+_IN_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_TABLE = re.compile(r'\b(?:FROM|INTO|UPDATE|JOIN)\s+([A-Za-z_]\w*)', re.IGNORECASE)
+
+
+def normalize_sql(sql: str) -> str:
+    """把语句规范化为统计键：字面量替换为 ?，(?, ?, ...) 列表合并，空白折叠"""
+    text = _STRING.sub('?', sql)
+    text = _NUMBER.sub('?', text)
+    text = _SPACES.sub(' ', text).strip()
+    return _IN_LIST.sub('(?, ...)', text)
+
+
+class StatementStats:
+    """一条规范化语句的统计"""
+
+    __slots__ = ('sql', 'op', 'table', 'calls', 'total', 'max', 'rows', 'slow', 'recent', 'plan', 'plan_at')
+
+    def __init__(self, sql: str):
+        self.sql = sql
+        self.op = sql.split(' ', 1)[0].upper() or '-'
+        match = _TABLE.search(sql)
+        self.table = match.group(1) if match else '-'
+        self.calls = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.rows = 0
+        self.slow = 0
+        self.recent: Deque['QueryCall'] = collections.deque(maxlen=RECENT_CALLS)
+        self.plan: Optional[str] = None
+        self.plan_at = 0.0
+
+    def p99(self) -> float:
+        durations = sorted(call.duration for call in self.recent)
+        if not durations:
+            return 0.0
+        return durations[min(len(durations) - 1, int(len(durations) * 0.99))]
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'sql': self.sql,
+            'calls': self.calls,
+            'total': self.total,
+            'avg': self.total / self.calls if self.calls else 0.0,
+            'p99': self.p99(),
+            'max': self.max,
+            'rows': self.rows,
+            'slow': self.slow,
+            'plan': self.plan,
+        }
+
+
+class QueryCall:
+    """一次语句调用（执行和之后的取结果都计入）"""
+
+    __slots__ = ('stats', 'duration', 'rows', 'reported')
+
+    def __init__(self, stats: StatementStats):
+        self.stats = stats
+        self.duration = 0.0
+        self.rows = 0
+        self.reported = False
+
+
+class SqlProfiler:
+    """
+    按规范化语句汇总的 SQL 统计
+
+    Args:
+        slow_threshold: 慢查询阈值（秒）
+    """
+
+    def __init__(self, slow_threshold: float):
+        self.slow_threshold = slow_threshold
+        self._statements: Dict[str, StatementStats] = {}
+        self._normalized: Dict[str, str] = {}
+
+    def begin(self, sql: str) -> QueryCall:
+        """开始一次调用"""
+        key = self._normalized.get(sql)
+        if key is None:
+            if len(self._normalized) >= _NORMALIZE_CACHE_SIZE:
+                self._normalized.clear()
+            key = self._normalized[sql] = normalize_sql(sql)
+        stats = self._statements.get(key)
+        if stats is None:
+            stats = self._statements[key] = StatementStats(key)
+        stats.calls += 1
+        call = QueryCall(stats)
+        stats.recent.append(call)
+        SQL_STATEMENTS.labels(stats.op, stats.table).inc()
+        return call
+
+    def record(self, call: QueryCall, seconds: float, rows: int = 0):
+        """记录一次执行或取结果的耗时和行数"""
+        stats = call.stats
+        call.duration += seconds
+        call.rows += rows
+        stats.total += seconds
+        stats.rows += rows
+        stats.max = max(stats.max, call.duration)
+        SQL_SECONDS.labels(stats.op, stats.table).inc(seconds)
+        if rows:
+            SQL_ROWS.labels(stats.op, stats.table).inc(rows)
+
+    async def check_slow(self, conn: aiosqlite.Connection, call: QueryCall, sql: Optional[str], parameters):
+        """
+        调用累计耗时超过阈值时记录慢查询日志（每次调用最多一次）
+
+        Args:
+            sql: 原始语句（用于抓取查询计划，为 None 时不抓取）
+            parameters: 原始参数
+        """
+        if call.reported or call.duration < self.slow_threshold:
+            return
+        call.reported = True
+        stats = call.stats
+        stats.slow += 1
+        SQL_SLOW.labels(stats.op, stats.table).inc()
+        now = time.monotonic()
+        if _PLANNABLE.match(stats.op) and sql is not None and now - stats.plan_at > PLAN_TTL:
+            stats.plan_at = now
+            stats.plan = await self._explain(conn, sql, parameters)
+        message = f"慢查询 {call.duration * 1000:.0f} ms（{call.rows} 行）: {stats.sql}"
+        if stats.plan:
+            message += "\n查询计划:\n" + stats.plan
+        logger.warning(message)
+
+    async def _explain(self, conn: aiosqlite.Connection, sql: str, parameters) -> Optional[str]:
+        try:
+            async with conn.execute(f"EXPLAIN QUERY PLAN {sql}", parameters or ()) as cursor:
+                rows = await cursor.fetchall()
+        except Exception as e:
+            logger.debug(f"抓取查询计划失败: {e}")
+            return None
+        depth = {0: -1}
+        lines = []
+        for row in rows:
+            node_id, parent, detail = row[0], row[1], row[3]
+            depth[node_id] = depth.get(parent, -1) + 1
+            lines.append('  ' * depth[node_id] + detail)
+        return '\n'.join(lines)
+
+    def top(self, limit: int = 10, sort: str = 'total') -> List[Dict[str, Any]]:
+        """
+        耗时最多的语句
+
+        Args:
+            limit: 返回条数
+            sort: 排序字段（total、avg、p99、calls、rows、slow）
+        """
+        rows = [stats.as_dict() for stats in self._statements.values()]
+        rows.sort(key=lambda row: row[sort], reverse=True)
+        return rows[:limit]
+
+    def reset(self):
+        """清空统计"""
+        self._statements.clear()
+
+
+class ProfiledCursor(aiosqlite.Cursor):
+    """记录执行和取结果耗时的游标（保持 aiosqlite.Cursor 类型，async with 退出时照常关闭）"""
+
+    def __init__(self, profiler: SqlProfiler, cursor: aiosqlite.Cursor):
+        super().__init__(cursor._conn, cursor._cursor)
+        self._profiler = profiler
+        self._call: Optional[QueryCall] = None
+        self._sql: Optional[str] = None
+        self._parameters = None
+
+    async def _record(self, started: float, rows: int = 0):
+        if self._call is not None:
+            self._profiler.record(self._call, time.perf_counter() - started, rows)
+            await self._profiler.check_slow(self._conn, self._call, self._sql, self._parameters)
+
+    async def execute(self, sql: str, parameters=None) -> 'ProfiledCursor':
+        self._call = self._profiler.begin(sql)
+        self._sql, self._parameters = sql, parameters
+        started = time.perf_counter()
+        await super().execute(sql, parameters)
+        await self._record(started)
+        return self
+
+    async def executemany(self, sql: str, parameters) -> 'ProfiledCursor':
+        # 参数是序列的序列，不抓取查询计划
+        self._call = self._profiler.begin(sql)
+        self._sql = self._parameters = None
+        started = time.perf_counter()
+        await super().executemany(sql, parameters)
+        await self._record(started)
+        return self
+
+    async def fetchone(self):
+        started = time.perf_counter()
+        row = await super().fetchone()
+        await self._record(started, 0 if row is None else 1)
+        return row
+
+    async def fetchmany(self, size: Optional[int] = None):
+        started = time.perf_counter()
+        rows = await super().fetchmany(size)
+        await self._record(started, len(rows))
+        return rows
+
+    async def fetchall(self):
+        started = time.perf_counter()
+        rows = await super().fetchall()
+        await self._record(started, len(rows))
+        return rows
+
+    async def __aiter__(self):
+        while True:
+            rows = await self.fetchmany(self.iter_chunk_size)
+            if not rows:
+                break
+            for row in rows:
+                yield row
+
+
+class ProfiledConnection:
+    """
+    包装 aiosqlite.Connection：execute / executemany / cursor 返回 ProfiledCursor，
+    其余属性和方法（commit、rollback、row_factory 等）直接转发
+    """
+
+    __slots__ = ('_conn', '_profiler')
+
+    def __init__(self, conn: aiosqlite.Connection, profiler: SqlProfiler):
+        object.__setattr__(self, '_conn', conn)
+        object.__setattr__(self, '_profiler', profiler)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._conn, name, value)
+
+    async def _cursor(self) -> ProfiledCursor:
+        return ProfiledCursor(self._profiler, await self._conn.cursor())
+
+    def cursor(self):
+        return Result(self._cursor())
+
+    async def _execute(self, sql: str, parameters=None) -> ProfiledCursor:
+        cursor = await self._cursor()
+        return await cursor.execute(sql, parameters)
+
+    def execute(self, sql: str, parameters=None):
+        """与 aiosqlite 相同：可 await，也可 async with（退出时关闭游标）"""
+        return Result(self._execute(sql, parameters))
+
+    async def _executemany(self, sql: str, parameters) -> ProfiledCursor:
+        cursor = await self._cursor()
+        return await cursor.executemany(sql, parameters)
+
+    def executemany(self, sql: str, parameters):
+        return Result(self._executemany(sql, parameters))
+
+
+_profiler = SqlProfiler(DB_SLOW_QUERY_MS / 1000)
+
+
+def get_sql_profiler() -> Optional[SqlProfiler]:
+    """获取 SQL 统计（DB_PROFILE_QUERIES 关闭时为 None）"""
+    return _profiler if DB_PROFILE_QUERIES else None
+
+
+def profile_connection(conn: aiosqlite.Connection):
+    """按配置包装连接（关闭分析时原样返回）"""
+    if not DB_PROFILE_QUERIES:
+        return conn
+    return ProfiledConnection(conn, _profiler)
@@ -0,0 +1,197 @@
+"""
+帖子统计时间序列模块
+
+每次统计刷新时为帖子追加一条紧凑样本（views/forwards/reactions），
+旧样本自动降采样，保证 5 万+ 帖子规模下存储仍然有界：
+
+- 最近 48 小时：保留每次刷新的原始样本（统计任务每 2 小时一次，约 24 条）
+- 48 小时 ~ 30 天：每个帖子每天只保留最后一条样本（约 28 条）
+- 超过 30 天：删除（与统计任务的 30 天刷新窗口一致）
+
+因此每个帖子最多约 52 行，且只有仍在刷新窗口内的帖子会产生样本。
+"""
+import logging
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 原始样本保留时长（秒）
+RAW_RETENTION_SECONDS = 48 * 3600
+# 降采样粒度（秒）：超过原始保留期后每个桶只保留最后一条样本
+DOWNSAMPLE_BUCKET_SECONDS = 86400
+# 历史样本总保留时长（秒）
+HISTORY_RETENTION_SECONDS = 30 * 86400
+# 计算浏览速度的默认时间窗口（小时）
+VELOCITY_WINDOW_HOURS = 24
+
+
+async def ensure_schema(conn):
+    """
+    创建时间序列表和索引
+
+    使用 WITHOUT ROWID + 复合主键，样本按 (message_id, ts) 聚簇存储，
+    不额外占用 rowid 和主键索引空间。
+
+    Args:
+        conn: 数据库连接
+    """
+    await conn.execute('''
+        CREATE TABLE IF NOT EXISTS post_stats_history (
+            message_id INTEGER NOT NULL,
+            ts INTEGER NOT NULL,
+            views INTEGER NOT NULL DEFAULT 0,
+            forwards INTEGER NOT NULL DEFAULT 0,
+            reactions INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (message_id, ts)
+        ) WITHOUT ROWID
+    ''')
+    # 按时间窗口计算速度、清理过期样本时使用
+    await conn.execute('CREATE INDEX IF NOT EXISTS idx_stats_history_ts ON post_stats_history(ts)')
+
+
+async def record_samples(conn, samples: Iterable[Tuple[int, int, int, int]], ts: Optional[int] = None) -> int:
+    """
+    追加一批统计样本
+
+    Args:
+        conn: 数据库连接
+        samples: (message_id, views, forwards, reactions) 元组序列
+        ts: 样本时间戳（秒），默认当前时间
+
+    Returns:
+        int: 写入的样本数
+    """
+    ts = int(ts if ts is not None else datetime.now().timestamp())
+    rows = [(int(mid), ts, int(views), int(forwards), int(reactions))
+            for mid, views, forwards, reactions in samples]
+    if not rows:
+        return 0
+    await conn.executemany(
+        "INSERT OR REPLACE INTO post_stats_history (message_id, ts, views, forwards, reactions) VALUES (?, ?, ?, ?, ?)",
+        rows
+    )
+    return len(rows)
+
+
+async def downsample_history(conn, now: Optional[float] = None) -> int:
+    """
+    降采样并清理过期样本
+
+    Args:
+        conn: 数据库连接
+        now: 当前时间戳，默认当前时间（便于测试）
+
+    Returns:
+        int: 删除的样本数
+    """
+    now = int(now if now is not None else datetime.now().timestamp())
+    removed = 0
+
+    # 1. 删除超过保留期的样本
+    cursor = await conn.execute(
+        "DELETE FROM post_stats_history WHERE ts < ?",
+        (now - HISTORY_RETENTION_SECONDS,)
+    )
+    removed += max(cursor.rowcount, 0)
+
+    # 2. 超过原始保留期的样本，每个帖子每个桶只保留最后一条
+    cursor = await conn.execute(f"""
+        DELETE FROM post_stats_history
+        WHERE ts < ?
+          AND EXISTS (
+              SELECT 1 FROM post_stats_history AS newer
+              WHERE newer.message_id = post_stats_history.message_id
+                AND newer.ts > post_stats_history.ts
+                AND newer.ts / {DOWNSAMPLE_BUCKET_SECONDS} = post_stats_history.ts / {DOWNSAMPLE_BUCKET_SECONDS}
+          )
+    """, (now - RAW_RETENTION_SECONDS,))
+    removed += max(cursor.rowcount, 0)
+
+    if removed:
+        logger.info(f"统计时间序列降采样完成，删除 {removed} 条样本")
+    return removed
+
+
+def _velocity_sql(filter_ids: bool, id_count: int = 0) -> str:
+    """构建按窗口计算浏览速度（每小时浏览增量）的 SQL"""
+    id_filter = f" AND message_id IN ({','.join('?' * id_count)})" if filter_ids else ""
+    return f"""
+        SELECT message_id,
+               (MAX(views) - MIN(views)) * 3600.0 / (MAX(ts) - MIN(ts)) AS velocity
+        FROM post_stats_history
+        WHERE ts >= ?{id_filter}
+        GROUP BY message_id
+        HAVING MAX(ts) > MIN(ts)
+    """
+
+
+def _rising_sql() -> str:
+    """构建"上升最快"榜的 SQL：按浏览速度排序的未删除帖子"""
+    return f"""
+        SELECT p.message_id, p.title, p.tags, c.note, p.views, p.forwards, p.reactions,
+               p.heat_score, p.publish_time, v.velocity
+        FROM ({_velocity_sql(False)}) AS v
+        JOIN published_posts AS p ON p.message_id = v.message_id
+        LEFT JOIN post_content AS c ON c.message_id = p.message_id
+        WHERE p.is_deleted = 0 AND v.velocity > 0
+        ORDER BY v.velocity DESC
+        LIMIT ?
+    """
+
+
+async def get_view_velocity(conn, message_ids: Optional[List[int]] = None,
+                            window_hours: float = VELOCITY_WINDOW_HOURS,
+                            now: Optional[float] = None) -> Dict[int, float]:
+    """
+    计算帖子的浏览速度（窗口内每小时新增浏览数）
+
+    浏览数单调递增，窗口内 MAX - MIN 即为增量；窗口内少于两条样本的帖子不返回。
+
+    Args:
+        conn: 数据库连接
+        message_ids: 只计算这些帖子，None 表示窗口内全部帖子
+        window_hours: 时间窗口（小时）
+        now: 当前时间戳，默认当前时间
+
+    Returns:
+        Dict[int, float]: message_id -> 每小时浏览增量
+    """
+    now = now if now is not None else datetime.now().timestamp()
+    since = int(now - window_hours * 3600)
+
+    if message_ids is not None:
+        ids = [int(mid) for mid in message_ids]
+        if not ids:
+            return {}
+        velocities = {}
+        # 分块查询，避免超过 SQLite 参数数量上限
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            cursor = await conn.execute(_velocity_sql(True, len(chunk)), (since, *chunk))
+            for row in await cursor.fetchall():
+                velocities[row[0]] = row[1]
+        return velocities
+
+    cursor = await conn.execute(_velocity_sql(False), (since,))
+    return {row[0]: row[1] for row in await cursor.fetchall()}
+
+
+async def get_rising_posts(conn, limit: int = 10, window_hours: float = VELOCITY_WINDOW_HOURS,
+                           now: Optional[float] = None) -> list:
+    """
+    获取浏览速度最快的帖子（"上升最快"榜）
+
+    Args:
+        conn: 数据库连接
+        limit: 返回数量
+        window_hours: 时间窗口（小时）
+        now: 当前时间戳，默认当前时间
+
+    Returns:
+        list: 排行所需的帖子字段（含 post_content.note），附带 velocity 字段，按速度降序
+    """
+    now = now if now is not None else datetime.now().timestamp()
+    since = int(now - window_hours * 3600)
+    cursor = await conn.execute(_rising_sql(), (since, limit))
+    return await cursor.fetchall()
@@ -0,0 +1,213 @@
+"""
+用户投稿聚合统计模块
+
+`user_post_stats` 表为每个用户保存投稿数、总浏览/转发/反应数和最热帖子，
+由 published_posts 上的触发器增量维护：
+
+- 发布新帖子（INSERT）：累加
+- 删除帖子（标记 is_deleted 或删除行）：扣减
+- 统计任务更新浏览/热度（UPDATE）：先扣减旧值再累加新值
+
+最热帖子只有在"当前最热帖子"热度下降、被删除或换了用户时才需要重新查找，
+其余情况直接与新值比较即可。/mystats 因此只需读取一行。
+"""
+import logging
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# 重新查找用户最热帖子的子查询（按热度降序取第一条未删除的帖子）
+_HOTTEST_SUBQUERY = '''
+    SELECT message_id, heat_score FROM published_posts
+    WHERE user_id = user_post_stats.user_id AND is_deleted = 0
+    ORDER BY heat_score DESC, message_id DESC LIMIT 1
+'''
+
+# 扣减旧行的贡献（旧行未删除时）
+_SUBTRACT_OLD = '''
+    UPDATE user_post_stats SET
+        post_count = post_count - 1,
+        total_views = total_views - COALESCE(OLD.views, 0),
+        total_forwards = total_forwards - COALESCE(OLD.forwards, 0),
+        total_reactions = total_reactions - COALESCE(OLD.reactions, 0)
+    WHERE user_id = OLD.user_id AND OLD.is_deleted = 0;
+'''
+
+# 累加新行的贡献（新行未删除时），必要时更新最热帖子
+_ADD_NEW = '''
+    INSERT INTO user_post_stats
+        (user_id, post_count, total_views, total_forwards, total_reactions, hottest_message_id, hottest_heat)
+    SELECT NEW.user_id, 1, COALESCE(NEW.views, 0), COALESCE(NEW.forwards, 0),
+           COALESCE(NEW.reactions, 0), NEW.message_id, COALESCE(NEW.heat_score, 0)
+    WHERE NEW.user_id IS NOT NULL AND NEW.is_deleted = 0
+    ON CONFLICT(user_id) DO UPDATE SET
+        post_count = post_count + 1,
+        total_views = total_views + excluded.total_views,
+        total_forwards = total_forwards + excluded.total_forwards,
+        total_reactions = total_reactions + excluded.total_reactions,
+        hottest_message_id = CASE
+            WHEN hottest_message_id IS NULL OR excluded.hottest_heat > hottest_heat
+            THEN excluded.hottest_message_id ELSE hottest_message_id END,
+        hottest_heat = CASE
+            WHEN hottest_message_id IS NULL OR excluded.hottest_heat > hottest_heat
+                 OR hottest_message_id = excluded.hottest_message_id
+            THEN excluded.hottest_heat ELSE hottest_heat END;
+'''
+
+# 删除已没有投稿的用户行
+_DROP_EMPTY = '''
+    DELETE FROM user_post_stats WHERE user_id = OLD.user_id AND post_count <= 0;
+'''
+
+_TRIGGERS = {
+    'trg_user_stats_insert': f'''
+        CREATE TRIGGER IF NOT EXISTS trg_user_stats_insert
+        AFTER INSERT ON published_posts
+        BEGIN
+            {_ADD_NEW}
+        END
+    ''',
+    'trg_user_stats_update': f'''
+        CREATE TRIGGER IF NOT EXISTS trg_user_stats_update
+        AFTER UPDATE OF user_id, views, forwards, reactions, heat_score, is_deleted ON published_posts
+        BEGIN
+            {_SUBTRACT_OLD}
+            {_ADD_NEW}
+            UPDATE user_post_stats SET (hottest_message_id, hottest_heat) = ({_HOTTEST_SUBQUERY})
+            WHERE user_id = OLD.user_id AND hottest_message_id = OLD.message_id
+              AND (NEW.is_deleted != 0 OR NEW.user_id IS NOT OLD.user_id
+                   OR COALESCE(NEW.heat_score, 0) < COALESCE(OLD.heat_score, 0));
+            {_DROP_EMPTY}
+        END
+    ''',
+    'trg_user_stats_delete': f'''
+        CREATE TRIGGER IF NOT EXISTS trg_user_stats_delete
+        AFTER DELETE ON published_posts
+        BEGIN
+            {_SUBTRACT_OLD}
+            UPDATE user_post_stats SET (hottest_message_id, hottest_heat) = ({_HOTTEST_SUBQUERY})
+            WHERE user_id = OLD.user_id AND hottest_message_id = OLD.message_id;
+            {_DROP_EMPTY}
+        END
+    ''',
+}
+
+
+async def ensure_schema(conn):
+    """
+    创建聚合表和维护触发器
+
+    已有数据的回填由迁移登记为后台任务（见 backfill）。
+
+    Args:
+        conn: 数据库连接
+
+    Returns:
+        bool: 聚合表是否为本次新建
+    """
+    cursor = await conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'user_post_stats'"
+    )
+    exists = await cursor.fetchone() is not None
+
+    await conn.execute('''
+        CREATE TABLE IF NOT EXISTS user_post_stats (
+            user_id INTEGER PRIMARY KEY,
+            post_count INTEGER NOT NULL DEFAULT 0,
+            total_views INTEGER NOT NULL DEFAULT 0,
+            total_forwards INTEGER NOT NULL DEFAULT 0,
+            total_reactions INTEGER NOT NULL DEFAULT 0,
+            hottest_message_id INTEGER,
+            hottest_heat REAL
+        )
+    ''')
+    for sql in _TRIGGERS.values():
+        await conn.execute(sql)
+
+    return not exists
+
+
+async def rebuild(conn) -> int:
+    """
+    从 published_posts 全量重算聚合表
+
+    用于首次回填，或怀疑聚合数据与明细不一致时手动修复。
+
+    Args:
+        conn: 数据库连接
+
+    Returns:
+        int: 聚合后的用户数
+    """
+    await conn.execute("DELETE FROM user_post_stats")
+    # SQLite 中与唯一的 MAX() 同时出现的裸列取自最大值所在行，即最热帖子
+    await conn.execute('''
+        INSERT INTO user_post_stats
+            (user_id, post_count, total_views, total_forwards, total_reactions, hottest_message_id, hottest_heat)
+        SELECT user_id, COUNT(*), COALESCE(SUM(views), 0), COALESCE(SUM(forwards), 0),
+               COALESCE(SUM(reactions), 0), message_id, MAX(COALESCE(heat_score, 0))
+        FROM published_posts
+        WHERE is_deleted = 0 AND user_id IS NOT NULL
+        GROUP BY user_id
+    ''')
+    cursor = await conn.execute("SELECT COUNT(*) FROM user_post_stats")
+    row = await cursor.fetchone()
+    return row[0]
+
+
+async def backfill(conn, after_user_id: Optional[int], limit: int) -> Optional[int]:
+    """
+    回填一批用户的聚合数据（后台迁移任务）
+
+    按 user_id 顺序取下一批有投稿的用户，从明细重算后整行覆盖。
+    回填期间触发器照常工作：尚未回填的用户可能已有触发器写入的部分数据，
+    轮到该用户时会被完整结果覆盖。
+
+    Args:
+        conn: 数据库连接
+        after_user_id: 上一批最后一个用户ID，首批为 None
+        limit: 本批用户数
+
+    Returns:
+        Optional[int]: 本批最后一个用户ID，没有更多用户时返回 None
+    """
+    cursor = await conn.execute(
+        "SELECT DISTINCT user_id FROM published_posts WHERE user_id > ? AND is_deleted = 0 ORDER BY user_id LIMIT ?",
+        (after_user_id if after_user_id is not None else -(2 ** 63), limit)
+    )
+    user_ids = [row[0] for row in await cursor.fetchall()]
+    if not user_ids:
+        return None
+    await conn.execute('''
+        INSERT OR REPLACE INTO user_post_stats
+            (user_id, post_count, total_views, total_forwards, total_reactions, hottest_message_id, hottest_heat)
+        SELECT user_id, COUNT(*), COALESCE(SUM(views), 0), COALESCE(SUM(forwards), 0),
+               COALESCE(SUM(reactions), 0), message_id, MAX(COALESCE(heat_score, 0))
+        FROM published_posts
+        WHERE is_deleted = 0 AND user_id BETWEEN ? AND ?
+        GROUP BY user_id
+    ''', (user_ids[0], user_ids[-1]))
+    return user_ids[-1]
+
+
+async def get_user_stats(conn, user_id: int):
+    """
+    读取用户的投稿聚合统计
+
+    Args:
+        conn: 数据库连接
+        user_id: 用户ID
+
+    Returns:
+        聚合行（附带最热帖子的 hottest_title），用户没有投稿时返回 None
+    """
+    cursor = await conn.execute('''
+        SELECT s.*, p.title AS hottest_title
+        FROM user_post_stats AS s
+        LEFT JOIN published_posts AS p ON p.message_id = s.hottest_message_id
+        WHERE s.user_id = ?
+    ''', (user_id,))
+    row = await cursor.fetchone()
+    if row is None or row['post_count'] <= 0:
+        return None
+    return row
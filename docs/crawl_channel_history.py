@@ -24,6 +24,7 @@ sys.path.insert(0, str(Path(__file__).parent))
 
 from config.settings import TOKEN, CHANNEL_ID, DB_PATH
 from database.db_manager import get_db, init_db
+from database import post_content, post_tags
 from telegram import Bot
 from telegram.error import TelegramError
 
@@ -146,21 +147,17 @@ async def import_messages_to_db(messages: list):
                 # 插入数据库
                 await conn.execute("""
                     INSERT INTO published_posts
-                    (message_id, user_id, username, title, tags, link, note,
-                     content_type, file_ids, caption, filename, publish_time,
+                    (message_id, user_id, username, title, tags,
+                     content_type, filename, publish_time,
                      views, forwards, reactions, heat_score, last_update)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
                 """, (
                     message_id,
                     0,  # 未知用户
                     '',
                     title,
                     tags,
-                    '',  # link
-                    caption,
                     content_type,
-                    file_ids,
-                    caption,
                     filename,
                     publish_time,
                     views,
@@ -169,6 +166,8 @@ async def import_messages_to_db(messages: list):
                     0.0,  # heat_score
                     publish_time
                 ))
+                await post_content.save_content(conn, message_id, note=caption, file_ids=file_ids, caption=caption)
+                await post_tags.set_post_tags(conn, message_id, tags)
                 
                 imported += 1
                 if imported % 10 == 0:
@@ -0,0 +1,130 @@
+"""
+帖子归档任务和归档查询命令
+"""
+import asyncio
+import logging
+from datetime import datetime
+from telegram import Update
+from telegram.ext import CallbackContext
+
+from config.settings import ADMIN_IDS, ARCHIVE_BATCH_SIZE, ARCHIVE_RETENTION_DAYS
+from database import archive
+from utils.leaderboard import get_leaderboards
+from utils.search_engine import get_search_engine
+
+logger = logging.getLogger(__name__)
+
+# 两批归档之间的间隔（秒），让出数据库给正常请求
+ARCHIVE_PAUSE_SECONDS = 1.0
+
+
+def _retention_cutoff():
+    """超过保留期限的发布时间界限，未配置保留期限时返回 None"""
+    if ARCHIVE_RETENTION_DAYS <= 0:
+        return None
+    return datetime.now().timestamp() - ARCHIVE_RETENTION_DAYS * 86400
+
+
+def _forget_posts(message_ids):
+    """超过保留期限的帖子归档后从排行和搜索索引中移除（已删除的帖子在删除时已移除）"""
+    leaderboards = get_leaderboards()
+    search_engine = get_search_engine()
+    for message_id in message_ids:
+        leaderboards.remove_post(message_id)
+    if search_engine and message_ids:
+        try:
+            search_engine.delete_posts(message_ids)
+        except Exception as e:
+            logger.warning(f"从搜索索引移除 {len(message_ids)} 个归档帖子失败: {e}")
+
+
+async def archive_posts_job(context: CallbackContext):
+    """
+    定期归档任务：分批把已删除和超过保留期限的帖子移到归档库，直到没有待归档的帖子
+    """
+    cutoff = _retention_cutoff()
+    deleted_total = aged_total = 0
+    try:
+        while True:
+            async with archive.get_archive_db() as conn:
+                deleted, aged = await archive.archive_batch(conn, ARCHIVE_BATCH_SIZE, cutoff)
+            _forget_posts(aged)
+            deleted_total += len(deleted)
+            aged_total += len(aged)
+            if len(deleted) + len(aged) < ARCHIVE_BATCH_SIZE:
+                break
+            await asyncio.sleep(ARCHIVE_PAUSE_SECONDS)
+    except Exception as e:
+        logger.error(f"归档帖子失败: {e}", exc_info=True)
+    if deleted_total or aged_total:
+        logger.info(f"归档完成：已删除帖子 {deleted_total} 个，超过保留期限的帖子 {aged_total} 个")
+
+
+def _format_time(timestamp) -> str:
+    return datetime.fromtimestamp(timestamp or 0).strftime('%Y-%m-%d %H:%M')
+
+
+async def archived_command(update: Update, context: CallbackContext):
+    """
+    /archived - 查询归档库
+    仅管理员可用
+
+    用法：
+    /archived - 主库与归档库的帖子数
+    /archived <消息ID> - 查看归档的帖子
+    /archived user <用户ID> - 用户最近的归档帖子
+    """
+    user_id = update.effective_user.id
+
+    if user_id not in ADMIN_IDS:
+        await update.message.reply_text("❌ 此命令仅限管理员使用")
+        return
+
+    args = context.args or []
+    try:
+        async with archive.get_archive_db() as conn:
+            if not args:
+                stats = await archive.get_archive_stats(conn)
+                message = (
+                    f"🗄️ 归档统计\n\n"
+                    f"• 有效帖子：{stats['live']}\n"
+                    f"• 待归档（已删除）：{stats['pending']}\n"
+                    f"• 已归档：{stats['archived']}\n\n"
+                    f"保留期限：{f'{ARCHIVE_RETENTION_DAYS} 天' if ARCHIVE_RETENTION_DAYS > 0 else '不限（只归档已删除的帖子）'}"
+                )
+            elif args[0] == 'user' and len(args) > 1 and args[1].lstrip('-').isdigit():
+                posts = await archive.get_archived_user_posts(conn, int(args[1]))
+                if not posts:
+                    message = f"🔍 用户 {args[1]} 没有归档的帖子"
+                else:
+                    message = f"🗄️ 用户 {args[1]} 的归档帖子（最近 {len(posts)} 篇）\n\n"
+                    for post in posts:
+                        state = "已删除" if post['is_deleted'] else "过期"
+                        message += (
+                            f"• {post['message_id']} {post['title'] or '无标题'}\n"
+                            f"   📅 {_format_time(post['publish_time'])} | 👀 {post['views']} | {state}\n"
+                        )
+            elif args[0].isdigit():
+                post = await archive.get_archived_post(conn, int(args[0]))
+                if post is None:
+                    message = f"🔍 归档库中没有消息 {args[0]}"
+                else:
+                    message = (
+                        f"🗄️ 归档帖子 {post['message_id']}\n\n"
+                        f"📄 {post['title'] or '无标题'}\n"
+                        f"👤 {post['username'] or post['user_id']}\n"
+                        f"🏷️ {post['tags'] or '无'}\n"
+                        f"📅 发布：{_format_time(post['publish_time'])}\n"
+                        f"📊 浏览 {post['views']} | 转发 {post['forwards']} | 热度 {post['heat_score'] or 0:.0f}\n"
+                        f"🗑️ {'已删除' if post['is_deleted'] else '超过保留期限'}，归档于 {_format_time(post['archived_at'])}"
+                    )
+                    if post['note']:
+                        message += f"\n\n💬 {post['note'][:300]}"
+            else:
+                message = "用法：/archived [消息ID | user 用户ID]"
+
+        await update.message.reply_text(message, disable_web_page_preview=True)
+
+    except Exception as e:
+        logger.error(f"查询归档库失败: {e}", exc_info=True)
+        await update.message.reply_text(f"❌ 查询失败: {str(e)}")
@@ -2,6 +2,7 @@
 回调查询处理器 - 处理所有按钮点击事件
 """
 import logging
+from datetime import datetime
 from telegram import Update
 from telegram.ext import CallbackContext, ConversationHandler
 from telegram.constants import ParseMode
@@ -9,11 +10,14 @@ from telegram.constants import ParseMode
 from ui.keyboards import Keyboards
 from ui.messages import MessageFormatter
 from database.db_manager import get_db
+from database import user_stats
 from models.state import STATE
 from utils.blacklist import remove_from_blacklist, is_owner
-from config.settings import OWNER_ID
+from config.settings import OWNER_ID, CHANNEL_ID
 from handlers.publish import publish_submission
-from handlers.stats_handlers import get_hot_posts, update_post_stats
+from handlers.stats_handlers import get_hot_posts
+from utils.leaderboard import get_leaderboards
+from utils.post_deletion import delete_posts, STATUS_ALREADY_DELETED, STATUS_NOT_FOUND
 from handlers.search_handlers import search_posts_by_tag
 
 logger = logging.getLogger(__name__)
@@ -229,12 +233,8 @@ async def handle_hot_limit(update: Update, context: CallbackContext):
 
 async def handle_hot_refresh(update: Update, context: CallbackContext):
     """刷新热门帖子"""
-    query = update.callback_query
-    
-    await query.answer("🔄 正在刷新...")
-    
-    # 更新统计数据
-    await update_post_stats(context)
+    # 从数据库重算排行榜（统计数据由定时任务刷新，这里不再同步拉取全部帖子统计）
+    await get_leaderboards().rebuild()
     
     # 重新获取热门帖子
     await get_hot_posts(update, context, edit_message=True)
@@ -292,7 +292,7 @@ async def handle_view_post(update: Update, context: CallbackContext):
         async with get_db() as conn:
             c = await conn.cursor()
             await c.execute(
-                "SELECT message_id FROM published_posts WHERE id=? AND is_deleted = 0",
+                "SELECT message_id FROM published_posts WHERE message_id=? AND is_deleted = 0",
                 (post_id,)
             )
             row = await c.fetchone()
@@ -328,9 +328,9 @@ async def handle_stats_post(update: Update, context: CallbackContext):
             c = await conn.cursor()
             await c.execute(
                 """
-                SELECT views, forwards, heat_score, created_at 
+                SELECT views, forwards, heat_score, publish_time 
                 FROM published_posts 
-                WHERE id=?
+                WHERE message_id=?
                 """,
                 (post_id,)
             )
@@ -343,7 +343,7 @@ async def handle_stats_post(update: Update, context: CallbackContext):
 👁️ 浏览量: {row['views']:,}
 📤 转发量: {row['forwards']}
 🔥 热度分: {row['heat_score']:.2f}
-📅 发布时间: {row['created_at']}
+📅 发布时间: {datetime.fromtimestamp(row['publish_time'] or 0).strftime('%Y-%m-%d %H:%M')}
 """
                 await query.edit_message_text(
                     stats_text,
@@ -422,18 +422,13 @@ async def handle_user_info(update: Update, context: CallbackContext):
     
     try:
         async with get_db() as conn:
-            c = await conn.cursor()
-            await c.execute(
-                "SELECT COUNT(*) as count FROM published_posts WHERE user_id=? AND is_deleted = 0",
-                (target_user_id,)
-            )
-            row = await c.fetchone()
+            stats = await user_stats.get_user_stats(conn, int(target_user_id))
             
             info_text = f"""
 👤 <b>用户信息</b>
 
 🆔 用户ID: <code>{target_user_id}</code>
-📝 投稿数: {row['count'] if row else 0}
+📝 投稿数: {stats['post_count'] if stats else 0}
 """
             await query.edit_message_text(
                 info_text,
@@ -516,134 +511,47 @@ async def execute_delete_post(query, message_id: str, context: CallbackContext):
         return
     
     try:
-        async with get_db() as conn:
-            cursor = await conn.cursor()
-            
-            # 根据 message_id 获取帖子信息（包括已删除的帖子，用于检查状态）
-            await cursor.execute(
-                "SELECT rowid AS post_id, message_id, related_message_ids, is_deleted FROM published_posts WHERE message_id=?",
-                (int(message_id),)
-            )
-            post_row = await cursor.fetchone()
-            
-            if not post_row:
-                await query.edit_message_text("❌ 帖子不存在或已被删除")
-                logger.warning(f"尝试删除不存在的帖子: message_id={message_id}")
-                return
-            
-            # 检查是否已经标记为删除
-            if post_row.get('is_deleted', 0) == 1:
-                await query.edit_message_text("ℹ️ 该帖子已被标记为删除")
-                logger.info(f"帖子 {message_id} 已经被标记为删除")
-                return
-            
-            post_id = post_row['post_id']
-            related_ids_json = post_row['related_message_ids']
-            
-            # 先尝试删除频道消息（双向同步删除）
-            from config.settings import CHANNEL_ID
-            channel_deleted = False
-            related_channel_deleted = 0
-            channel_delete_failed = False
-            
-            try:
-                # 尝试删除主消息
-                try:
-                    await context.bot.delete_message(chat_id=CHANNEL_ID, message_id=int(message_id))
-                    channel_deleted = True
-                    logger.info(f"已从频道删除消息: {message_id}")
-                except Exception as e:
-                    error_msg = str(e).lower()
-                    if "message to delete not found" in error_msg or "message can't be deleted" in error_msg:
-                        # 消息已不存在或被删除，这是正常的
-                        logger.info(f"频道消息 {message_id} 已不存在或无法删除: {e}")
-                        channel_deleted = True  # 视为成功，因为目标已达成
-                    else:
-                        logger.warning(f"删除频道消息 {message_id} 失败: {e}")
-                        channel_delete_failed = True
-                
-                # 尝试删除关联消息
-                if related_ids_json:
-                    import json
-                    try:
-                        related_ids = json.loads(related_ids_json)
-                        for related_id in related_ids:
-                            try:
-                                await context.bot.delete_message(chat_id=CHANNEL_ID, message_id=int(related_id))
-                                related_channel_deleted += 1
-                                logger.info(f"已从频道删除关联消息: {related_id}")
-                            except Exception as e:
-                                error_msg = str(e).lower()
-                                if "message to delete not found" in error_msg or "message can't be deleted" in error_msg:
-                                    related_channel_deleted += 1  # 视为成功
-                                    logger.debug(f"关联消息 {related_id} 已不存在")
-                                else:
-                                    logger.warning(f"删除关联消息 {related_id} 失败: {e}")
-                    except json.JSONDecodeError:
-                        logger.warning(f"解析关联消息ID失败: {related_ids_json}")
-            except Exception as e:
-                logger.error(f"删除频道消息时出错: {e}")
-                channel_delete_failed = True
-            
-            # 从搜索索引中删除
-            index_deleted = False
-            related_count = 0
-            try:
-                from utils.search_engine import get_search_engine
-                search_engine = get_search_engine()
-                if search_engine:
-                    search_engine.delete_post(int(message_id))
-                    index_deleted = True
-                    logger.info(f"已从搜索索引删除帖子: {message_id}")
-                    
-                    # 如果有关联消息，也从索引删除
-                    if related_ids_json:
-                        import json
-                        try:
-                            related_ids = json.loads(related_ids_json)
-                            for related_id in related_ids:
-                                search_engine.delete_post(related_id)
-                                related_count += 1
-                            logger.info(f"已从索引删除 {related_count} 个关联消息")
-                        except json.JSONDecodeError:
-                            logger.warning(f"解析关联消息ID失败: {related_ids_json}")
-            except Exception as e:
-                logger.error(f"从搜索索引删除失败: {e}")
-                # 继续执行，不因索引删除失败而中断
-            
-            # 标记为已删除而不是直接删除记录（保留历史数据）
-            await cursor.execute("UPDATE published_posts SET is_deleted = 1 WHERE rowid=?", (post_id,))
-            await conn.commit()
-            logger.info(f"已标记帖子为已删除: ID={post_id}, message_id={message_id}")
-            
-            # 构建响应消息
-            channel_link = f"https://t.me/{CHANNEL_ID.lstrip('@')}/{message_id}" if CHANNEL_ID.startswith('@') else f"消息ID: {message_id}"
-            
-            response = "✅ <b>删除操作完成</b>\n\n"
-            response += f"📝 消息ID: <code>{message_id}</code>\n"
-            response += f"🔗 频道链接: {channel_link}\n\n"
-            response += "<b>已完成：</b>\n"
-            
-            # 频道消息删除状态
-            if channel_deleted:
-                if related_channel_deleted > 0:
-                    response += f"✅ 从频道删除消息（包含 {related_channel_deleted} 个关联消息）\n"
-                else:
-                    response += "✅ 从频道删除消息\n"
-            elif channel_delete_failed:
-                response += "⚠️ 频道消息删除失败（可能无权限或消息已不存在）\n"
-            else:
-                response += "⚠️ 频道消息删除状态未知\n"
-            
-            # 数据库和索引删除状态
-            response += "✅ 从数据库标记为已删除（保留历史数据）\n"
-            if index_deleted:
-                response += f"✅ 从搜索索引删除" + (f"（包含 {related_count} 个关联消息）" if related_count > 0 else "") + "\n"
+        results = await delete_posts(context.bot, [int(message_id)])
+        result = results[0]
+        if result.status == STATUS_NOT_FOUND:
+            await query.edit_message_text("❌ 帖子不存在或已被删除")
+            logger.warning(f"尝试删除不存在的帖子: message_id={message_id}")
+            return
+        if result.status == STATUS_ALREADY_DELETED:
+            await query.edit_message_text("ℹ️ 该帖子已被标记为删除")
+            logger.info(f"帖子 {result.message_id} 已经被标记为删除")
+            return
+        
+        # 传入的是关联消息时，删除的是所属的帖子
+        message_id = result.message_id
+        related_count = result.related_count
+        
+        # 构建响应消息
+        channel_link = f"https://t.me/{CHANNEL_ID.lstrip('@')}/{message_id}" if CHANNEL_ID.startswith('@') else f"消息ID: {message_id}"
+        
+        response = "✅ <b>删除操作完成</b>\n\n"
+        response += f"📝 消息ID: <code>{message_id}</code>\n"
+        response += f"🔗 频道链接: {channel_link}\n\n"
+        response += "<b>已完成：</b>\n"
+        
+        # 频道消息删除状态
+        if result.channel_deleted:
+            if related_count > 0:
+                response += f"✅ 从频道删除消息（包含 {related_count} 个关联消息）\n"
             else:
-                response += "⚠️ 搜索索引删除失败\n"
-            
-            await query.edit_message_text(response, parse_mode=ParseMode.HTML, disable_web_page_preview=True)
-            
+                response += "✅ 从频道删除消息\n"
+        else:
+            response += "⚠️ 频道消息删除失败（可能无权限）\n"
+        
+        # 数据库和索引删除状态
+        response += "✅ 从数据库标记为已删除（保留历史数据）\n"
+        if result.index_deleted:
+            response += f"✅ 从搜索索引删除" + (f"（包含 {related_count} 个关联消息）" if related_count > 0 else "") + "\n"
+        else:
+            response += "⚠️ 搜索索引删除失败\n"
+        
+        await query.edit_message_text(response, parse_mode=ParseMode.HTML, disable_web_page_preview=True)
+        
     except Exception as e:
         logger.error(f"删除帖子时出错: {e}", exc_info=True)
         await query.edit_message_text(f"❌ 删除失败: {str(e)[:100]}")
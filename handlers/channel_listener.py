@@ -7,6 +7,7 @@ import json
 import re
 import logging
 import asyncio
+from collections import OrderedDict
 from datetime import datetime
 from typing import Optional, Set
 from telegram import Update
@@ -14,7 +15,10 @@ from telegram.ext import CallbackContext
 
 from config.settings import CHANNEL_ID
 from database.db_manager import get_db
+from database import post_tags, post_content, post_messages
 from utils.search_engine import get_search_engine, PostDocument
+from utils.leaderboard import get_leaderboards
+from utils.rate_limiter import PRIORITY_BACKGROUND, with_api_priority, pace
 
 logger = logging.getLogger(__name__)
 
@@ -22,6 +26,10 @@ logger = logging.getLogger(__name__)
 _processing_messages: Set[int] = set()
 _processing_lock = asyncio.Lock()
 
+# 最近的媒体组：media_group_id -> 第一条消息ID（同组消息几乎同时到达，只需保留最近的少量）
+_media_groups: "OrderedDict[str, int]" = OrderedDict()
+MAX_MEDIA_GROUPS = 256
+
 # 字段长度限制（防止数据库溢出）
 MAX_TITLE_LENGTH = 200
 MAX_NOTE_LENGTH = 2000
@@ -30,6 +38,13 @@ MAX_FILENAME_LENGTH = 500
 MAX_TAGS_LENGTH = 500
 
 
+def _remember_media_group(media_group_id: str, message_id: int):
+    """登记媒体组的第一条消息，超出上限时丢弃最早的记录"""
+    _media_groups[media_group_id] = message_id
+    while len(_media_groups) > MAX_MEDIA_GROUPS:
+        _media_groups.popitem(last=False)
+
+
 def clean_text(text: str, max_length: Optional[int] = None) -> str:
     """
     清理文本：移除多余空格、换行，处理特殊字符
@@ -395,7 +410,7 @@ async def extract_message_info(message):
             'publish_time': publish_time,
             'user_id': 0,  # 频道消息没有用户ID
             'username': 'channel',  # 频道消息默认用户名
-            'related_message_ids': []  # 用于媒体组
+            'media_group_id': None  # 媒体组的后续消息并入第一条消息的帖子
         }
         
         # 提取文本信息
@@ -498,7 +513,7 @@ async def extract_message_info(message):
         # 处理媒体组（media_group_id）
         try:
             if hasattr(message, 'media_group_id') and message.media_group_id:
-                info['related_message_ids'] = [message_id]
+                info['media_group_id'] = str(message.media_group_id)
         except Exception as e:
             logger.warning(f"提取媒体组信息失败: {e}")
         
@@ -539,7 +554,7 @@ async def extract_message_info(message):
             'publish_time': datetime.now(),
             'user_id': 0,
             'username': 'channel',
-            'related_message_ids': []
+            'media_group_id': None
         }
 
 
@@ -596,16 +611,14 @@ async def save_channel_message(message_info: dict):
         publish_time = message_info.get('publish_time', datetime.now())
         user_id = message_info.get('user_id', 0)
         username = message_info.get('username', 'channel') or 'channel'
-        related_ids_json = None
         
-        # 处理相关消息ID
-        related_ids = message_info.get('related_message_ids', [])
-        if related_ids:
-            try:
-                related_ids_json = json.dumps(related_ids)
-            except (TypeError, ValueError) as e:
-                logger.warning(f"序列化 related_message_ids 失败: {e}")
-                related_ids_json = None
+        # 同一媒体组的后续消息并入第一条消息的帖子（在任何 await 之前登记，避免并发处理同组消息时重复建帖）
+        group_main_id = None
+        media_group_id = message_info.get('media_group_id')
+        if media_group_id:
+            group_main_id = _media_groups.get(media_group_id)
+            if group_main_id is None:
+                _remember_media_group(media_group_id, message_id)
         
         # 转换发布时间为时间戳
         if isinstance(publish_time, datetime):
@@ -630,30 +643,37 @@ async def save_channel_message(message_info: dict):
                     logger.debug(f"消息 {message_id} 已存在，跳过")
                     return False
                 
+                # 已入库帖子的关联消息（多组媒体、媒体组）不单独建帖
+                main_id = await post_messages.resolve_main_id(conn, message_id)
+                if main_id is not None:
+                    logger.debug(f"消息 {message_id} 是帖子 {main_id} 的关联消息，跳过")
+                    return False
+                if group_main_id is not None:
+                    await post_messages.add_post_message(conn, group_main_id, message_id)
+                    logger.info(f"消息 {message_id} 属于帖子 {group_main_id} 的媒体组，已记录为关联消息")
+                    return False
+                
                 # 插入新记录（使用参数化查询防止 SQL 注入）
                 try:
                     await cursor.execute("""
                         INSERT INTO published_posts 
-                        (message_id, user_id, username, title, tags, link, note,
-                         content_type, file_ids, caption, filename, publish_time, last_update, related_message_ids)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                        (message_id, user_id, username, title, tags,
+                         content_type, filename, publish_time, last_update)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
                     """, (
                         message_id,
                         user_id,
                         username,
                         title,
                         tags,
-                        link,
-                        note,
                         content_type,
-                        file_ids,
-                        caption,
                         filename,
                         publish_timestamp,
-                        datetime.now().timestamp(),
-                        related_ids_json
+                        datetime.now().timestamp()
                     ))
                     post_id = cursor.lastrowid
+                    await post_content.save_content(conn, message_id, link=link, note=note, file_ids=file_ids, caption=caption)
+                    await post_tags.set_post_tags(conn, message_id, tags)
                     # 注意：get_db() 上下文管理器会自动 commit，不需要手动 commit
                     logger.info(f"已保存频道消息 {message_id} (post_id: {post_id}) 到数据库")
                 except Exception as db_error:
@@ -681,6 +701,9 @@ async def save_channel_message(message_info: dict):
             logger.error(f"数据库连接错误 (message_id: {message_id}): {conn_error}", exc_info=True)
             return False
         
+        # 新帖子入库，热门排行需要重算
+        get_leaderboards().invalidate()
+        
         # 添加到搜索索引（独立处理，失败不影响数据库保存）
         try:
             search_engine = get_search_engine()
@@ -754,7 +777,7 @@ async def delete_channel_post_from_db(message_id: int, context: CallbackContext
             
             # 根据 message_id 获取帖子信息
             await cursor.execute(
-                "SELECT rowid AS post_id, message_id, related_message_ids FROM published_posts WHERE message_id=?",
+                "SELECT rowid AS post_id, message_id FROM published_posts WHERE message_id=?",
                 (int(message_id),)
             )
             post_row = await cursor.fetchone()
@@ -764,7 +787,7 @@ async def delete_channel_post_from_db(message_id: int, context: CallbackContext
                 return False
             
             post_id = post_row['post_id']
-            related_ids_json = post_row['related_message_ids']
+            related_ids = await post_messages.get_related_ids(conn, message_id)
             
             # 从搜索索引中删除
             try:
@@ -774,14 +797,10 @@ async def delete_channel_post_from_db(message_id: int, context: CallbackContext
                     logger.info(f"已从搜索索引删除帖子: {message_id}")
                     
                     # 如果有关联消息，也从索引删除
-                    if related_ids_json:
-                        try:
-                            related_ids = json.loads(related_ids_json)
-                            for related_id in related_ids:
-                                search_engine.delete_post(related_id)
-                            logger.info(f"已从索引删除 {len(related_ids)} 个关联消息")
-                        except json.JSONDecodeError:
-                            logger.warning(f"解析关联消息ID失败: {related_ids_json}")
+                    if related_ids:
+                        for related_id in related_ids:
+                            search_engine.delete_post(related_id)
+                        logger.info(f"已从索引删除 {len(related_ids)} 个关联消息")
             except Exception as e:
                 logger.error(f"从搜索索引删除失败: {e}")
                 # 继续执行，不因索引删除失败而中断
@@ -789,6 +808,7 @@ async def delete_channel_post_from_db(message_id: int, context: CallbackContext
             # 标记为已删除而不是直接删除记录（保留历史数据）
             await cursor.execute("UPDATE published_posts SET is_deleted = 1 WHERE rowid=?", (post_id,))
             await conn.commit()
+            get_leaderboards().remove_post(message_id)
             logger.info(f"已标记帖子为已删除: ID={post_id}, message_id={message_id}")
             
             return True
@@ -865,6 +885,7 @@ async def check_and_handle_deleted_message(message_id: int, context: CallbackCon
         return False
 
 
+@with_api_priority(PRIORITY_BACKGROUND)
 async def check_deleted_messages_periodic(context: CallbackContext):
     """
     定期检查数据库中的消息是否仍然存在于频道中
@@ -902,8 +923,8 @@ async def check_deleted_messages_periodic(context: CallbackContext):
                     if deleted:
                         deleted_count += 1
                     
-                    # 添加小延迟，避免请求过快
-                    await asyncio.sleep(0.5)
+                    # 添加小延迟，避免请求过快（启用全局限流器时由限流器调度）
+                    await pace(context.bot, 0.5)
                     
                 except Exception as e:
                     logger.warning(f"检查消息 {message_id} 时出错: {e}")
@@ -306,14 +306,16 @@ async def debug(update: Update, context: CallbackContext):
             process = psutil.Process()
             memory_info = psutil.virtual_memory()
             memory_usage = process.memory_info().rss / 1024 / 1024  # MB
-            cpu_percent = process.cpu_percent(interval=0.1)
             uptime = (datetime.now() - datetime.fromtimestamp(process.create_time())).total_seconds() / 60  # 分钟
+            # 按启动以来的 CPU 时间计算平均占用（cpu_percent(interval=...) 会阻塞事件循环）
+            cpu_times = process.cpu_times()
+            cpu_percent = (cpu_times.user + cpu_times.system) / max(uptime * 60, 1) * 100
             
             system_info = (
                 "\n📊 **系统信息**\n\n"
                 f"💻 操作系统: {platform.system()} {platform.release()}\n"
                 f"🐍 Python版本: {platform.python_version()}\n"
-                f"📈 进程CPU: {cpu_percent:.1f}%\n"
+                f"📈 进程CPU(平均): {cpu_percent:.1f}%\n"
                 f"🧠 进程内存: {memory_usage:.1f} MB\n"
                 f"💾 系统内存: {memory_info.percent:.1f}% ({memory_info.used/1024/1024/1024:.1f}GB/{memory_info.total/1024/1024/1024:.1f}GB)\n"
                 f"⏲️ 运行时间: {int(uptime)} 分钟\n"
@@ -363,6 +365,94 @@ async def debug(update: Update, context: CallbackContext):
             except Exception as se_err:
                 search_info += f"📄 索引文档数: N/A ({se_err})\n"
 
+            # 最近一次数据库维护
+            from database.maintenance import get_last_report
+            report = get_last_report()
+            if report:
+                ckpt = report['checkpoint']
+                ckpt_text = f"{ckpt['mode']} {ckpt['ms']:.0f} ms" if ckpt else "未达到阈值"
+                search_info += (
+                    f"🧹 最近维护: {datetime.fromtimestamp(report['time']).strftime('%H:%M:%S')}，"
+                    f"WAL {report['wal_bytes']/1024/1024:.1f} → {report['wal_bytes_after']/1024/1024:.1f} MB\n"
+                    f"⏱️ 检查点: {ckpt_text}，空闲页 {report['freelist_pages']}\n"
+                )
+
+            # 发布队列
+            from database import publish_outbox
+            async with get_db() as conn:
+                outbox = await publish_outbox.get_status_counts(conn)
+            search_info += (
+                f"📤 发布队列: 待处理 {outbox.get('pending', 0)}，发布中 {outbox.get('running', 0)}，"
+                f"失败 {outbox.get('failed', 0)}\n"
+            )
+
+            # API 限流排队延迟
+            from utils.rate_limiter import ApiRateLimiter
+            limiter = getattr(context.bot, 'rate_limiter', None)
+            if isinstance(limiter, ApiRateLimiter):
+                limiter_stats = limiter.get_stats()
+                waits = "，".join(
+                    f"{name} {p['wait_avg'] * 1000:.0f}/{p['wait_max'] * 1000:.0f} ms"
+                    for name, p in limiter_stats['priorities'].items()
+                )
+                search_info += (
+                    f"🚦 API 排队延迟(平均/最大): {waits}\n"
+                    f"⏳ 限流重试: {limiter_stats['retry_after']['count']} 次，当前排队 {limiter_stats['queued']}\n"
+                )
+
+            # Webhook 接收
+            from utils.webhook_server import get_webhook_server
+            webhook_server = get_webhook_server()
+            if webhook_server:
+                hook = webhook_server.get_stats()
+                search_info += (
+                    f"📡 Webhook: 接收 {hook['accepted']}，重复 {hook['duplicates']}，"
+                    f"饱和拒绝 {hook['rejected']}，排队 {hook['queued'] + hook['update_queue']}/{hook['max_queue']}\n"
+                )
+
+            # 并发更新处理（按用户分区）
+            from utils.update_processor import OrderedUpdateProcessor
+            processor = context.application.update_processor
+            if isinstance(processor, OrderedUpdateProcessor):
+                proc_stats = processor.get_stats()
+                search_info += (
+                    f"🔀 并发处理: {proc_stats['in_flight']}/{proc_stats['max_concurrent']}，"
+                    f"活跃用户 {proc_stats['active_partitions']}，排队 {proc_stats['queued']}，"
+                    f"待处理 {proc_stats['pending']}/{proc_stats['max_pending']}（等待名额 {proc_stats['blocked']}），"
+                    f"等待 {proc_stats['wait_avg'] * 1000:.0f}/{proc_stats['wait_max'] * 1000:.0f} ms\n"
+                )
+                for p in proc_stats['busiest']:
+                    if p['queued']:
+                        search_info += f"  • {p['key']}: 排队 {p['queued']}，最久等待 {p['oldest_wait']:.1f} 秒\n"
+
+            # 事件循环阻塞
+            from utils.loop_monitor import get_loop_monitor
+            loop_monitor = get_loop_monitor()
+            if loop_monitor:
+                lag = loop_monitor.get_stats()
+                search_info += (
+                    f"🐢 事件循环延迟: 平均 {lag['lag_avg'] * 1000:.1f} ms，最大 {lag['lag_max'] * 1000:.0f} ms，"
+                    f"阻塞 {lag['stalls']} 次共 {lag['blocked_seconds']:.1f} 秒\n"
+                )
+                for site in lag['top_sites'][:3]:
+                    search_info += f"  • {site['site']}: {site['count']} 次，最长 {site['max'] * 1000:.0f} ms\n"
+
+            # 会话数据
+            from utils import session_store
+            session_stats = session_store.get_stats()
+            if session_stats:
+                search_info += "🗂 会话数据: " + "，".join(
+                    f"{kind} 内存 {s['entries']} / 已溢出 {s['spilled']}" for kind, s in session_stats.items()
+                ) + "\n"
+
+            # 链路追踪
+            from utils import tracing
+            trace_stats = tracing.get_stats()
+            if trace_stats['enabled']:
+                search_info += (
+                    f"🧵 Trace: 抽样 {trace_stats['sample_rate']:.0%}，慢于 {trace_stats['slow_threshold']} 秒必导出，"
+                    f"已导出 {trace_stats['exported']}（当前 {tracing.current_trace_id() or '-'}）\n"
+                )
             debug_info += search_info
         except Exception as e:
             logger.warning(f"获取搜索/数据库配置失败: {e}")
@@ -387,6 +477,185 @@ async def debug(update: Update, context: CallbackContext):
         except Exception as e2:
             logger.error(f"发送错误消息失败: {e2}")
 
+async def profile(update: Update, context: CallbackContext):
+    """
+    采样分析机器人进程（仅所有者）
+
+    命令格式: /profile [秒数]，默认 10 秒。分析在后台进行，期间照常处理请求；
+    结束后发送函数耗时排行和折叠栈文件（可用 flamegraph.pl / speedscope 生成火焰图）。
+
+    Args:
+        update: Telegram 更新对象
+        context: 回调上下文
+    """
+    from utils import profiler
+
+    user_id = update.effective_user.id
+    if not is_owner(user_id):
+        logger.warning(f"非所有者用户 {user_id} 尝试使用性能分析命令")
+        await update.message.reply_text("⚠️ 只有机器人所有者才能使用此命令")
+        return
+
+    try:
+        seconds = float(context.args[0]) if context.args else 10.0
+    except ValueError:
+        await update.message.reply_text(f"⚠️ 命令格式: /profile [秒数]，最长 {profiler.MAX_SECONDS} 秒")
+        return
+    seconds = max(1.0, min(seconds, profiler.MAX_SECONDS))
+    if profiler.is_running():
+        await update.message.reply_text("⏳ 已有分析正在进行，请稍后再试")
+        return
+
+    await update.message.reply_text(f"🔬 开始采样 {seconds:.0f} 秒，结束后发送结果")
+    logger.info(f"所有者 {user_id} 开始性能分析，时长 {seconds:.0f} 秒")
+    # 在后台任务中等待，不占用当前更新的处理（同一用户的后续更新不会排队等待）
+    context.application.create_task(
+        _send_profile(context.bot, update.effective_chat.id, seconds), update=update
+    )
+
+
+async def _send_profile(bot, chat_id: int, seconds: float):
+    """执行采样并发送结果"""
+    import io
+    from telegram import InputFile
+    from utils import profiler
+
+    try:
+        result = await profiler.profile(seconds)
+    except RuntimeError as e:
+        await bot.send_message(chat_id, f"⏳ {e}")
+        return
+
+    summary = result.summary()
+    if len(summary) > 4000:
+        summary = summary[:4000] + "\n…"
+    await bot.send_message(chat_id, summary)
+    filename = f"profile-{datetime.now().strftime('%Y%m%d-%H%M%S')}.collapsed"
+    await bot.send_document(
+        chat_id,
+        document=InputFile(io.BytesIO(result.collapsed().encode('utf-8')), filename=filename),
+        caption="折叠栈文件：flamegraph.pl 或 https://www.speedscope.app 可生成火焰图",
+    )
+
+
+async def sqlstats(update: Update, context: CallbackContext):
+    """
+    查看 SQL 语句统计（仅所有者）
+
+    命令格式: /sqlstats [条数] [total|avg|p99|calls|rows|slow]，/sqlstats reset 清空统计
+
+    Args:
+        update: Telegram 更新对象
+        context: 回调上下文
+    """
+    from database.sql_profiler import get_sql_profiler
+
+    user_id = update.effective_user.id
+    if not is_owner(user_id):
+        logger.warning(f"非所有者用户 {user_id} 尝试使用 SQL 统计命令")
+        await update.message.reply_text("⚠️ 只有机器人所有者才能使用此命令")
+        return
+
+    sql_profiler = get_sql_profiler()
+    if sql_profiler is None:
+        await update.message.reply_text("⚠️ SQL 统计未启用（[DB] PROFILE_QUERIES）")
+        return
+
+    args = context.args or []
+    if args and args[0] == 'reset':
+        sql_profiler.reset()
+        await update.message.reply_text("✅ SQL 统计已清空")
+        return
+    limit = int(args[0]) if args and args[0].isdigit() else 10
+    sort = next((arg for arg in args if arg in ('total', 'avg', 'p99', 'calls', 'rows', 'slow')), 'total')
+
+    statements = sql_profiler.top(min(limit, 30), sort)
+    if not statements:
+        await update.message.reply_text("暂无 SQL 统计")
+        return
+    lines = [f"🗄️ SQL 语句（按 {sort} 排序，慢查询阈值 {sql_profiler.slow_threshold * 1000:.0f} ms）\n"]
+    for index, stat in enumerate(statements, 1):
+        sql = stat['sql'] if len(stat['sql']) <= 200 else stat['sql'][:200] + '…'
+        lines.append(
+            f"{index}. {stat['calls']} 次，共 {stat['total'] * 1000:.0f} ms，"
+            f"平均 {stat['avg'] * 1000:.1f} / p99 {stat['p99'] * 1000:.1f} ms，"
+            f"{stat['rows']} 行，慢 {stat['slow']} 次\n{sql}\n"
+        )
+    text = "\n".join(lines)
+    if len(text) > 4000:
+        text = text[:4000] + "\n…"
+    await update.message.reply_text(text)
+
+
+async def memory(update: Update, context: CallbackContext):
+    """
+    查看内存占用（仅所有者）
+
+    命令格式: /memory，/memory shrink 立即释放缓存，/memory trace [off] 开启/关闭按子系统的分配统计
+
+    Args:
+        update: Telegram 更新对象
+        context: 回调上下文
+    """
+    from utils import memory_governor
+
+    user_id = update.effective_user.id
+    if not is_owner(user_id):
+        logger.warning(f"非所有者用户 {user_id} 尝试使用内存命令")
+        await update.message.reply_text("⚠️ 只有机器人所有者才能使用此命令")
+        return
+
+    governor = memory_governor.get_memory_governor()
+    args = context.args or []
+    if args and args[0] == 'shrink':
+        result = governor.shrink(memory_governor.LEVEL_HARD)
+        text = f"🧹 已清空缓存 {sum(result['dropped'].values())} 条，回收 {result['collected']} 个对象"
+        if result['rss_before'] and result['rss_after']:
+            text += f"\nRSS {result['rss_before'] / 1024 / 1024:.1f} → {result['rss_after'] / 1024 / 1024:.1f} MB"
+        await update.message.reply_text(text)
+        return
+    if args and args[0] == 'trace':
+        if len(args) > 1 and args[1] == 'off':
+            memory_governor.stop_tracemalloc()
+            await update.message.reply_text("✅ 已关闭 tracemalloc")
+        else:
+            memory_governor.start_tracemalloc()
+            await update.message.reply_text("✅ 已开启 tracemalloc，之后的分配会按子系统统计（/memory 查看，/memory trace off 关闭）")
+        return
+
+    def mb(value):
+        return f"{value / 1024 / 1024:.1f} MB" if value else "未知"
+
+    report = governor.report()
+    lines = [
+        "🧠 内存占用\n",
+        f"RSS: {mb(report['rss'])}，上限: {mb(report['limit']) if report['limit'] else '未设置'}，"
+        f"状态: {memory_governor.LEVEL_NAMES[report['level']]}",
+        f"SQLite page cache（新连接）: {report['page_cache_kb']} KB",
+    ]
+    if report['limit']:
+        lines.append(f"软/硬限制: {mb(report['soft'])} / {mb(report['hard'])}")
+    lines.append("\n📦 缓存和会话数据（条目数）")
+    for name, size in sorted(report['consumers'].items()):
+        lines.append(f"  • {name}: {size}")
+
+    usage = await memory_governor.subsystem_usage()
+    if usage is None:
+        lines.append("\n按子系统统计需开启 tracemalloc: /memory trace")
+    else:
+        lines.append("\n🔍 Python 分配（tracemalloc，开启后的分配）")
+        for name, size in usage[:10]:
+            lines.append(f"  • {name}: {mb(size)}")
+
+    last = report['last_shrink']
+    if last:
+        lines.append(
+            f"\n上次释放: {datetime.fromtimestamp(last['time']).strftime('%H:%M:%S')}"
+            f"（{memory_governor.LEVEL_NAMES[last['level']]}），淘汰 {sum(last['dropped'].values())} 条"
+        )
+    await update.message.reply_text("\n".join(lines))
+
+
 async def catch_all(update: Update, context: CallbackContext):
     """
     捕获所有未处理的消息
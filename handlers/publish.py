@@ -4,7 +4,9 @@
 import json
 import logging
 import asyncio
+import uuid
 from datetime import datetime
+from typing import Optional
 from telegram import (
     Update,
     InputMediaPhoto,
@@ -13,15 +15,30 @@ from telegram import (
     InputMediaAudio,
     InputMediaDocument
 )
+from telegram.error import RetryAfter
 from telegram.ext import ConversationHandler, CallbackContext
 
-from config.settings import CHANNEL_ID, NET_TIMEOUT, OWNER_ID, NOTIFY_OWNER
-from database.db_manager import get_db, cleanup_old_data
+from config.settings import (
+    CHANNEL_ID, NET_TIMEOUT, OWNER_ID, NOTIFY_OWNER,
+    PUBLISH_WORKERS, PUBLISH_MAX_ATTEMPTS, PUBLISH_RETRY_DELAY
+)
+from database.db_manager import get_db
+from database import post_tags, post_content, post_messages, publish_outbox
+from database.publish_outbox import OutboxJob
 from utils.helper_functions import build_caption, safe_send
 from utils.search_engine import get_search_engine, PostDocument
+from utils.leaderboard import get_leaderboards
+from utils.rate_limiter import PRIORITY_PUBLISH, api_priority, pace
+from utils import tracing
 
 logger = logging.getLogger(__name__)
 
+# 发布失败后重试等待时间的上限（秒）
+MAX_RETRY_DELAY = 3600
+# 没有新任务通知时，工作协程检查到期重试任务的间隔（秒）
+PUBLISH_POLL_INTERVAL = 5
+
+@tracing.traced('publish.save_post')
 async def save_published_post(user_id, message_id, data, media_list, doc_list, all_message_ids=None):
     """
     保存已发布的帖子信息到数据库和搜索索引
@@ -33,122 +50,160 @@ async def save_published_post(user_id, message_id, data, media_list, doc_list, a
         media_list: 媒体列表
         doc_list: 文档列表
         all_message_ids: 所有相关消息ID列表（用于多组媒体的热度统计）
+
+    Raises:
+        Exception: 写入数据库失败（由发布队列重试；写入搜索索引失败只记录日志）
     """
+    # 确定内容类型
+    content_type = 'media' if media_list else 'document'
+    if media_list and doc_list:
+        content_type = 'mixed'
+    
+    # 获取文件ID列表
+    file_ids = json.dumps(media_list if media_list else doc_list)
+    
+    # 提取标签（从tags字段）- 兼容 sqlite3.Row 对象
+    tags = data['tags'] if 'tags' in data.keys() else ''
+    
+    # 构建说明
+    caption = build_caption(data)
+    
+    # 提取信息 - 兼容 sqlite3.Row 对象
+    title = data['title'] if data['title'] else ''
+    note = data['note'] if data['note'] else ''
+    link = data['link'] if data['link'] else ''
+    username = data['username'] if 'username' in data.keys() and data['username'] else f'user{user_id}'
+    publish_time = datetime.now()
+    
+    # 提取文件名（从文档列表中）
+    filename = ''
+    if doc_list:
+        filenames = []
+        for doc_item in doc_list:
+            # 新格式：document:file_id:filename
+            parts = doc_item.split(':', 2)
+            if len(parts) >= 3:
+                filenames.append(parts[2])
+            elif len(parts) == 2:
+                # 兼容旧格式 document:file_id
+                filenames.append('未知文件')
+        filename = ' | '.join(filenames) if filenames else ''
+    
+    # 处理相关消息ID（用于多组媒体热度统计和删除）
+    related_ids = [mid for mid in (all_message_ids or []) if mid != message_id]
+    if related_ids:
+        logger.info(f"记录{len(related_ids)}个关联消息ID: {related_ids}")
+    
+    # 保存到数据库并获取 post_id
+    post_id = None
+    async with get_db() as conn:
+        cursor = await conn.cursor()
+        # 重试时帖子可能已在上次尝试中入库（入库后、记录阶段前中断），不重复写入
+        await cursor.execute("SELECT 1 FROM published_posts WHERE message_id = ?", (message_id,))
+        if await cursor.fetchone():
+            logger.info(f"帖子 {message_id} 已在published_posts表中，跳过保存")
+            return
+        await cursor.execute("""
+            INSERT INTO published_posts 
+            (message_id, user_id, username, title, tags,
+             content_type, filename, publish_time, last_update)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (
+            message_id,
+            user_id,
+            username,
+            title,
+            tags,
+            content_type,
+            filename,
+            publish_time.timestamp(),
+            publish_time.timestamp()
+        ))
+        post_id = cursor.lastrowid  # 获取插入的行ID
+        await post_content.save_content(conn, message_id, link=link, note=note, file_ids=file_ids, caption=caption)
+        await post_messages.set_post_messages(conn, message_id, related_ids)
+        await post_tags.set_post_tags(conn, message_id, tags)
+        await conn.commit()
+        logger.info(f"已保存帖子 {message_id} (post_id: {post_id}) 到published_posts表（文件名: {filename}）")
+    
+    # 新帖子入库，热门排行需要重算
+    get_leaderboards().invalidate()
+    
+    # 添加到搜索索引
     try:
-        # 确定内容类型
-        content_type = 'media' if media_list else 'document'
-        if media_list and doc_list:
-            content_type = 'mixed'
+        search_engine = get_search_engine()
         
-        # 获取文件ID列表
-        file_ids = json.dumps(media_list if media_list else doc_list)
-        
-        # 提取标签（从tags字段）- 兼容 sqlite3.Row 对象
-        tags = data['tags'] if 'tags' in data.keys() else ''
-        
-        # 构建说明
-        caption = build_caption(data)
-        
-        # 提取信息 - 兼容 sqlite3.Row 对象
-        title = data['title'] if data['title'] else ''
-        note = data['note'] if data['note'] else ''
-        link = data['link'] if data['link'] else ''
-        username = data['username'] if 'username' in data.keys() and data['username'] else f'user{user_id}'
-        publish_time = datetime.now()
-        
-        # 提取文件名（从文档列表中）
-        filename = ''
-        if doc_list:
-            filenames = []
-            for doc_item in doc_list:
-                # 新格式：document:file_id:filename
-                parts = doc_item.split(':', 2)
-                if len(parts) >= 3:
-                    filenames.append(parts[2])
-                elif len(parts) == 2:
-                    # 兼容旧格式 document:file_id
-                    filenames.append('未知文件')
-            filename = ' | '.join(filenames) if filenames else ''
-        
-        # 处理相关消息ID（用于多组媒体热度统计）
-        related_ids_json = None
-        if all_message_ids and len(all_message_ids) > 1:
-            # 只保存除主消息外的其他消息ID
-            related_ids = [mid for mid in all_message_ids if mid != message_id]
-            if related_ids:
-                related_ids_json = json.dumps(related_ids)
-                logger.info(f"记录{len(related_ids)}个关联消息ID: {related_ids}")
+        # 构建搜索文档
+        # 将 note 作为 description
+        post_doc = PostDocument(
+            message_id=message_id,
+            post_id=post_id,  # 传入数据库ID
+            title=title,
+            description=note,  # 使用note作为描述
+            tags=tags,
+            filename=filename,  # 文件名
+            link=link,
+            user_id=user_id,
+            username=username,
+            publish_time=publish_time,
+            views=0,
+            heat_score=0
+        )
         
-        # 保存到数据库并获取 post_id
-        post_id = None
-        async with get_db() as conn:
-            cursor = await conn.cursor()
-            await cursor.execute("""
-                INSERT INTO published_posts 
-                (message_id, user_id, username, title, tags, link, note,
-                 content_type, file_ids, caption, filename, publish_time, last_update, related_message_ids)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                message_id,
-                user_id,
-                username,
-                title,
-                tags,
-                link,
-                note,
-                content_type,
-                file_ids,
-                caption,
-                filename,
-                publish_time.timestamp(),
-                publish_time.timestamp(),
-                related_ids_json
-            ))
-            post_id = cursor.lastrowid  # 获取插入的行ID
-            await conn.commit()
-            logger.info(f"已保存帖子 {message_id} (post_id: {post_id}) 到published_posts表（文件名: {filename}）")
+        # 添加到索引
+        search_engine.add_post(post_doc)
+        logger.info(f"已添加帖子 {message_id} (post_id: {post_id}) 到搜索索引（文件名: {filename}）")
         
-        # 添加到搜索索引
-        try:
-            search_engine = get_search_engine()
-            
-            # 构建搜索文档
-            # 将 note 作为 description
-            post_doc = PostDocument(
-                message_id=message_id,
-                post_id=post_id,  # 传入数据库ID
-                title=title,
-                description=note,  # 使用note作为描述
-                tags=tags,
-                filename=filename,  # 文件名
-                link=link,
-                user_id=user_id,
-                username=username,
-                publish_time=publish_time,
-                views=0,
-                heat_score=0
-            )
-            
-            # 添加到索引
-            search_engine.add_post(post_doc)
-            logger.info(f"已添加帖子 {message_id} (post_id: {post_id}) 到搜索索引（文件名: {filename}）")
-            
-        except Exception as e:
-            logger.error(f"添加到搜索索引失败: {e}", exc_info=True)
-            # 继续执行，不影响发布流程
-            
     except Exception as e:
-        logger.error(f"保存帖子信息到数据库失败: {e}")
+        logger.error(f"添加到搜索索引失败: {e}", exc_info=True)
+        # 继续执行，不影响发布流程
+
+
+def _parse_files(data, user_id):
+    """
+    解析投稿中的媒体和文档列表
+
+    Args:
+        data: 投稿数据（sqlite3.Row 或任务快照中的 dict）
+        user_id: 用户ID（用于日志）
+
+    Returns:
+        tuple: (媒体列表, 文档列表)
+    """
+    media_list = []
+    doc_list = []
+
+    try:
+        if data["image_id"]:
+            media_list = json.loads(data["image_id"])
+    except (json.JSONDecodeError, TypeError):
+        logger.warning(f"解析媒体数据失败，user_id: {user_id}")
+        media_list = []
+
+    try:
+        if data["document_id"]:
+            doc_list = json.loads(data["document_id"])
+    except (json.JSONDecodeError, TypeError):
+        logger.warning(f"解析文档数据失败，user_id: {user_id}")
+        doc_list = []
+
+    return media_list, doc_list
+
+
+def _submission_link(message_id):
+    """生成频道帖子链接"""
+    if CHANNEL_ID.startswith('@'):
+        channel_username = CHANNEL_ID.lstrip('@')
+        return f"https://t.me/{channel_username}/{message_id}"
+    return "频道无公开链接"
+
 
 async def publish_submission(update: Update, context: CallbackContext) -> int:
     """
-    发布投稿到频道
-    
-    处理逻辑:
-    1. 仅媒体模式: 将媒体发送到频道
-    2. 仅文档模式或文档优先模式: 
-       - 若同时有媒体和文档，则以媒体为主贴，文档组合作为回复
-       - 若仅有文档，则以文档进行组合发送（说明文本放在最后一条）
+    确认发布投稿
+
+    把投稿快照写入发布队列（与删除临时投稿数据在同一事务中提交）后立即返回，
+    由后台工作协程发送到频道（见 PublishWorkerPool），并通过进度消息告知投稿人。
     
     Args:
         update: Telegram 更新对象
@@ -158,6 +213,8 @@ async def publish_submission(update: Update, context: CallbackContext) -> int:
         int: 会话结束状态
     """
     user_id = update.effective_user.id
+    # 通过按钮确认时 update.message 为空，回复到按钮所在的消息
+    message = update.effective_message
     try:
         async with get_db() as conn:
             c = await conn.cursor()
@@ -165,189 +222,366 @@ async def publish_submission(update: Update, context: CallbackContext) -> int:
             data = await c.fetchone()
         
         if not data:
-            await update.message.reply_text("❌ 数据异常，请重新发送 /start")
+            await message.reply_text("❌ 数据异常，请重新发送 /start")
             return ConversationHandler.END
 
-        caption = build_caption(data)
-        
-        # 解析媒体和文档数据，增强型错误处理
-        media_list = []
-        doc_list = []
-        
-        try:
-            if data["image_id"]:
-                media_list = json.loads(data["image_id"])
-        except (json.JSONDecodeError, TypeError):
-            logger.warning(f"解析媒体数据失败，user_id: {user_id}")
-            media_list = []
-            
-        try:
-            if data["document_id"]:
-                doc_list = json.loads(data["document_id"])
-        except (json.JSONDecodeError, TypeError):
-            logger.warning(f"解析文档数据失败，user_id: {user_id}")
-            doc_list = []
-        
+        media_list, doc_list = _parse_files(data, user_id)
         if not media_list and not doc_list:
-            await update.message.reply_text("❌ 未检测到任何上传文件，请重新发送 /start")
+            # 没有可发布的内容，丢弃这份投稿
+            async with get_db() as conn:
+                await conn.execute("DELETE FROM submissions WHERE user_id=?", (user_id,))
+            logger.info(f"已删除用户 {user_id} 的投稿记录")
+            await message.reply_text("❌ 未检测到任何上传文件，请重新发送 /start")
             return ConversationHandler.END
 
-        # 安全处理spoiler字段，防止None值导致AttributeError
-        spoiler_value = data["spoiler"] if "spoiler" in data.keys() and data["spoiler"] else "false"
-        spoiler_flag = spoiler_value.lower() == "true"
-        sent_message = None
-        all_message_ids = []  # 用于记录所有发送的消息ID
+        user = update.effective_user
+        payload = {
+            'submission': dict(zip(data.keys(), data)),
+            # 说明文本在确认时生成，发布内容与用户确认的一致
+            'caption': build_caption(data),
+            'submitter': {
+                'username': user.username,
+                'first_name': user.first_name,
+                'last_name': user.last_name,
+            },
+        }
+        # 同一次投稿（同一条临时投稿数据）重复确认只生成一个发布任务
+        idempotency_key = f"{user_id}:{data['timestamp'] or uuid.uuid4().hex}"
+
+        progress = await message.reply_text("⏳ 正在加入发布队列……")
+        async with get_db() as conn:
+            job_id, created = await publish_outbox.enqueue(
+                conn, idempotency_key, user_id, update.effective_chat.id, payload, progress.message_id
+            )
+            await conn.execute("DELETE FROM submissions WHERE user_id=?", (user_id,))
+            position = await publish_outbox.queue_position(conn, job_id)
+        logger.info(f"用户 {user_id} 的投稿已加入发布队列，任务ID: {job_id}（新任务: {created}）")
+
+        ahead = max(position - 1, 0)
+        await progress.edit_text(
+            f"⏳ 投稿已加入发布队列{f'，前面还有 {ahead} 个投稿' if ahead else ''}。\n发布进度会在这里更新。"
+        )
+        wake_publish_workers()
         
-        # 处理媒体文件
-        if media_list:
-            sent_message, all_message_ids = await handle_media_publish(context, media_list, caption, spoiler_flag)
+    except Exception as e:
+        # 入队失败时保留临时投稿数据（入队与删除在同一事务中，失败时一并回滚）
+        logger.error(f"投稿加入发布队列失败: {e}")
+        await message.reply_text(f"❌ 发布失败，请联系管理员。错误信息：{str(e)}")
+    
+    return ConversationHandler.END
+
+
+class PublishError(Exception):
+    """发布任务的某个阶段失败（可重试）"""
+
+
+async def _report_progress(bot, job: OutboxJob, text: str, final: bool = False):
+    """
+    向投稿人汇报发布进度
+
+    过程中的进度编辑同一条进度消息；最终结果单独发送一条消息，确保投稿人收到提醒。
+
+    Args:
+        bot: Bot 实例
+        job: 发布任务
+        text: 进度文本
+        final: 是否为最终结果
+    """
+    if not job.chat_id:
+        return
+    try:
+        if job.progress_message_id and not final:
+            await bot.edit_message_text(chat_id=job.chat_id, message_id=job.progress_message_id, text=text)
+        else:
+            await bot.send_message(chat_id=job.chat_id, text=text)
+    except Exception as e:
+        logger.warning(f"更新发布进度失败，任务ID: {job.id}: {e}")
+
+
+async def _advance_job(job: OutboxJob, stage: str, main_message_id, message_ids) -> str:
+    """记录任务完成到的阶段，返回下一个阶段"""
+    async with get_db() as conn:
+        await publish_outbox.advance(conn, job.id, stage, main_message_id, message_ids)
+    return stage
+
+
+async def _notify_owner(bot, job: OutboxJob, submission_link: str):
+    """
+    向所有者发送投稿通知
+
+    Args:
+        bot: Bot 实例
+        job: 发布任务
+        submission_link: 帖子链接
+    """
+    user_id = job.user_id
+    submitter = job.payload.get('submitter') or {}
+    real_username = submitter.get('username') or f"user{user_id}"
+    last_name = submitter.get('last_name')
+
+    # 构建纯文本通知消息（不使用任何Markdown，确保最大兼容性）
+    notification_text = (
+        f"📨 新投稿通知\n\n"
+        f"👤 投稿人信息:\n"
+        f"  • ID: {user_id}\n"
+        f"  • 用户名: {('@' + real_username) if submitter.get('username') else real_username}\n"
+        f"  • 昵称: {submitter.get('first_name') or ''}{f' {last_name}' if last_name else ''}\n\n"
+        
+        f"🔗 查看投稿: {submission_link}\n\n"
         
-        # 处理文档文件
+        f"⚙️ 管理操作:\n"
+        f"封禁此用户: /blacklist_add {user_id} 违规内容\n"
+        f"查看黑名单: /blacklist_list"
+    )
+
+    logger.info(f"准备发送通知到所有者: {OWNER_ID}")
+    try:
+        message = await bot.send_message(chat_id=OWNER_ID, text=notification_text)
+        logger.info(f"通知发送成功！消息ID: {message.message_id}")
+    except Exception as e:
+        logger.error(f"发送通知失败: {e}")
+        # 尝试使用更简化的消息
+        try:
+            simple_msg = f"📨 新投稿通知 - 用户 {real_username} (ID: {user_id}) 发布了新投稿\n链接: {submission_link}\n\n封禁命令: /blacklist_add {user_id} 违规内容"
+            await bot.send_message(chat_id=OWNER_ID, text=simple_msg)
+            logger.info("使用简化消息成功发送通知")
+        except Exception as e2:
+            logger.error(f"发送简化通知也失败: {e2}")
+            # 通知用户有问题
+            await _report_progress(bot, job, "⚠️ 投稿已发布，但无法通知管理员。请直接联系管理员。", final=True)
+
+
+async def process_publish_job(application, job: OutboxJob, final_attempt: bool = False) -> str:
+    """
+    执行发布任务
+    
+    处理逻辑:
+    1. 仅媒体模式: 将媒体发送到频道
+    2. 仅文档模式或文档优先模式: 
+       - 若同时有媒体和文档，则以媒体为主贴，文档组合作为回复
+       - 若仅有文档，则以文档进行组合发送（说明文本放在最后一条）
+
+    从任务记录的阶段继续执行，每完成一个阶段记录阶段和已发送的消息ID，
+    重试时不会重复发送已完成的部分。
+
+    Args:
+        application: Application 实例
+        job: 已领取的发布任务
+        final_attempt: 是否为最后一次尝试（此时媒体已发出而文档发送失败，仍按已发出的内容入库）
+
+    Returns:
+        str: 帖子链接
+
+    Raises:
+        PublishError: 某个阶段发送失败
+    """
+    bot = application.bot
+    data = job.payload['submission']
+    caption = job.payload['caption']
+    media_list, doc_list = _parse_files(data, job.user_id)
+    # 安全处理spoiler字段，防止None值导致AttributeError
+    spoiler_flag = (data.get('spoiler') or 'false').lower() == 'true'
+    stage = job.stage
+    main_message_id = job.main_message_id
+    message_ids = list(job.message_ids)
+
+    if stage == publish_outbox.STAGE_MEDIA:
+        if media_list:
+            await _report_progress(bot, job, f"⏳ 正在发送 {len(media_list)} 个媒体到频道……")
+            sent_message, message_ids = await handle_media_publish(application, media_list, caption, spoiler_flag)
+            if not sent_message:
+                raise PublishError("媒体发送失败")
+            main_message_id = sent_message.message_id
+        stage = await _advance_job(job, publish_outbox.STAGE_DOCUMENTS, main_message_id, message_ids)
+
+    if stage == publish_outbox.STAGE_DOCUMENTS:
         if doc_list:
-            if sent_message:
-                # 如果已经发送了媒体，则文档作为回复
-                doc_msg = await handle_document_publish(
-                    context, 
-                    doc_list, 
-                    None,  # 不需要重复发送说明，回复到主贴即可
-                    sent_message.message_id
-                )
+            await _report_progress(bot, job, f"⏳ 正在发送 {len(doc_list)} 个文档到频道……")
+            if main_message_id:
+                # 已经发送了媒体，文档作为回复，不需要重复发送说明
+                doc_msg = await handle_document_publish(application, doc_list, None, main_message_id)
                 if doc_msg:
-                    all_message_ids.append(doc_msg.message_id)
+                    message_ids.append(doc_msg.message_id)
+                elif not final_attempt:
+                    raise PublishError("文档发送失败")
+                else:
+                    logger.warning(f"任务 {job.id} 的文档最终未能发送，按已发送的媒体保存帖子")
             else:
                 # 如果只有文档，直接发送
-                sent_message = await handle_document_publish(context, doc_list, caption)
-                if sent_message:
-                    all_message_ids.append(sent_message.message_id)
-        
-        # 处理结果
-        if not sent_message:
-            await update.message.reply_text("❌ 内容发送失败，请稍后再试")
-            return ConversationHandler.END
-            
-        # 生成投稿链接
-        if CHANNEL_ID.startswith('@'):
-            channel_username = CHANNEL_ID.lstrip('@')
-            submission_link = f"https://t.me/{channel_username}/{sent_message.message_id}"
-        else:
-            submission_link = "频道无公开链接"
+                sent_message = await handle_document_publish(application, doc_list, caption)
+                if not sent_message:
+                    raise PublishError("文档发送失败")
+                main_message_id = sent_message.message_id
+                message_ids.append(main_message_id)
+        if not main_message_id:
+            raise PublishError("内容发送失败")
+        stage = await _advance_job(job, publish_outbox.STAGE_SAVE, main_message_id, message_ids)
 
-        await update.message.reply_text(
-            f"🎉 投稿已成功发布到频道！\n点击以下链接查看投稿：\n{submission_link}"
-        )
-        
-        # 保存已发布的帖子信息到数据库（用于热度统计和搜索）
-        await save_published_post(user_id, sent_message.message_id, data, media_list, doc_list, all_message_ids)
-        
-        # 向所有者发送投稿通知
-        if NOTIFY_OWNER and OWNER_ID:
-            # 记录详细的调试信息
-            logger.info(f"准备发送通知: NOTIFY_OWNER={NOTIFY_OWNER}, OWNER_ID={OWNER_ID}, 类型={type(OWNER_ID)}")
-            
-            # 获取用户名信息
-            username = None
-            try:
-                username = data["username"] if "username" in data else f"user{user_id}"
-            except (KeyError, TypeError):
-                username = f"user{user_id}"
-                
-            # 获取用户名信息，优先使用真实用户名
-            user = update.effective_user
-            real_username = user.username or username
-            
-            # 安全处理可能缺失的数据字段
+    if stage == publish_outbox.STAGE_SAVE:
+        # 保存已发布的帖子信息到数据库（用于热度统计和搜索），失败时从本阶段重试
+        try:
+            await save_published_post(job.user_id, main_message_id, data, media_list, doc_list, message_ids)
+        except Exception as e:
+            logger.error(f"保存帖子信息到数据库失败，任务ID: {job.id}: {e}")
+            raise PublishError(f"保存帖子信息失败: {e}") from e
+        stage = await _advance_job(job, publish_outbox.STAGE_NOTIFY, main_message_id, message_ids)
+
+    submission_link = _submission_link(main_message_id)
+    await _report_progress(
+        bot, job, f"🎉 投稿已成功发布到频道！\n点击以下链接查看投稿：\n{submission_link}", final=True
+    )
+    # 向所有者发送投稿通知
+    if NOTIFY_OWNER and OWNER_ID:
+        await _notify_owner(bot, job, submission_link)
+    else:
+        logger.info(f"不发送通知: NOTIFY_OWNER={NOTIFY_OWNER}, OWNER_ID={OWNER_ID}")
+    return submission_link
+
+
+def _retry_delay(attempts: int, error: Exception) -> float:
+    """第 attempts 次尝试失败后距下次尝试的秒数（指数退避，遵守 Telegram 的 RetryAfter）"""
+    if isinstance(error, RetryAfter):
+        retry_after = error.retry_after
+        if hasattr(retry_after, 'total_seconds'):
+            retry_after = retry_after.total_seconds()
+        return float(retry_after) + 1
+    return min(PUBLISH_RETRY_DELAY * 2 ** max(attempts - 1, 0), MAX_RETRY_DELAY)
+
+
+class PublishWorkerPool:
+    """
+    发布队列工作协程池
+
+    每个工作协程循环领取到期的发布任务并执行；新任务入队时通过 wake() 唤醒，
+    等待重试的任务由工作协程定期轮询领取。
+    """
+
+    def __init__(self, application, workers: int = PUBLISH_WORKERS, poll_interval: float = PUBLISH_POLL_INTERVAL):
+        """
+        Args:
+            application: Application 实例
+            workers: 工作协程数
+            poll_interval: 没有任务时检查到期重试任务的间隔（秒）
+        """
+        self.application = application
+        self.workers = max(1, workers)
+        self.poll_interval = poll_interval
+        self._wakeup = asyncio.Event()
+        self._tasks = []
+
+    async def start(self):
+        """把上次中断的任务重新排队，然后启动工作协程"""
+        async with get_db() as conn:
+            recovered = await publish_outbox.recover_running(conn)
+        if recovered:
+            logger.info(f"已恢复 {recovered} 个中断的发布任务")
+        self._tasks = [
+            asyncio.create_task(self._worker(index), name=f"publish-worker-{index}")
+            for index in range(self.workers)
+        ]
+        logger.info(f"发布队列已启动，工作协程数: {self.workers}")
+
+    async def stop(self):
+        """停止工作协程（执行中的任务保持 running 状态，下次启动时恢复）"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def wake(self):
+        """有新任务入队时唤醒空闲的工作协程"""
+        self._wakeup.set()
+
+    async def run_once(self) -> bool:
+        """
+        领取并执行一个到期任务
+
+        Returns:
+            bool: 是否领取到任务
+        """
+        async with get_db() as conn:
+            job = await publish_outbox.claim_next(conn)
+        if job is None:
+            return False
+
+        final_attempt = job.attempts >= PUBLISH_MAX_ATTEMPTS
+        try:
+            with tracing.trace('publish_job', job_id=job.id, attempt=job.attempts), api_priority(PRIORITY_PUBLISH):
+                await process_publish_job(self.application, job, final_attempt)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            async with get_db() as conn:
+                if final_attempt:
+                    await publish_outbox.fail(conn, job.id, error)
+                else:
+                    delay = _retry_delay(job.attempts, e)
+                    await publish_outbox.reschedule(conn, job.id, delay, error)
+            if final_attempt:
+                logger.error(f"发布任务 {job.id} 最终失败（已尝试 {job.attempts} 次）: {error}")
+                await _report_progress(
+                    self.application.bot, job, "❌ 发布失败，请联系管理员。错误信息：" + str(e), final=True
+                )
+            else:
+                logger.warning(f"发布任务 {job.id} 第 {job.attempts} 次尝试失败，{delay:.0f} 秒后重试: {error}")
+                await _report_progress(
+                    self.application.bot, job,
+                    f"⚠️ 发布遇到问题，将在 {delay:.0f} 秒后自动重试（第 {job.attempts}/{PUBLISH_MAX_ATTEMPTS} 次）"
+                )
+            return True
+
+        async with get_db() as conn:
+            await publish_outbox.complete(conn, job.id)
+        logger.info(f"发布任务 {job.id} 完成（用户 {job.user_id}）")
+        return True
+
+    async def _worker(self, index: int):
+        while True:
+            self._wakeup.clear()
             try:
-                mode = data["mode"] if "mode" in data else "未知"
-                media_count = len(json.loads(data["image_id"])) if "image_id" in data and data["image_id"] else 0
-                doc_count = len(json.loads(data["document_id"])) if "document_id" in data and data["document_id"] else 0
-                tag_text = data["tag"] if "tag" in data else "无"
-                title_text = data["title"] if "title" in data else "无"
-                spoiler_text = "是" if "spoiler" in data and data["spoiler"] == "true" else "否"
+                if await self.run_once():
+                    continue
+            except asyncio.CancelledError:
+                raise
             except Exception as e:
-                logger.error(f"数据处理错误: {e}")
-                # 设置默认值
-                mode = "未知"
-                media_count = 0
-                doc_count = 0
-                tag_text = "无"
-                title_text = "无"
-                spoiler_text = "否"
-            
-            # 构建纯文本通知消息（不使用任何Markdown，确保最大兼容性）
-            notification_text = (
-                f"📨 新投稿通知\n\n"
-                f"👤 投稿人信息:\n"
-                f"  • ID: {user_id}\n"
-                f"  • 用户名: {('@' + real_username) if user.username else real_username}\n"
-                f"  • 昵称: {user.first_name}{f' {user.last_name}' if user.last_name else ''}\n\n"
-                
-                f"🔗 查看投稿: {submission_link}\n\n"
-                
-                f"⚙️ 管理操作:\n"
-                f"封禁此用户: /blacklist_add {user_id} 违规内容\n"
-                f"查看黑名单: /blacklist_list"
-            )
-            
+                logger.error(f"发布工作协程 {index} 出错: {e}", exc_info=True)
             try:
-                # OWNER_ID 已经在配置中转换为整数类型，直接使用
-                logger.info(f"准备发送通知到所有者: {OWNER_ID}")
-                
-                # 记录通知消息内容
-                logger.info(f"通知消息长度: {len(notification_text)}, 使用纯文本格式")
-                
-                # 简化尝试逻辑 - 直接使用纯文本，不尝试任何格式化
-                try:
-                    message = await context.bot.send_message(
-                        chat_id=OWNER_ID,
-                        text=notification_text
-                    )
-                    logger.info(f"通知发送成功！消息ID: {message.message_id}")
-                except Exception as e:
-                    logger.error(f"发送通知失败: {e}")
-                    # 尝试使用更简化的消息
-                    try:
-                        simple_msg = f"📨 新投稿通知 - 用户 {real_username} (ID: {user_id}) 发布了新投稿\n链接: {submission_link}\n\n封禁命令: /blacklist_add {user_id} 违规内容"
-                        await context.bot.send_message(
-                            chat_id=OWNER_ID,
-                            text=simple_msg
-                        )
-                        logger.info("使用简化消息成功发送通知")
-                    except Exception as e2:
-                        logger.error(f"发送简化通知也失败: {e2}")
-                        # 通知用户有问题
-                        await update.message.reply_text(
-                            "⚠️ 投稿已发布，但无法通知管理员。请直接联系管理员。"
-                        )
-            except Exception as e:
-                logger.error(f"处理通知过程中发生错误: 错误类型: {type(e)}, 详细信息: {str(e)}")
-                logger.error("异常追踪: ", exc_info=True)
-        else:
-            logger.info(f"不发送通知: NOTIFY_OWNER={NOTIFY_OWNER}, OWNER_ID={OWNER_ID}")
-        
-    except Exception as e:
-        logger.error(f"发布投稿失败: {e}")
-        await update.message.reply_text(f"❌ 发布失败，请联系管理员。错误信息：{str(e)}")
-    finally:
-        # 清理用户会话数据
-        try:
-            async with get_db() as conn:
-                c = await conn.cursor()
-                await c.execute("DELETE FROM submissions WHERE user_id=?", (user_id,))
-            logger.info(f"已删除用户 {user_id} 的投稿记录")
-        except Exception as e:
-            logger.error(f"删除数据错误: {e}")
-        
-        # 清理过期数据
-        await cleanup_old_data()
-    
-    return ConversationHandler.END
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+
+_worker_pool: Optional[PublishWorkerPool] = None
+
+
+async def start_publish_workers(application) -> PublishWorkerPool:
+    """启动发布队列（在 Application 启动后调用）"""
+    global _worker_pool
+    _worker_pool = PublishWorkerPool(application)
+    await _worker_pool.start()
+    return _worker_pool
+
 
+async def stop_publish_workers():
+    """停止发布队列"""
+    global _worker_pool
+    if _worker_pool is not None:
+        await _worker_pool.stop()
+        _worker_pool = None
+
+
+def wake_publish_workers():
+    """通知发布队列有新任务（发布队列未启动时任务留在队列中，启动后处理）"""
+    if _worker_pool is not None:
+        _worker_pool.wake()
+
+
+@tracing.traced('publish.media')
 async def handle_media_publish(context, media_list, caption, spoiler_flag):
     """
     处理媒体发布
     
     Args:
-        context: 回调上下文
+        context: 回调上下文或 Application（只使用其中的 bot）
         media_list: 媒体列表
         caption: 说明文本
         spoiler_flag: 是否剧透标志
@@ -552,8 +786,8 @@ async def handle_media_publish(context, media_list, caption, spoiler_flag):
                             await asyncio.sleep(5)
                 
                 # 添加更长的延迟，避免API限制
-                # 每组之间等待2秒，给Telegram API更多处理时间
-                await asyncio.sleep(2)
+                # 每组之间等待2秒，给Telegram API更多处理时间（启用全局限流器时由频道令牌桶调度）
+                await pace(context.bot, 2)
             
             # 计算实际处理的媒体数量并记录结果
             total_media_estimate = success_groups * 10
@@ -577,12 +811,13 @@ async def handle_media_publish(context, media_list, caption, spoiler_flag):
                 return (caption_message, [caption_message.message_id])
             return (None, [])
 
+@tracing.traced('publish.documents')
 async def handle_document_publish(context, doc_list, caption=None, reply_to_message_id=None):
     """
     处理文档发布
     
     Args:
-        context: 回调上下文
+        context: 回调上下文或 Application（只使用其中的 bot）
         doc_list: 文档列表
         caption: 说明文本，如果为None则不添加说明
         reply_to_message_id: 回复的消息ID，如果为None则创建新消息
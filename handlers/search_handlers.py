@@ -11,13 +11,15 @@ from whoosh.query import DateRange
 
 from config.settings import CHANNEL_ID, OWNER_ID
 from database.db_manager import get_db
+from database import user_stats, post_tags
 from utils.search_engine import get_search_engine
 from utils.cache import TTLCache
+from utils.post_deletion import delete_posts, STATUS_DELETED, STATUS_ALREADY_DELETED, STATUS_NOT_FOUND
 
 logger = logging.getLogger(__name__)
 
 # 简单缓存：标签云 60s
-_tag_cloud_cache = TTLCache(default_ttl=60, max_size=16)
+_tag_cloud_cache = TTLCache(default_ttl=60, max_size=16, name='tag_cloud')
 
 
 def is_owner(user_id: int) -> bool:
@@ -110,7 +112,7 @@ async def search_posts(update: Update, context: CallbackContext):
         tag_filter = None
         if is_tag_search:
             tag_filter = keyword.lstrip('#')
-            keyword = tag_filter  # 也搜索关键词
+            keyword = tag_filter
         
         # 构建时间过滤器
         time_filter = None
@@ -141,8 +143,9 @@ async def search_posts(update: Update, context: CallbackContext):
         search_engine = get_search_engine()
         
         # 执行搜索
+        # 标签搜索只按标签字段精确匹配（倒排表查找），不再同时做关键词匹配
         search_result = search_engine.search(
-            query_str=keyword,
+            query_str='' if is_tag_search else keyword,
             page_num=1,
             page_len=limit,
             time_filter=time_filter,
@@ -190,7 +193,16 @@ async def search_posts(update: Update, context: CallbackContext):
         search_desc = f"#{tag_filter}" if is_tag_search else f"\"{keyword}\""
         time_prefix = f"{time_desc} " if time_desc else ""
         message = f"🔍 搜索结果：{time_prefix}{search_desc}\n"
-        message += f"找到 {len(valid_hits)} 个结果（显示前 {len(valid_hits)} 个）\n\n"
+        message += f"找到 {len(valid_hits)} 个结果（显示前 {len(valid_hits)} 个）\n"
+        
+        # 结果集中出现最多的其他标签
+        related_tags = [
+            f"#{name}({count})" for name, count in search_result.tag_counts.items()
+            if not (is_tag_search and name == tag_filter.lower())
+        ][:5]
+        if related_tags:
+            message += f"🏷️ 相关标签：{' '.join(related_tags)}\n"
+        message += "\n"
         
         # 存储消息ID用于删除按钮
         message_ids = []
@@ -332,19 +344,11 @@ async def search_posts_by_tag(update: Update, context: CallbackContext, tag: str
     tag = tag.lstrip('#').lower()
     
     try:
-        # 使用搜索引擎
-        search_engine = get_search_engine()
-        
-        # 执行标签搜索
-        search_result = search_engine.search(
-            query_str=tag,  # 关键词也搜索标签内容
-            page_num=1,
-            page_len=10,
-            tag_filter=tag,  # 使用标签过滤
-            sort_by="publish_time"
-        )
+        # 通过 post_tags 关联表按标签索引查询，已删除的帖子在查询中直接过滤
+        async with get_db() as conn:
+            total, valid_hits = await post_tags.get_tag_posts(conn, tag, limit=10)
         
-        if not search_result.hits:
+        if not valid_hits:
             # 根据update类型选择回复方式
             if hasattr(update, 'callback_query') and update.callback_query:
                 await update.callback_query.message.reply_text(f"🔍 未找到标签 #{tag} 的帖子")
@@ -352,58 +356,28 @@ async def search_posts_by_tag(update: Update, context: CallbackContext, tag: str
                 await update.message.reply_text(f"🔍 未找到标签 #{tag} 的帖子")
             return
         
-        # 验证搜索结果是否仍然存在于频道中（过滤已删除的帖子）
-        # 通过检查数据库中的 is_deleted 字段来过滤已删除的帖子
-        valid_hits = []
-        
-        # 批量检查消息ID是否已删除
-        message_ids = [hit.message_id for hit in search_result.hits]
-        if message_ids:
-            async with get_db() as conn:
-                cursor = await conn.cursor()
-                # 使用 IN 查询批量检查
-                placeholders = ','.join('?' * len(message_ids))
-                await cursor.execute(
-                    f"SELECT message_id FROM published_posts WHERE message_id IN ({placeholders}) AND is_deleted = 0",
-                    message_ids
-                )
-                valid_message_ids = {row['message_id'] for row in await cursor.fetchall()}
-            
-            # 只保留未删除的帖子
-            for hit in search_result.hits:
-                if hit.message_id in valid_message_ids:
-                    valid_hits.append(hit)
-        
-        if not valid_hits:
-            # 根据update类型选择回复方式
-            if hasattr(update, 'callback_query') and update.callback_query:
-                await update.callback_query.message.reply_text(f"🔍 未找到标签 #{tag} 的帖子（或所有结果已被删除）")
-            else:
-                await update.message.reply_text(f"🔍 未找到标签 #{tag} 的帖子（或所有结果已被删除）")
-            return
-        
         # 构建结果消息
         message = f"🏷️ 标签搜索结果：#{tag}\n"
-        message += f"找到 {len(valid_hits)} 个结果（显示前 {len(valid_hits)} 个）\n\n"
+        message += f"找到 {total} 个结果（显示前 {len(valid_hits)} 个）\n\n"
         
         for idx, hit in enumerate(valid_hits, 1):
             # 生成帖子链接
             if CHANNEL_ID.startswith('@'):
                 channel_username = CHANNEL_ID.lstrip('@')
-                post_link = f"https://t.me/{channel_username}/{hit.message_id}"
+                post_link = f"https://t.me/{channel_username}/{hit['message_id']}"
             else:
-                post_link = f"消息ID: {hit.message_id}"
+                post_link = f"消息ID: {hit['message_id']}"
             
-            title = hit.title or '无标题'
+            title = hit['title'] or '无标题'
             if len(title) > 40:
                 title = title[:37] + '...'
             
             # 发布时间
-            publish_date = hit.publish_time.strftime('%Y-%m-%d')
+            publish_date = datetime.fromtimestamp(hit['publish_time'] or 0).strftime('%Y-%m-%d')
             
             message += (
                 f"{idx}. {title}\n"
-                f"   📅 {publish_date} | 👀 {hit.views} | 🔥 {hit.heat_score:.0f}\n"
+                f"   📅 {publish_date} | 👀 {hit['views']} | 🔥 {hit['heat_score']:.0f}\n"
                 f"   🔗 {post_link}\n\n"
             )
             
@@ -448,50 +422,21 @@ async def get_tag_cloud(update: Update, context: CallbackContext):
         if context.args and context.args[0].isdigit():
             limit = min(int(context.args[0]), 100)
         
-        async with get_db() as conn:
-            cursor = await conn.cursor()
-            
-            # 获取所有未删除帖子的标签
-            await cursor.execute("SELECT tags FROM published_posts WHERE tags IS NOT NULL AND is_deleted = 0")
-            posts = await cursor.fetchall()
-        
-        if not posts:
-            await update.message.reply_text("📊 暂无标签数据")
-            return
-        
-        # 统计标签使用次数
-        tag_counts = {}
-        for post in posts:
-            try:
-                # 尝试作为 JSON 解析（兼容旧数据）
-                tags = json.loads(post['tags'])
-                for tag in tags:
-                    tag_counts[tag] = tag_counts.get(tag, 0) + 1
-            except (json.JSONDecodeError, TypeError, ValueError):
-                # 如果不是 JSON，按空格分割（当前格式：'#测试 #标签2'）
-                tags_text = post['tags']
-                if tags_text:
-                    tags = tags_text.split()
-                    for tag in tags:
-                        # 移除 # 前缀，统一处理
-                        tag_clean = tag.lstrip('#')
-                        if tag_clean:
-                            tag_counts[tag_clean] = tag_counts.get(tag_clean, 0) + 1
-        
-        if not tag_counts:
-            await update.message.reply_text("📊 暂无标签数据")
-            return
-        
-        # 按使用次数排序
-        sorted_tags = sorted(tag_counts.items(), key=lambda x: x[1], reverse=True)[:limit]
-        
         # 缓存命中（按 limit 区分）
         cache_key = f"tag_cloud:{limit}"
         cached = _tag_cloud_cache.get(cache_key)
         if cached:
             await update.message.reply_text(cached)
             return
-
+        
+        # 标签计数由 tags 表增量维护，按使用次数索引读取
+        async with get_db() as conn:
+            sorted_tags = await post_tags.get_tag_counts(conn, limit)
+        
+        if not sorted_tags:
+            await update.message.reply_text("📊 暂无标签数据")
+            return
+        
         # 构建标签云消息
         message = f"🏷️ 标签云 TOP {len(sorted_tags)}\n\n"
         
@@ -560,7 +505,8 @@ async def get_my_posts(update: Update, context: CallbackContext):
             
             # 获取用户的帖子（过滤已删除的帖子）
             await cursor.execute(
-                "SELECT * FROM published_posts WHERE user_id = ? AND is_deleted = 0 ORDER BY publish_time DESC LIMIT ?",
+                "SELECT message_id, title, tags, publish_time, views, forwards, heat_score FROM published_posts "
+                "WHERE user_id = ? AND is_deleted = 0 ORDER BY publish_time DESC LIMIT ?",
                 (user_id, limit)
             )
             user_posts = await cursor.fetchall()
@@ -682,28 +628,29 @@ async def search_by_user(update: Update, context: CallbackContext):
         async with get_db() as conn:
             cursor = await conn.cursor()
             
-            # 获取指定用户的所有帖子（过滤已删除的帖子）
+            # 统计数据来自用户投稿聚合表
+            stats = await user_stats.get_user_stats(conn, target_user_id)
+            
+            # 只获取最近10篇帖子（过滤已删除的帖子）
             await cursor.execute(
-                "SELECT * FROM published_posts WHERE user_id = ? AND is_deleted = 0 ORDER BY publish_time DESC",
+                "SELECT message_id, title, publish_time, views FROM published_posts "
+                "WHERE user_id = ? AND is_deleted = 0 ORDER BY publish_time DESC LIMIT 10",
                 (target_user_id,)
             )
             user_posts = await cursor.fetchall()
         
-        if not user_posts:
+        if not stats or not user_posts:
             await update.message.reply_text(f"🔍 用户 {target_user_id} 没有发布过帖子")
             return
         
-        # 统计数据
-        total_posts = len(user_posts)
-        total_views = sum(post['views'] for post in user_posts)
-        total_forwards = sum(post['forwards'] for post in user_posts)
+        total_posts = stats['post_count']
         
         message = (
             f"👤 用户 {target_user_id} 的投稿\n\n"
             f"📊 统计：\n"
             f"• 总投稿：{total_posts}\n"
-            f"• 总浏览：{total_views}\n"
-            f"• 总转发：{total_forwards}\n\n"
+            f"• 总浏览：{stats['total_views']}\n"
+            f"• 总转发：{stats['total_forwards']}\n\n"
             f"最近投稿：\n\n"
         )
         
@@ -727,8 +674,8 @@ async def search_by_user(update: Update, context: CallbackContext):
                 f"   🔗 {post_link}\n\n"
             )
         
-        if len(user_posts) > 10:
-            message += f"... 还有 {len(user_posts) - 10} 篇投稿"
+        if total_posts > 10:
+            message += f"... 还有 {total_posts - 10} 篇投稿"
         
         await update.message.reply_text(message, disable_web_page_preview=True)
         
@@ -737,6 +684,14 @@ async def search_by_user(update: Update, context: CallbackContext):
         await update.message.reply_text("❌ 搜索失败，请稍后重试")
 
 
+def _format_id_list(message_ids, limit: int = 20) -> str:
+    """格式化消息ID列表（超过 limit 个时省略）"""
+    text = ', '.join(str(mid) for mid in message_ids[:limit])
+    if len(message_ids) > limit:
+        text += f" 等 {len(message_ids)} 个"
+    return text
+
+
 async def delete_posts_batch(update: Update, context: CallbackContext):
     """
     批量删除帖子（仅 OWNER 可用）
@@ -831,123 +786,30 @@ async def delete_posts_batch(update: Update, context: CallbackContext):
             "请稍候..."
         )
         
-        # 执行批量删除
-        success_count = 0
-        failed_count = 0
-        not_found_count = 0
-        already_deleted_count = 0
-        deleted_from_index = 0
-        deleted_from_channel = 0
-        channel_delete_failed = 0
-        
-        from config.settings import CHANNEL_ID
-        
-        async with get_db() as conn:
-            cursor = await conn.cursor()
-            
-            for msg_id in message_ids:
-                try:
-                    # 查询帖子是否存在
-                    await cursor.execute(
-                        "SELECT rowid AS post_id, message_id, related_message_ids, is_deleted FROM published_posts WHERE message_id=?",
-                        (msg_id,)
-                    )
-                    post = await cursor.fetchone()
-                    
-                    if not post:
-                        not_found_count += 1
-                        continue
-                    
-                    # 检查是否已经标记为删除
-                    if post.get('is_deleted', 0) == 1:
-                        already_deleted_count += 1
-                        logger.debug(f"批量删除：帖子 {msg_id} 已经被标记为删除")
-                        continue
-                    
-                    # 先尝试删除频道消息（双向同步删除）
-                    try:
-                        # 尝试删除主消息
-                        try:
-                            await context.bot.delete_message(chat_id=CHANNEL_ID, message_id=int(msg_id))
-                            deleted_from_channel += 1
-                            logger.info(f"批量删除：已从频道删除消息 {msg_id}")
-                        except Exception as e:
-                            error_msg = str(e).lower()
-                            if "message to delete not found" in error_msg or "message can't be deleted" in error_msg:
-                                # 消息已不存在或被删除，视为成功
-                                deleted_from_channel += 1
-                                logger.debug(f"批量删除：频道消息 {msg_id} 已不存在")
-                            else:
-                                channel_delete_failed += 1
-                                logger.warning(f"批量删除：删除频道消息 {msg_id} 失败: {e}")
-                        
-                        # 尝试删除关联消息
-                        if post['related_message_ids']:
-                            try:
-                                related_ids = json.loads(post['related_message_ids'])
-                                for related_id in related_ids:
-                                    try:
-                                        await context.bot.delete_message(chat_id=CHANNEL_ID, message_id=int(related_id))
-                                        deleted_from_channel += 1
-                                        logger.debug(f"批量删除：已从频道删除关联消息 {related_id}")
-                                    except Exception as e:
-                                        error_msg = str(e).lower()
-                                        if "message to delete not found" in error_msg or "message can't be deleted" in error_msg:
-                                            deleted_from_channel += 1  # 视为成功
-                                        else:
-                                            logger.debug(f"批量删除：删除关联消息 {related_id} 失败: {e}")
-                            except (json.JSONDecodeError, TypeError):
-                                pass
-                    except Exception as e:
-                        logger.warning(f"批量删除：删除频道消息时出错: {e}")
-                        channel_delete_failed += 1
-                    
-                    # 从搜索索引删除
-                    try:
-                        from utils.search_engine import get_search_engine
-                        search_engine = get_search_engine()
-                        if search_engine:
-                            search_engine.delete_post(msg_id)
-                            deleted_from_index += 1
-                            
-                            # 删除关联消息
-                            if post['related_message_ids']:
-                                try:
-                                    related_ids = json.loads(post['related_message_ids'])
-                                    for related_id in related_ids:
-                                        search_engine.delete_post(related_id)
-                                except (json.JSONDecodeError, TypeError):
-                                    pass
-                    except Exception as e:
-                        logger.warning(f"从索引删除消息 {msg_id} 失败: {e}")
-                    
-                    # 标记为已删除而不是直接删除记录（保留历史数据）
-                    await cursor.execute("UPDATE published_posts SET is_deleted = 1 WHERE rowid=?", (post['post_id'],))
-                    success_count += 1
-                    logger.info(f"批量删除：已标记帖子为已删除 message_id={msg_id}")
-                    
-                except Exception as e:
-                    logger.error(f"删除消息 {msg_id} 时出错: {e}")
-                    failed_count += 1
-            
-            await conn.commit()
+        # 执行批量删除（频道消息按批删除，索引和数据库各提交一次）
+        results = await delete_posts(context.bot, sorted(message_ids))
+        deleted = {r.message_id: r for r in results if r.status == STATUS_DELETED}
+        already_deleted = {r.message_id for r in results if r.status == STATUS_ALREADY_DELETED}
+        not_found = [r.requested_id for r in results if r.status == STATUS_NOT_FOUND]
+        channel_failed = [mid for mid, r in deleted.items() if not r.channel_deleted]
         
         # 构建结果消息
         result_message = "✅ <b>批量删除完成</b>\n\n"
         result_message += f"📊 <b>统计：</b>\n"
-        result_message += f"• 成功删除：{success_count} 个\n"
-        if deleted_from_channel > 0:
-            result_message += f"• 从频道删除：{deleted_from_channel} 个消息\n"
-        if deleted_from_index > 0:
-            result_message += f"• 从索引删除：{deleted_from_index} 个\n"
-        if already_deleted_count > 0:
-            result_message += f"• 已删除：{already_deleted_count} 个（之前已标记为删除）\n"
-        if not_found_count > 0:
-            result_message += f"• 未找到：{not_found_count} 个\n"
-        if failed_count > 0:
-            result_message += f"• 失败：{failed_count} 个\n"
-        if channel_delete_failed > 0:
-            result_message += f"• 频道删除失败：{channel_delete_failed} 个（可能无权限或消息已不存在）\n"
+        result_message += f"• 成功删除：{len(deleted)} 个\n"
+        channel_messages = sum(1 + r.related_count for r in deleted.values())
+        if channel_messages > 0:
+            result_message += f"• 从频道删除：{channel_messages} 个消息\n"
+        if deleted and all(r.index_deleted for r in deleted.values()):
+            result_message += f"• 从索引删除：{len(deleted)} 个\n"
+        if already_deleted:
+            result_message += f"• 已删除：{len(already_deleted)} 个（之前已标记为删除）\n"
+        if not_found:
+            result_message += f"• 未找到：{len(not_found)} 个（{_format_id_list(not_found)}）\n"
+        if channel_failed:
+            result_message += (
+                f"• 频道删除失败：{len(channel_failed)} 个（{_format_id_list(channel_failed)}，可能无权限）\n"
+            )
         
         await update.message.reply_text(result_message, parse_mode=ParseMode.HTML)
         
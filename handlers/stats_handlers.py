@@ -3,18 +3,34 @@
 """
 import json
 import logging
-import asyncio
 from datetime import datetime, timedelta
 from telegram import Update
 from telegram.ext import CallbackContext
 from telegram.error import BadRequest, TelegramError
 
-from config.settings import CHANNEL_ID, OWNER_ID
+from config.settings import CHANNEL_ID, OWNER_ID, ADMIN_IDS
 from database.db_manager import get_db
+from database import stats_history, user_stats, job_checkpoints, post_messages
+from ui.keyboards import Keyboards
 from utils.heat_calculator import calculate_multi_message_heat, get_quality_metrics
+from utils.leaderboard import get_leaderboards, MAX_LIMIT
+from utils.rate_limiter import PRIORITY_BACKGROUND, with_api_priority, pace
 
 logger = logging.getLogger(__name__)
 
+# 刷新调度参数：新帖子每轮都刷新，老帖子浏览速度过低时降低刷新频率
+ALWAYS_REFRESH_AGE_SECONDS = 3 * 86400   # 发布不足 3 天的帖子每轮刷新
+COLD_VELOCITY_THRESHOLD = 1.0            # 每小时浏览增量低于该值视为冷帖
+COLD_REFRESH_INTERVAL_SECONDS = 12 * 3600  # 冷帖最短刷新间隔
+
+# 统计任务分批提交：每探测这么多个帖子提交一次结果和断点
+STATS_COMMIT_BATCH = 20
+STATS_JOB_NAME = 'update_post_stats'
+# 断点超过该时长未更新视为过期，重新开始一轮
+STATS_CHECKPOINT_MAX_AGE = 6 * 3600
+# _probe_post 的返回值：消息已被删除
+POST_DELETED = 'deleted'
+
 
 def calculate_heat_score(views, forwards, reactions, publish_time):
     """
@@ -125,347 +141,458 @@ async def get_post_statistics(context: CallbackContext, message_id: int):
         return None
 
 
+def plan_stats_refresh(posts, velocities, now=None):
+    """
+    根据浏览速度安排本轮需要刷新的帖子
+    
+    - 发布不足 3 天的帖子每轮都刷新
+    - 更老的帖子如果浏览速度低于阈值，且距上次刷新不足 12 小时，则本轮跳过
+    - 结果按浏览速度降序排列，上升快的帖子优先刷新
+    
+    Args:
+        posts: 候选帖子（需包含 message_id、publish_time、last_update）
+        velocities: message_id -> 每小时浏览增量
+        now: 当前时间戳，默认当前时间
+        
+    Returns:
+        list: 本轮需要刷新的帖子
+    """
+    now = now if now is not None else datetime.now().timestamp()
+    planned = []
+    for post in posts:
+        velocity = velocities.get(post['message_id'], 0.0)
+        age = now - (post['publish_time'] or 0)
+        since_update = now - (post['last_update'] or 0)
+        if (age >= ALWAYS_REFRESH_AGE_SECONDS
+                and velocity < COLD_VELOCITY_THRESHOLD
+                and since_update < COLD_REFRESH_INTERVAL_SECONDS):
+            continue
+        planned.append(post)
+    planned.sort(key=lambda p: velocities.get(p['message_id'], 0.0), reverse=True)
+    return planned
+
+
+async def _load_stats_plan(now):
+    """
+    读取本轮需要刷新的帖子
+
+    上一轮中途退出（断点未过期）时沿用其开始时间，跳过该轮已经刷新过的帖子
+
+    Returns:
+        tuple: (帖子列表, 关联消息 {主消息ID: [消息ID]}, 本轮开始时间, 已处理数量)
+    """
+    async with get_db() as conn:
+        checkpoint = await job_checkpoints.get_checkpoint(conn, STATS_JOB_NAME)
+        if checkpoint and now - checkpoint.updated_at > STATS_CHECKPOINT_MAX_AGE:
+            checkpoint = None
+
+        # 获取最近30天的帖子（避免过度请求API，过滤已删除的帖子）
+        cutoff_time = (datetime.now() - timedelta(days=30)).timestamp()
+        cursor = await conn.execute(
+            "SELECT message_id, publish_time, last_update FROM published_posts WHERE publish_time > ? AND is_deleted = 0",
+            (cutoff_time,)
+        )
+        candidates = await cursor.fetchall()
+
+        # 按浏览速度安排刷新顺序，跳过暂时无需刷新的冷帖
+        velocities = await stats_history.get_view_velocity(
+            conn, [post['message_id'] for post in candidates]
+        )
+        posts = plan_stats_refresh(candidates, velocities, now)
+        related = await post_messages.get_related_map(conn, [post['message_id'] for post in posts])
+
+    if len(posts) < len(candidates):
+        logger.info(f"本轮刷新 {len(posts)} 个帖子，跳过 {len(candidates) - len(posts)} 个冷帖")
+    if checkpoint is None:
+        return posts, related, now, 0
+
+    remaining = [post for post in posts if (post['last_update'] or 0) < checkpoint.started_at]
+    logger.info(
+        f"从上次中断处继续：上一轮已处理 {checkpoint.position} 个帖子，"
+        f"跳过其中已刷新的 {len(posts) - len(remaining)} 个"
+    )
+    return remaining, related, checkpoint.started_at, checkpoint.position
+
+
+async def _probe_post(context: CallbackContext, post, related_ids):
+    """
+    获取单个帖子（含关联消息）的统计数据并计算热度
+
+    Args:
+        context: 回调上下文
+        post: 帖子（message_id、publish_time）
+        related_ids: 帖子的关联消息ID列表
+
+    Returns:
+        tuple: (views, forwards, reactions, heat_score)；
+        POST_DELETED 表示消息已被删除；None 表示获取失败
+    """
+    message_id = post['message_id']
+    publish_time = post['publish_time']
+
+    # 获取主消息的统计信息
+    try:
+        main_stats = await get_post_statistics(context, message_id)
+    except BadRequest as e:
+        # 如果 get_post_statistics 抛出 BadRequest，说明消息可能已被删除
+        error_msg = str(e).lower()
+        if "message" in error_msg or "invalid" in error_msg:
+            logger.info(f"检测到帖子 {message_id} 已被删除，已标记为已删除")
+            return POST_DELETED
+        return None
+
+    if not main_stats:
+        # 如果获取统计失败，检查消息是否被删除
+        # 通过尝试转发消息来检查
+        try:
+            check_chat_id = OWNER_ID if OWNER_ID else context.bot.id
+            forwarded_msg = await context.bot.forward_message(
+                chat_id=check_chat_id,
+                from_chat_id=CHANNEL_ID,
+                message_id=message_id
+            )
+            # 如果转发成功，说明消息存在，只是获取统计失败
+            # 删除转发的消息以保持整洁
+            try:
+                await context.bot.delete_message(
+                    chat_id=check_chat_id,
+                    message_id=forwarded_msg.message_id
+                )
+            except Exception:
+                pass  # 删除失败不影响检查结果
+        except BadRequest as e:
+            # 如果是 BadRequest 且错误信息包含 "message" 或 "invalid"，可能是消息被删除
+            error_msg = str(e).lower()
+            if "message" in error_msg or "invalid" in error_msg:
+                logger.info(f"检测到帖子 {message_id} 已被删除，已标记为已删除")
+                return POST_DELETED
+        except Exception as e:
+            # 其他错误，只记录失败
+            logger.warning(f"检查帖子 {message_id} 状态时出错: {e}")
+        return None
+
+    related_stats_list = []
+
+    # 如果有关联消息（多组媒体），获取它们的统计
+    if related_ids:
+        logger.info(f"帖子 {message_id} 有 {len(related_ids)} 个关联消息，使用智能算法计算热度")
+
+        for related_id in related_ids:
+            try:
+                related_stats = await get_post_statistics(context, related_id)
+                if related_stats:
+                    related_stats_list.append(related_stats)
+            except BadRequest as e:
+                # 如果关联消息已被删除，跳过它
+                error_msg = str(e).lower()
+                if "message" in error_msg or "invalid" in error_msg:
+                    logger.debug(f"关联消息 {related_id} 已被删除，跳过")
+                # 其他 BadRequest 错误也跳过
+            await pace(context.bot, 1)  # 避免API限制
+
+    # 使用智能算法计算热度（避免重复计数）
+    heat_result = calculate_multi_message_heat(
+        main_stats=main_stats,
+        related_stats_list=related_stats_list,
+        publish_time=publish_time
+    )
+
+    # 获取质量指标
+    quality_metrics = get_quality_metrics(main_stats, related_stats_list)
+
+    logger.info(
+        f"帖子 {message_id} 热度计算完成 | "
+        f"有效浏览: {heat_result['effective_views']:.0f} | "
+        f"有效转发: {heat_result['effective_forwards']} | "
+        f"有效反应: {heat_result['effective_reactions']:.0f} | "
+        f"热度: {heat_result['heat_score']:.2f} | "
+        f"互动率: {quality_metrics['engagement_rate']:.2%} | "
+        f"完成率: {quality_metrics['completion_rate']:.2%}"
+    )
+    return (
+        int(heat_result['effective_views']),
+        int(heat_result['effective_forwards']),
+        int(heat_result['effective_reactions']),
+        heat_result['heat_score'],
+    )
+
+
+async def _flush_stats(updates, deleted_ids, samples, started_at, position):
+    """
+    在一个短事务中提交一批统计结果，并保存断点
+
+    Args:
+        updates: (views, forwards, reactions, heat_score, last_update, message_id) 列表
+        deleted_ids: 已被删除的帖子消息ID列表
+        samples: (message_id, views, forwards, reactions) 时间序列样本
+        started_at: 本轮开始时间
+        position: 本轮已处理的帖子数
+    """
+    async with get_db() as conn:
+        if updates:
+            await conn.executemany("""
+                UPDATE published_posts
+                SET views = ?, forwards = ?, reactions = ?,
+                    heat_score = ?, last_update = ?
+                WHERE message_id = ?
+            """, updates)
+        if deleted_ids:
+            await conn.executemany(
+                "UPDATE published_posts SET is_deleted = 1 WHERE message_id = ?",
+                [(message_id,) for message_id in deleted_ids]
+            )
+        await stats_history.record_samples(conn, samples)
+        await job_checkpoints.save_checkpoint(conn, STATS_JOB_NAME, started_at, position)
+
+
+@with_api_priority(PRIORITY_BACKGROUND)
 async def update_post_stats(context: CallbackContext):
     """
     定期更新频道帖子统计数据
-    
+
     这个函数会被定时任务调用，用于更新所有活跃帖子的统计信息
     支持多组媒体：累加所有相关消息的统计数据
-    
+
+    探测 Telegram API 时不持有数据库连接，每 STATS_COMMIT_BATCH 个帖子
+    用一个短事务批量写入结果和断点，中途退出后下次从断点继续
+
     Args:
         context: 回调上下文
     """
     try:
         logger.info("开始更新帖子统计数据...")
-        
+
+        posts, related, started_at, position = await _load_stats_plan(datetime.now().timestamp())
+
+        updated_count = 0
+        failed_count = 0
+        updates, deleted_ids, samples = [], [], []
+
+        for index, post in enumerate(posts, 1):
+            message_id = post['message_id']
+            result = await _probe_post(context, post, related.get(message_id, []))
+            if result is POST_DELETED:
+                deleted_ids.append(message_id)
+                failed_count += 1
+            elif result is None:
+                failed_count += 1
+            else:
+                views, forwards, reactions, heat_score = result
+                updates.append((views, forwards, reactions, heat_score, datetime.now().timestamp(), message_id))
+                samples.append((message_id, views, forwards, reactions))
+                updated_count += 1
+
+            if index % STATS_COMMIT_BATCH == 0 or index == len(posts):
+                await _flush_stats(updates, deleted_ids, samples, started_at, position + index)
+                updates, deleted_ids, samples = [], [], []
+
+            # 避免API限制（启用全局限流器时由限流器以后台优先级调度）
+            await pace(context.bot, 1)
+
+        # 降采样旧样本，本轮完成后删除断点
         async with get_db() as conn:
-            cursor = await conn.cursor()
-            
-            # 获取最近30天的帖子（避免过度请求API，过滤已删除的帖子）
-            cutoff_time = (datetime.now() - timedelta(days=30)).timestamp()
-            await cursor.execute(
-                "SELECT message_id, publish_time, related_message_ids FROM published_posts WHERE publish_time > ? AND is_deleted = 0",
-                (cutoff_time,)
-            )
-            posts = await cursor.fetchall()
-            
-            updated_count = 0
-            failed_count = 0
-            
-            for post in posts:
-                message_id = post['message_id']
-                publish_time = post['publish_time']
-                related_ids_json = post['related_message_ids']
-                
-                # 获取主消息的统计信息
-                try:
-                    main_stats = await get_post_statistics(context, message_id)
-                except BadRequest as e:
-                    # 如果 get_post_statistics 抛出 BadRequest，说明消息可能已被删除
-                    error_msg = str(e).lower()
-                    if "message" in error_msg or "invalid" in error_msg:
-                        # 标记为已删除
-                        await cursor.execute(
-                            "UPDATE published_posts SET is_deleted = 1 WHERE message_id = ?",
-                            (message_id,)
-                        )
-                        logger.info(f"检测到帖子 {message_id} 已被删除，已标记为已删除")
-                        failed_count += 1
-                    else:
-                        failed_count += 1
-                    # 避免API限制，每次请求后休眠
-                    await asyncio.sleep(1)
-                    continue
-                
-                if main_stats:
-                    related_stats_list = []
-                    
-                    # 如果有关联消息（多组媒体），获取它们的统计
-                    if related_ids_json:
-                        try:
-                            related_ids = json.loads(related_ids_json)
-                            logger.info(f"帖子 {message_id} 有 {len(related_ids)} 个关联消息，使用智能算法计算热度")
-                            
-                            for related_id in related_ids:
-                                try:
-                                    related_stats = await get_post_statistics(context, related_id)
-                                    if related_stats:
-                                        related_stats_list.append(related_stats)
-                                except BadRequest as e:
-                                    # 如果关联消息已被删除，跳过它
-                                    error_msg = str(e).lower()
-                                    if "message" in error_msg or "invalid" in error_msg:
-                                        logger.debug(f"关联消息 {related_id} 已被删除，跳过")
-                                    # 其他 BadRequest 错误也跳过
-                                await asyncio.sleep(1)  # 避免API限制
-                                
-                        except json.JSONDecodeError:
-                            logger.warning(f"解析关联消息ID失败: {related_ids_json}")
-                    
-                    # 使用智能算法计算热度（避免重复计数）
-                    heat_result = calculate_multi_message_heat(
-                        main_stats=main_stats,
-                        related_stats_list=related_stats_list,
-                        publish_time=publish_time
-                    )
-                    
-                    # 获取质量指标
-                    quality_metrics = get_quality_metrics(main_stats, related_stats_list)
-                    
-                    logger.info(
-                        f"帖子 {message_id} 热度计算完成 | "
-                        f"有效浏览: {heat_result['effective_views']:.0f} | "
-                        f"有效转发: {heat_result['effective_forwards']} | "
-                        f"有效反应: {heat_result['effective_reactions']:.0f} | "
-                        f"热度: {heat_result['heat_score']:.2f} | "
-                        f"互动率: {quality_metrics['engagement_rate']:.2%} | "
-                        f"完成率: {quality_metrics['completion_rate']:.2%}"
-                    )
-                    
-                    # 更新数据库
-                    await cursor.execute("""
-                        UPDATE published_posts 
-                        SET views = ?, forwards = ?, reactions = ?, 
-                            heat_score = ?, last_update = ?
-                        WHERE message_id = ?
-                    """, (
-                        int(heat_result['effective_views']),
-                        int(heat_result['effective_forwards']),
-                        int(heat_result['effective_reactions']),
-                        heat_result['heat_score'], 
-                        datetime.now().timestamp(), 
-                        message_id
-                    ))
-                    updated_count += 1
-                else:
-                    # 如果获取统计失败，检查消息是否被删除
-                    # 通过尝试转发消息来检查
-                    try:
-                        check_chat_id = OWNER_ID if OWNER_ID else context.bot.id
-                        forwarded_msg = await context.bot.forward_message(
-                            chat_id=check_chat_id,
-                            from_chat_id=CHANNEL_ID,
-                            message_id=message_id
-                        )
-                        # 如果转发成功，说明消息存在，只是获取统计失败
-                        # 删除转发的消息以保持整洁
-                        try:
-                            await context.bot.delete_message(
-                                chat_id=check_chat_id,
-                                message_id=forwarded_msg.message_id
-                            )
-                        except Exception:
-                            pass  # 删除失败不影响检查结果
-                        failed_count += 1
-                    except BadRequest as e:
-                        # 如果是 BadRequest 且错误信息包含 "message" 或 "invalid"，可能是消息被删除
-                        error_msg = str(e).lower()
-                        if "message" in error_msg or "invalid" in error_msg:
-                            # 标记为已删除
-                            await cursor.execute(
-                                "UPDATE published_posts SET is_deleted = 1 WHERE message_id = ?",
-                                (message_id,)
-                            )
-                            logger.info(f"检测到帖子 {message_id} 已被删除，已标记为已删除")
-                            failed_count += 1
-                        else:
-                            failed_count += 1
-                    except Exception as e:
-                        # 其他错误，只记录失败
-                        logger.warning(f"检查帖子 {message_id} 状态时出错: {e}")
-                        failed_count += 1
-                
-                # 避免API限制，每次请求后休眠
-                await asyncio.sleep(1)
-            
-            await conn.commit()
-            logger.info(f"统计数据更新完成：成功 {updated_count} 个，失败 {failed_count} 个")
-            
+            await stats_history.downsample_history(conn)
+            await job_checkpoints.clear_checkpoint(conn, STATS_JOB_NAME)
+        logger.info(f"统计数据更新完成：成功 {updated_count} 个，失败 {failed_count} 个")
+
+        # 热度已更新，重算热门排行榜
+        await get_leaderboards().rebuild()
+
     except Exception as e:
         logger.error(f"更新统计数据失败: {e}")
 
 
-async def get_hot_posts(update: Update, context: CallbackContext):
+# 时间范围参数对应的显示名称
+HOT_TIME_DESC = {
+    'day': "今日",
+    'week': "本周",
+    'month': "本月",
+    'rising': "上升最快",
+    'all': "全部",
+}
+
+
+def _parse_hot_args(args):
     """
-    获取热门帖子排行 - 只显示主贴，优化预览样式
+    解析 /hot 命令参数
     
-    命令格式：
-    /hot [数量] [时间范围]
+    Returns:
+        tuple: (limit, time_filter)
+    """
+    limit = 10  # 默认10个
+    time_filter = None  # 时间过滤：day, week, month, rising, all
     
-    示例：
-    /hot - 查看热门帖子（默认10个）
-    /hot 20 - 查看前20个热门帖子
-    /hot 10 week - 查看本周前10个热门帖子
+    if args:
+        # 第一个参数可能是数量
+        if args[0].isdigit():
+            limit = int(args[0])
+            
+            # 第二个参数可能是时间范围
+            if len(args) > 1:
+                time_filter = args[1].lower()
+        else:
+            # 第一个参数是时间范围
+            time_filter = args[0].lower()
+    
+    return limit, time_filter
+
+
+def _render_hot_message(hot_posts, time_desc):
+    """
+    渲染热门帖子排行消息（HTML）
     
     Args:
-        update: Telegram 更新对象
-        context: 回调上下文
+        hot_posts: 排行条目列表
+        time_desc: 时间范围显示名称
+        
+    Returns:
+        str: 消息文本
     """
-    user_id = update.effective_user.id
+    message = f"🔥 <b>{time_desc}热门帖子 TOP {len(hot_posts)}</b>\n\n"
     
-    try:
-        # 解析参数
-        args = context.args
-        limit = 10  # 默认10个
-        time_filter = None  # 时间过滤：day, week, month, all
+    for idx, post in enumerate(hot_posts, 1):
+        # 生成帖子链接
+        if CHANNEL_ID.startswith('@'):
+            channel_username = CHANNEL_ID.lstrip('@')
+            post_link = f"https://t.me/{channel_username}/{post['message_id']}"
+        else:
+            post_link = f"消息ID: {post['message_id']}"
         
-        if args:
-            # 第一个参数可能是数量
-            if args[0].isdigit():
-                limit = int(args[0])
-                limit = min(limit, 50)  # 最多50个
-                
-                # 第二个参数可能是时间范围
-                if len(args) > 1:
-                    time_filter = args[1].lower()
-            else:
-                # 第一个参数是时间范围
-                time_filter = args[0].lower()
+        # 解析标签
+        tags_display = ""
+        if post['tags']:
+            try:
+                # 尝试解析JSON格式的标签
+                tags = json.loads(post['tags'])
+                if isinstance(tags, list):
+                    tags_display = ' '.join([f"#{tag}" for tag in tags[:5]])  # 显示最多5个标签
+                else:
+                    tags_display = post['tags']  # 如果不是列表，直接显示
+            except (json.JSONDecodeError, TypeError, ValueError):
+                # 如果解析失败，假设是空格分隔的字符串
+                tags_list = post['tags'].split()[:5]
+                tags_display = ' '.join([f"#{tag.lstrip('#')}" for tag in tags_list])
         
-        # 构建查询 - 只查询主贴（有标题或至少有内容的帖子）
-        # published_posts 表中存储的都是主贴，不包含多组媒体的后续消息
-        # 过滤已删除的帖子
-        query = "SELECT * FROM published_posts WHERE is_deleted = 0"
-        query_params = []
+        # 处理标题
+        title = post['title'] or '无标题'
+        if len(title) > 40:
+            title = title[:37] + '...'
         
-        # 时间过滤
-        if time_filter == 'day':
-            cutoff = (datetime.now() - timedelta(days=1)).timestamp()
-            query += " AND publish_time > ?"
-            query_params.append(cutoff)
-            time_desc = "今日"
-        elif time_filter == 'week':
-            cutoff = (datetime.now() - timedelta(days=7)).timestamp()
-            query += " AND publish_time > ?"
-            query_params.append(cutoff)
-            time_desc = "本周"
-        elif time_filter == 'month':
-            cutoff = (datetime.now() - timedelta(days=30)).timestamp()
-            query += " AND publish_time > ?"
-            query_params.append(cutoff)
-            time_desc = "本月"
-        else:
-            time_desc = "全部"
+        # 处理简介（note）
+        note_preview = ""
+        if post['note']:
+            note = post['note'].strip()
+            if note:
+                # 去掉换行，限制长度
+                note = note.replace('\n', ' ').replace('\r', ' ')
+                if len(note) > 60:
+                    note = note[:57] + '...'
+                note_preview = f"\n   💬 {note}"
         
-        # 按热度排序
-        query += " ORDER BY heat_score DESC LIMIT ?"
-        query_params.append(limit)
+        # 格式化发布时间
+        publish_time = datetime.fromtimestamp(post['publish_time'])
+        time_ago = _format_time_ago(publish_time)
         
-        async with get_db() as conn:
-            cursor = await conn.cursor()
-            await cursor.execute(query, query_params)
-            hot_posts = await cursor.fetchall()
+        # 构建单个帖子的显示
+        message += f"<b>{idx}.</b> <a href='{post_link}'>{title}</a>\n"
         
-        if not hot_posts:
-            await update.message.reply_text(f"📊 暂无{time_desc}热门帖子数据")
-            return
+        if tags_display:
+            message += f"   🏷 {tags_display}\n"
         
-        # 再次验证帖子是否仍然存在（防止并发问题）
-        # 批量检查消息ID是否已删除
-        message_ids = [post['message_id'] for post in hot_posts]
-        valid_hot_posts = []
+        if note_preview:
+            message += note_preview + "\n"
         
-        if message_ids:
-            async with get_db() as conn:
-                cursor = await conn.cursor()
-                # 使用 IN 查询批量检查
-                placeholders = ','.join('?' * len(message_ids))
-                await cursor.execute(
-                    f"SELECT message_id FROM published_posts WHERE message_id IN ({placeholders}) AND is_deleted = 0",
-                    message_ids
-                )
-                valid_message_ids = {row['message_id'] for row in await cursor.fetchall()}
-            
-            # 只保留未删除的帖子
-            for post in hot_posts:
-                if post['message_id'] in valid_message_ids:
-                    valid_hot_posts.append(post)
+        # 统计数据
+        stats_parts = []
+        if post['views'] > 0:
+            stats_parts.append(f"👁 {_format_number(post['views'])}")
+        if post['forwards'] > 0:
+            stats_parts.append(f"📤 {post['forwards']}")
+        if post['reactions'] > 0:
+            stats_parts.append(f"❤️ {post['reactions']}")
         
-        if not valid_hot_posts:
-            await update.message.reply_text(f"📊 暂无{time_desc}热门帖子数据（或所有结果已被删除）")
-            return
+        if stats_parts:
+            message += f"   📊 {' | '.join(stats_parts)}\n"
         
-        # 构建消息 - 优化显示格式
-        message = f"🔥 <b>{time_desc}热门帖子 TOP {len(valid_hot_posts)}</b>\n\n"
+        # 浏览速度（仅"上升最快"榜）
+        if 'velocity' in post.keys():
+            message += f"   📈 +{_format_number(int(post['velocity']))} 浏览/小时\n"
         
-        for idx, post in enumerate(valid_hot_posts, 1):
-            # 生成帖子链接
-            if CHANNEL_ID.startswith('@'):
-                channel_username = CHANNEL_ID.lstrip('@')
-                post_link = f"https://t.me/{channel_username}/{post['message_id']}"
-            else:
-                post_link = f"消息ID: {post['message_id']}"
-            
-            # 解析标签
-            tags_display = ""
-            if post['tags']:
-                try:
-                    # 尝试解析JSON格式的标签
-                    tags = json.loads(post['tags'])
-                    if isinstance(tags, list):
-                        tags_display = ' '.join([f"#{tag}" for tag in tags[:5]])  # 显示最多5个标签
-                    else:
-                        tags_display = post['tags']  # 如果不是列表，直接显示
-                except (json.JSONDecodeError, TypeError, ValueError):
-                    # 如果解析失败，假设是空格分隔的字符串
-                    tags_list = post['tags'].split()[:5]
-                    tags_display = ' '.join([f"#{tag.lstrip('#')}" for tag in tags_list])
-            
-            # 处理标题
-            title = post['title'] or '无标题'
-            if len(title) > 40:
-                title = title[:37] + '...'
-            
-            # 处理简介（note）
-            note_preview = ""
-            if post['note']:
-                note = post['note'].strip()
-                if note:
-                    # 去掉换行，限制长度
-                    note = note.replace('\n', ' ').replace('\r', ' ')
-                    if len(note) > 60:
-                        note = note[:57] + '...'
-                    note_preview = f"\n   💬 {note}"
-            
-            # 格式化发布时间
-            publish_time = datetime.fromtimestamp(post['publish_time'])
-            time_ago = _format_time_ago(publish_time)
-            
-            # 构建单个帖子的显示
-            message += f"<b>{idx}.</b> <a href='{post_link}'>{title}</a>\n"
-            
-            if tags_display:
-                message += f"   🏷 {tags_display}\n"
-            
-            if note_preview:
-                message += note_preview + "\n"
-            
-            # 统计数据
-            stats_parts = []
-            if post['views'] > 0:
-                stats_parts.append(f"👁 {_format_number(post['views'])}")
-            if post['forwards'] > 0:
-                stats_parts.append(f"📤 {post['forwards']}")
-            if post['reactions'] > 0:
-                stats_parts.append(f"❤️ {post['reactions']}")
-            
-            if stats_parts:
-                message += f"   📊 {' | '.join(stats_parts)}\n"
+        # 热度和时间
+        message += f"   🔥 热度: <code>{post['heat_score']:.1f}</code> • 🕐 {time_ago}\n"
+        message += "\n"
+        
+        # 防止消息过长
+        if len(message) > 3500:
+            message += "...\n\n💡 更多帖子请使用 /search 搜索"
+            break
+    
+    message += f"━━━━━━━━━━━━━━━\n"
+    message += f"💡 使用 <code>/hot &lt;数量&gt; &lt;时间&gt;</code> 自定义查询\n"
+    message += f"⏰ 时间范围：day(今日)、week(本周)、month(本月)、rising(上升最快)"
+    return message
+
+
+async def get_hot_posts(update: Update, context: CallbackContext, edit_message: bool = False):
+    """
+    获取热门帖子排行 - 只显示主贴，优化预览样式
+    
+    排行和渲染后的消息均来自内存中的预计算排行榜（utils.leaderboard），
+    只有排行过期时才会查询数据库。
+    
+    命令格式：
+    /hot [数量] [时间范围]
+    
+    示例：
+    /hot - 查看热门帖子（默认10个）
+    /hot 20 - 查看前20个热门帖子
+    /hot 10 week - 查看本周前10个热门帖子
+    /hot rising - 查看最近24小时浏览增长最快的帖子
+    
+    Args:
+        update: Telegram 更新对象
+        context: 回调上下文
+        edit_message: 是否编辑按钮所在的消息（筛选按钮回调），
+            此时筛选条件从 user_data 中读取
+    """
+    if edit_message:
+        limit = context.user_data.get('hot_limit', 10)
+        time_filter = context.user_data.get('hot_time_filter')
+    else:
+        limit, time_filter = _parse_hot_args(context.args)
+    
+    limit = max(1, min(limit, MAX_LIMIT))  # 最多50个
+    window = time_filter if time_filter in HOT_TIME_DESC else 'all'
+    time_desc = HOT_TIME_DESC[window]
+    
+    async def respond(text, **kwargs):
+        if edit_message:
+            try:
+                await update.callback_query.edit_message_text(
+                    text, reply_markup=Keyboards.hot_posts_filter(), **kwargs
+                )
+            except BadRequest as e:
+                # 内容未变化时 Telegram 会拒绝编辑，忽略即可
+                if "not modified" not in str(e).lower():
+                    raise
+        else:
+            await update.message.reply_text(text, **kwargs)
+    
+    try:
+        leaderboards = get_leaderboards()
+        message = leaderboards.get_page(window, limit)
+        
+        if message is None:
+            hot_posts = await leaderboards.top(window, limit)
             
-            # 热度和时间
-            message += f"   🔥 热度: <code>{post['heat_score']:.1f}</code> • 🕐 {time_ago}\n"
-            message += "\n"
+            if not hot_posts:
+                await respond(f"📊 暂无{time_desc}热门帖子数据")
+                return
             
-            # 防止消息过长
-            if len(message) > 3500:
-                message += "...\n\n💡 更多帖子请使用 /search 搜索"
-                break
-        
-        message += f"━━━━━━━━━━━━━━━\n"
-        message += f"💡 使用 <code>/hot &lt;数量&gt; &lt;时间&gt;</code> 自定义查询\n"
-        message += f"⏰ 时间范围：day(今日)、week(本周)、month(本月)"
+            message = _render_hot_message(hot_posts, time_desc)
+            leaderboards.set_page(window, limit, message)
         
-        await update.message.reply_text(
+        await respond(
             message, 
             disable_web_page_preview=True,
             parse_mode='HTML'
@@ -473,7 +600,7 @@ async def get_hot_posts(update: Update, context: CallbackContext):
         
     except Exception as e:
         logger.error(f"获取热门帖子失败: {e}")
-        await update.message.reply_text("❌ 获取热门帖子失败，请稍后重试")
+        await respond("❌ 获取热门帖子失败，请稍后重试")
 
 
 def _format_time_ago(publish_time: datetime) -> str:
@@ -529,6 +656,8 @@ async def get_user_stats(update: Update, context: CallbackContext):
     命令格式：
     /mystats - 查看自己的投稿统计
     
+    统计数据来自 user_post_stats 聚合表，只读取一行。
+    
     Args:
         update: Telegram 更新对象
         context: 回调上下文
@@ -537,44 +666,28 @@ async def get_user_stats(update: Update, context: CallbackContext):
     
     try:
         async with get_db() as conn:
-            cursor = await conn.cursor()
-            
-            # 获取用户的所有投稿（过滤已删除的帖子）
-            await cursor.execute(
-                "SELECT * FROM published_posts WHERE user_id = ? AND is_deleted = 0 ORDER BY publish_time DESC",
-                (user_id,)
-            )
-            user_posts = await cursor.fetchall()
+            stats = await user_stats.get_user_stats(conn, user_id)
         
-        if not user_posts:
+        if not stats:
             await update.message.reply_text("📊 您还没有发布过投稿")
             return
         
-        # 统计数据
-        total_posts = len(user_posts)
-        total_views = sum(post['views'] for post in user_posts)
-        total_forwards = sum(post['forwards'] for post in user_posts)
-        total_reactions = sum(post['reactions'] for post in user_posts)
-        
-        # 最热的帖子
-        hottest_post = max(user_posts, key=lambda x: x['heat_score'])
-        
         # 生成链接
         if CHANNEL_ID.startswith('@'):
             channel_username = CHANNEL_ID.lstrip('@')
-            hottest_link = f"https://t.me/{channel_username}/{hottest_post['message_id']}"
+            hottest_link = f"https://t.me/{channel_username}/{stats['hottest_message_id']}"
         else:
-            hottest_link = f"消息ID: {hottest_post['message_id']}"
+            hottest_link = f"消息ID: {stats['hottest_message_id']}"
         
         message = (
             f"📊 您的投稿统计\n\n"
-            f"📝 总投稿数：{total_posts}\n"
-            f"👀 总浏览数：{total_views}\n"
-            f"📤 总转发数：{total_forwards}\n"
-            f"❤️ 总反应数：{total_reactions}\n\n"
+            f"📝 总投稿数：{stats['post_count']}\n"
+            f"👀 总浏览数：{stats['total_views']}\n"
+            f"📤 总转发数：{stats['total_forwards']}\n"
+            f"❤️ 总反应数：{stats['total_reactions']}\n\n"
             f"🔥 最热帖子：\n"
-            f"   标题：{hottest_post['title'] or '无标题'}\n"
-            f"   热度：{hottest_post['heat_score']:.1f}\n"
+            f"   标题：{stats['hottest_title'] or '无标题'}\n"
+            f"   热度：{stats['hottest_heat'] or 0:.1f}\n"
             f"   链接：{hottest_link}\n\n"
             f"💡 使用 /hot 查看全站热门帖子"
         )
@@ -585,3 +698,25 @@ async def get_user_stats(update: Update, context: CallbackContext):
         logger.error(f"获取用户统计失败: {e}")
         await update.message.reply_text("❌ 获取统计失败，请稍后重试")
 
+
+async def rebuild_user_stats_command(update: Update, context: CallbackContext):
+    """
+    /rebuild_user_stats - 从帖子明细全量重算用户投稿聚合表
+    仅管理员可用
+    """
+    user_id = update.effective_user.id
+    
+    if user_id not in ADMIN_IDS:
+        await update.message.reply_text("❌ 此命令仅限管理员使用")
+        return
+    
+    try:
+        async with get_db() as conn:
+            count = await user_stats.rebuild(conn)
+        
+        await update.message.reply_text(f"✅ 用户投稿统计已重算，共 {count} 个用户")
+        logger.info(f"管理员 {user_id} 重算了用户投稿统计（{count} 个用户）")
+        
+    except Exception as e:
+        logger.error(f"重算用户投稿统计失败: {e}", exc_info=True)
+        await update.message.reply_text(f"❌ 重算失败: {str(e)}")
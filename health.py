@@ -0,0 +1,58 @@
+"""
+健康检查服务器（Polling 模式）
+
+Polling 模式没有 Webhook 服务器，由这里在后台线程中提供：
+- /health：健康检查（Docker、Fly.io 等平台使用）
+- /metrics：Prometheus 文本格式的指标（METRICS_ENABLED 为 true 时）
+"""
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from config.settings import METRICS_ENABLED
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class HealthRequestHandler(BaseHTTPRequestHandler):
+    """处理 /health 和 /metrics 请求"""
+
+    def _send(self, status: int, body: bytes, content_type: str = 'text/plain; charset=utf-8'):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == '/health':
+            self._send(200, b'OK')
+        elif self.path == '/metrics' and METRICS_ENABLED:
+            if not metrics.is_authorized(self.headers.get('Authorization')):
+                self._send(401, b'Unauthorized')
+                return
+            self._send(200, metrics.render().encode(), metrics.CONTENT_TYPE)
+        else:
+            self._send(404, b'Not Found')
+
+    def log_message(self, format, *args):
+        # 健康检查和指标抓取很频繁，不记录访问日志
+        pass
+
+
+def start_health_server(port: int = 8080) -> ThreadingHTTPServer:
+    """
+    在后台线程中启动健康检查服务器
+
+    Args:
+        port: 监听端口
+
+    Returns:
+        ThreadingHTTPServer: 服务器实例（进程退出时随守护线程结束）
+    """
+    server = ThreadingHTTPServer(('0.0.0.0', port), HealthRequestHandler)
+    thread = threading.Thread(target=server.serve_forever, name='health-server', daemon=True)
+    thread.start()
+    logger.info(f"健康检查端点: http://0.0.0.0:{port}/health" + ("，指标: /metrics" if METRICS_ENABLED else ""))
+    return server
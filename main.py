@@ -27,13 +27,19 @@ from dotenv import load_dotenv
 # 配置相关导入
 from config.settings import (
     TOKEN, TIMEOUT, BOT_MODE, MODE_MEDIA, MODE_DOCUMENT, MODE_MIXED,
-    RUN_MODE, WEBHOOK_URL, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_SECRET_TOKEN,
-    CHANNEL_ID
+    RUN_MODE, WEBHOOK_URL, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_SECRET_TOKEN, WEBHOOK_MAX_QUEUE,
+    CHANNEL_ID, ARCHIVE_INTERVAL, DB_MAINTENANCE_INTERVAL,
+    RATE_LIMIT_ENABLED, RATE_LIMIT_GLOBAL_PER_SECOND, RATE_LIMIT_CHAT_PER_SECOND,
+    RATE_LIMIT_GROUP_PER_MINUTE, RATE_LIMIT_MAX_RETRIES, CONCURRENT_UPDATES, MAX_PENDING_UPDATES,
+    LOOP_MONITOR_ENABLED, LOOP_LAG_THRESHOLD, MEMORY_CHECK_INTERVAL, MEMORY_TRACEMALLOC,
+    SESSION_PERSISTENCE
 )
 from models.state import STATE
 
 # 数据库相关导入
 from database.db_manager import init_db, cleanup_old_data, get_db
+from database.migrations import run_backfills
+from database.maintenance import run_maintenance
 from utils.database import (
     get_user_state, 
     delete_user_state, 
@@ -44,6 +50,9 @@ from utils.database import (
 # 工具函数导入
 from utils.logging_config import setup_logging, cleanup_old_logs
 from utils.helper_functions import CONFIG
+from utils.rate_limiter import ApiRateLimiter
+from utils.update_processor import OrderedUpdateProcessor
+from utils.metrics import InstrumentedApplication, timed_job, register_runtime_gauges
 
 # 处理程序导入 - 按功能分组
 # 基础命令
@@ -55,10 +64,13 @@ from handlers import (
 
 # 黑名单管理
 from utils.blacklist import manage_blacklist, init_blacklist, blacklist_filter
-from handlers.command_handlers import blacklist_add, blacklist_remove, blacklist_list, catch_all, debug, handle_menu_shortcuts
+from handlers.command_handlers import blacklist_add, blacklist_remove, blacklist_list, catch_all, debug, profile, sqlstats, memory, handle_menu_shortcuts
 
 # 投稿处理
-from handlers.publish import publish_submission
+from handlers.publish import publish_submission, start_publish_workers, stop_publish_workers
+from utils.loop_monitor import start_loop_monitor, stop_loop_monitor
+from utils import memory_governor, session_store
+from utils.persistence import SqlitePersistence
 
 # 不同投稿模式支持
 from handlers.mode_selection import submit, start, select_mode
@@ -79,7 +91,8 @@ from handlers.submit_handlers import (
 from handlers.error_handler import error_handler
 
 # 统计和搜索功能
-from handlers.stats_handlers import get_hot_posts, get_user_stats, update_post_stats
+from handlers.stats_handlers import get_hot_posts, get_user_stats, update_post_stats, rebuild_user_stats_command
+from handlers.archive_handlers import archive_posts_job, archived_command
 from handlers.search_handlers import (
     search_posts, 
     get_tag_cloud, 
@@ -257,8 +270,8 @@ async def main():
         except Exception as e:
             logger.warning(f"启动健康检查服务器失败: {e}")
     
-    # 初始化数据库
-    await init_db()
+    # 初始化数据库（执行 schema 迁移；耗时的数据回填在启动后于后台执行）
+    has_backfills = await init_db()
     # 初始化用户会话数据库
     initialize_database()
     # 初始化黑名单
@@ -325,8 +338,29 @@ async def main():
         logger.error("未设置TELEGRAM_BOT_TOKEN环境变量")
         sys.exit(1)
         
-    # 创建Application实例
-    application = Application.builder().token(token).build()
+    # 创建Application实例（所有 API 请求经过统一的优先级限流器；不同用户的更新并发处理，同一用户按顺序处理）
+    builder = Application.builder().token(token).application_class(InstrumentedApplication)
+    if CONCURRENT_UPDATES > 1:
+        builder = builder.concurrent_updates(OrderedUpdateProcessor(CONCURRENT_UPDATES, MAX_PENDING_UPDATES))
+    if RATE_LIMIT_ENABLED:
+        builder = builder.rate_limiter(ApiRateLimiter(
+            global_rate=RATE_LIMIT_GLOBAL_PER_SECOND,
+            chat_rate=RATE_LIMIT_CHAT_PER_SECOND,
+            group_per_minute=RATE_LIMIT_GROUP_PER_MINUTE,
+            max_retries=RATE_LIMIT_MAX_RETRIES,
+        ))
+    if SESSION_PERSISTENCE:
+        # 投稿会话状态和 user_data / chat_data / bot_data 保存到数据库，重启后继续
+        builder = builder.persistence(SqlitePersistence())
+    application = builder.build()
+    register_runtime_gauges(application)
+    
+    # user_data / chat_data 只在内存中保留最近活跃的条目，其余溢出到数据库（同时登记到内存调控）
+    session_store.install(application)
+    
+    # 按配置开启 tracemalloc（/memory 按子系统统计 Python 分配）
+    if MEMORY_TRACEMALLOC:
+        memory_governor.start_tracemalloc()
     
     # 设置应用程序
     setup_application(application)
@@ -334,11 +368,23 @@ async def main():
     # 初始化应用程序
     logger.info(f"机器人正在启动，运行模式: {RUN_MODE}")
     await application.initialize()
+    await session_store.load_spilled()
     await application.start()
     
     # 设置命令菜单
     await setup_bot_commands(application)
     
+    # 启动发布队列（上次中断的发布任务会重新排队）
+    await start_publish_workers(application)
+    
+    # 事件循环延迟监控（记录阻塞事件循环的代码位置）
+    if LOOP_MONITOR_ENABLED:
+        start_loop_monitor(LOOP_LAG_THRESHOLD)
+    
+    # 后台执行迁移登记的数据回填（分批提交，中断后下次启动继续）
+    if has_backfills:
+        application.create_task(run_backfills())
+    
     # 根据运行模式选择启动方式
     webhook_server = None
     
@@ -365,7 +411,8 @@ async def main():
             application=application,
             port=WEBHOOK_PORT,
             path=WEBHOOK_PATH,
-            secret_token=secret_token
+            secret_token=secret_token,
+            max_queue=WEBHOOK_MAX_QUEUE
         )
         await webhook_server.start()
         
@@ -447,6 +494,13 @@ async def shutdown(application, signal, loop, webhook_server=None):
         except Exception as e:
             logger.warning(f"删除 Webhook 失败: {e}")
     
+    # 停止发布队列（未完成的任务下次启动时继续）
+    await stop_publish_workers()
+    await stop_loop_monitor()
+    
+    # 写入已溢出、尚未写入数据库的会话数据
+    await session_store.flush_all()
+    
     # 关闭机器人更新器
     await application.updater.stop()
     await application.stop()
@@ -467,6 +521,9 @@ def setup_application(application):
     try:
         logger.info("注册高优先级命令处理器...")
         application.add_handler(CommandHandler('debug', debug), group=-998)
+        application.add_handler(CommandHandler('profile', profile), group=-998)
+        application.add_handler(CommandHandler('sqlstats', sqlstats), group=-998)
+        application.add_handler(CommandHandler('memory', memory), group=-998)
         application.add_handler(CommandHandler('blacklist_add', blacklist_add), group=-998)
         application.add_handler(CommandHandler('blacklist_remove', blacklist_remove), group=-998)
         application.add_handler(CommandHandler('blacklist_list', blacklist_list), group=-998)
@@ -499,6 +556,8 @@ def setup_application(application):
     application.add_handler(CommandHandler("sync_index", sync_index_command))
     application.add_handler(CommandHandler("index_stats", index_stats_command))
     application.add_handler(CommandHandler("optimize_index", optimize_index_command))
+    application.add_handler(CommandHandler("rebuild_user_stats", rebuild_user_stats_command))
+    application.add_handler(CommandHandler("archived", archived_command))
     
     # 注册会话超时检查处理器
     application.add_handler(MessageHandler(filters.ALL, check_conversation_timeout), group=0)
@@ -589,7 +648,7 @@ def setup_application(application):
             },
             fallbacks=[CommandHandler("cancel", cancel)],
             name="submission_conversation",
-            persistent=False,
+            persistent=SESSION_PERSISTENCE,
         )
         
         application.add_handler(conv_handler, group=2)
@@ -605,11 +664,11 @@ def setup_application(application):
     try:
         logger.info("设置定期任务...")
         job_queue = application.job_queue
-        job_queue.run_repeating(
-            lambda context: asyncio.create_task(cleanup_old_data()), 
-            interval=300, 
-            first=10
-        )
+        async def cleanup_old_data_job(context):
+            """定期清理过期数据"""
+            await cleanup_old_data()
+
+        job_queue.run_repeating(timed_job(cleanup_old_data_job), interval=300, first=10)
         
         # 添加周期性清理日志任务
         def clean_logs_job(context):
@@ -618,18 +677,42 @@ def setup_application(application):
             cleanup_old_logs("logs")
             
         # 每天凌晨3点执行一次日志清理
-        job_queue.run_daily(clean_logs_job, time=datetime_time(hour=3, minute=0))
+        job_queue.run_daily(timed_job(clean_logs_job), time=datetime_time(hour=3, minute=0))
         
         # 添加帖子统计数据更新任务（默认每2小时执行一次，降低峰值）
-        job_queue.run_repeating(update_post_stats, interval=7200, first=60)
+        job_queue.run_repeating(timed_job(update_post_stats), interval=7200, first=60)
         
         # 添加定期检查已删除消息的任务（每30分钟检查一次）
         job_queue.run_repeating(
-            check_deleted_messages_periodic,
+            timed_job(check_deleted_messages_periodic),
             interval=1800,  # 30分钟
             first=300  # 启动后5分钟开始第一次检查
         )
-        logger.info("定期任务设置完成（包括统计数据更新和删除消息检查）")
+
+        # 添加帖子归档任务（已删除和超过保留期限的帖子移到归档库）
+        job_queue.run_repeating(timed_job(archive_posts_job), interval=ARCHIVE_INTERVAL, first=600)
+
+        # 添加数据库维护任务（统计信息、WAL 检查点、空闲时增量 vacuum）
+        async def db_maintenance_job(context):
+            """定期维护数据库"""
+            await run_maintenance()
+
+        job_queue.run_repeating(timed_job(db_maintenance_job), interval=DB_MAINTENANCE_INTERVAL, first=120)
+
+        # 添加内存调控任务（RSS 接近上限时释放缓存）
+        def memory_governor_job(context):
+            """检查内存占用"""
+            memory_governor.get_memory_governor().check()
+
+        job_queue.run_repeating(timed_job(memory_governor_job), interval=MEMORY_CHECK_INTERVAL, first=30)
+
+        # 添加会话数据溢出任务（空闲和超出上限的 user_data / chat_data 写入数据库）
+        async def session_store_job(context):
+            """溢出空闲的会话数据"""
+            await session_store.evict_and_flush()
+
+        job_queue.run_repeating(timed_job(session_store_job), interval=session_store.EVICT_INTERVAL, first=60)
+        logger.info("定期任务设置完成（包括统计数据更新、删除消息检查、帖子归档和数据库维护）")
     except Exception as e:
         logger.error(f"设置定期任务失败: {e}", exc_info=True)
     
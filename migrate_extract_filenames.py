@@ -27,7 +27,7 @@ async def extract_filenames_from_messages():
             
             # 获取所有需要更新的帖子
             await cursor.execute("""
-                SELECT message_id, user_id, username, title, tags, link, note, 
+                SELECT message_id, user_id, username, title, tags,
                        publish_time, views, heat_score
                 FROM published_posts 
                 WHERE content_type IN ('document', 'mixed') 
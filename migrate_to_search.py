@@ -2,6 +2,9 @@
 """
 数据迁移脚本：将现有数据库中的帖子迁移到搜索引擎索引
 
+机器人启动时会自动升级数据库并同步索引；本脚本用于在不启动机器人的情况下
+手动执行同样的操作。
+
 使用方法：
     python migrate_to_search.py         # 迁移所有现有帖子
     python migrate_to_search.py --clear # 清空现有索引后重新迁移
@@ -9,10 +12,11 @@
 import asyncio
 import argparse
 import logging
-from datetime import datetime
 
-from database.db_manager import get_db
-from utils.search_engine import init_search_engine, PostDocument, get_search_engine
+from database.db_manager import init_db
+from database.migrations import run_backfills
+from utils.search_engine import init_search_engine
+from utils.index_manager import IndexManager
 from utils.logging_config import setup_logging
 
 # 设置日志
@@ -29,76 +33,28 @@ async def migrate_posts(clear_index: bool = False):
     """
     logger.info("开始迁移数据...")
     
-    # 初始化搜索引擎
+    # 先将数据库升级到最新 schema（旧数据库可能缺少 filename 等字段）
+    if await init_db():
+        await run_backfills(pause=0)
+    
     # 从配置文件读取索引目录
     from config.settings import SEARCH_INDEX_DIR
-    init_search_engine(index_dir=SEARCH_INDEX_DIR, from_scratch=clear_index)
-    search_engine = get_search_engine()
-    
-    if clear_index:
-        logger.info("已清空现有索引")
-    
-    # 获取所有已发布的帖子
-    async with get_db() as conn:
-        cursor = await conn.cursor()
-        await cursor.execute("SELECT * FROM published_posts ORDER BY publish_time DESC")
-        posts = await cursor.fetchall()
+    init_search_engine(index_dir=SEARCH_INDEX_DIR, from_scratch=False)
+    manager = IndexManager()
     
-    if not posts:
-        logger.info("数据库中没有帖子需要迁移")
-        return
-    
-    logger.info(f"找到 {len(posts)} 篇帖子需要迁移")
-    
-    # 批量迁移
-    migrated_count = 0
-    error_count = 0
-    
-    with search_engine.ix.writer() as writer:
-        for post in posts:
-            try:
-                # 创建搜索文档
-                # 安全获取 filename 字段（可能不存在于旧数据）
-                try:
-                    filename = post['filename'] or ''
-                except (KeyError, IndexError):
-                    filename = ''
-                
-                post_doc = PostDocument(
-                    message_id=post['message_id'],
-                    title=post['title'] or '',
-                    description=post['note'] or '',  # 使用 note 作为描述
-                    tags=post['tags'] or '',
-                    filename=filename,  # 文件名字段
-                    link=post['link'] or '',
-                    user_id=post['user_id'],
-                    username=post['username'] or f"user{post['user_id']}",
-                    publish_time=datetime.fromtimestamp(post['publish_time']),
-                    views=post['views'] or 0,
-                    heat_score=post['heat_score'] or 0
-                )
-                
-                # 添加到索引（使用批量写入）
-                search_engine.add_post(post_doc, writer=writer)
-                migrated_count += 1
-                
-                if migrated_count % 100 == 0:
-                    logger.info(f"已迁移 {migrated_count}/{len(posts)} 篇帖子...")
-                    
-            except Exception as e:
-                error_count += 1
-                logger.error(f"迁移帖子 {post['message_id']} 失败: {e}")
+    result = await manager.rebuild_index(clear_first=clear_index)
     
     # 显示统计信息
     logger.info("\n" + "="*60)
-    logger.info("迁移完成！")
-    logger.info(f"总帖子数: {len(posts)}")
-    logger.info(f"成功迁移: {migrated_count}")
-    logger.info(f"失败数量: {error_count}")
+    logger.info("迁移完成！" if result["success"] else "迁移未完全成功")
+    logger.info(f"成功迁移: {result['added']}")
+    logger.info(f"失败数量: {result['failed']}")
+    for error in result["errors"][:10]:
+        logger.error(f"  - {error}")
     logger.info("="*60)
     
     # 显示索引统计
-    stats = search_engine.get_stats()
+    stats = manager.search_engine.get_stats()
     logger.info(f"\n索引统计:")
     logger.info(f"  - 总文档数: {stats['total_docs']}")
     logger.info(f"  - 索引字段: {', '.join(stats['indexed_fields'])}")
@@ -130,4 +86,3 @@ def main():
 
 if __name__ == '__main__':
     main()
-
@@ -1,12 +1,16 @@
 #!/usr/bin/env python3
 """
 数据库性能优化脚本
-添加索引以提升查询性能
+执行 schema 迁移（建立查询所需的索引、删除旧索引）并整理数据库
 """
+import asyncio
+import os
 import sqlite3
 import logging
 from datetime import datetime
 
+from config.settings import DB_PATH
+
 logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
 logger = logging.getLogger(__name__)
 
@@ -33,50 +37,40 @@ def optimize_main_db():
     """优化主数据库（submissions.db）"""
     print('📊 优化 submissions.db...')
     
+    if not os.path.exists(DB_PATH):
+        logger.warning(f'  ⚠️ {DB_PATH} 不存在')
+        return
+    
     try:
-        conn = sqlite3.connect('data/submissions.db')
-        c = conn.cursor()
-        
-        # 检查现有索引
-        c.execute("SELECT name FROM sqlite_master WHERE type='index'")
-        existing_indexes = {row[0] for row in c.fetchall()}
+        # 索引由 schema 迁移统一维护（database/migrations.py 的 POST_INDEXES），
+        # 迁移同时删除已被取代的旧单列索引
+        from database.db_manager import init_db
+        asyncio.run(init_db())
+        print('  ✅ 数据库 schema 和索引已更新到最新版本')
         
-        # 需要创建的索引
-        indexes = [
-            ('idx_published_posts_user_id', 'published_posts', 'user_id'),
-            ('idx_published_posts_publish_time', 'published_posts', 'publish_time'),
-            ('idx_published_posts_heat_score', 'published_posts', 'heat_score'),
-            ('idx_published_posts_message_id', 'published_posts', 'message_id'),
-            ('idx_published_posts_username', 'published_posts', 'username'),
-        ]
-        
-        created = 0
-        for idx_name, table, column in indexes:
-            if idx_name not in existing_indexes:
-                try:
-                    c.execute(f'CREATE INDEX IF NOT EXISTS {idx_name} ON {table}({column})')
-                    logger.info(f'  ✓ 创建索引: {idx_name}')
-                    created += 1
-                except sqlite3.Error as e:
-                    logger.warning(f'  ⚠️ 索引创建失败 {idx_name}: {e}')
-            else:
-                logger.info(f'  → 索引已存在: {idx_name}')
+        conn = sqlite3.connect(DB_PATH)
+        c = conn.cursor()
         
         # 分析表以更新统计信息
         c.execute('ANALYZE published_posts')
         
-        # 清理和优化
+        # 清理和优化（同时转换为增量 vacuum 模式，之后由机器人的维护任务在线回收空闲页）
+        conn.commit()
+        c.execute('PRAGMA auto_vacuum=INCREMENTAL')
         c.execute('VACUUM')
+        # 2 = INCREMENTAL
+        incremental = c.execute('PRAGMA auto_vacuum').fetchone()[0] == 2
         
         conn.commit()
         conn.close()
         
-        print(f'  ✅ 创建了 {created} 个新索引')
-        print(f'  ✅ 已运行 ANALYZE 和 VACUUM')
+        print('  ✅ 已运行 ANALYZE 和 VACUUM')
+        if incremental:
+            print('  ✅ 已启用增量 vacuum，空闲页由机器人的维护任务在线回收')
+        else:
+            logger.warning('  ⚠️ 未能启用增量 vacuum（数据库可能正被其他进程使用，请停止机器人后重试）')
         
-    except FileNotFoundError:
-        logger.warning('  ⚠️ data/submissions.db 不存在')
-    except sqlite3.Error as e:
+    except Exception as e:
         logger.error(f'  ❌ 优化失败: {e}')
 
 def optimize_session_db():
@@ -142,7 +136,7 @@ def show_db_stats():
     print()
     
     try:
-        conn = sqlite3.connect('data/submissions.db')
+        conn = sqlite3.connect(DB_PATH)
         c = conn.cursor()
         
         # 统计投稿数量
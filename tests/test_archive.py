@@ -0,0 +1,96 @@
+"""
+帖子归档测试
+"""
+import os
+import pytest
+from unittest.mock import patch
+
+from database import archive, post_content
+
+
+@pytest.fixture
+def archive_paths(temp_dir):
+    """已初始化的临时主库与归档库路径"""
+    db_path = os.path.join(temp_dir, 'posts.db')
+    archive_path = os.path.join(temp_dir, 'posts_archive.db')
+    with patch('database.db_manager.DB_PATH', db_path):
+        yield db_path, archive_path
+
+
+async def _setup(posts):
+    """初始化主库并写入 (message_id, user_id, publish_time, is_deleted) 帖子"""
+    from database.db_manager import init_db, get_db
+    await init_db()
+    async with get_db() as conn:
+        for message_id, user_id, publish_time, is_deleted in posts:
+            await conn.execute(
+                "INSERT INTO published_posts (message_id, user_id, title, tags, publish_time, views, is_deleted) "
+                "VALUES (?, ?, ?, '#a', ?, 10, ?)",
+                (message_id, user_id, f"post {message_id}", publish_time, is_deleted)
+            )
+            await post_content.save_content(conn, message_id, note=f"note {message_id}")
+
+
+async def _count(conn, sql, params=()):
+    cursor = await conn.execute(sql, params)
+    return (await cursor.fetchone())[0]
+
+
+class TestArchive:
+    """归档任务测试"""
+
+    @pytest.mark.database
+    @pytest.mark.unit
+    async def test_deleted_posts_move_with_content(self, archive_paths):
+        _, archive_path = archive_paths
+        await _setup([(1, 100, 1000, 1), (2, 100, 2000, 0), (3, 200, 3000, 1)])
+
+        async with archive.get_archive_db(archive_path) as conn:
+            deleted, aged = await archive.archive_batch(conn, limit=10)
+            assert (deleted, aged) == ([1, 3], [])
+
+            assert await _count(conn, "SELECT COUNT(*) FROM main.published_posts") == 1
+            assert await _count(conn, "SELECT COUNT(*) FROM main.post_content") == 1
+            post = await archive.get_archived_post(conn, 3)
+            assert post['title'] == 'post 3'
+            assert post['note'] == 'note 3'
+            assert post['is_deleted'] == 1
+            assert post['archived_at'] > 0
+            assert await archive.get_archive_stats(conn) == {'live': 1, 'pending': 0, 'archived': 2}
+
+            # 没有待归档的帖子时什么都不做
+            assert await archive.archive_batch(conn, limit=10) == ([], [])
+
+    @pytest.mark.database
+    @pytest.mark.unit
+    async def test_retention_archives_aged_posts(self, archive_paths):
+        _, archive_path = archive_paths
+        await _setup([(1, 100, 1000, 0), (2, 100, 2000, 0), (3, 100, 9000, 0), (4, 200, 500, 1)])
+
+        async with archive.get_archive_db(archive_path) as conn:
+            # 先归档已删除的帖子，同一批中剩余名额按发布时间取过期帖子
+            assert await archive.archive_batch(conn, limit=2, cutoff=5000) == ([4], [1])
+            assert await archive.archive_batch(conn, limit=2, cutoff=5000) == ([], [2])
+
+            posts = await archive.get_archived_user_posts(conn, 100)
+            assert [post['message_id'] for post in posts] == [2, 1]
+            # 物理删除触发聚合表更新：只剩未过期的帖子
+            cursor = await conn.execute("SELECT post_count FROM user_post_stats WHERE user_id = 100")
+            assert (await cursor.fetchone())[0] == 1
+            assert await _count(conn, "SELECT COUNT(*) FROM post_tags WHERE message_id IN (1, 2)") == 0
+
+    @pytest.mark.database
+    @pytest.mark.unit
+    async def test_interrupted_batch_is_recopied(self, archive_paths):
+        """复制后中断（主库未删除）时，下次重新复制同一批帖子不会出错或重复"""
+        _, archive_path = archive_paths
+        await _setup([(1, 100, 1000, 1)])
+
+        async with archive.get_archive_db(archive_path) as conn:
+            await conn.execute(
+                "INSERT INTO archive.published_posts (message_id, user_id, title, archived_at) VALUES (1, 100, 'old', 1)"
+            )
+            await conn.commit()
+            assert await archive.archive_batch(conn, limit=10) == ([1], [])
+            assert await _count(conn, "SELECT COUNT(*) FROM archive.published_posts") == 1
+            assert (await archive.get_archived_post(conn, 1))['title'] == 'post 1'
@@ -0,0 +1,133 @@
+"""
+热门排行榜测试
+"""
+import os
+import pytest
+from datetime import datetime
+from unittest.mock import patch
+
+from utils.leaderboard import HotLeaderboards
+
+
+@pytest.fixture
+def leaderboard_db(temp_dir):
+    """创建临时数据库并让 get_db 指向它"""
+    db_path = os.path.join(temp_dir, 'leaderboard.db')
+    with patch('database.db_manager.DB_PATH', db_path):
+        yield db_path
+
+
+async def _seed(posts):
+    from database.db_manager import init_db, get_db
+    await init_db()
+    async with get_db() as conn:
+        await conn.executemany(
+            "INSERT INTO published_posts (message_id, user_id, title, publish_time, heat_score, is_deleted) "
+            "VALUES (?, 1, ?, ?, ?, ?)",
+            [(mid, f"post {mid}", publish_time, heat, deleted) for mid, publish_time, heat, deleted in posts]
+        )
+
+
+class TestHotLeaderboards:
+    """排行榜预计算与维护测试"""
+
+    @pytest.mark.database
+    @pytest.mark.unit
+    async def test_rebuild_per_window(self, leaderboard_db):
+        """各时间窗口按热度排序，并排除已删除帖子"""
+        now = datetime.now().timestamp()
+        await _seed([
+            (1, now - 3600, 10.0, 0),
+            (2, now - 3 * 86400, 50.0, 0),
+            (3, now - 60 * 86400, 90.0, 0),
+            (4, now - 600, 99.0, 1),
+        ])
+        boards = HotLeaderboards()
+
+        await boards.rebuild(now=now)
+
+        assert [p['message_id'] for p in boards.get('day', 10, now=now)] == [1]
+        assert [p['message_id'] for p in boards.get('week', 10, now=now)] == [2, 1]
+        assert [p['message_id'] for p in boards.get('all', 10, now=now)] == [3, 2, 1]
+        assert [p['message_id'] for p in boards.get('all', 2, now=now)] == [3, 2]
+        assert boards.get('rising', 10, now=now) == []
+
+    @pytest.mark.database
+    @pytest.mark.unit
+    async def test_remove_post_patches_boards_and_pages(self, leaderboard_db):
+        """删帖时就地剔除排行条目并清空已渲染页面"""
+        now = datetime.now().timestamp()
+        await _seed([(1, now - 3600, 10.0, 0), (2, now - 3600, 20.0, 0)])
+        boards = HotLeaderboards()
+        await boards.rebuild(now=now)
+        boards.set_page('all', 10, "cached")
+
+        assert boards.remove_post(2) is True
+
+        assert [p['message_id'] for p in boards.get('all', 10, now=now)] == [1]
+        assert boards.get_page('all', 10) is None
+        assert boards.remove_post(2) is False
+
+    @pytest.mark.database
+    @pytest.mark.unit
+    async def test_truncated_board_requires_rebuild(self, leaderboard_db):
+        """截断的排行在条目滑出窗口后不足 limit 时要求重算"""
+        now = datetime.now().timestamp()
+        await _seed([(mid, now - 3600 * mid, float(100 - mid), 0) for mid in range(1, 6)])
+        boards = HotLeaderboards(board_size=3)
+        await boards.rebuild(now=now)
+
+        # 2 小时后前三名仍在今日窗口；一天后前三名全部滑出窗口
+        assert len(boards.get('day', 3, now=now + 7200)) == 3
+        assert boards.get('day', 3, now=now + 86400) is None
+
+    @pytest.mark.database
+    @pytest.mark.unit
+    async def test_invalidate_triggers_lazy_rebuild(self, leaderboard_db):
+        """新帖子入库后排行过期，下一次读取时重算"""
+        now = datetime.now().timestamp()
+        await _seed([(1, now - 3600, 10.0, 0)])
+        boards = HotLeaderboards()
+        assert [p['message_id'] for p in await boards.top('all', 10)] == [1]
+
+        from database.db_manager import get_db
+        async with get_db() as conn:
+            await conn.execute(
+                "INSERT INTO published_posts (message_id, user_id, title, publish_time, heat_score) VALUES (2, 1, 'new', ?, 0)",
+                (now,)
+            )
+        boards.invalidate()
+
+        assert boards.get('all', 10) is None
+        assert [p['message_id'] for p in await boards.top('all', 10)] == [1, 2]
+
+    @pytest.mark.database
+    @pytest.mark.unit
+    async def test_changes_during_rebuild_are_kept(self, leaderboard_db):
+        """重算查询期间的删帖和新帖子不会被重算结果覆盖"""
+        from database import stats_history
+        from database.db_manager import get_db
+
+        now = datetime.now().timestamp()
+        await _seed([(1, now - 3600, 10.0, 0), (2, now - 3600, 20.0, 0)])
+        boards = HotLeaderboards()
+        get_rising_posts = stats_history.get_rising_posts
+
+        async def concurrent_changes(*args, **kwargs):
+            # 排行查询已完成：帖子 2 被删除，帖子 3 入库
+            async with get_db() as conn:
+                await conn.execute("UPDATE published_posts SET is_deleted = 1 WHERE message_id = 2")
+                await conn.execute(
+                    "INSERT INTO published_posts (message_id, user_id, title, publish_time, heat_score) "
+                    "VALUES (3, 1, 'new', ?, 0)", (now,)
+                )
+            boards.remove_post(2)
+            boards.invalidate()
+            return await get_rising_posts(*args, **kwargs)
+
+        with patch.object(stats_history, 'get_rising_posts', concurrent_changes):
+            assert [p['message_id'] for p in await boards.top('all', 10)] == [1]
+        assert boards.is_stale
+
+        assert [p['message_id'] for p in await boards.top('all', 10)] == [1, 3]
+        assert not boards.is_stale
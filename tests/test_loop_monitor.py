@@ -0,0 +1,72 @@
+"""
+事件循环延迟监控测试
+"""
+import asyncio
+import logging
+import time
+import pytest
+
+from utils.loop_monitor import LoopMonitor, LOOP_STALLS, UNKNOWN_SITE
+
+
+def blocking_call(seconds):
+    time.sleep(seconds)
+
+
+async def _settle(monitor, stalls):
+    for _ in range(100):
+        if monitor.get_stats()['stalls'] >= stalls:
+            return
+        await asyncio.sleep(0.01)
+
+
+class TestLoopMonitor:
+    """阻塞检测和阻塞位置定位测试"""
+
+    @pytest.mark.unit
+    async def test_blocking_call_site_is_named(self, caplog):
+        monitor = LoopMonitor(threshold=0.05, interval=0.01)
+        monitor.start()
+        try:
+            await asyncio.sleep(0.05)
+            with caplog.at_level(logging.WARNING, logger='utils.loop_monitor'):
+                blocking_call(0.3)
+                await _settle(monitor, 1)
+                blocking_call(0.3)
+                await _settle(monitor, 2)
+        finally:
+            await monitor.stop()
+
+        stats = monitor.get_stats()
+        top = stats['top_sites'][0]
+        assert top['site'].startswith('tests/test_loop_monitor.py:')
+        assert top['site'].endswith(' blocking_call')
+        assert top['count'] == 2
+        assert top['max'] >= 0.25
+        assert stats['lag_max'] >= 0.25
+        assert LOOP_STALLS.labels(top['site']).value >= 2
+        # 同一位置只在第一次输出完整调用栈
+        messages = [r.getMessage() for r in caplog.records if top['site'] in r.getMessage()]
+        assert len(messages) == 2
+        assert 'time.sleep(seconds)' in messages[0]
+        assert '\n' not in messages[1]
+
+    @pytest.mark.unit
+    async def test_no_stalls_when_loop_is_idle(self):
+        monitor = LoopMonitor(threshold=0.2, interval=0.01)
+        monitor.start()
+        try:
+            await asyncio.sleep(0.1)
+        finally:
+            await monitor.stop()
+
+        stats = monitor.get_stats()
+        assert stats['stalls'] == 0
+        assert stats['top_sites'] == []
+        assert stats['lag_avg'] < 0.2
+
+    @pytest.mark.unit
+    def test_stall_without_captured_stack_is_unknown(self):
+        monitor = LoopMonitor(threshold=0.05)
+        monitor._record_stall(0.08, None)
+        assert monitor.get_stats()['top_sites'][0]['site'] == UNKNOWN_SITE
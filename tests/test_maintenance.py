@@ -0,0 +1,87 @@
+"""
+数据库在线维护测试
+"""
+import os
+import pytest
+import aiosqlite
+from unittest.mock import patch
+
+from database import maintenance
+
+
+@pytest.fixture
+async def maint_db(temp_dir):
+    """已初始化并写入一批帖子的临时数据库"""
+    db_path = os.path.join(temp_dir, 'maint.db')
+    with patch('database.db_manager.DB_PATH', db_path):
+        from database.db_manager import init_db, get_db
+        await init_db()
+        async with get_db() as conn:
+            await conn.executemany(
+                "INSERT INTO published_posts (message_id, user_id, title, publish_time) VALUES (?, ?, ?, ?)",
+                [(i, i % 7, 'x' * 500, i) for i in range(1, 2001)]
+            )
+        yield db_path
+
+
+async def _pragma(db_path, pragma):
+    async with aiosqlite.connect(db_path) as conn:
+        cursor = await conn.execute(f"PRAGMA {pragma}")
+        return (await cursor.fetchone())[0]
+
+
+class TestMaintenance:
+    """维护任务测试"""
+
+    @pytest.mark.database
+    @pytest.mark.unit
+    async def test_run_maintenance_reports_and_analyzes(self, maint_db):
+        report = await maintenance.run_maintenance(maint_db)
+
+        assert report is maintenance.get_last_report()
+        assert report['analyze_ms'] >= 0
+        async with aiosqlite.connect(maint_db) as conn:
+            cursor = await conn.execute("SELECT COUNT(*) FROM sqlite_stat1 WHERE tbl = 'published_posts'")
+            assert (await cursor.fetchone())[0] > 0
+        # 小数据库自动转换为增量 vacuum 模式
+        assert await _pragma(maint_db, "auto_vacuum") == maintenance.AUTO_VACUUM_INCREMENTAL
+
+    @pytest.mark.database
+    @pytest.mark.unit
+    async def test_checkpoint_truncates_large_wal(self, maint_db):
+        async with aiosqlite.connect(maint_db) as conn:
+            # 最后一个连接关闭时 SQLite 会自动检查点，因此在连接打开期间写入
+            await conn.execute("UPDATE published_posts SET views = views + 1")
+            await conn.commit()
+            assert maintenance.wal_size(maint_db) > 0
+            assert await maintenance.checkpoint(conn, maint_db, threshold_bytes=1 << 40) is None
+            result = await maintenance.checkpoint(conn, maint_db, threshold_bytes=1)
+
+        assert result['mode'] == 'TRUNCATE'
+        assert result['wal_bytes'] > 0
+        assert result['ms'] >= 0
+        assert maintenance.wal_size(maint_db) == 0
+
+    @pytest.mark.database
+    @pytest.mark.unit
+    async def test_incremental_vacuum_only_when_idle(self, maint_db):
+        async with aiosqlite.connect(maint_db) as conn:
+            assert await maintenance.ensure_incremental_vacuum(conn, maint_db) is True
+            await conn.execute("DELETE FROM published_posts")
+            await conn.commit()
+            cursor = await conn.execute("PRAGMA freelist_count")
+            free_before = (await cursor.fetchone())[0]
+            assert free_before > 0
+
+            with patch.object(maintenance, 'VACUUM_STEP_PAUSE', 0), \
+                    patch('database.db_manager.seconds_since_activity', return_value=0):
+                assert await maintenance.incremental_vacuum(conn, step_pages=16, idle_seconds=60) == 0
+
+            with patch.object(maintenance, 'VACUUM_STEP_PAUSE', 0), \
+                    patch.object(maintenance, 'VACUUM_MAX_STEPS', 2), \
+                    patch('database.db_manager.seconds_since_activity', return_value=3600):
+                freed = await maintenance.incremental_vacuum(conn, step_pages=16, idle_seconds=60)
+
+            cursor = await conn.execute("PRAGMA freelist_count")
+            assert freed == 32
+            assert (await cursor.fetchone())[0] == free_before - 32
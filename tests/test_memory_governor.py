@@ -0,0 +1,95 @@
+"""
+内存调控测试
+"""
+import time
+import pytest
+
+from database import db_manager
+from utils import memory_governor
+from utils.cache import TTLCache
+from utils.memory_governor import LEVEL_HARD, LEVEL_OK, LEVEL_SOFT, MemoryGovernor
+
+MB = 1024 * 1024
+
+
+@pytest.fixture
+def restore_page_cache():
+    yield
+    db_manager.set_page_cache_kb()
+
+
+class TestMemoryGovernor:
+    """缓存淘汰、调控级别和子系统统计测试"""
+
+    @pytest.mark.unit
+    def test_cache_shrink_drops_expired_then_oldest(self):
+        cache = TTLCache(default_ttl=60, max_size=100)
+        for i in range(10):
+            cache.set(f"k{i}", i, ttl=10 + i)
+        cache._store['expired'] = (time.time() - 1, 'x')
+
+        assert cache.shrink(0.5) == 6
+        assert cache.memory_size() == 5
+        assert cache.get('k0') is None
+        assert cache.get('k9') == 9
+
+        assert cache.shrink(1.0) == 5
+        assert cache.memory_size() == 0
+
+    @pytest.mark.unit
+    def test_named_cache_registered_weakly(self):
+        governor = memory_governor.get_memory_governor()
+        cache = TTLCache(name='test_governor_cache')
+        cache.set('a', 1)
+        assert governor.consumers()['cache:test_governor_cache'] == 1
+        del cache
+        assert 'cache:test_governor_cache' not in governor.consumers()
+
+    @pytest.mark.unit
+    def test_levels_shrink_and_page_cache(self, restore_page_cache):
+        governor = MemoryGovernor(100 * MB, soft_percent=80, hard_percent=90)
+        cache = TTLCache(default_ttl=60, max_size=100)
+        for i in range(8):
+            cache.set(f"k{i}", i, ttl=10 + i)
+        governor.register('cache', cache)
+        governor.register_gauge('sessions', lambda: 3)
+        default_kb = db_manager.get_page_cache_kb()
+
+        assert governor.check(rss=50 * MB) == LEVEL_OK
+        assert cache.memory_size() == 8
+
+        assert governor.check(rss=85 * MB) == LEVEL_SOFT
+        assert cache.memory_size() == 4
+        assert db_manager.get_page_cache_kb() == min(default_kb, 1024)
+        assert governor.last_shrink['dropped'] == {'cache': 4}
+
+        assert governor.check(rss=95 * MB) == LEVEL_HARD
+        assert cache.memory_size() == 0
+        assert db_manager.get_page_cache_kb() == min(default_kb, 256)
+
+        # 回落到软限制以下但仍在恢复区间内，保持软限制
+        assert governor.check(rss=75 * MB) == LEVEL_SOFT
+        assert governor.check(rss=60 * MB) == LEVEL_OK
+        assert db_manager.get_page_cache_kb() == default_kb
+        assert governor.consumers() == {'cache': 0, 'sessions': 3}
+
+    @pytest.mark.unit
+    def test_without_limit_only_reports(self):
+        governor = MemoryGovernor(None)
+        assert governor.check(rss=10_000 * MB) == LEVEL_OK
+        assert governor.last_shrink is None
+
+    @pytest.mark.unit
+    async def test_subsystem_usage_with_tracemalloc(self):
+        was_tracing = memory_governor.tracemalloc.is_tracing()
+        memory_governor.stop_tracemalloc()
+        assert await memory_governor.subsystem_usage() is None
+        memory_governor.start_tracemalloc()
+        try:
+            data = [bytes(1024) for _ in range(100)]
+            usage = dict(await memory_governor.subsystem_usage())
+            assert usage.get('其他', 0) >= 100 * 1024
+            del data
+        finally:
+            if not was_tracing:
+                memory_governor.stop_tracemalloc()
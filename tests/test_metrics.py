@@ -0,0 +1,153 @@
+"""
+指标注册表和 /metrics 端点测试
+"""
+import asyncio
+import pytest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+from telegram import CallbackQuery, Chat, Message, Update, User
+from telegram.ext import CommandHandler, ConversationHandler
+
+from utils import metrics
+from utils.metrics import MetricsRegistry, Counter, Gauge, Histogram
+
+
+def _sample(text, line_prefix):
+    for line in text.splitlines():
+        if line.startswith(line_prefix + ' '):
+            return float(line.rsplit(' ', 1)[1])
+    return None
+
+
+class TestRegistry:
+    """指标类型和文本格式测试"""
+
+    @pytest.mark.unit
+    def test_render_counter_gauge_histogram(self):
+        registry = MetricsRegistry()
+        requests = registry.register(Counter('t_requests_total', '请求数', ('method',)))
+        queued = registry.register(Gauge('t_queued', '排队数'))
+        latency = registry.register(Histogram('t_seconds', '耗时', buckets=(0.1, 1)))
+
+        requests.labels('sendMessage').inc()
+        requests.labels(method='sendMessage').inc(2)
+        requests.labels('get"Me').inc()
+        queued.set_function(lambda: 7)
+        latency.observe(0.05)
+        latency.observe(0.5)
+        latency.observe(5)
+        text = registry.render()
+
+        assert '# TYPE t_requests_total counter' in text
+        assert _sample(text, 't_requests_total{method="sendMessage"}') == 3
+        assert _sample(text, 't_requests_total{method="get\\"Me"}') == 1
+        assert _sample(text, 't_queued') == 7
+        assert _sample(text, 't_seconds_bucket{le="0.1"}') == 1
+        assert _sample(text, 't_seconds_bucket{le="1"}') == 2
+        assert _sample(text, 't_seconds_bucket{le="+Inf"}') == 3
+        assert _sample(text, 't_seconds_count') == 3
+        assert _sample(text, 't_seconds_sum') == pytest.approx(5.55)
+
+    @pytest.mark.unit
+    def test_register_is_idempotent_and_checks_labels(self):
+        registry = MetricsRegistry()
+        first = registry.register(Counter('t_total', 'x', ('a',)))
+        assert registry.register(Counter('t_total', 'x', ('a',))) is first
+        with pytest.raises(ValueError):
+            registry.register(Counter('t_total', 'x', ('b',)))
+        with pytest.raises(AttributeError):
+            first.inc()
+
+    @pytest.mark.unit
+    async def test_timed_job_records_duration_and_errors(self):
+        async def failing_job(context):
+            raise RuntimeError('boom')
+
+        def sync_job(context):
+            return 'done'
+
+        assert await metrics.timed_job(sync_job)(None) == 'done'
+        with pytest.raises(RuntimeError):
+            await metrics.timed_job(failing_job)(None)
+
+        assert metrics.JOB_SECONDS.labels('sync_job').count >= 1
+        assert metrics.JOB_ERRORS.labels('failing_job').value >= 1
+
+    @pytest.mark.unit
+    def test_update_label_has_bounded_cardinality(self):
+        user = User(1, 'u', False)
+        chat = Chat(1, 'private')
+        command = Message(1, None, chat, from_user=user, text='/search@bot hello')
+        query = CallbackQuery('1', user, 'c', data='delete_post_12345')
+
+        with patch.object(metrics, '_commands', set()):
+            metrics.register_commands(ConversationHandler(
+                entry_points=[CommandHandler('search', AsyncMock())], states={}, fallbacks=[]
+            ))
+            assert metrics.update_label(Update(1, message=command)) == '/search'
+            # 用户随意输入的命令不产生新的标签值
+            for text in ('/a1b2c3', '/xyz_random_987', '/删除'):
+                unknown = Message(3, None, chat, from_user=user, text=text)
+                assert metrics.update_label(Update(4, message=unknown)) == 'command:other'
+        assert metrics.update_label(Update(2, callback_query=query)) == 'callback:delete_post'
+        assert metrics.update_label(Update(3, message=Message(2, None, chat, text='hi'))) == 'text'
+        assert metrics.update_label(object()) == 'other'
+
+
+class TestInstrumentation:
+    """各子系统的指标记录测试"""
+
+    @pytest.mark.unit
+    def test_named_cache_records_hits_and_misses(self):
+        from utils.cache import TTLCache, CACHE_REQUESTS
+
+        cache = TTLCache(name='test_cache')
+        cache.get('a')
+        cache.set('a', 1)
+        assert cache.get('a') == 1
+        assert CACHE_REQUESTS.labels('test_cache', 'hit').value == 1
+        assert CACHE_REQUESTS.labels('test_cache', 'miss').value == 1
+
+    @pytest.mark.unit
+    async def test_api_requests_counted_by_method(self):
+        from utils.rate_limiter import ApiRateLimiter, API_REQUESTS
+
+        limiter = ApiRateLimiter()
+        before = API_REQUESTS.labels('getChatMember', 'ok').value
+
+        async def call():
+            return True
+
+        async def fail():
+            raise ValueError('bad')
+
+        try:
+            await limiter.process_request(call, (), {}, 'getChatMember', {}, None)
+            with pytest.raises(ValueError):
+                await limiter.process_request(fail, (), {}, 'getChatMember', {}, None)
+        finally:
+            await limiter.shutdown()
+        assert API_REQUESTS.labels('getChatMember', 'ok').value == before + 1
+        assert API_REQUESTS.labels('getChatMember', 'error').value >= 1
+
+    @pytest.mark.unit
+    async def test_webhook_metrics_endpoint_requires_token(self):
+        from utils.webhook_server import WebhookServer
+
+        server = WebhookServer(SimpleNamespace(bot=None, update_queue=asyncio.Queue()), 0, '/webhook', 's')
+        app = web.Application()
+        app.router.add_get('/metrics', server.metrics_handler)
+        client = TestClient(TestServer(app))
+        await client.start_server()
+        try:
+            with patch.object(metrics, 'METRICS_TOKEN', 'scrape'):
+                assert (await client.get('/metrics')).status == 401
+                response = await client.get('/metrics', headers={'Authorization': 'Bearer scrape'})
+                assert response.status == 200
+                assert response.headers['Content-Type'].startswith('text/plain')
+                assert '# TYPE telesubmit_update_seconds histogram' in await response.text()
+        finally:
+            await client.close()
@@ -0,0 +1,231 @@
+"""
+数据库 schema 迁移测试
+"""
+import os
+import pytest
+import aiosqlite
+from unittest.mock import patch
+
+from database import migrations, post_content
+
+
+class _CountingConnection:
+    """记录执行语句数的连接代理"""
+
+    def __init__(self, conn):
+        self._conn = conn
+        self.statements = []
+
+    async def execute(self, sql, *args):
+        self.statements.append(sql)
+        return await self._conn.execute(sql, *args)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+async def _versions(db_path):
+    async with aiosqlite.connect(db_path) as conn:
+        cursor = await conn.execute("SELECT version FROM schema_version ORDER BY version")
+        return [row[0] for row in await cursor.fetchall()]
+
+
+async def _columns(db_path, table):
+    async with aiosqlite.connect(db_path) as conn:
+        cursor = await conn.execute(f"PRAGMA table_info({table})")
+        return {row[1] for row in await cursor.fetchall()}
+
+
+class TestMigrations:
+    """迁移执行测试"""
+
+    @pytest.mark.database
+    @pytest.mark.unit
+    async def test_fresh_database_reaches_latest_version(self, temp_dir):
+        db_path = os.path.join(temp_dir, 'fresh.db')
+        with patch('database.db_manager.DB_PATH', db_path):
+            from database.db_manager import init_db
+            # 空数据库不需要回填
+            assert await init_db() is False
+            assert await init_db() is False
+
+        assert await _versions(db_path) == [m.version for m in migrations.MIGRATIONS]
+        expected = {name for name, _ in migrations.PUBLISHED_POSTS_COLUMNS} - set(migrations.MOVED_POST_COLUMNS)
+        assert await _columns(db_path, 'published_posts') == expected
+
+    @pytest.mark.database
+    @pytest.mark.unit
+    async def test_up_to_date_boot_reads_version_once(self, temp_dir):
+        db_path = os.path.join(temp_dir, 'current.db')
+        with patch('database.db_manager.DB_PATH', db_path):
+            from database.db_manager import init_db
+            await init_db()
+
+        async with aiosqlite.connect(db_path) as conn:
+            counting = _CountingConnection(conn)
+            assert await migrations.migrate(counting) is False
+
+        assert len(counting.statements) == 1
+
+    @pytest.mark.database
+    @pytest.mark.unit
+    async def test_legacy_database_is_upgraded(self, temp_dir):
+        """迁移系统引入之前的旧表：补齐字段、建立索引并登记回填"""
+        db_path = os.path.join(temp_dir, 'legacy.db')
+        async with aiosqlite.connect(db_path) as conn:
+            await conn.execute(
+                "CREATE TABLE published_posts (message_id INTEGER PRIMARY KEY, user_id INTEGER, title TEXT, "
+                "tags TEXT, publish_time REAL, views INTEGER DEFAULT 0, heat_score REAL DEFAULT 0)"
+            )
+            await conn.execute("CREATE INDEX idx_heat_score ON published_posts(heat_score)")
+            # 旧版 optimize_database.py 创建的索引
+            await conn.execute("CREATE INDEX idx_published_posts_user_id ON published_posts(user_id)")
+            await conn.execute(
+                "INSERT INTO published_posts (message_id, user_id, title, tags, publish_time) VALUES (1, 100, 'a', '#x', 0)"
+            )
+            await conn.commit()
+
+        with patch('database.db_manager.DB_PATH', db_path):
+            from database.db_manager import init_db
+            assert await init_db() is True
+
+        columns = await _columns(db_path, 'published_posts')
+        assert {'filename', 'is_deleted'} <= columns
+        async with aiosqlite.connect(db_path) as conn:
+            cursor = await conn.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'published_posts'")
+            indexes = {row[0] for row in await cursor.fetchall()}
+            cursor = await conn.execute("SELECT name FROM schema_backfills ORDER BY name")
+            backfills = [row[0] for row in await cursor.fetchall()]
+        assert set(migrations.POST_INDEXES) | set(migrations.DELETED_POST_INDEXES) <= indexes
+        assert not {'idx_heat_score', 'idx_published_posts_user_id'} & indexes
+        assert backfills == ['post_tags', 'user_post_stats']
+
+    @pytest.mark.database
+    @pytest.mark.unit
+    async def test_failed_migration_rolls_back(self, temp_dir):
+        db_path = os.path.join(temp_dir, 'failing.db')
+
+        async def broken(conn):
+            await conn.execute("CREATE TABLE half_done (id INTEGER)")
+            raise RuntimeError("boom")
+
+        failing = migrations.MIGRATIONS + (migrations.Migration(99, "broken", broken),)
+        with patch('database.db_manager.DB_PATH', db_path), \
+                patch.object(migrations, 'MIGRATIONS', failing), \
+                patch.object(migrations, 'LATEST_VERSION', 99):
+            from database.db_manager import init_db
+            with pytest.raises(RuntimeError):
+                await init_db()
+
+        assert await _versions(db_path) == [m.version for m in migrations.MIGRATIONS]
+        async with aiosqlite.connect(db_path) as conn:
+            cursor = await conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'half_done'")
+            assert await cursor.fetchone() is None
+
+    @pytest.mark.database
+    @pytest.mark.unit
+    @pytest.mark.parametrize('sqlite_version', [(3, 40, 0), (3, 31, 1)])
+    async def test_content_columns_moved_to_side_table(self, temp_dir, sqlite_version):
+        """大字段移到 post_content；旧版 SQLite 走重建表的路径，索引和触发器保留"""
+        db_path = os.path.join(temp_dir, 'split.db')
+        with patch('database.db_manager.DB_PATH', db_path):
+            from database.db_manager import init_db
+            before_split = tuple(m for m in migrations.MIGRATIONS if m.version < 6)
+            with patch.object(migrations, 'MIGRATIONS', before_split), \
+                    patch.object(migrations, 'LATEST_VERSION', before_split[-1].version):
+                await init_db()
+            async with aiosqlite.connect(db_path) as conn:
+                await conn.execute(
+                    "INSERT INTO published_posts (message_id, user_id, title, tags, link, note, file_ids, caption) "
+                    "VALUES (1, 100, 't', '#a', 'https://x', 'n', '[]', 'c')"
+                )
+                await conn.commit()
+
+            with patch('database.migrations.sqlite3.sqlite_version_info', sqlite_version):
+                await init_db()
+
+        assert not set(post_content.CONTENT_COLUMNS) & await _columns(db_path, 'published_posts')
+        async with aiosqlite.connect(db_path) as conn:
+            cursor = await conn.execute("SELECT link, note, file_ids, caption FROM post_content WHERE message_id = 1")
+            assert tuple(await cursor.fetchone()) == ('https://x', 'n', '[]', 'c')
+            cursor = await conn.execute("SELECT name FROM sqlite_master WHERE tbl_name = 'published_posts'")
+            dependents = {row[0] for row in await cursor.fetchall()}
+            assert set(migrations.POST_INDEXES) | set(migrations.DELETED_POST_INDEXES) | {
+                'trg_user_stats_insert', 'trg_post_content_cascade'
+            } <= dependents
+
+            # 触发器仍然生效：删除帖子行时一并删除内容和聚合
+            await conn.execute("DELETE FROM published_posts WHERE message_id = 1")
+            cursor = await conn.execute("SELECT COUNT(*) FROM post_content")
+            assert (await cursor.fetchone())[0] == 0
+            cursor = await conn.execute("SELECT COUNT(*) FROM user_post_stats")
+            assert (await cursor.fetchone())[0] == 0
+
+
+class TestBackfills:
+    """后台回填测试"""
+
+    @pytest.mark.database
+    @pytest.mark.unit
+    async def test_backfill_resumes_from_saved_position(self, temp_dir):
+        db_path = os.path.join(temp_dir, 'backfill.db')
+        with patch('database.db_manager.DB_PATH', db_path):
+            from database.db_manager import init_db
+            await init_db()
+            async with aiosqlite.connect(db_path) as conn:
+                for mid in (1, 2, 3):
+                    await conn.execute(
+                        "INSERT INTO published_posts (message_id, user_id, tags, publish_time) VALUES (?, 1, '#a', 0)",
+                        (mid,)
+                    )
+                await migrations.schedule_backfill(conn, 'post_tags')
+                await conn.commit()
+
+                # 处理一批后中断：进度已随该批一起提交
+                assert await migrations.run_backfill_step(conn, batch_size=2) is True
+                await conn.commit()
+                cursor = await conn.execute("SELECT last_key FROM schema_backfills WHERE name = 'post_tags'")
+                assert (await cursor.fetchone())[0] == 2
+
+            await migrations.run_backfills(batch_size=2, pause=0)
+
+        async with aiosqlite.connect(db_path) as conn:
+            cursor = await conn.execute("SELECT COUNT(*) FROM post_tags")
+            assert (await cursor.fetchone())[0] == 3
+            cursor = await conn.execute("SELECT post_count FROM tags WHERE name = 'a'")
+            assert (await cursor.fetchone())[0] == 3
+            cursor = await conn.execute("SELECT COUNT(*) FROM schema_backfills")
+            assert (await cursor.fetchone())[0] == 0
+
+
+class TestRelatedMessagesMigration:
+    """related_message_ids JSON 字段转换测试"""
+
+    @pytest.mark.database
+    @pytest.mark.unit
+    @pytest.mark.parametrize('sqlite_version', [(3, 40, 0), (3, 31, 1)])
+    async def test_related_ids_moved_to_post_messages(self, temp_dir, sqlite_version):
+        db_path = os.path.join(temp_dir, 'related.db')
+        before = tuple(m for m in migrations.MIGRATIONS if m.version < 9)
+        with patch('database.db_manager.DB_PATH', db_path):
+            from database.db_manager import init_db
+            with patch.object(migrations, 'MIGRATIONS', before), \
+                    patch.object(migrations, 'LATEST_VERSION', before[-1].version):
+                await init_db()
+            async with aiosqlite.connect(db_path) as conn:
+                await conn.executemany(
+                    "INSERT INTO published_posts (message_id, user_id, related_message_ids) VALUES (?, 1, ?)",
+                    [(10, '[11, 12]'), (20, None), (30, 'not json'), (40, '[40, 41]')]
+                )
+                await conn.commit()
+
+            with patch('database.migrations.sqlite3.sqlite_version_info', sqlite_version):
+                await init_db()
+
+        assert 'related_message_ids' not in await _columns(db_path, 'published_posts')
+        async with aiosqlite.connect(db_path) as conn:
+            cursor = await conn.execute("SELECT main_id, message_id, position FROM post_messages ORDER BY message_id")
+            assert [tuple(row) for row in await cursor.fetchall()] == [(10, 11, 1), (10, 12, 2), (40, 41, 1)]
+            cursor = await conn.execute("SELECT name FROM sqlite_master WHERE tbl_name = 'published_posts'")
+            dependents = {row[0] for row in await cursor.fetchall()}
+            assert {'trg_post_content_cascade', 'trg_post_messages_cascade'} <= dependents
@@ -0,0 +1,134 @@
+"""
+SQLite 持久化测试
+"""
+import os
+import time
+import pytest
+import aiosqlite
+from unittest.mock import AsyncMock, patch
+
+from telegram import Chat, Message, Update, User
+from telegram.ext import Application, ConversationHandler, MessageHandler, filters
+
+from utils import persistence as persistence_module
+from utils import session_store
+from utils.persistence import SqlitePersistence
+
+NAME = 'submission_conversation'
+
+
+@pytest.fixture
+async def persistence_db(temp_dir):
+    """创建已初始化的临时数据库"""
+    db_path = os.path.join(temp_dir, 'persistence.db')
+    with patch('database.db_manager.DB_PATH', db_path):
+        from database.db_manager import init_db
+        await init_db()
+        yield db_path
+    session_store._stores.clear()
+
+
+async def _count(db_path, table):
+    async with aiosqlite.connect(db_path) as conn:
+        cursor = await conn.execute(f"SELECT COUNT(*) FROM {table}")
+        return (await cursor.fetchone())[0]
+
+
+def _build(persistence):
+    """投稿会话的简化版本：任意文本进入状态 1 并记录到 user_data"""
+    async def start(update, context):
+        context.user_data['draft'] = update.message.text
+        return 1
+
+    async def step(update, context):
+        context.user_data['step'] = update.message.text
+        return ConversationHandler.END
+
+    application = Application.builder().token('123:TEST').persistence(persistence).build()
+    session_store.install(application)
+    application.add_handler(ConversationHandler(
+        entry_points=[MessageHandler(filters.TEXT, start)],
+        states={1: [MessageHandler(filters.TEXT, step)]},
+        fallbacks=[],
+        name=NAME,
+        persistent=True,
+    ))
+    return application
+
+
+def _message_update(application, update_id, text, user_id=1):
+    user = User(user_id, 'u', False)
+    message = Message(update_id, None, Chat(user_id, 'private'), from_user=user, text=text)
+    update = Update(update_id, message=message)
+    update.set_bot(application.bot)
+    message.set_bot(application.bot)
+    return update
+
+
+class TestSqlitePersistence:
+    """变更合并、跳过未变化的条目和重启恢复测试"""
+
+    @pytest.mark.database
+    async def test_unchanged_data_skipped_and_empty_deleted(self, persistence_db):
+        persistence = SqlitePersistence(update_interval=60)
+        await persistence.update_user_data(1, {'search_mode': 'tag'})
+        await persistence.update_user_data(2, {'time_filter': 'week'})
+        await persistence.update_conversation(NAME, (1, 1), 4)
+        await persistence.update_bot_data({'runs': 1})
+        await persistence.flush()
+        assert await _count(persistence_db, 'session_data') == 2
+        assert await _count(persistence_db, 'ptb_conversations') == 1
+
+        # PTB 每个周期都会提交用到的条目，内容未变化时不写入
+        await persistence.update_user_data(1, {'search_mode': 'tag'})
+        assert persistence._pending_sessions == {}
+
+        await persistence.update_user_data(2, {})
+        await persistence.update_conversation(NAME, (1, 1), None)
+        await persistence.flush()
+        assert await _count(persistence_db, 'session_data') == 1
+        assert await _count(persistence_db, 'ptb_conversations') == 0
+
+        restarted = SqlitePersistence(update_interval=60)
+        assert await restarted.get_user_data() == {1: {'search_mode': 'tag'}}
+        assert await restarted.get_bot_data() == {'runs': 1}
+        assert await restarted.get_conversations(NAME) == {}
+
+        # 超出载入窗口的条目启动时不载入，由会话数据存储按需读回
+        async with aiosqlite.connect(persistence_db) as conn:
+            await conn.execute("UPDATE session_data SET updated_at = ?", (time.time() - 7200,))
+            await conn.commit()
+        assert await SqlitePersistence(load_window=3600).get_user_data() == {}
+
+    @pytest.mark.database
+    async def test_changes_coalesced_into_one_write(self, persistence_db):
+        persistence = SqlitePersistence(update_interval=60)
+        with patch.object(persistence_module, 'WRITE_DELAY', 0.01), \
+                patch.object(persistence, '_write', wraps=persistence._write) as write:
+            for user_id in range(20):
+                await persistence.update_user_data(user_id, {'n': user_id})
+            await persistence._write_task
+        assert write.await_count == 1
+        assert await _count(persistence_db, 'session_data') == 20
+
+    @pytest.mark.database
+    async def test_conversation_survives_restart(self, persistence_db):
+        with patch('telegram.ext.ExtBot.initialize', AsyncMock()), \
+                patch('telegram.ext.ExtBot.shutdown', AsyncMock()):
+            application = _build(SqlitePersistence(update_interval=60))
+            await application.initialize()
+            await application.process_update(_message_update(application, 1, 'hello'))
+            await application.shutdown()
+
+            session_store._stores.clear()
+            restarted = _build(SqlitePersistence(update_interval=60))
+            await restarted.initialize()
+            await session_store.load_spilled()
+            assert restarted.user_data[1] == {'draft': 'hello'}
+
+            # 重启后从上次的状态继续
+            await restarted.process_update(_message_update(restarted, 2, 'next'))
+            assert restarted.user_data[1] == {'draft': 'hello', 'step': 'next'}
+            await restarted.shutdown()
+
+        assert await _count(persistence_db, 'ptb_conversations') == 0
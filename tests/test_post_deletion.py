@@ -0,0 +1,95 @@
+"""
+帖子批量删除测试
+"""
+import os
+import pytest
+import aiosqlite
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from telegram.error import BadRequest
+
+from database import post_messages
+from utils import post_deletion
+
+
+@pytest.fixture
+async def deletion_db(temp_dir):
+    """创建包含三个帖子的临时数据库：1 和 20 为多消息帖子，30 已删除"""
+    db_path = os.path.join(temp_dir, 'deletion.db')
+    with patch('database.db_manager.DB_PATH', db_path):
+        from database.db_manager import init_db
+        await init_db()
+        async with aiosqlite.connect(db_path) as conn:
+            await conn.executemany(
+                "INSERT INTO published_posts (message_id, user_id, is_deleted) VALUES (?, 1, ?)",
+                [(1, 0), (20, 0), (30, 1)]
+            )
+            await post_messages.set_post_messages(conn, 1, [2, 3])
+            await post_messages.set_post_messages(conn, 20, [21])
+            await conn.commit()
+        yield db_path
+
+
+@pytest.fixture
+def search_engine():
+    engine = MagicMock()
+    with patch.object(post_deletion, 'get_search_engine', return_value=engine), \
+            patch.object(post_deletion, 'get_leaderboards'):
+        yield engine
+
+
+class TestDeletePosts:
+    """批量删除流程测试"""
+
+    @pytest.mark.database
+    @pytest.mark.unit
+    async def test_batches_channel_index_and_database(self, deletion_db, search_engine):
+        bot = AsyncMock()
+        # 3 为关联消息：与 1 属于同一帖子，只删除一次
+        results = await post_deletion.delete_posts(bot, [1, 3, 20, 30, 99])
+
+        bot.delete_messages.assert_awaited_once()
+        assert bot.delete_messages.call_args.kwargs['message_ids'] == [1, 2, 3, 20, 21]
+        bot.delete_message.assert_not_called()
+        search_engine.delete_posts.assert_called_once_with([1, 2, 3, 20, 21])
+
+        assert [(r.requested_id, r.message_id, r.status) for r in results] == [
+            (1, 1, 'deleted'), (3, 1, 'deleted'), (20, 20, 'deleted'),
+            (30, 30, 'already_deleted'), (99, None, 'not_found'),
+        ]
+        assert results[0].related_count == 2
+        assert all(r.channel_deleted and r.index_deleted for r in results[:3])
+
+        async with aiosqlite.connect(deletion_db) as conn:
+            cursor = await conn.execute("SELECT message_id FROM published_posts WHERE is_deleted = 1")
+            assert sorted(row[0] for row in await cursor.fetchall()) == [1, 20, 30]
+
+    @pytest.mark.database
+    @pytest.mark.unit
+    async def test_falls_back_to_single_deletes_when_batch_fails(self, deletion_db, search_engine):
+        bot = AsyncMock()
+        bot.delete_messages.side_effect = BadRequest("Not enough rights")
+
+        async def delete_message(chat_id, message_id):
+            if message_id == 2:
+                raise BadRequest("Message to delete not found")
+            if message_id == 21:
+                raise BadRequest("Not enough rights")
+            return True
+
+        bot.delete_message.side_effect = delete_message
+        results = await post_deletion.delete_posts(bot, [1, 20])
+
+        assert bot.delete_message.await_count == 5
+        # 已不存在的消息视为删除成功，无权限删除的消息记入对应帖子
+        assert [(r.message_id, r.channel_deleted) for r in results] == [(1, True), (20, False)]
+        assert all(r.status == 'deleted' for r in results)
+
+    @pytest.mark.unit
+    async def test_channel_messages_are_chunked(self):
+        bot = AsyncMock()
+        with patch.object(post_deletion, 'DELETE_CHUNK_SIZE', 2):
+            failed = await post_deletion.delete_channel_messages(bot, [1, 2, 3, 4, 5])
+
+        assert failed == set()
+        assert [c.kwargs['message_ids'] for c in bot.delete_messages.call_args_list] == [[1, 2], [3, 4], [5]]
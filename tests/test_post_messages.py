@@ -0,0 +1,72 @@
+"""
+帖子关联消息测试
+"""
+import os
+import pytest
+import aiosqlite
+from datetime import datetime
+from unittest.mock import patch
+
+from database import post_messages
+
+
+@pytest.fixture
+async def messages_db(temp_dir):
+    """创建已初始化的临时数据库"""
+    db_path = os.path.join(temp_dir, 'post_messages.db')
+    with patch('database.db_manager.DB_PATH', db_path):
+        from database.db_manager import init_db
+        await init_db()
+        conn = await aiosqlite.connect(db_path)
+        yield conn
+        await conn.close()
+
+
+class TestPostMessages:
+    """关联消息读写测试"""
+
+    @pytest.mark.database
+    @pytest.mark.unit
+    async def test_lookup_in_both_directions(self, messages_db):
+        await messages_db.execute("INSERT INTO published_posts (message_id, user_id) VALUES (10, 1)")
+        await post_messages.set_post_messages(messages_db, 10, [10, 11, 12, 11])
+        await post_messages.add_post_message(messages_db, 10, 13)
+
+        assert await post_messages.get_related_ids(messages_db, 10) == [11, 12, 13]
+        assert await post_messages.get_related_map(messages_db, [10, 20]) == {10: [11, 12, 13]}
+        assert await post_messages.resolve_main_id(messages_db, 12) == 10
+        assert await post_messages.resolve_main_id(messages_db, 10) is None
+
+        # 物理删除帖子时一并删除关联消息
+        await messages_db.execute("DELETE FROM published_posts WHERE message_id = 10")
+        assert await post_messages.get_related_ids(messages_db, 10) == []
+
+
+class TestChannelListenerDedup:
+    """频道监听器按关联消息去重测试"""
+
+    @pytest.mark.database
+    @pytest.mark.unit
+    async def test_media_group_and_related_messages_are_not_new_posts(self, messages_db):
+        from handlers import channel_listener
+
+        def info(message_id, media_group_id=None):
+            return {
+                'message_id': message_id, 'title': f'post {message_id}', 'tags': '#a',
+                'publish_time': datetime.now(), 'media_group_id': media_group_id,
+            }
+
+        await messages_db.execute("INSERT INTO published_posts (message_id, user_id) VALUES (100, 1)")
+        await post_messages.set_post_messages(messages_db, 100, [101, 102])
+        await messages_db.commit()
+
+        with patch('handlers.channel_listener.get_search_engine', return_value=None):
+            # 机器人发布的多组媒体：关联消息已登记，不再单独建帖
+            assert await channel_listener.save_channel_message(info(101)) is False
+            # 手动发布的媒体组：后续消息并入第一条消息的帖子
+            assert await channel_listener.save_channel_message(info(200, 'album')) is True
+            assert await channel_listener.save_channel_message(info(201, 'album')) is False
+
+        cursor = await messages_db.execute("SELECT message_id FROM published_posts ORDER BY message_id")
+        assert [row[0] for row in await cursor.fetchall()] == [100, 200]
+        assert await post_messages.get_related_ids(messages_db, 200) == [201]
@@ -0,0 +1,96 @@
+"""
+规范化标签表测试
+"""
+import os
+import json
+import pytest
+import aiosqlite
+from unittest.mock import patch
+
+from database import post_tags
+
+
+@pytest.fixture
+async def tags_db(temp_dir):
+    """创建已初始化的临时数据库"""
+    db_path = os.path.join(temp_dir, 'tags.db')
+    with patch('database.db_manager.DB_PATH', db_path):
+        from database.db_manager import init_db
+        await init_db()
+    conn = await aiosqlite.connect(db_path)
+    conn.row_factory = aiosqlite.Row
+    yield conn
+    await conn.close()
+
+
+async def _publish(conn, message_id, tags, is_deleted=0):
+    await conn.execute(
+        "INSERT INTO published_posts (message_id, user_id, title, tags, publish_time, is_deleted) VALUES (?, 1, ?, ?, 0, ?)",
+        (message_id, f"post {message_id}", tags, is_deleted)
+    )
+    await post_tags.set_post_tags(conn, message_id, tags)
+
+
+class TestParseTags:
+    """标签文本解析测试"""
+
+    @pytest.mark.unit
+    def test_parse_formats(self):
+        assert post_tags.parse_tags('#Foo #bar ##foo') == ['foo', 'bar']
+        assert post_tags.parse_tags(json.dumps(['A', '#b'])) == ['a', 'b']
+        assert post_tags.parse_tags('') == []
+        assert post_tags.parse_tags(None) == []
+
+
+class TestTagCounts:
+    """标签计数增量维护测试"""
+
+    @pytest.mark.database
+    @pytest.mark.unit
+    async def test_counts_follow_publish_and_delete(self, tags_db):
+        await _publish(tags_db, 1, '#a #b')
+        await _publish(tags_db, 2, '["a"]')
+        await _publish(tags_db, 3, '#c', is_deleted=1)
+
+        assert await post_tags.get_tag_counts(tags_db) == [('a', 2), ('b', 1)]
+
+        await tags_db.execute("UPDATE published_posts SET is_deleted = 1 WHERE message_id = 1")
+        assert await post_tags.get_tag_counts(tags_db) == [('a', 1)]
+
+        await tags_db.execute("UPDATE published_posts SET is_deleted = 0 WHERE message_id = 3")
+        await tags_db.execute("DELETE FROM published_posts WHERE message_id = 2")
+        assert await post_tags.get_tag_counts(tags_db) == [('c', 1)]
+
+    @pytest.mark.database
+    @pytest.mark.unit
+    async def test_retag_replaces_links(self, tags_db):
+        await _publish(tags_db, 1, '#a #b')
+
+        await post_tags.set_post_tags(tags_db, 1, '#b #c')
+
+        assert sorted(await post_tags.get_tag_counts(tags_db)) == [('b', 1), ('c', 1)]
+
+    @pytest.mark.database
+    @pytest.mark.unit
+    async def test_tag_posts_newest_first(self, tags_db):
+        await _publish(tags_db, 1, '#a')
+        await _publish(tags_db, 2, '#A')
+        await _publish(tags_db, 3, '#a', is_deleted=1)
+
+        total, rows = await post_tags.get_tag_posts(tags_db, '#a')
+
+        assert total == 2
+        assert [row['message_id'] for row in rows] == [2, 1]
+        assert await post_tags.get_tag_posts(tags_db, 'missing') == (0, [])
+
+    @pytest.mark.database
+    @pytest.mark.unit
+    async def test_rebuild_matches_incremental(self, tags_db):
+        await _publish(tags_db, 1, '#a #b')
+        await _publish(tags_db, 2, '["b", "c"]')
+        await tags_db.execute("UPDATE published_posts SET is_deleted = 1 WHERE message_id = 2")
+        incremental = sorted(await post_tags.get_tag_counts(tags_db))
+
+        assert await post_tags.rebuild(tags_db) == 2
+
+        assert sorted(await post_tags.get_tag_counts(tags_db)) == incremental == [('a', 1), ('b', 1)]
@@ -0,0 +1,75 @@
+"""
+采样分析器测试
+"""
+import asyncio
+import threading
+import time
+import pytest
+
+from utils import profiler
+
+
+def busy_loop(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        sum(range(1000))
+
+
+class TestSamplingProfiler:
+    """采样、汇总和折叠栈输出测试"""
+
+    @pytest.mark.unit
+    async def test_profile_covers_loop_and_worker_threads(self):
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        worker = threading.Thread(target=busy_loop, args=(0.3,), name='busy worker')
+        ticking = asyncio.create_task(ticker())
+        worker.start()
+        try:
+            result = await profiler.profile(0.3, interval=0.005)
+        finally:
+            ticking.cancel()
+            worker.join()
+
+        # 采样期间事件循环照常运行
+        assert ticks >= 10
+        assert result.samples > result.idle_samples > 0
+        top = [label for label, _, _ in result.top_functions(5)]
+        assert any(label.startswith('busy_loop(tests/test_profiler.py:') for label in top)
+        assert not any(label in result.idle_labels for label in top)
+
+        lines = result.collapsed().splitlines()
+        worker_lines = [line for line in lines if line.startswith('busy_worker;')]
+        assert worker_lines
+        frames, count = worker_lines[0].rsplit(' ', 1)
+        assert int(count) > 0
+        assert 'busy_loop(tests/test_profiler.py:' in frames
+        assert all(' ' not in line.rsplit(' ', 1)[0] for line in lines)
+
+    @pytest.mark.unit
+    async def test_only_one_profile_at_a_time(self):
+        first = asyncio.create_task(profiler.profile(0.2))
+        await asyncio.sleep(0.05)
+        assert profiler.is_running()
+        with pytest.raises(RuntimeError):
+            await profiler.profile(0.1)
+        result = await first
+        assert not profiler.is_running()
+        assert 'ms' in result.summary()
+
+    @pytest.mark.unit
+    def test_summary_reports_percentages_of_busy_samples(self):
+        result = profiler.ProfileResult(duration=1.0, interval=0.01, samples=10, idle_samples=2)
+        result.stacks[('MainThread', ('main(main.py:1)', 'work(a.py:3)'))] = 6
+        result.stacks[('MainThread', ('main(main.py:1)',))] = 2
+        result.stacks[('MainThread', ('main(main.py:1)', 'select(selectors.py:1)'))] = 2
+        result.idle_labels = frozenset({'select(selectors.py:1)'})
+
+        assert result.top_functions() == [('work(a.py:3)', 6, 6), ('main(main.py:1)', 2, 8)]
+        assert '75.0% 75.0%  work(a.py:3)' in result.summary()
@@ -0,0 +1,263 @@
+"""
+投稿发布队列测试
+"""
+import os
+import json
+import time
+import pytest
+import aiosqlite
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from database import publish_outbox
+
+
+@pytest.fixture
+async def outbox_db(temp_dir):
+    """创建已初始化的临时数据库"""
+    db_path = os.path.join(temp_dir, 'outbox.db')
+    with patch('database.db_manager.DB_PATH', db_path):
+        from database.db_manager import init_db
+        await init_db()
+        yield db_path
+
+
+async def _job_row(db_path, job_id):
+    async with aiosqlite.connect(db_path) as conn:
+        conn.row_factory = aiosqlite.Row
+        cursor = await conn.execute("SELECT * FROM publish_outbox WHERE id = ?", (job_id,))
+        return await cursor.fetchone()
+
+
+def _payload(image_id='["photo:abc"]', document_id=None):
+    return {
+        'submission': {
+            'user_id': 1, 'timestamp': 1.0, 'image_id': image_id, 'document_id': document_id,
+            'tags': '#a', 'link': '', 'title': 't', 'note': '', 'spoiler': 'false', 'username': 'u1',
+        },
+        'caption': 'caption',
+        'submitter': {'username': 'u1', 'first_name': 'U', 'last_name': None},
+    }
+
+
+class TestOutbox:
+    """队列读写测试"""
+
+    @pytest.mark.database
+    @pytest.mark.unit
+    async def test_enqueue_claim_retry_and_recover(self, outbox_db):
+        async with aiosqlite.connect(outbox_db) as conn:
+            job_id, created = await publish_outbox.enqueue(conn, '1:1.0', 1, 1, _payload(), 77)
+            # 同一幂等键只生成一个任务
+            assert await publish_outbox.enqueue(conn, '1:1.0', 1, 1, _payload()) == (job_id, False)
+            assert created is True
+            assert await publish_outbox.queue_position(conn, job_id) == 1
+
+            job = await publish_outbox.claim_next(conn)
+            assert (job.id, job.attempts, job.progress_message_id, job.stage) == (job_id, 1, 77, 'media')
+            assert job.payload['caption'] == 'caption'
+            assert await publish_outbox.claim_next(conn) is None
+
+            # 失败后退避重新排队，到期前不会被领取
+            await publish_outbox.reschedule(conn, job_id, 60, 'boom')
+            assert await publish_outbox.claim_next(conn) is None
+            job = await publish_outbox.claim_next(conn, now=time.time() + 61)
+            assert job.attempts == 2
+
+            # 进程重启：运行中的任务重新排队，已完成的阶段保留
+            await publish_outbox.advance(conn, job_id, publish_outbox.STAGE_SAVE, 500, [500, 501])
+            assert await publish_outbox.recover_running(conn) == 1
+            job = await publish_outbox.claim_next(conn)
+            assert (job.stage, job.main_message_id, job.message_ids) == ('save', 500, [500, 501])
+
+            await publish_outbox.complete(conn, job_id)
+            assert await publish_outbox.get_status_counts(conn) == {'done': 1}
+            assert await publish_outbox.purge_finished(conn, time.time() + 1) == 1
+
+
+class TestPublishSubmission:
+    """确认投稿只入队、不在处理器中发送"""
+
+    @pytest.mark.database
+    @pytest.mark.unit
+    async def test_submission_is_enqueued_and_removed(self, outbox_db, mock_telegram_update, mock_telegram_context):
+        from handlers import publish
+        from telegram.ext import ConversationHandler
+
+        user_id = mock_telegram_update.effective_user.id
+        mock_telegram_update.effective_user.last_name = None
+        async with aiosqlite.connect(outbox_db) as conn:
+            await conn.execute(
+                "INSERT INTO submissions (user_id, timestamp, mode, image_id, tags, spoiler) VALUES (?, ?, ?, ?, ?, ?)",
+                (user_id, 123.0, 'MEDIA', json.dumps(['photo:abc']), '#a', 'false')
+            )
+            await conn.commit()
+        progress = MagicMock(message_id=55, edit_text=AsyncMock())
+        mock_telegram_update.effective_message.reply_text = AsyncMock(return_value=progress)
+
+        with patch('database.db_manager.DB_PATH', outbox_db), \
+                patch.object(publish, 'wake_publish_workers') as wake:
+            result = await publish.publish_submission(mock_telegram_update, mock_telegram_context)
+
+        assert result == ConversationHandler.END
+        wake.assert_called_once()
+        mock_telegram_context.bot.send_photo.assert_not_called()
+        mock_telegram_context.bot.send_media_group.assert_not_called()
+        async with aiosqlite.connect(outbox_db) as conn:
+            cursor = await conn.execute("SELECT COUNT(*) FROM submissions")
+            assert (await cursor.fetchone())[0] == 0
+            cursor = await conn.execute("SELECT idempotency_key, progress_message_id, payload FROM publish_outbox")
+            key, progress_id, payload = await cursor.fetchone()
+        assert (key, progress_id) == (f"{user_id}:123.0", 55)
+        assert json.loads(payload)['submission']['image_id'] == json.dumps(['photo:abc'])
+
+    @pytest.mark.database
+    @pytest.mark.unit
+    async def test_submission_kept_when_enqueue_fails(self, outbox_db, mock_telegram_update, mock_telegram_context):
+        from handlers import publish
+
+        user_id = mock_telegram_update.effective_user.id
+        async with aiosqlite.connect(outbox_db) as conn:
+            await conn.execute(
+                "INSERT INTO submissions (user_id, timestamp, mode, image_id, tags, spoiler) VALUES (?, ?, ?, ?, ?, ?)",
+                (user_id, 123.0, 'MEDIA', json.dumps(['photo:abc']), '#a', 'false')
+            )
+            await conn.commit()
+        mock_telegram_update.effective_message.reply_text = AsyncMock(return_value=MagicMock(message_id=55))
+
+        with patch('database.db_manager.DB_PATH', outbox_db), \
+                patch.object(publish_outbox, 'enqueue', new_callable=AsyncMock, side_effect=RuntimeError('disk I/O error')):
+            await publish.publish_submission(mock_telegram_update, mock_telegram_context)
+
+        assert '发布失败' in mock_telegram_update.effective_message.reply_text.call_args.args[0]
+        async with aiosqlite.connect(outbox_db) as conn:
+            cursor = await conn.execute("SELECT COUNT(*) FROM submissions")
+            assert (await cursor.fetchone())[0] == 1
+
+
+class TestPublishWorker:
+    """发布工作协程测试"""
+
+    @pytest.fixture
+    def application(self):
+        application = MagicMock()
+        application.bot = AsyncMock()
+        return application
+
+    async def _enqueue(self, db_path, payload):
+        async with aiosqlite.connect(db_path) as conn:
+            job_id, _ = await publish_outbox.enqueue(conn, 'k', 1, 42, payload, 9)
+            await conn.commit()
+        return job_id
+
+    @pytest.mark.database
+    @pytest.mark.unit
+    async def test_failed_job_is_retried_then_published(self, outbox_db, application):
+        from handlers import publish
+
+        job_id = await self._enqueue(outbox_db, _payload())
+        pool = publish.PublishWorkerPool(application)
+        sent = MagicMock(message_id=500)
+
+        with patch('database.db_manager.DB_PATH', outbox_db), \
+                patch.object(publish, 'NOTIFY_OWNER', False), \
+                patch.object(publish, 'save_published_post', new_callable=AsyncMock) as save, \
+                patch.object(publish, 'handle_media_publish', new_callable=AsyncMock) as send_media:
+            send_media.return_value = (None, [])
+            assert await pool.run_once() is True
+            row = await _job_row(outbox_db, job_id)
+            assert (row['status'], row['attempts'], row['stage']) == ('pending', 1, 'media')
+            assert row['next_attempt_at'] > time.time() + publish.PUBLISH_RETRY_DELAY - 5
+            assert '媒体发送失败' in row['last_error']
+            # 进度消息提示将自动重试
+            assert '重试' in application.bot.edit_message_text.call_args.kwargs['text']
+
+            async with aiosqlite.connect(outbox_db) as conn:
+                await conn.execute("UPDATE publish_outbox SET next_attempt_at = 0")
+                await conn.commit()
+            send_media.return_value = (sent, [500, 501])
+            assert await pool.run_once() is True
+            assert await pool.run_once() is False
+
+        row = await _job_row(outbox_db, job_id)
+        assert (row['status'], row['attempts'], row['stage'], row['main_message_id']) == ('done', 2, 'notify', 500)
+        assert save.call_args.args[1] == 500
+        assert save.call_args.args[5] == [500, 501]
+        assert '成功发布' in application.bot.send_message.call_args.kwargs['text']
+
+    @pytest.mark.database
+    @pytest.mark.unit
+    async def test_restart_resumes_without_resending(self, outbox_db, application):
+        from handlers import publish
+
+        job_id = await self._enqueue(outbox_db, _payload(document_id='["document:d1:a.zip"]'))
+        async with aiosqlite.connect(outbox_db) as conn:
+            # 模拟媒体和文档已发出、入库前进程退出
+            assert (await publish_outbox.claim_next(conn)).id == job_id
+            await publish_outbox.advance(conn, job_id, publish_outbox.STAGE_SAVE, 500, [500, 501, 502])
+            await conn.commit()
+
+        pool = publish.PublishWorkerPool(application)
+        with patch('database.db_manager.DB_PATH', outbox_db), \
+                patch.object(publish, 'NOTIFY_OWNER', False), \
+                patch.object(publish, 'save_published_post', new_callable=AsyncMock) as save, \
+                patch.object(publish, 'handle_media_publish', new_callable=AsyncMock) as send_media, \
+                patch.object(publish, 'handle_document_publish', new_callable=AsyncMock) as send_docs:
+            async with aiosqlite.connect(outbox_db) as conn:
+                assert await publish_outbox.recover_running(conn) == 1
+                await conn.commit()
+            assert await pool.run_once() is True
+
+        send_media.assert_not_called()
+        send_docs.assert_not_called()
+        save.assert_awaited_once()
+        assert (await _job_row(outbox_db, job_id))['status'] == 'done'
+
+    @pytest.mark.database
+    @pytest.mark.unit
+    async def test_save_failure_retries_from_save_stage(self, outbox_db, application):
+        from handlers import publish
+
+        job_id = await self._enqueue(outbox_db, _payload())
+        pool = publish.PublishWorkerPool(application)
+        with patch('database.db_manager.DB_PATH', outbox_db), \
+                patch.object(publish, 'NOTIFY_OWNER', False), \
+                patch.object(publish, 'get_search_engine'), \
+                patch.object(publish.post_tags, 'set_post_tags', new_callable=AsyncMock,
+                             side_effect=[RuntimeError('database is locked'), None]), \
+                patch.object(publish, 'handle_media_publish', new_callable=AsyncMock) as send_media:
+            send_media.return_value = (MagicMock(message_id=500), [500])
+            assert await pool.run_once() is True
+            row = await _job_row(outbox_db, job_id)
+            assert (row['status'], row['stage']) == ('pending', 'save')
+            assert '保存帖子信息失败' in row['last_error']
+            application.bot.send_message.assert_not_called()
+
+            async with aiosqlite.connect(outbox_db) as conn:
+                # 失败的写入已整体回滚
+                cursor = await conn.execute("SELECT COUNT(*) FROM published_posts")
+                assert (await cursor.fetchone())[0] == 0
+                await conn.execute("UPDATE publish_outbox SET next_attempt_at = 0")
+                await conn.commit()
+            assert await pool.run_once() is True
+
+        send_media.assert_awaited_once()
+        assert (await _job_row(outbox_db, job_id))['status'] == 'done'
+        async with aiosqlite.connect(outbox_db) as conn:
+            cursor = await conn.execute("SELECT message_id FROM published_posts")
+            assert await cursor.fetchall() == [(500,)]
+
+    @pytest.mark.database
+    @pytest.mark.unit
+    async def test_gives_up_after_max_attempts(self, outbox_db, application):
+        from handlers import publish
+
+        job_id = await self._enqueue(outbox_db, _payload())
+        pool = publish.PublishWorkerPool(application)
+        with patch('database.db_manager.DB_PATH', outbox_db), \
+                patch.object(publish, 'PUBLISH_MAX_ATTEMPTS', 1), \
+                patch.object(publish, 'handle_media_publish', new_callable=AsyncMock, return_value=(None, [])):
+            assert await pool.run_once() is True
+
+        row = await _job_row(outbox_db, job_id)
+        assert (row['status'], row['attempts']) == ('failed', 1)
+        assert '发布失败' in application.bot.send_message.call_args.kwargs['text']
@@ -0,0 +1,192 @@
+"""
+SQL 查询计划回归测试
+
+静态提取生产代码中的全部 SQL 语句，在按 init_db 建好的数据库上执行
+EXPLAIN QUERY PLAN，出现全表扫描（不带索引的 SCAN）或临时 B 树排序时失败。
+这样新增查询或调整索引时，缺索引的查询会在测试阶段暴露出来。
+
+- 字符串常量中的 SQL 必须能在当前 schema 上编译（可发现引用了不存在字段的查询）
+- f-string 中的插值一律替换为 `?`；替换后无法编译的动态 SQL 跳过，
+  由 dynamic_statements() 中调用拼接函数得到的语句覆盖
+- 确实需要全表扫描/排序的语句登记在 ALLOWED_PLANS 中并说明原因
+"""
+import ast
+import re
+import sqlite3
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# 使用主数据库（database.db_manager.get_db）的生产模块
+SQL_SOURCES = [
+    *sorted((ROOT / 'handlers').glob('*.py')),
+    *sorted((ROOT / 'database').glob('*.py')),
+    ROOT / 'utils' / 'blacklist.py',
+    ROOT / 'utils' / 'index_manager.py',
+    ROOT / 'utils' / 'leaderboard.py',
+]
+
+SQL_START = re.compile(r'^\s*(SELECT|INSERT|UPDATE|DELETE|WITH)\b', re.IGNORECASE)
+
+# 允许出现全表扫描或临时排序的语句：语句片段 -> 原因
+ALLOWED_PLANS = {
+    "FROM sqlite_master": "查询 schema 目录，只在启动时执行",
+    "DELETE FROM submissions WHERE timestamp < ?": "临时投稿表只保存进行中的会话，行数很少",
+    "FROM blacklist ORDER BY added_at DESC": "/blacklist_list 列出全部黑名单，表很小",
+    "SELECT user_id FROM blacklist": "启动时把整个黑名单加载到内存",
+    "SELECT COUNT(*) FROM published_posts": "/index_stats 统计总帖子数",
+    "SELECT COUNT(*) FROM user_post_stats": "管理员重算聚合表后统计用户数",
+    "SELECT EXISTS (SELECT 1 FROM published_posts)": "迁移时判断表中是否已有数据，读到第一行即停止",
+    "ORDER BY p.message_id\n": "重建搜索索引需要读取全部帖子",
+    "ORDER BY rowid DESC LIMIT 100": "按 rowid 倒序扫描，LIMIT 限定只读最近 100 条",
+    "FROM published_posts WHERE ? IS NOT NULL": "迁移 9 一次性读取旧的 related_message_ids 字段",
+    "GROUP BY message_id": "浏览速度需要对窗口内的样本按帖子分组聚合，上升榜再按计算结果排序",
+}
+
+
+# 不是完整语句的 SQL 片段（拼接进触发器或其他语句中使用）
+SQL_FRAGMENTS = (
+    "WHERE user_id = user_post_stats.user_id",
+)
+
+
+def _render(node) -> str:
+    """把字符串常量或 f-string 还原为 SQL 文本，插值替换为 ?"""
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return node.value
+    parts = []
+    for value in node.values:
+        if isinstance(value, ast.Constant):
+            parts.append(value.value)
+        else:
+            parts.append('?')
+    return ''.join(parts)
+
+
+def collect_statements():
+    """提取生产代码中的 SQL 语句：[(位置, SQL, 是否 f-string)]"""
+    statements = []
+    for path in SQL_SOURCES:
+        tree = ast.parse(path.read_text(encoding='utf-8'))
+        # f-string 内部的常量片段随 f-string 整体处理
+        fstring_parts = {
+            id(value) for node in ast.walk(tree) if isinstance(node, ast.JoinedStr) for value in node.values
+        }
+        for node in ast.walk(tree):
+            if id(node) in fstring_parts:
+                continue
+            if isinstance(node, ast.Constant) and isinstance(node.value, str):
+                dynamic = False
+            elif isinstance(node, ast.JoinedStr):
+                dynamic = True
+            else:
+                continue
+            sql = _render(node)
+            if not SQL_START.match(sql):
+                continue
+            # 触发器体中的片段引用 NEW/OLD，只能在触发器内编译
+            if re.search(r'\b(NEW|OLD)\.', sql) or any(fragment in sql for fragment in SQL_FRAGMENTS):
+                continue
+            location = f"{path.relative_to(ROOT)}:{node.lineno}"
+            statements.append((location, sql, dynamic))
+    return statements
+
+
+def dynamic_statements():
+    """由拼接函数生成的动态 SQL"""
+    from database import stats_history
+    from utils import leaderboard
+    return [
+        ("leaderboard._board_sql(False)", leaderboard._board_sql(False)),
+        ("leaderboard._board_sql(True)", leaderboard._board_sql(True)),
+        ("stats_history._velocity_sql(False)", stats_history._velocity_sql(False)),
+        ("stats_history._velocity_sql(True, 3)", stats_history._velocity_sql(True, 3)),
+        ("stats_history._rising_sql()", stats_history._rising_sql()),
+    ]
+
+
+@pytest.fixture(scope='module')
+def schema_db(tmp_path_factory):
+    """按 init_db 建好全部表和索引的数据库（同步连接，便于逐条 EXPLAIN），并附加归档库"""
+    import asyncio
+    db_dir = tmp_path_factory.mktemp('plans')
+    db_path = str(db_dir / 'plans.db')
+    archive_path = str(db_dir / 'plans_archive.db')
+
+    async def build():
+        with patch('database.db_manager.DB_PATH', db_path):
+            from database.db_manager import init_db
+            from utils.blacklist import init_blacklist
+            from database import archive
+            await init_db()
+            await init_blacklist()
+            async with archive.get_archive_db(archive_path):
+                pass
+
+    asyncio.run(build())
+    conn = sqlite3.connect(db_path)
+    conn.execute("ATTACH DATABASE ? AS archive", (archive_path,))
+    yield conn
+    conn.close()
+
+
+def explain(conn, sql):
+    """执行 EXPLAIN QUERY PLAN，所有参数绑定为 NULL"""
+    rows = conn.execute(f"EXPLAIN QUERY PLAN {sql}", [None] * sql.count('?')).fetchall()
+    return [row[3] for row in rows]
+
+
+def plan_problems(details):
+    """找出计划中的全表扫描和临时 B 树排序"""
+    problems = []
+    for detail in details:
+        if re.match(r'^SCAN \S+$', detail) or 'USE TEMP B-TREE' in detail:
+            problems.append(detail)
+    return problems
+
+
+def _allowed(sql):
+    """返回豁免该语句的允许列表项"""
+    return next((fragment for fragment in ALLOWED_PLANS if fragment in sql), None)
+
+
+def test_statements_are_collected():
+    """确认提取逻辑能找到生产代码中的查询"""
+    sqls = [sql for _, sql, _ in collect_statements()]
+    assert any('FROM published_posts' in sql for sql in sqls)
+    assert len(sqls) > 30
+
+
+@pytest.mark.database
+def test_no_full_scans_or_temp_sorts(schema_db):
+    failures = []
+    checked = 0
+    used_allowances = set()
+    candidates = [(loc, sql, dynamic) for loc, sql, dynamic in collect_statements()]
+    candidates += [(loc, sql, False) for loc, sql in dynamic_statements()]
+
+    for location, sql, dynamic in candidates:
+        try:
+            details = explain(schema_db, sql)
+        except sqlite3.Error as e:
+            if dynamic:
+                continue
+            failures.append(f"{location}: 无法编译 ({e}): {sql.strip()[:120]}")
+            continue
+        checked += 1
+        problems = plan_problems(details)
+        if not problems:
+            continue
+        fragment = _allowed(sql)
+        if fragment is None:
+            failures.append(f"{location}: {problems}: {' '.join(sql.split())[:160]}")
+        else:
+            used_allowances.add(fragment)
+
+    assert checked > 30
+    assert not failures, "以下查询缺少合适的索引：\n" + "\n".join(failures)
+    # 允许列表中的每一项都应对应一条仍然需要豁免的语句，避免残留
+    assert used_allowances == set(ALLOWED_PLANS)
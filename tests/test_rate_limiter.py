@@ -0,0 +1,112 @@
+"""
+Telegram API 全局限流测试
+"""
+import asyncio
+import pytest
+from unittest.mock import patch
+
+from telegram.error import RetryAfter
+
+from utils import rate_limiter
+from utils.rate_limiter import (
+    ApiRateLimiter, TokenBucket, api_priority,
+    PRIORITY_INTERACTIVE, PRIORITY_PUBLISH, PRIORITY_BACKGROUND
+)
+
+
+class TestTokenBucket:
+    """令牌桶测试"""
+
+    @pytest.mark.unit
+    def test_refill_and_wait_time(self):
+        bucket = TokenBucket(rate=2, capacity=2, now=0)
+        bucket.take(0)
+        bucket.take(0)
+        assert bucket.wait_time(0) == pytest.approx(0.5)
+        assert bucket.wait_time(0.5) == 0
+        assert bucket.is_full(10)
+
+
+class TestApiRateLimiter:
+    """优先级调度和 RetryAfter 处理测试"""
+
+    @pytest.mark.unit
+    async def test_interactive_requests_overtake_background(self):
+        limiter = ApiRateLimiter(global_rate=10)
+        order = []
+
+        async def call(name):
+            order.append(name)
+            return True
+
+        async def request(name, priority):
+            with api_priority(priority):
+                return await limiter.process_request(call, (name,), {}, 'getChat', {}, None)
+
+        try:
+            # 先用后台请求耗尽全局令牌，之后排队的请求按优先级放行
+            await asyncio.gather(*(request(f'warmup{i}', PRIORITY_BACKGROUND) for i in range(10)))
+            order.clear()
+            background = [asyncio.create_task(request(f'bg{i}', PRIORITY_BACKGROUND)) for i in range(3)]
+            await asyncio.sleep(0)
+            publish = asyncio.create_task(request('publish', PRIORITY_PUBLISH))
+            interactive = asyncio.create_task(request('reply', PRIORITY_INTERACTIVE))
+            await asyncio.gather(*background, publish, interactive)
+        finally:
+            await limiter.shutdown()
+
+        assert order[:2] == ['reply', 'publish']
+        stats = limiter.get_stats()
+        assert stats['priorities']['background']['requests'] == 13
+        assert stats['priorities']['background']['wait_max'] > 0
+        assert stats['queued'] == 0
+
+    @pytest.mark.unit
+    async def test_private_chat_bucket_limits_sends_only(self):
+        limiter = ApiRateLimiter(global_rate=1000, chat_rate=1000)
+
+        async def call():
+            return True
+
+        try:
+            with patch.object(rate_limiter, 'CHAT_BURST', 1):
+                await limiter.process_request(call, (), {}, 'sendMessage', {'chat_id': 42}, None)
+                await limiter.process_request(call, (), {}, 'getChat', {'chat_id': 42}, None)
+                bucket = limiter._chat_buckets[42]
+                # getChat 不消耗会话令牌
+                assert bucket.tokens < 1
+                assert '@channel' not in limiter._chat_buckets
+                await limiter.process_request(call, (), {}, 'sendMessage', {'chat_id': '@channel'}, None)
+                assert limiter._chat_buckets['@channel'].capacity == limiter.group_per_minute
+        finally:
+            await limiter.shutdown()
+
+    @pytest.mark.unit
+    async def test_retry_after_pauses_chat_and_retries(self):
+        limiter = ApiRateLimiter(max_retries=1)
+        attempts = []
+
+        async def flaky():
+            attempts.append(asyncio.get_running_loop().time())
+            if len(attempts) == 1:
+                raise RetryAfter(0)
+            return {'ok': True}
+
+        async def always_limited():
+            raise RetryAfter(0)
+
+        try:
+            result = await limiter.process_request(flaky, (), {}, 'sendMessage', {'chat_id': 7}, None)
+            assert result == {'ok': True}
+            assert len(attempts) == 2
+            assert attempts[1] - attempts[0] >= 0.1
+            assert 7 in limiter._paused_until
+
+            with pytest.raises(RetryAfter):
+                await limiter.process_request(always_limited, (), {}, 'getMe', {}, PRIORITY_INTERACTIVE)
+            # 没有会话的请求触发限流时暂停全部请求
+            assert None in limiter._paused_until
+        finally:
+            await limiter.shutdown()
+
+        assert limiter.get_stats()['retry_after']['count'] == 3
@@ -0,0 +1,59 @@
+"""
+搜索索引标签字段测试
+"""
+import os
+import pytest
+from whoosh import index
+from whoosh.fields import Schema, TEXT, ID
+
+from utils.search_engine import PostSearchEngine, PostDocument
+
+
+@pytest.fixture
+def engine(temp_dir):
+    """创建临时索引并写入几篇帖子"""
+    engine = PostSearchEngine(os.path.join(temp_dir, 'index'))
+    engine.add_post(PostDocument(1, title="hello world", tags="#Foo #bar"))
+    engine.add_post(PostDocument(2, title="hello there", tags='["foo", "baz"]'))
+    engine.add_post(PostDocument(3, title="other", tags="#bar"))
+    return engine
+
+
+class TestTagField:
+    """精确标签匹配与分面统计测试"""
+
+    @pytest.mark.unit
+    def test_tag_only_search_is_exact(self, engine):
+        """纯标签搜索大小写、# 前缀无关，且不做部分匹配"""
+        result = engine.search("", tag_filter="#FOO")
+
+        assert sorted(hit.message_id for hit in result.hits) == [1, 2]
+        assert engine.search("", tag_filter="fo").total_results == 0
+
+    @pytest.mark.unit
+    def test_tag_filter_combined_with_keyword(self, engine):
+        result = engine.search("hello", tag_filter="bar")
+
+        assert [hit.message_id for hit in result.hits] == [1]
+
+    @pytest.mark.unit
+    def test_tag_counts_cover_whole_result_set(self, engine):
+        """标签计数针对全部匹配结果，而非当前页"""
+        result = engine.search("hello", page_len=1)
+
+        assert len(result.hits) == 1
+        assert result.tag_counts == {'foo': 2, 'bar': 1, 'baz': 1}
+        assert engine.search("hello", tag_counts=False).tag_counts == {}
+
+    @pytest.mark.unit
+    def test_old_schema_triggers_rebuild(self, temp_dir):
+        """没有 tag 字段的旧索引通过兼容性检查被识别并重建"""
+        index_dir = os.path.join(temp_dir, 'old_index')
+        os.makedirs(index_dir)
+        old_schema = Schema(message_id=ID(stored=True, unique=True), title=TEXT(stored=True))
+        index.create_in(index_dir, old_schema, 'posts')
+
+        engine = PostSearchEngine(index_dir)
+
+        assert 'tag' in engine.ix.schema
+        assert getattr(engine, '_needs_reindex', False) is True
@@ -0,0 +1,111 @@
+"""
+有界会话数据存储测试
+"""
+import os
+import time
+import pytest
+import aiosqlite
+from unittest.mock import patch
+
+from telegram.ext import Application
+
+from database import session_data
+from utils import session_store
+from utils.session_store import BoundedDataStore
+
+
+@pytest.fixture
+async def session_db(temp_dir):
+    """创建已初始化的临时数据库"""
+    db_path = os.path.join(temp_dir, 'session.db')
+    with patch('database.db_manager.DB_PATH', db_path):
+        from database.db_manager import init_db
+        await init_db()
+        yield db_path
+    session_store._stores.clear()
+
+
+async def _rows(db_path):
+    async with aiosqlite.connect(db_path) as conn:
+        cursor = await conn.execute("SELECT kind, id FROM session_data ORDER BY kind, id")
+        return [tuple(row) for row in await cursor.fetchall()]
+
+
+def _age(store, key, seconds):
+    store._touched[key] = time.monotonic() - seconds
+
+
+class TestBoundedDataStore:
+    """溢出、读回和条目上限测试"""
+
+    @pytest.mark.database
+    async def test_idle_entries_spill_and_restore(self, session_db):
+        store = BoundedDataStore(session_data.KIND_USER, dict, max_entries=100, idle_ttl=600)
+        store[3]  # 空条目
+        store[1]['search_mode'] = 'tag'
+        store[2]['time_filter'] = 'week'
+        for key in (1, 3):
+            _age(store, key, 700)
+
+        assert store.evict_idle() == 2
+        assert list(store) == [2]
+        assert await store.flush() == 1
+        assert await _rows(session_db) == [('user', 1)]
+
+        # 未溢出的 ID 不查询数据库
+        assert await store.restore(3) is False
+        assert await store.restore(1) is True
+        assert store[1] == {'search_mode': 'tag'}
+        assert list(store) == [2, 1]
+
+        # 读回后以内存为准，数据库中的旧数据删除
+        await store.flush()
+        assert await _rows(session_db) == []
+        assert store.get_stats() == {'entries': 2, 'spilled': 0, 'pending': 0}
+
+    @pytest.mark.unit
+    def test_size_cap_spares_recent_entries_and_reads_back_pending(self):
+        store = BoundedDataStore(session_data.KIND_CHAT, dict, max_entries=2, idle_ttl=3600)
+        for key in range(1, 5):
+            store[key]['n'] = key
+            _age(store, key, 300 - key)
+        store[4]  # 刚访问过
+
+        assert store.evict_idle() == 2
+        assert list(store) == [3, 4]
+        assert store.get_stats()['pending'] == 2
+
+        # 尚未写入数据库的条目直接从内存读回
+        assert store[1] == {'n': 1}
+        assert store.get_stats() == {'entries': 3, 'spilled': 1, 'pending': 2}
+
+        # 内存调控按比例溢出，跳过最近访问的条目
+        for key in (3, 4):
+            _age(store, key, 120)
+        assert store.shrink(1.0) == 2
+        assert list(store) == [1]
+
+    @pytest.mark.database
+    async def test_installed_on_application(self, session_db):
+        application = Application.builder().token('123:TEST').build()
+        session_store.install(application, max_entries=10, idle_ttl=600)
+        store = application._user_data
+        assert isinstance(store, BoundedDataStore)
+
+        application.user_data[7]['search_mode'] = 'title'
+        _age(store, 7, 700)
+        assert await session_store.evict_and_flush() == {'user': 1, 'chat': 0}
+        assert 7 not in application.user_data
+
+        # 重启后从数据库建立溢出索引
+        session_store._stores.clear()
+        restarted = Application.builder().token('123:TEST').build()
+        session_store.install(restarted, max_entries=10, idle_ttl=600)
+        await session_store.load_spilled()
+        assert await restarted._user_data.restore(7) is True
+        assert restarted.user_data[7] == {'search_mode': 'title'}
+
+        restarted.drop_user_data(7)
+        await session_store.flush_all()
+        assert await _rows(session_db) == []
+        assert 'search_mode' not in restarted.user_data[7]
@@ -0,0 +1,81 @@
+"""
+SQL 语句分析测试
+"""
+import logging
+import pytest
+import aiosqlite
+
+from database.sql_profiler import ProfiledConnection, SqlProfiler, normalize_sql
+
+
+@pytest.fixture
+async def profiled(tmp_path):
+    conn = await aiosqlite.connect(str(tmp_path / 'profile.db'))
+    profiler = SqlProfiler(slow_threshold=10)
+    wrapped = ProfiledConnection(conn, profiler)
+    wrapped.row_factory = aiosqlite.Row
+    await conn.execute("CREATE TABLE posts (id INTEGER PRIMARY KEY, user_id INTEGER, title TEXT)")
+    try:
+        yield wrapped, profiler
+    finally:
+        await conn.close()
+
+
+class TestSqlProfiler:
+    """语句规范化、统计和慢查询计划测试"""
+
+    @pytest.mark.unit
+    def test_normalize_sql(self):
+        sql = """SELECT * FROM posts
+                 WHERE user_id = 42 AND title = 'it''s' AND id IN (?, ?, ?) LIMIT 10"""
+        assert normalize_sql(sql) == "SELECT * FROM posts WHERE user_id = ? AND title = ? AND id IN (?, ...) LIMIT ?"
+        assert normalize_sql("SELECT t1.id FROM t1") == "SELECT t1.id FROM t1"
+
+    @pytest.mark.database
+    async def test_statements_counted_across_cursor_styles(self, profiled):
+        conn, profiler = profiled
+        cursor = await conn.executemany(
+            "INSERT INTO posts (user_id, title) VALUES (?, ?)", [(1, 'a'), (1, 'b'), (2, 'c')]
+        )
+        assert cursor.rowcount == 3
+
+        for user_id in (1, 2):
+            cursor = await conn.execute("SELECT * FROM posts WHERE user_id = ?", (user_id,))
+            rows = await cursor.fetchall()
+        assert rows[0]['title'] == 'c'
+
+        async with conn.execute("SELECT * FROM posts WHERE user_id = ?", (1,)) as cursor:
+            titles = [row['title'] async for row in cursor]
+        assert titles == ['a', 'b']
+
+        c = await conn.cursor()
+        await c.execute("SELECT COUNT(*) FROM posts")
+        assert (await c.fetchone())[0] == 3
+
+        stats = {row['sql']: row for row in profiler.top(10, 'calls')}
+        select = stats["SELECT * FROM posts WHERE user_id = ?"]
+        assert select['calls'] == 3
+        assert select['rows'] == 5
+        assert select['total'] > 0
+        assert select['p99'] <= select['max']
+        assert stats["INSERT INTO posts (user_id, title) VALUES (?, ...)"]['calls'] == 1
+        assert stats["SELECT COUNT(*) FROM posts"]['rows'] == 1
+
+    @pytest.mark.database
+    async def test_slow_query_logged_with_plan(self, profiled, caplog):
+        conn, profiler = profiled
+        profiler.slow_threshold = 0
+        with caplog.at_level(logging.WARNING, logger='database.sql_profiler'):
+            cursor = await conn.execute("SELECT title FROM posts WHERE title = ?", ('x',))
+            await cursor.fetchall()
+
+        messages = [r.getMessage() for r in caplog.records if '慢查询' in r.getMessage()]
+        assert len(messages) == 1
+        assert 'SELECT title FROM posts WHERE title = ?' in messages[0]
+        assert 'SCAN posts' in messages[0]
+        stat = profiler.top(1, 'slow')[0]
+        assert stat['slow'] == 1
+        assert 'SCAN posts' in stat['plan']
+
+        profiler.reset()
+        assert profiler.top() == []
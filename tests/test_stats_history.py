@@ -0,0 +1,174 @@
+"""
+帖子统计时间序列测试
+"""
+import os
+import pytest
+import aiosqlite
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from database import stats_history
+
+
+NOW = 1_700_000_000
+
+
+@pytest.fixture
+async def history_db(temp_dir):
+    """创建包含统计时间序列表的临时数据库"""
+    db_path = os.path.join(temp_dir, 'history.db')
+    with patch('database.db_manager.DB_PATH', db_path):
+        from database.db_manager import init_db
+        await init_db()
+    conn = await aiosqlite.connect(db_path)
+    conn.row_factory = aiosqlite.Row
+    yield conn
+    await conn.close()
+
+
+async def _insert_post(conn, message_id, publish_time=NOW - 3600, is_deleted=0):
+    await conn.execute(
+        "INSERT INTO published_posts (message_id, user_id, title, publish_time, is_deleted) VALUES (?, ?, ?, ?, ?)",
+        (message_id, 1, f"post {message_id}", publish_time, is_deleted)
+    )
+
+
+class TestStatsHistory:
+    """时间序列存储与速度计算测试"""
+
+    @pytest.mark.database
+    @pytest.mark.unit
+    async def test_record_and_velocity(self, history_db):
+        """两次采样之间的浏览增量换算为每小时速度"""
+        await stats_history.record_samples(history_db, [(1, 100, 0, 0)], ts=NOW - 7200)
+        await stats_history.record_samples(history_db, [(1, 300, 1, 0)], ts=NOW)
+
+        velocities = await stats_history.get_view_velocity(history_db, [1], now=NOW)
+
+        assert velocities[1] == pytest.approx(100.0)
+
+    @pytest.mark.database
+    @pytest.mark.unit
+    async def test_velocity_requires_two_samples(self, history_db):
+        """窗口内只有一条样本时不返回速度"""
+        await stats_history.record_samples(history_db, [(2, 100, 0, 0)], ts=NOW)
+
+        assert await stats_history.get_view_velocity(history_db, [2], now=NOW) == {}
+        assert await stats_history.get_view_velocity(history_db, [], now=NOW) == {}
+
+    @pytest.mark.database
+    @pytest.mark.unit
+    async def test_downsample_keeps_last_sample_per_day(self, history_db):
+        """超过原始保留期的样本每天只保留最后一条，超过保留期的样本被删除"""
+        day_start = (NOW - 5 * 86400) // 86400 * 86400
+        old_samples = [day_start + 3600 * h for h in (1, 5, 9)]
+        for ts in old_samples:
+            await stats_history.record_samples(history_db, [(3, ts % 1000, 0, 0)], ts=ts)
+        await stats_history.record_samples(history_db, [(3, 1, 0, 0)], ts=NOW - 40 * 86400)
+        await stats_history.record_samples(history_db, [(3, 2, 0, 0)], ts=NOW - 3600)
+        await stats_history.record_samples(history_db, [(3, 3, 0, 0)], ts=NOW - 1800)
+
+        removed = await stats_history.downsample_history(history_db, now=NOW)
+
+        cursor = await history_db.execute("SELECT ts FROM post_stats_history WHERE message_id = 3 ORDER BY ts")
+        remaining = [row[0] for row in await cursor.fetchall()]
+        assert removed == 3
+        assert remaining == [old_samples[-1], NOW - 3600, NOW - 1800]
+
+    @pytest.mark.database
+    @pytest.mark.unit
+    async def test_rising_posts_excludes_deleted(self, history_db):
+        """上升榜按速度排序并过滤已删除帖子"""
+        await _insert_post(history_db, 10)
+        await _insert_post(history_db, 11)
+        await _insert_post(history_db, 12, is_deleted=1)
+        await stats_history.record_samples(history_db, [(10, 0, 0, 0), (11, 0, 0, 0), (12, 0, 0, 0)], ts=NOW - 3600)
+        await stats_history.record_samples(history_db, [(10, 50, 0, 0), (11, 500, 0, 0), (12, 900, 0, 0)], ts=NOW)
+
+        rows = await stats_history.get_rising_posts(history_db, limit=5, now=NOW)
+
+        assert [row['message_id'] for row in rows] == [11, 10]
+        assert rows[0]['velocity'] == pytest.approx(500.0)
+
+
+class TestStatsRefreshPlan:
+    """基于浏览速度的刷新调度测试"""
+
+    @pytest.mark.unit
+    def test_plan_skips_cold_posts_and_orders_by_velocity(self):
+        from handlers.stats_handlers import plan_stats_refresh
+
+        posts = [
+            # 新帖子：速度为 0 也要刷新
+            {'message_id': 1, 'publish_time': NOW - 3600, 'last_update': NOW - 600},
+            # 老帖子且刚刷新过、速度很低：跳过
+            {'message_id': 2, 'publish_time': NOW - 10 * 86400, 'last_update': NOW - 3600},
+            # 老帖子但很久没刷新：刷新
+            {'message_id': 3, 'publish_time': NOW - 10 * 86400, 'last_update': NOW - 86400},
+            # 老帖子但仍在快速上升：优先刷新
+            {'message_id': 4, 'publish_time': NOW - 10 * 86400, 'last_update': NOW - 3600},
+        ]
+        velocities = {4: 50.0, 2: 0.2}
+
+        planned = plan_stats_refresh(posts, velocities, now=NOW)
+
+        assert [p['message_id'] for p in planned] == [4, 1, 3]
+
+
+class TestStatsJobCheckpoint:
+    """统计任务分批提交与断点续跑测试"""
+
+    @pytest.mark.database
+    @pytest.mark.unit
+    async def test_interrupted_run_resumes_from_checkpoint(self, temp_dir):
+        from datetime import datetime
+        from handlers import stats_handlers
+
+        db_path = os.path.join(temp_dir, 'stats_job.db')
+        now = datetime.now().timestamp()
+        probed = []
+
+        async def crash_on_third(context, post, related_ids):
+            probed.append(post['message_id'])
+            if len(probed) == 3:
+                raise RuntimeError("进程退出")
+            return (100, 2, 3, 9.5)
+
+        async def probe(context, post, related_ids):
+            probed.append(post['message_id'])
+            return stats_handlers.POST_DELETED if post['message_id'] == 5 else (100, 2, 3, 9.5)
+
+        with patch('database.db_manager.DB_PATH', db_path), \
+                patch.object(stats_handlers, 'STATS_COMMIT_BATCH', 2), \
+                patch.object(stats_handlers, 'pace', new_callable=AsyncMock):
+            from database.db_manager import init_db
+            await init_db()
+            async with aiosqlite.connect(db_path) as conn:
+                for mid in range(1, 6):
+                    await _insert_post(conn, mid, publish_time=now - 3600)
+                await conn.commit()
+
+            with patch.object(stats_handlers, '_probe_post', crash_on_third):
+                await stats_handlers.update_post_stats(MagicMock())
+
+            # 第一批（2 个帖子）已连同断点提交
+            async with aiosqlite.connect(db_path) as conn:
+                cursor = await conn.execute("SELECT message_id FROM published_posts WHERE views = 100 ORDER BY message_id")
+                assert [row[0] for row in await cursor.fetchall()] == [1, 2]
+                cursor = await conn.execute("SELECT position FROM job_checkpoints WHERE name = 'update_post_stats'")
+                assert (await cursor.fetchone())[0] == 2
+
+            probed.clear()
+            with patch.object(stats_handlers, '_probe_post', probe):
+                await stats_handlers.update_post_stats(MagicMock())
+
+        # 续跑只探测上一轮未提交的帖子，完成后删除断点
+        assert probed == [3, 4, 5]
+        async with aiosqlite.connect(db_path) as conn:
+            cursor = await conn.execute("SELECT COUNT(*) FROM published_posts WHERE views = 100")
+            assert (await cursor.fetchone())[0] == 4
+            cursor = await conn.execute("SELECT is_deleted FROM published_posts WHERE message_id = 5")
+            assert (await cursor.fetchone())[0] == 1
+            cursor = await conn.execute("SELECT COUNT(DISTINCT message_id) FROM post_stats_history")
+            assert (await cursor.fetchone())[0] == 4
+            cursor = await conn.execute("SELECT COUNT(*) FROM job_checkpoints")
+            assert (await cursor.fetchone())[0] == 0
@@ -0,0 +1,141 @@
+"""
+链路追踪测试
+"""
+import asyncio
+import json
+import logging
+import time
+import pytest
+from unittest.mock import patch
+
+from telegram.ext import CommandHandler, ConversationHandler, MessageHandler, filters
+
+from utils import tracing
+
+
+class _CollectingExporter:
+    def __init__(self):
+        self.records = []
+
+    def export(self, record):
+        self.records.append(record)
+
+
+@pytest.fixture
+def exporter():
+    collecting = _CollectingExporter()
+    with patch.object(tracing, '_exporter', collecting), patch.object(tracing, 'TRACING_ENABLED', True):
+        yield collecting
+
+
+class TestTracing:
+    """trace/span 记录与导出测试"""
+
+    @pytest.mark.unit
+    async def test_nested_spans_and_sampling(self, exporter):
+        @tracing.traced('work')
+        async def work():
+            with tracing.span('db'):
+                await asyncio.sleep(0)
+
+        with patch.object(tracing, 'TRACE_SAMPLE_RATE', 1.0):
+            with tracing.trace('update', handler='/search'):
+                await work()
+                with pytest.raises(ValueError):
+                    with tracing.span('api.sendMessage'):
+                        raise ValueError('bad')
+        with patch.object(tracing, 'TRACE_SAMPLE_RATE', 0.0):
+            with tracing.trace('update'):
+                pass
+
+        assert len(exporter.records) == 1
+        record = exporter.records[0]
+        spans = {span['name']: span for span in record['spans']}
+        assert record['attrs'] == {'handler': '/search'}
+        assert spans['work']['parent'] == 0
+        assert spans['db']['parent'] == spans['work']['id']
+        assert spans['api.sendMessage']['error'] == 'ValueError: bad'
+        assert tracing.current_trace_id() is None
+
+    @pytest.mark.unit
+    def test_slow_traces_always_exported_and_spans_capped(self, exporter):
+        with patch.object(tracing, 'TRACE_SAMPLE_RATE', 0.0), patch.object(tracing, 'TRACE_SLOW_THRESHOLD', 0.0):
+            with tracing.trace('job'):
+                for _ in range(tracing.MAX_SPANS + 10):
+                    with tracing.span('loop'):
+                        pass
+
+        record = exporter.records[0]
+        assert len(record['spans']) == tracing.MAX_SPANS - 1
+        assert record['dropped_spans'] == 11
+
+    @pytest.mark.unit
+    def test_spans_outside_trace_are_ignored(self, exporter):
+        with tracing.span('db'):
+            assert tracing.current_trace_id() is None
+        assert exporter.records == []
+
+    @pytest.mark.unit
+    def test_log_records_carry_trace_id(self, exporter):
+        record = logging.LogRecord('t', logging.INFO, __file__, 1, 'msg', None, None)
+        log_filter = tracing.TraceIdFilter()
+        log_filter.filter(record)
+        assert record.trace_id == '-'
+        with tracing.trace('update'):
+            log_filter.filter(record)
+            assert record.trace_id == tracing.current_trace_id()
+
+    @pytest.mark.unit
+    async def test_handler_callbacks_wrapped_including_conversations(self, exporter):
+        async def start(update, context):
+            return 1
+
+        async def on_text(update, context):
+            return ConversationHandler.END
+
+        conversation = ConversationHandler(
+            entry_points=[CommandHandler('start', start)],
+            states={1: [MessageHandler(filters.TEXT, on_text)]},
+            fallbacks=[],
+        )
+        tracing.wrap_handler_callbacks(conversation)
+        tracing.wrap_handler_callbacks(conversation)
+
+        with patch.object(tracing, 'TRACE_SAMPLE_RATE', 1.0):
+            with tracing.trace('update'):
+                await conversation.states[1][0].callback(None, None)
+        assert [span['name'] for span in exporter.records[0]['spans']] == ['handler.on_text']
+
+
+class TestFileExporter:
+    """JSONL 导出和分析工具测试"""
+
+    @pytest.mark.unit
+    def test_export_rotates_and_analyzer_reads_both_files(self, tmp_path):
+        import analyze_traces
+
+        path = str(tmp_path / 'traces.jsonl')
+        file_exporter = tracing._FileExporter(path, max_bytes=1)
+        with patch.object(tracing, '_exporter', file_exporter), \
+                patch.object(tracing, 'TRACING_ENABLED', True), \
+                patch.object(tracing, 'TRACE_SAMPLE_RATE', 1.0):
+            for name in ('first', 'second'):
+                with tracing.trace('update', handler=name):
+                    with tracing.span('db'):
+                        pass
+                    with tracing.span('search'):
+                        pass
+        deadline = time.monotonic() + 5
+        while file_exporter.exported < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        traces = analyze_traces.load_traces(path)
+        assert sorted(t['attrs']['handler'] for t in traces) == ['first', 'second']
+        with open(path + '.1', encoding='utf-8') as f:
+            assert json.loads(f.readline())['attrs']['handler'] == 'first'
+
+        own = analyze_traces.self_times(traces[0])
+        assert own[-1] <= traces[0]['duration_ms']
+        names = [row[0] for row in analyze_traces.summarize(traces)]
+        assert sorted(names) == ['db', 'search']
+        assert any('├ db' in line for line in analyze_traces.format_trace(traces[0]))
@@ -0,0 +1,126 @@
+"""
+按用户有序的并发更新处理测试
+"""
+import asyncio
+import pytest
+
+from telegram import CallbackQuery, Update, User
+
+from utils.update_processor import OrderedUpdateProcessor, partition_key
+
+
+def _update(update_id, user_id):
+    query = CallbackQuery(id=str(update_id), from_user=User(user_id, f'u{user_id}', False), chat_instance='c')
+    return Update(update_id, callback_query=query)
+
+
+class TestOrderedUpdateProcessor:
+    """分区顺序、并发和统计测试"""
+
+    @pytest.mark.unit
+    def test_partition_key(self):
+        assert partition_key(_update(1, 42)) == 42
+        assert partition_key(Update(2)) is None
+        assert partition_key(object()) is None
+
+    @pytest.mark.unit
+    async def test_same_user_serial_other_users_concurrent(self):
+        processor = OrderedUpdateProcessor(2)
+        events = []
+        release = asyncio.Event()
+
+        async def handle(name, wait=False):
+            events.append(f'start {name}')
+            if wait:
+                await release.wait()
+            events.append(f'end {name}')
+
+        # 用户 1 的第一个更新阻塞；它之后的两个更新排队，不占用并发名额
+        tasks = [
+            asyncio.create_task(processor.process_update(_update(1, 1), handle('a1', wait=True))),
+            asyncio.create_task(processor.process_update(_update(2, 1), handle('a2'))),
+            asyncio.create_task(processor.process_update(_update(3, 1), handle('a3'))),
+            asyncio.create_task(processor.process_update(_update(4, 2), handle('b1'))),
+        ]
+        await asyncio.sleep(0.01)
+        assert events == ['start a1', 'start b1', 'end b1']
+
+        stats = processor.get_stats()
+        assert (stats['in_flight'], stats['active_partitions'], stats['queued']) == (1, 1, 2)
+        assert stats['busiest'][0]['key'] == 1
+        assert stats['busiest'][0]['queued'] == 2
+
+        release.set()
+        await asyncio.gather(*tasks)
+        assert events[3:] == ['end a1', 'start a2', 'end a2', 'start a3', 'end a3']
+
+        stats = processor.get_stats()
+        assert (stats['processed'], stats['queued'], stats['active_partitions']) == (4, 0, 0)
+        assert stats['wait_max'] > 0
+
+    @pytest.mark.unit
+    async def test_error_does_not_stop_partition(self):
+        processor = OrderedUpdateProcessor(4)
+        done = []
+        gate = asyncio.Event()
+
+        async def fail():
+            await gate.wait()
+            raise RuntimeError('boom')
+
+        async def ok():
+            done.append('ok')
+
+        first = asyncio.create_task(processor.process_update(_update(1, 7), fail()))
+        await asyncio.sleep(0)
+        await processor.process_update(_update(2, 7), ok())
+        gate.set()
+        await first
+        assert done == ['ok']
+
+    @pytest.mark.unit
+    async def test_shutdown_drops_queued_updates(self):
+        processor = OrderedUpdateProcessor(4)
+        gate = asyncio.Event()
+        ran = []
+
+        async def handle(name):
+            await gate.wait()
+            ran.append(name)
+
+        first = asyncio.create_task(processor.process_update(_update(1, 5), handle('first')))
+        await asyncio.sleep(0)
+        await processor.process_update(_update(2, 5), handle('second'))
+        await processor.shutdown()
+        gate.set()
+        await first
+        assert ran == ['first']
+
+    @pytest.mark.unit
+    async def test_pending_updates_are_capped(self):
+        processor = OrderedUpdateProcessor(4, max_pending_updates=4)
+        release = asyncio.Event()
+        started = []
+
+        async def handle(name):
+            started.append(name)
+            await release.wait()
+
+        # 同一用户连续发来 6 个更新：1 个处理中、3 个排队后达到上限，其余等待名额
+        tasks = [
+            asyncio.create_task(processor.process_update(_update(i, 1), handle(f'a{i}')))
+            for i in range(1, 7)
+        ]
+        await asyncio.sleep(0.01)
+        stats = processor.get_stats()
+        assert (stats['pending'], stats['queued'], stats['blocked']) == (4, 3, 2)
+        assert processor.is_saturated()
+        assert started == ['a1']
+
+        release.set()
+        await asyncio.gather(*tasks)
+        # 等待名额的更新仍按到达顺序处理
+        assert started == [f'a{i}' for i in range(1, 7)]
+        stats = processor.get_stats()
+        assert (stats['pending'], stats['blocked'], stats['processed']) == (0, 0, 6)
+        assert not processor.is_saturated()
@@ -0,0 +1,128 @@
+"""
+用户投稿聚合统计测试
+"""
+import os
+import pytest
+import aiosqlite
+from unittest.mock import patch
+
+from database import user_stats
+
+
+@pytest.fixture
+async def stats_db(temp_dir):
+    """创建已初始化的临时数据库"""
+    db_path = os.path.join(temp_dir, 'user_stats.db')
+    with patch('database.db_manager.DB_PATH', db_path):
+        from database.db_manager import init_db
+        await init_db()
+    conn = await aiosqlite.connect(db_path)
+    conn.row_factory = aiosqlite.Row
+    yield conn
+    await conn.close()
+
+
+async def _insert(conn, message_id, user_id, views=0, heat=0.0, is_deleted=0):
+    await conn.execute(
+        "INSERT INTO published_posts (message_id, user_id, title, publish_time, views, forwards, reactions, heat_score, is_deleted) "
+        "VALUES (?, ?, ?, 0, ?, 1, 2, ?, ?)",
+        (message_id, user_id, f"post {message_id}", views, heat, is_deleted)
+    )
+
+
+async def _snapshot(conn):
+    cursor = await conn.execute(
+        "SELECT user_id, post_count, total_views, total_forwards, total_reactions, hottest_message_id, hottest_heat "
+        "FROM user_post_stats ORDER BY user_id"
+    )
+    return [tuple(row) for row in await cursor.fetchall()]
+
+
+async def _assert_matches_rebuild(conn):
+    """触发器维护的结果应与全量重算一致"""
+    incremental = await _snapshot(conn)
+    await user_stats.rebuild(conn)
+    assert incremental == await _snapshot(conn)
+    return incremental
+
+
+class TestUserStats:
+    """聚合表增量维护测试"""
+
+    @pytest.mark.database
+    @pytest.mark.unit
+    async def test_insert_accumulates(self, stats_db):
+        await _insert(stats_db, 1, 100, views=10, heat=5.0)
+        await _insert(stats_db, 2, 100, views=20, heat=8.0)
+        await _insert(stats_db, 3, 200, views=7, heat=1.0, is_deleted=1)
+
+        rows = await _assert_matches_rebuild(stats_db)
+
+        assert rows == [(100, 2, 30, 2, 4, 2, 8.0)]
+        stats = await user_stats.get_user_stats(stats_db, 100)
+        assert stats['hottest_title'] == "post 2"
+        assert await user_stats.get_user_stats(stats_db, 200) is None
+
+    @pytest.mark.database
+    @pytest.mark.unit
+    async def test_stats_update_and_hottest_decay(self, stats_db):
+        """最热帖子热度下降后重新查找最热帖子"""
+        await _insert(stats_db, 1, 100, views=10, heat=5.0)
+        await _insert(stats_db, 2, 100, views=20, heat=8.0)
+
+        await stats_db.execute("UPDATE published_posts SET views = 50, heat_score = 2.0 WHERE message_id = 2")
+
+        rows = await _assert_matches_rebuild(stats_db)
+        assert rows == [(100, 2, 60, 2, 4, 1, 5.0)]
+
+    @pytest.mark.database
+    @pytest.mark.unit
+    async def test_soft_and_hard_delete(self, stats_db):
+        await _insert(stats_db, 1, 100, views=10, heat=5.0)
+        await _insert(stats_db, 2, 100, views=20, heat=8.0)
+        await _insert(stats_db, 3, 200, views=1, heat=1.0)
+
+        await stats_db.execute("UPDATE published_posts SET is_deleted = 1 WHERE message_id = 2")
+        assert await _assert_matches_rebuild(stats_db) == [(100, 1, 10, 1, 2, 1, 5.0), (200, 1, 1, 1, 2, 3, 1.0)]
+
+        await stats_db.execute("DELETE FROM published_posts WHERE message_id = 3")
+        assert await _assert_matches_rebuild(stats_db) == [(100, 1, 10, 1, 2, 1, 5.0)]
+
+        # 恢复已删除的帖子
+        await stats_db.execute("UPDATE published_posts SET is_deleted = 0 WHERE message_id = 2")
+        assert await _assert_matches_rebuild(stats_db) == [(100, 2, 30, 2, 4, 2, 8.0)]
+
+    @pytest.mark.database
+    @pytest.mark.unit
+    async def test_user_change_moves_contribution(self, stats_db):
+        await _insert(stats_db, 1, 100, views=10, heat=5.0)
+        await _insert(stats_db, 2, 100, views=20, heat=8.0)
+
+        await stats_db.execute("UPDATE published_posts SET user_id = 300 WHERE message_id = 2")
+
+        assert await _assert_matches_rebuild(stats_db) == [(100, 1, 10, 1, 2, 1, 5.0), (300, 1, 20, 1, 2, 2, 8.0)]
+
+    @pytest.mark.database
+    @pytest.mark.unit
+    async def test_backfill_on_first_init(self, temp_dir):
+        """已有数据的数据库首次创建聚合表时在后台回填"""
+        db_path = os.path.join(temp_dir, 'legacy.db')
+        from database.db_manager import init_db
+        from database.migrations import run_backfills
+        with patch('database.db_manager.DB_PATH', db_path):
+            await init_db()
+            # 模拟升级前的数据库：没有聚合表和触发器，schema 版本停在聚合表迁移之前
+            async with aiosqlite.connect(db_path) as conn:
+                await conn.execute("DROP TABLE user_post_stats")
+                for name in ('trg_user_stats_insert', 'trg_user_stats_update', 'trg_user_stats_delete'):
+                    await conn.execute(f"DROP TRIGGER {name}")
+                await conn.execute("DELETE FROM schema_version WHERE version >= 4")
+                await conn.execute("INSERT INTO published_posts (message_id, user_id, views, heat_score) VALUES (1, 100, 5, 3.0)")
+                await conn.execute("INSERT INTO published_posts (message_id, user_id, views, heat_score) VALUES (2, 200, 7, 1.0)")
+                await conn.commit()
+
+            assert await init_db() is True
+            await run_backfills(batch_size=1, pause=0)
+
+        async with aiosqlite.connect(db_path) as conn:
+            assert await _snapshot(conn) == [(100, 1, 5, 0, 0, 1, 3.0), (200, 1, 7, 0, 0, 2, 1.0)]
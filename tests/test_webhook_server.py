@@ -0,0 +1,131 @@
+"""
+Webhook 接收路径测试
+"""
+import asyncio
+import json
+import pytest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from aiohttp.test_utils import TestClient, TestServer
+from aiohttp import web
+
+from utils import webhook_server
+from utils.update_processor import OrderedUpdateProcessor
+from utils.webhook_server import WebhookServer
+
+SECRET = 'secret-token'
+
+
+def _body(update_id):
+    return json.dumps({
+        'update_id': update_id,
+        'channel_post': {
+            'message_id': 10, 'date': 1700000000, 'text': 'hello',
+            'chat': {'id': -1001, 'type': 'channel', 'title': 'c'},
+        },
+    })
+
+
+@pytest.fixture
+async def webhook():
+    """启动转发协程的 Webhook 服务器和测试客户端"""
+    application = SimpleNamespace(bot=None, update_queue=asyncio.Queue())
+    server = WebhookServer(application, port=0, path='/webhook', secret_token=SECRET, max_queue=2)
+    app = web.Application()
+    app.router.add_post('/webhook', server.webhook_handler)
+    server._forwarder = asyncio.create_task(server._forward_updates())
+    client = TestClient(TestServer(app))
+    await client.start_server()
+    try:
+        yield server, client
+    finally:
+        await client.close()
+        server._forwarder.cancel()
+
+
+async def _post(client, body, token=SECRET):
+    return await client.post('/webhook', data=body, headers={webhook_server.SECRET_TOKEN_HEADER: token})
+
+
+class TestWebhookIngest:
+    """校验、去重、背压测试"""
+
+    @pytest.mark.unit
+    async def test_update_is_forwarded_and_duplicates_dropped(self, webhook):
+        server, client = webhook
+        assert (await _post(client, _body(1))).status == 200
+        # Telegram 重新投递同一更新
+        assert (await _post(client, _body(1))).status == 200
+        await server._queue.join()
+
+        update = server.application.update_queue.get_nowait()
+        assert update.update_id == 1
+        assert update.channel_post.text == 'hello'
+        assert server.application.update_queue.empty()
+        stats = server.get_stats()
+        assert (stats['accepted'], stats['duplicates']) == (1, 1)
+
+    @pytest.mark.unit
+    async def test_rejects_bad_token_and_invalid_body(self, webhook):
+        server, client = webhook
+        assert (await _post(client, _body(1), token='wrong')).status == 401
+        assert (await _post(client, _body(1), token='')).status == 401
+        assert (await _post(client, 'not json')).status == 400
+        assert (await _post(client, '{"message": {}}')).status == 400
+        stats = server.get_stats()
+        assert (stats['unauthorized'], stats['invalid'], stats['accepted']) == (2, 2, 0)
+
+    @pytest.mark.unit
+    async def test_returns_503_when_saturated(self, webhook):
+        server, client = webhook
+        # Application 处理不过来：更新队列达到上限
+        await server.application.update_queue.put(object())
+        await server.application.update_queue.put(object())
+
+        response = await _post(client, _body(5))
+        assert response.status == 503
+        assert response.headers['Retry-After'] == '1'
+        assert server.get_stats()['rejected'] == 1
+
+        # 被拒绝的更新没有记入去重窗口，Telegram 重新投递时可以正常接收
+        server.application.update_queue.get_nowait()
+        server.application.update_queue.get_nowait()
+        assert (await _post(client, _body(5))).status == 200
+
+    @pytest.mark.unit
+    async def test_returns_503_when_processor_saturated(self, webhook):
+        server, client = webhook
+        processor = OrderedUpdateProcessor(2, max_pending_updates=2)
+        server.application.update_processor = processor
+        with patch.object(processor, 'is_saturated', return_value=True):
+            assert (await _post(client, _body(6))).status == 503
+        assert (await _post(client, _body(6))).status == 200
+
+    @pytest.mark.unit
+    async def test_queue_filled_while_reading_body_returns_503(self, webhook):
+        server, client = webhook
+        server._forwarder.cancel()
+        # 饱和检查通过后、读取请求体期间并发请求占满了接收队列
+        server._queue.put_nowait({'update_id': 1})
+        server._queue.put_nowait({'update_id': 2})
+        with patch.object(server, '_saturated', return_value=False):
+            assert (await _post(client, _body(7))).status == 503
+        assert 7 not in server._recent_set
+        assert server.get_stats()['rejected'] == 1
+
+        # 重新投递时正常接收，不会被当作重复更新丢弃
+        server._queue.get_nowait()
+        assert (await _post(client, _body(7))).status == 200
+        assert server.get_stats()['accepted'] == 1
+
+    @pytest.mark.unit
+    def test_dedup_window_is_bounded(self):
+        server = WebhookServer(SimpleNamespace(bot=None, update_queue=asyncio.Queue()), 0, '/w', SECRET)
+        with patch.object(webhook_server, 'DEDUP_WINDOW', 3):
+            server._recent_ids = webhook_server.deque(maxlen=3)
+            for update_id in range(4):
+                server._remember(update_id)
+            # 最早的 update_id 已移出窗口
+            assert server._recent_set == {1, 2, 3}
+            assert list(server._recent_ids) == [1, 2, 3]
@@ -2,14 +2,25 @@
 轻量级 TTL 缓存，用于减少重复计算/数据库访问。
 """
 import time
-from typing import Any, Callable, Tuple
+from typing import Any, Callable, Optional, Tuple
+
+from utils import memory_governor, metrics
+
+CACHE_REQUESTS = metrics.counter('telesubmit_cache_requests_total', '缓存读取次数，按缓存和命中结果', ('cache', 'result'))
 
 
 class TTLCache:
-    def __init__(self, default_ttl: int = 60, max_size: int = 256) -> None:
+    def __init__(self, default_ttl: int = 60, max_size: int = 256, name: Optional[str] = None) -> None:
         self.default_ttl = default_ttl
         self.max_size = max_size
         self._store: dict[str, Tuple[float, Any]] = {}
+        # 指定名称时记录命中率指标，并登记到内存调控（内存紧张时淘汰）
+        if name:
+            self._hit = CACHE_REQUESTS.labels(name, 'hit')
+            self._miss = CACHE_REQUESTS.labels(name, 'miss')
+            memory_governor.register(f"cache:{name}", self)
+        else:
+            self._hit = self._miss = None
 
     def _evict_if_needed(self) -> None:
         if len(self._store) <= self.max_size:
@@ -21,6 +32,12 @@ class TTLCache:
             self._store.pop(k, None)
 
     def get(self, key: str) -> Any | None:
+        value = self._get(key)
+        if self._hit is not None:
+            (self._miss if value is None else self._hit).inc()
+        return value
+
+    def _get(self, key: str) -> Any | None:
         item = self._store.get(key)
         if not item:
             return None
@@ -35,6 +52,29 @@ class TTLCache:
         self._store[key] = (expire_at, value)
         self._evict_if_needed()
 
+    def delete(self, key: str) -> None:
+        self._store.pop(key, None)
+
+    def clear(self) -> None:
+        self._store.clear()
+
+    def memory_size(self) -> int:
+        return len(self._store)
+
+    def shrink(self, fraction: float) -> int:
+        """淘汰已过期的条目，再按过期时间从早到晚淘汰 fraction 比例的条目，返回淘汰条数"""
+        before = len(self._store)
+        now = time.time()
+        for k in [k for k, (expire_at, _) in self._store.items() if expire_at < now]:
+            self._store.pop(k, None)
+        drop = int(len(self._store) * fraction + 0.5)
+        if drop >= len(self._store):
+            self._store.clear()
+        elif drop:
+            for k, _ in sorted(self._store.items(), key=lambda kv: kv[1][0])[:drop]:
+                self._store.pop(k, None)
+        return before - len(self._store)
+
     def cached(self, key_builder: Callable[..., str], ttl: int | None = None):
         def decorator(func):
             def wrapper(*args, **kwargs):
@@ -8,6 +8,7 @@ import logging
 from functools import lru_cache, wraps
 from datetime import datetime
 from telegram import Update, ReplyKeyboardRemove
+from telegram.error import RetryAfter
 from telegram.ext import ConversationHandler, CallbackContext
 
 from config.settings import ALLOWED_TAGS, NET_TIMEOUT, SHOW_SUBMITTER
@@ -404,6 +405,11 @@ async def enhanced_safe_send(send_func, *args, **kwargs):
             else:
                 logger.warning(f"发送失败: {last_error}")
         
+        except RetryAfter as e:
+            # 限流由全局限流器集中处理（暂停并重试），到这里说明重试次数已用完
+            logger.warning(f"发送失败，触发 Telegram 限流: {e}")
+            return None
+        
         except Exception as e:
             error_text = str(e).lower()
             
@@ -437,18 +443,6 @@ async def enhanced_safe_send(send_func, *args, **kwargs):
             # 处理请求错误
             elif "bad request" in error_text:
                 logger.error(f"无效请求错误: {e}")
-                # 检查是否需要重试
-                if "retry after" in error_text:
-                    # 提取需要等待的秒数
-                    import re
-                    retry_seconds = 1
-                    match = re.search(r"retry after (\d+)", error_text)
-                    if match:
-                        retry_seconds = int(match.group(1))
-                    
-                    logger.info(f"请求过于频繁，等待 {retry_seconds} 秒后重试")
-                    await asyncio.sleep(retry_seconds)
-                    continue
                 return None
             
             # 其他错误
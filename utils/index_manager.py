@@ -14,7 +14,7 @@ from typing import Optional
 from whoosh.writing import CLEAR
 
 from config.settings import DB_PATH
-from utils.search_engine import get_search_engine, PostDocument
+from utils.search_engine import get_search_engine, PostDocument, INDEX_WRITE_SECONDS
 
 logger = logging.getLogger(__name__)
 
@@ -74,10 +74,11 @@ class IndexManager:
             conn.row_factory = aiosqlite.Row
             
             cursor = await conn.execute('''
-                SELECT message_id, user_id, username, title, tags, link, 
-                       filename, caption, publish_time, views, heat_score
-                FROM published_posts
-                ORDER BY message_id
+                SELECT p.message_id, p.user_id, p.username, p.title, p.tags, c.link,
+                       p.filename, c.caption, p.publish_time, p.views, p.heat_score
+                FROM published_posts AS p
+                LEFT JOIN post_content AS c ON c.message_id = p.message_id
+                ORDER BY p.message_id
             ''')
             posts = await cursor.fetchall()
             await conn.close()
@@ -183,10 +184,11 @@ class IndexManager:
                 for message_id in to_add:
                     try:
                         cursor = await conn.execute('''
-                            SELECT message_id, user_id, username, title, tags, link, 
-                                   filename, caption, publish_time, views, heat_score
-                            FROM published_posts
-                            WHERE message_id = ?
+                            SELECT p.message_id, p.user_id, p.username, p.title, p.tags, c.link,
+                                   p.filename, c.caption, p.publish_time, p.views, p.heat_score
+                            FROM published_posts AS p
+                            LEFT JOIN post_content AS c ON c.message_id = p.message_id
+                            WHERE p.message_id = ?
                         ''', (int(message_id),))
                         post = await cursor.fetchone()
                         
@@ -312,8 +314,9 @@ class IndexManager:
             logger.info("开始优化索引...")
             
             # 执行优化（合并索引段）
-            writer = self.search_engine.ix.writer()
-            writer.commit(optimize=True)
+            with INDEX_WRITE_SECONDS.labels('optimize').time():
+                writer = self.search_engine.ix.writer()
+                writer.commit(optimize=True)
             
             result["success"] = True
             result["message"] = "索引优化完成"
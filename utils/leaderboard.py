@@ -0,0 +1,242 @@
+"""
+热门帖子排行榜模块
+
+为 day/week/month/all 四个时间窗口（以及"上升最快"榜）预先计算 top-K 排行，
+常驻内存；/hot 命令和筛选按钮直接读取内存中的排行和已渲染的消息页面，
+不再每次查询数据库、重新拼接 HTML。
+
+- 统计任务结束后整体重算（热度只在统计任务中变化）
+- 帖子被删除时就地剔除，不需要重算
+- 有新帖子入库时标记为过期，下一次 /hot 请求时惰性重算
+"""
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional, Set
+
+from database.db_manager import get_db
+from database import stats_history
+from database.post_content import CONTENT_COLUMNS
+from utils.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# 时间窗口（天），None 表示不限时间
+WINDOWS = {
+    'day': 1,
+    'week': 7,
+    'month': 30,
+    'all': None,
+}
+RISING_WINDOW = 'rising'
+
+# /hot 最多展示的帖子数
+MAX_LIMIT = 50
+# 每个排行榜保留的条目数：多留一些余量，删帖后无需立即重算
+BOARD_SIZE = MAX_LIMIT + 10
+# 已渲染页面的缓存时长（秒）：页面中包含"多久前"等相对时间，不宜长期缓存
+PAGE_TTL_SECONDS = 300
+
+# 渲染排行所需的字段，只保留这些字段以控制内存占用
+BOARD_FIELDS = (
+    'message_id', 'title', 'tags', 'note', 'views', 'forwards',
+    'reactions', 'heat_score', 'publish_time',
+)
+
+
+def _board_sql(windowed: bool) -> str:
+    """构建排行查询：按热度降序的未删除帖子，windowed 时只取 publish_time > ? 的帖子"""
+    # 简介（note）在 post_content 表中
+    columns = ', '.join(f'c.{field}' if field in CONTENT_COLUMNS else f'p.{field}' for field in BOARD_FIELDS)
+    window_filter = ' AND p.publish_time > ?' if windowed else ''
+    return (
+        f"SELECT {columns} FROM published_posts AS p "
+        "LEFT JOIN post_content AS c ON c.message_id = p.message_id "
+        f"WHERE p.is_deleted = 0{window_filter} ORDER BY p.heat_score DESC LIMIT ?"
+    )
+
+
+def _to_entry(row, with_velocity: bool = False) -> dict:
+    """把数据库行转换为排行条目"""
+    entry = {field: row[field] for field in BOARD_FIELDS}
+    if with_velocity:
+        entry['velocity'] = row['velocity']
+    return entry
+
+
+class HotLeaderboards:
+    """各时间窗口的热门帖子排行榜"""
+
+    def __init__(self, board_size: int = BOARD_SIZE, page_ttl: int = PAGE_TTL_SECONDS):
+        self.board_size = board_size
+        self._boards: Dict[str, List[dict]] = {}
+        self._pages = TTLCache(default_ttl=page_ttl, max_size=64, name='leaderboard_pages')
+        self._built_at: Optional[float] = None
+        self._stale = True
+        # invalidate() 的调用次数：重算期间有新帖子入库时，重算结果仍然过期
+        self._generation = 0
+        # 重算期间被删除的帖子，写入新排行前剔除
+        self._removed_during_rebuild: Optional[Set[int]] = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def built_at(self) -> Optional[float]:
+        """最近一次重算的时间戳"""
+        return self._built_at
+
+    @property
+    def is_stale(self) -> bool:
+        """排行是否需要重算"""
+        return self._stale
+
+    async def rebuild(self, now: Optional[float] = None):
+        """
+        从数据库重算全部排行榜
+
+        每个窗口一次 ORDER BY heat_score DESC LIMIT 查询，另加一次上升榜查询。
+        查询期间删除的帖子从结果中剔除；查询期间有新帖子入库时排行保持过期，下次读取时再次重算。
+
+        Args:
+            now: 当前时间戳，默认当前时间（便于测试）
+        """
+        now = now if now is not None else datetime.now().timestamp()
+
+        async with self._lock:
+            generation = self._generation
+            self._removed_during_rebuild = removed = set()
+            try:
+                boards = await self._query_boards(now)
+            finally:
+                self._removed_during_rebuild = None
+
+            if removed:
+                boards = {
+                    window: [entry for entry in board if entry['message_id'] not in removed]
+                    for window, board in boards.items()
+                }
+            self._boards = boards
+            self._built_at = now
+            self._stale = self._generation != generation
+            self._pages.clear()
+
+        logger.info(
+            "热门排行榜已重算: " + ', '.join(f"{name}={len(board)}" for name, board in boards.items())
+        )
+
+    async def _query_boards(self, now: float) -> Dict[str, List[dict]]:
+        """查询各时间窗口和上升榜的排行"""
+        boards: Dict[str, List[dict]] = {}
+        async with get_db() as conn:
+            for window, days in WINDOWS.items():
+                if days is None:
+                    cursor = await conn.execute(_board_sql(False), (self.board_size,))
+                else:
+                    cursor = await conn.execute(_board_sql(True), (now - days * 86400, self.board_size))
+                boards[window] = [_to_entry(row) for row in await cursor.fetchall()]
+
+            rising = await stats_history.get_rising_posts(conn, self.board_size, now=now)
+            boards[RISING_WINDOW] = [_to_entry(row, with_velocity=True) for row in rising]
+        return boards
+
+    def get(self, window: str, limit: int, now: Optional[float] = None) -> Optional[List[dict]]:
+        """
+        读取排行榜前 limit 条
+
+        排行在上次重算后可能有帖子滑出时间窗口，这里按当前时间再过滤一次；
+        如果过滤后不足 limit 条而排行本身是截断过的，说明可能漏掉了窗口内的帖子，返回 None。
+
+        Args:
+            window: 时间窗口（day/week/month/all/rising）
+            limit: 返回数量
+            now: 当前时间戳，默认当前时间
+
+        Returns:
+            Optional[List[dict]]: 排行条目；需要重算时返回 None
+        """
+        if self._stale:
+            return None
+        return self._read(window, limit, now)
+
+    def _read(self, window: str, limit: int, now: Optional[float] = None) -> Optional[List[dict]]:
+        if window not in self._boards:
+            return None
+        board = self._boards[window]
+
+        days = WINDOWS.get(window)
+        if days is not None:
+            now = now if now is not None else datetime.now().timestamp()
+            cutoff = now - days * 86400
+            entries = [entry for entry in board if entry['publish_time'] > cutoff]
+        else:
+            entries = board
+
+        if len(entries) < limit and len(board) >= self.board_size:
+            return None
+        return entries[:limit]
+
+    async def top(self, window: str, limit: int) -> List[dict]:
+        """
+        读取排行榜，必要时先从数据库重算
+
+        Args:
+            window: 时间窗口
+            limit: 返回数量
+
+        Returns:
+            List[dict]: 排行条目
+        """
+        entries = self.get(window, limit)
+        if entries is None:
+            await self.rebuild()
+            # 重算期间有新帖子入库时排行仍标记为过期，本次先使用刚重算的结果
+            entries = self._read(window, limit)
+        return entries or []
+
+    def remove_post(self, message_id: int) -> bool:
+        """
+        从所有排行榜中剔除帖子（帖子被删除时调用）
+
+        Args:
+            message_id: 帖子消息ID
+
+        Returns:
+            bool: 是否有排行榜包含该帖子
+        """
+        message_id = int(message_id)
+        if self._removed_during_rebuild is not None:
+            self._removed_during_rebuild.add(message_id)
+        removed = False
+        for window, board in self._boards.items():
+            kept = [entry for entry in board if entry['message_id'] != message_id]
+            if len(kept) != len(board):
+                self._boards[window] = kept
+                removed = True
+        if removed:
+            self._pages.clear()
+            logger.debug(f"已从热门排行榜中剔除帖子 {message_id}")
+        return removed
+
+    def invalidate(self):
+        """标记排行过期（有新帖子入库时调用），下一次读取时重算"""
+        self._generation += 1
+        self._stale = True
+        self._pages.clear()
+
+    def get_page(self, window: str, limit: int) -> Optional[str]:
+        """读取已渲染的排行消息"""
+        if self._stale:
+            return None
+        return self._pages.get(f"{window}:{limit}")
+
+    def set_page(self, window: str, limit: int, text: str):
+        """缓存已渲染的排行消息"""
+        self._pages.set(f"{window}:{limit}", text)
+
+
+# 全局排行榜实例
+_leaderboards = HotLeaderboards()
+
+
+def get_leaderboards() -> HotLeaderboards:
+    """获取全局热门排行榜实例"""
+    return _leaderboards
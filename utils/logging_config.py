@@ -71,8 +71,9 @@ def setup_logging():
     # 清理过期日志
     cleanup_old_logs(log_dir)
     
-    # 创建日志格式
-    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    # 创建日志格式（trace_id 由 TraceIdFilter 填充，不在更新处理中时为 -）
+    from utils.tracing import TraceIdFilter
+    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - [%(trace_id)s] %(message)s')
     
     # 配置根日志记录器
     root_logger = logging.getLogger()
@@ -110,8 +111,10 @@ def setup_logging():
     
     # 配置超时过滤器
     timeout_filter = TimeoutMessageFilter()
+    trace_id_filter = TraceIdFilter()
     for handler in root_logger.handlers:
         handler.addFilter(timeout_filter)
+        handler.addFilter(trace_id_filter)
     
     logger = logging.getLogger(__name__)
     logger.info("日志系统已初始化，日志文件保存在 %s 目录", os.path.abspath(log_dir))
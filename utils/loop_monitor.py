@@ -0,0 +1,200 @@
+"""
+事件循环延迟监控
+
+后台协程每隔 interval 秒醒来一次，实际醒来时间与预期时间之差即为调度延迟（loop lag）。
+看门狗线程在事件循环超过 threshold 秒没有醒来时抓取事件循环线程当前的调用栈，
+从内向外取第一个项目内的帧作为阻塞位置（例如 utils/database.py:57 get_user_state）。
+
+- 每次阻塞记录日志（同一位置只在第一次输出完整调用栈）和指标
+- 按阻塞位置汇总次数和总阻塞时间，/debug 显示阻塞最多的位置
+"""
+import asyncio
+import collections
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from typing import Any, Deque, Dict, Optional
+
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+LOOP_LAG_SECONDS = metrics.histogram(
+    'telesubmit_event_loop_lag_seconds', '事件循环调度延迟（秒）',
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+LOOP_STALLS = metrics.counter('telesubmit_event_loop_stalls_total', '事件循环阻塞次数', ('site',))
+LOOP_BLOCKED_SECONDS = metrics.counter(
+    'telesubmit_event_loop_blocked_seconds_total', '事件循环被阻塞的总时间（秒）', ('site',)
+)
+
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# 阻塞期间未采样到调用栈（阻塞时间接近阈值，看门狗还没来得及检查）
+UNKNOWN_SITE = 'unknown'
+# 保留的最近调度延迟样本数（用于 /debug 的平均值）
+RECENT_SAMPLES = 200
+
+
+def _is_project_frame(filename: str) -> bool:
+    return (filename.startswith(_PROJECT_ROOT)
+            and 'site-packages' not in filename
+            and os.path.abspath(filename) != os.path.abspath(__file__))
+
+
+def _blocking_site(stack: traceback.StackSummary) -> str:
+    """从内向外取第一个项目内的帧，没有时取最内层的帧"""
+    for frame in reversed(stack):
+        if _is_project_frame(frame.filename):
+            return f"{os.path.relpath(frame.filename, _PROJECT_ROOT)}:{frame.lineno} {frame.name}"
+    frame = stack[-1]
+    return f"{frame.filename}:{frame.lineno} {frame.name}"
+
+
+class LoopMonitor:
+    """
+    事件循环延迟监控
+
+    Args:
+        threshold: 调度延迟超过该秒数视为阻塞
+        interval: 心跳间隔（秒）
+        stack_limit: 日志中输出的调用栈帧数
+    """
+
+    def __init__(self, threshold: float = 0.1, interval: float = 0.05, stack_limit: int = 15):
+        self.threshold = threshold
+        self.interval = interval
+        self.stack_limit = stack_limit
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        self._loop_thread_id: Optional[int] = None
+        self._last_beat = time.monotonic()
+        self._pending = None  # 看门狗在本次阻塞中抓到的 (位置, 调用栈)
+        self._recent: Deque[float] = collections.deque(maxlen=RECENT_SAMPLES)
+        self._lag_max = 0.0
+        self._stalls = 0
+        self._blocked_seconds = 0.0
+        self._sites: Dict[str, Dict[str, Any]] = {}
+
+    def start(self):
+        """启动心跳协程和看门狗线程（在事件循环中调用）"""
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stopping.clear()
+        self._task = asyncio.get_running_loop().create_task(self._heartbeat())
+        self._watchdog = threading.Thread(target=self._watch, name='loop-watchdog', daemon=True)
+        self._watchdog.start()
+        logger.info(f"事件循环延迟监控已启动，阈值 {self.threshold * 1000:.0f} ms")
+
+    async def stop(self):
+        """停止监控"""
+        self._stopping.set()
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._watchdog:
+            self._watchdog.join(timeout=1)
+            self._watchdog = None
+
+    async def _heartbeat(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - expected)
+            with self._lock:
+                self._last_beat = now
+                pending, self._pending = self._pending, None
+            LOOP_LAG_SECONDS.observe(lag)
+            self._recent.append(lag)
+            self._lag_max = max(self._lag_max, lag)
+            if lag >= self.threshold:
+                self._record_stall(lag, pending)
+
+    def _watch(self):
+        """看门狗线程：事件循环超过阈值未醒来时抓取其调用栈（每次阻塞只抓一次）"""
+        check_every = max(0.005, min(self.interval, self.threshold) / 2)
+        while not self._stopping.wait(check_every):
+            with self._lock:
+                stalled = time.monotonic() - self._last_beat > self.interval + self.threshold
+                if not stalled or self._pending is not None:
+                    continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            stack = traceback.extract_stack(frame)
+            del frame
+            with self._lock:
+                # 抓取期间事件循环可能已恢复，此时丢弃
+                if time.monotonic() - self._last_beat > self.interval + self.threshold:
+                    self._pending = (_blocking_site(stack), stack)
+
+    def _record_stall(self, lag: float, pending):
+        site, stack = pending if pending else (UNKNOWN_SITE, None)
+        self._stalls += 1
+        self._blocked_seconds += lag
+        LOOP_STALLS.labels(site).inc()
+        LOOP_BLOCKED_SECONDS.labels(site).inc(lag)
+
+        entry = self._sites.get(site)
+        first_seen = entry is None
+        if first_seen:
+            entry = self._sites[site] = {'count': 0, 'total': 0.0, 'max': 0.0}
+        entry['count'] += 1
+        entry['total'] += lag
+        entry['max'] = max(entry['max'], lag)
+
+        message = f"事件循环阻塞 {lag * 1000:.0f} ms，位置: {site}（第 {entry['count']} 次）"
+        if first_seen and stack is not None:
+            message += "\n" + "".join(traceback.format_list(stack[-self.stack_limit:])).rstrip()
+        logger.warning(message)
+
+    def get_stats(self, top: int = 5) -> Dict[str, Any]:
+        """
+        调度延迟和阻塞位置统计
+
+        Returns:
+            Dict[str, Any]: 延迟单位为秒；top_sites 按总阻塞时间降序
+        """
+        recent = list(self._recent)
+        sites = sorted(self._sites.items(), key=lambda item: item[1]['total'], reverse=True)
+        return {
+            'threshold': self.threshold,
+            'lag_avg': sum(recent) / len(recent) if recent else 0.0,
+            'lag_max': self._lag_max,
+            'stalls': self._stalls,
+            'blocked_seconds': self._blocked_seconds,
+            'top_sites': [dict(site=site, **entry) for site, entry in sites[:top]],
+        }
+
+
+_monitor: Optional[LoopMonitor] = None
+
+
+def start_loop_monitor(threshold: float) -> LoopMonitor:
+    """启动事件循环延迟监控（在事件循环中调用）"""
+    global _monitor
+    _monitor = LoopMonitor(threshold=threshold)
+    _monitor.start()
+    return _monitor
+
+
+async def stop_loop_monitor():
+    """停止事件循环延迟监控"""
+    global _monitor
+    if _monitor is not None:
+        await _monitor.stop()
+        _monitor = None
+
+
+def get_loop_monitor() -> Optional[LoopMonitor]:
+    """获取正在运行的监控（未启用时为 None）"""
+    return _monitor
@@ -0,0 +1,270 @@
+"""
+内存调控
+
+定期采样进程 RSS，接近内存上限（MEMORY_LIMIT_MB，未设置时读取容器 cgroup 限制）时逐级释放内存：
+
+- 软限制（默认上限的 80%）：已登记的缓存淘汰一半，新数据库连接的 SQLite page cache 降到 1 MB，
+  执行完整垃圾回收并把空闲堆内存归还系统（glibc malloc_trim）
+- 硬限制（默认 90%）：已登记的缓存全部清空，page cache 降到 256 KB
+- 回落到软限制的 90% 以下时恢复 page cache 配置
+
+各子系统通过 register() 登记，需实现 memory_size()（条目数）和 shrink(fraction)（按比例淘汰，返回淘汰条数）。
+/memory 按子系统显示内存占用；开启 tracemalloc 后按代码所属子系统（搜索、数据库、PTB 等）统计 Python 分配。
+"""
+import asyncio
+import ctypes
+import gc
+import logging
+import os
+import time
+import tracemalloc
+import weakref
+from typing import Any, Dict, List, Optional, Tuple
+
+from config.settings import MEMORY_LIMIT_MB, MEMORY_SOFT_PERCENT, MEMORY_HARD_PERCENT, DB_CACHE_KB
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+LEVEL_OK, LEVEL_SOFT, LEVEL_HARD = 0, 1, 2
+LEVEL_NAMES = {LEVEL_OK: '正常', LEVEL_SOFT: '软限制', LEVEL_HARD: '硬限制'}
+
+# 各级别下新数据库连接的 page cache（KB）
+_PAGE_CACHE_KB = {LEVEL_SOFT: 1024, LEVEL_HARD: 256}
+# 回落到软限制的该比例以下才恢复，避免在阈值附近反复切换
+_RECOVER_RATIO = 0.9
+
+MEMORY_LEVEL = metrics.gauge('telesubmit_memory_governor_level', '内存调控级别（0 正常，1 软限制，2 硬限制）')
+MEMORY_LIMIT = metrics.gauge('telesubmit_memory_limit_bytes', '内存上限（字节）')
+MEMORY_SHRINKS = metrics.counter('telesubmit_memory_shrinks_total', '内存调控释放次数', ('level',))
+
+# tracemalloc 统计的文件路径 -> 子系统（按顺序匹配）
+_SUBSYSTEMS: List[Tuple[str, str]] = [
+    ('whoosh', '搜索索引 (whoosh)'),
+    ('jieba', '中文分词 (jieba)'),
+    ('telegram', 'python-telegram-bot'),
+    ('httpx', 'HTTP 客户端 (httpx)'),
+    ('httpcore', 'HTTP 客户端 (httpx)'),
+    ('aiohttp', 'Webhook (aiohttp)'),
+    ('aiosqlite', '数据库'),
+    ('sqlite3', '数据库'),
+    (os.sep + 'database' + os.sep, '数据库'),
+    (os.sep + 'handlers' + os.sep, '处理器'),
+    (os.sep + 'utils' + os.sep, '工具模块'),
+]
+
+
+def detect_limit_bytes() -> Optional[int]:
+    """读取容器内存限制（cgroup v2 / v1），没有限制时返回 None"""
+    for path in ('/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory/memory.limit_in_bytes'):
+        try:
+            with open(path) as f:
+                value = f.read().strip()
+        except OSError:
+            continue
+        if value.isdigit() and int(value) < 1 << 50:
+            return int(value)
+    return None
+
+
+def _rss_bytes() -> Optional[int]:
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process().memory_info().rss
+
+
+def _malloc_trim():
+    """把 glibc 空闲堆内存归还系统（其他 libc 上不做任何事）"""
+    try:
+        ctypes.CDLL('libc.so.6').malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+
+
+def _subsystem(filename: str) -> str:
+    for marker, name in _SUBSYSTEMS:
+        if marker in filename:
+            return name
+    return '其他'
+
+
+class MemoryGovernor:
+    """
+    内存调控器
+
+    Args:
+        limit_bytes: 内存上限（None 时只统计不调控）
+        soft_percent: 软限制（上限的百分比）
+        hard_percent: 硬限制（上限的百分比）
+    """
+
+    def __init__(self, limit_bytes: Optional[int], soft_percent: float = 80, hard_percent: float = 90):
+        self.limit_bytes = limit_bytes
+        self.soft_bytes = int(limit_bytes * soft_percent / 100) if limit_bytes else None
+        self.hard_bytes = int(limit_bytes * hard_percent / 100) if limit_bytes else None
+        self.level = LEVEL_OK
+        self.last_rss: Optional[int] = None
+        self.last_shrink: Optional[Dict[str, Any]] = None
+        self._consumers: "weakref.WeakValueDictionary[str, Any]" = weakref.WeakValueDictionary()
+        self._gauges: Dict[str, Any] = {}
+        if limit_bytes:
+            MEMORY_LIMIT.set(limit_bytes)
+
+    def register(self, name: str, consumer):
+        """登记可释放内存的子系统（只保留弱引用）"""
+        self._consumers[name] = consumer
+
+    def register_gauge(self, name: str, size_func):
+        """登记只统计、不释放的子系统（size_func 返回条目数）"""
+        self._gauges[name] = size_func
+
+    def _target_level(self, rss: int) -> int:
+        if not self.limit_bytes:
+            return LEVEL_OK
+        if rss >= self.hard_bytes:
+            return LEVEL_HARD
+        if rss >= self.soft_bytes:
+            return LEVEL_SOFT
+        if self.level != LEVEL_OK and rss >= self.soft_bytes * _RECOVER_RATIO:
+            # 仍在恢复区间内，保持软限制
+            return LEVEL_SOFT
+        return LEVEL_OK
+
+    def check(self, rss: Optional[int] = None) -> int:
+        """
+        采样内存并按需释放（由定时任务调用）
+
+        Returns:
+            int: 当前调控级别
+        """
+        rss = rss if rss is not None else _rss_bytes()
+        if rss is None:
+            return self.level
+        self.last_rss = rss
+        level = self._target_level(rss)
+        if level != self.level:
+            logger.info(
+                f"内存调控: {LEVEL_NAMES[self.level]} → {LEVEL_NAMES[level]}（RSS {rss / 1024 / 1024:.0f} MB，"
+                f"上限 {self.limit_bytes / 1024 / 1024:.0f} MB）"
+            )
+            self._set_page_cache(level)
+        self.level = level
+        MEMORY_LEVEL.set(level)
+        if level != LEVEL_OK:
+            self.shrink(level)
+        return level
+
+    def _set_page_cache(self, level: int):
+        from database import db_manager
+        db_manager.set_page_cache_kb(min(DB_CACHE_KB, _PAGE_CACHE_KB[level]) if level else None)
+
+    def shrink(self, level: int = LEVEL_SOFT) -> Dict[str, Any]:
+        """
+        释放内存
+
+        Args:
+            level: LEVEL_SOFT 淘汰一半缓存，LEVEL_HARD 清空缓存
+
+        Returns:
+            Dict[str, Any]: 各子系统淘汰的条目数和释放前后的 RSS
+        """
+        before = _rss_bytes()
+        fraction = 1.0 if level >= LEVEL_HARD else 0.5
+        dropped = {}
+        for name, consumer in list(self._consumers.items()):
+            try:
+                dropped[name] = consumer.shrink(fraction)
+            except Exception as e:
+                logger.warning(f"释放 {name} 内存失败: {e}")
+        collected = gc.collect()
+        _malloc_trim()
+        after = _rss_bytes()
+        self.last_shrink = {
+            'time': time.time(), 'level': level, 'dropped': dropped,
+            'collected': collected, 'rss_before': before, 'rss_after': after,
+        }
+        MEMORY_SHRINKS.labels(LEVEL_NAMES[level]).inc()
+        logger.info(
+            f"内存释放（{LEVEL_NAMES[level]}）: 淘汰 {sum(dropped.values())} 条缓存，回收 {collected} 个对象"
+            + (f"，RSS {before / 1024 / 1024:.0f} → {after / 1024 / 1024:.0f} MB" if before and after else "")
+        )
+        return self.last_shrink
+
+    def consumers(self) -> Dict[str, int]:
+        """各子系统当前的条目数"""
+        sizes = {}
+        for name, consumer in list(self._consumers.items()):
+            sizes[name] = consumer.memory_size()
+        for name, size_func in self._gauges.items():
+            try:
+                sizes[name] = size_func()
+            except Exception:
+                continue
+        return sizes
+
+    def report(self) -> Dict[str, Any]:
+        """内存报告（/memory 使用）"""
+        from database import db_manager
+        return {
+            'rss': _rss_bytes(),
+            'limit': self.limit_bytes,
+            'soft': self.soft_bytes,
+            'hard': self.hard_bytes,
+            'level': self.level,
+            'page_cache_kb': db_manager.get_page_cache_kb(),
+            'consumers': self.consumers(),
+            'tracemalloc': tracemalloc.is_tracing(),
+            'last_shrink': self.last_shrink,
+        }
+
+
+def start_tracemalloc():
+    """开始按代码位置统计 Python 内存分配（有一定 CPU 和内存开销，排查完毕后关闭）"""
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(1)
+
+
+def stop_tracemalloc():
+    """停止 tracemalloc 统计"""
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def _subsystem_usage_sync() -> List[Tuple[str, int]]:
+    snapshot = tracemalloc.take_snapshot()
+    usage: Dict[str, int] = {}
+    for stat in snapshot.statistics('filename'):
+        name = _subsystem(stat.traceback[0].filename)
+        usage[name] = usage.get(name, 0) + stat.size
+    return sorted(usage.items(), key=lambda item: item[1], reverse=True)
+
+
+async def subsystem_usage() -> Optional[List[Tuple[str, int]]]:
+    """
+    按子系统汇总 tracemalloc 统计的 Python 内存分配（在线程中计算快照）
+
+    Returns:
+        Optional[List[Tuple[str, int]]]: (子系统, 字节数)，按占用降序；未开启 tracemalloc 时为 None
+    """
+    if not tracemalloc.is_tracing():
+        return None
+    return await asyncio.to_thread(_subsystem_usage_sync)
+
+
+_governor = MemoryGovernor(
+    MEMORY_LIMIT_MB * 1024 * 1024 if MEMORY_LIMIT_MB else detect_limit_bytes(),
+    MEMORY_SOFT_PERCENT,
+    MEMORY_HARD_PERCENT,
+)
+
+
+def get_memory_governor() -> MemoryGovernor:
+    """获取全局内存调控器"""
+    return _governor
+
+
+def register(name: str, consumer):
+    """登记可释放内存的子系统（见 MemoryGovernor.register）"""
+    _governor.register(name, consumer)
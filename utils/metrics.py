@@ -0,0 +1,453 @@
+"""
+指标模块
+
+进程内的指标注册表（计数器、仪表、直方图），以 Prometheus 文本格式在 /metrics 暴露：
+Webhook 模式挂在 Webhook 服务器上，Polling 模式挂在健康检查服务器上。
+
+各模块在使用处定义自己的指标（counter / gauge / histogram 按名称幂等注册），例如：
+
+    SEARCH_SECONDS = metrics.histogram('telesubmit_search_seconds', '搜索耗时（秒）')
+    with SEARCH_SECONDS.time():
+        ...
+
+需要在抓取时才计算的值（队列长度、内存等）使用 Gauge.set_function 注册回调。
+"""
+import asyncio
+import functools
+import hmac
+import logging
+import re
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from telegram import Update
+from telegram.ext import Application, CommandHandler, ConversationHandler
+
+from config.settings import METRICS_TOKEN
+from utils import tracing
+
+logger = logging.getLogger(__name__)
+
+# 默认直方图分桶（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# 定时任务耗时分桶（秒）
+JOB_BUCKETS = (0.1, 1, 5, 15, 60, 300, 900, 1800, 3600)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Timer:
+    """计时上下文管理器：退出时把耗时记入直方图"""
+
+    __slots__ = ('_histogram', '_started')
+
+    def __init__(self, histogram):
+        self._histogram = histogram
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._histogram.observe(time.perf_counter() - self._started)
+        return False
+
+
+class _CounterChild:
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+
+class _GaugeChild:
+    __slots__ = ('value', 'function')
+
+    def __init__(self):
+        self.value = 0.0
+        self.function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float):
+        self.value = value
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+    def dec(self, amount: float = 1):
+        self.value -= amount
+
+    def set_function(self, function: Callable[[], float]):
+        """抓取时调用 function 取值"""
+        self.function = function
+
+    def get(self) -> float:
+        if self.function is None:
+            return self.value
+        try:
+            return float(self.function())
+        except Exception as e:
+            logger.debug(f"读取指标回调失败: {e}")
+            return float('nan')
+
+
+class _HistogramChild:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+    def time(self) -> _Timer:
+        return _Timer(self)
+
+
+class _Metric:
+    """带标签的指标：labels() 返回对应标签值的子指标；没有标签时指标本身即可直接使用"""
+
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._default = self.labels()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values, **kwargs):
+        if kwargs:
+            values = tuple(kwargs[name] for name in self.labelnames)
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"指标 {self.name} 需要标签 {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def __getattr__(self, item):
+        # 无标签指标直接调用 inc / observe / set 等方法
+        if item.startswith('_') or item == 'labelnames':
+            raise AttributeError(item)
+        if self.labelnames:
+            raise AttributeError(f"指标 {self.name} 有标签，需先调用 labels()")
+        return getattr(self._default, item)
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return '\n'.join(lines)
+
+
+class Counter(_Metric):
+    """只增不减的计数器"""
+
+    kind = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def _samples(self):
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(child.value)}"
+            for key, child in list(self._children.items())
+        ]
+
+
+class Gauge(_Metric):
+    """可增可减或在抓取时计算的值"""
+
+    kind = 'gauge'
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def _samples(self):
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(child.get())}"
+            for key, child in list(self._children.items())
+        ]
+
+
+class Histogram(_Metric):
+    """按分桶统计的耗时分布"""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def _samples(self):
+        lines = []
+        for key, child in list(self._children.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, list(child.counts)):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(child.sum)}")
+            lines.append(f"{self.name}_count{labels} {child.count}")
+        return lines
+
+
+class MetricsRegistry:
+    """指标注册表"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        """注册指标；同名指标已存在时返回已有的指标"""
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+                    raise ValueError(f"指标 {metric.name} 已以不同的类型或标签注册")
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        """Prometheus 文本格式"""
+        return '\n'.join(metric.render() for metric in list(self._metrics.values())) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+
+def counter(name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+    """注册（或获取已注册的）计数器"""
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+
+def gauge(name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+    """注册（或获取已注册的）仪表"""
+    return REGISTRY.register(Gauge(name, documentation, labelnames))
+
+
+def histogram(name: str, documentation: str, labelnames: Iterable[str] = (),
+              buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+    """注册（或获取已注册的）直方图"""
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))
+
+
+def render() -> str:
+    """全部指标的 Prometheus 文本格式"""
+    return REGISTRY.render()
+
+
+def is_authorized(authorization: Optional[str]) -> bool:
+    """
+    检查抓取请求的 Authorization 头（未配置 METRICS_TOKEN 时不校验）
+
+    Args:
+        authorization: Authorization 请求头，格式为 "Bearer <token>"
+    """
+    if not METRICS_TOKEN:
+        return True
+    return hmac.compare_digest((authorization or '').encode(), f"Bearer {METRICS_TOKEN}".encode())
+
+
+# 处理器和定时任务指标
+UPDATE_SECONDS = histogram(
+    'telesubmit_update_seconds', '处理一个更新的耗时（秒），按命令/回调/更新类型', ('handler',)
+)
+UPDATE_ERRORS = counter('telesubmit_update_errors_total', '处理更新时抛出的异常数', ('handler',))
+JOB_SECONDS = histogram('telesubmit_job_seconds', '定时任务耗时（秒）', ('job',), buckets=JOB_BUCKETS)
+JOB_ERRORS = counter('telesubmit_job_errors_total', '定时任务异常数', ('job',))
+
+_DIGITS = re.compile(r'\d+')
+# 已注册的命令（小写），只有这些命令作为标签值，其余命令归为 UNKNOWN_COMMAND_LABEL
+_commands: Set[str] = set()
+UNKNOWN_COMMAND_LABEL = 'command:other'
+
+
+def register_commands(handler):
+    """
+    记录处理器（包括 ConversationHandler 内的各处理器）注册的命令
+
+    Args:
+        handler: telegram.ext.BaseHandler 实例
+    """
+    if isinstance(handler, ConversationHandler):
+        nested = list(handler.entry_points) + list(handler.fallbacks)
+        for handlers in handler.states.values():
+            nested.extend(handlers)
+        for child in nested:
+            register_commands(child)
+    elif isinstance(handler, CommandHandler):
+        _commands.update(command.lower() for command in handler.commands)
+
+
+def update_label(update: object) -> str:
+    """
+    更新的处理器标签：命令名、去掉数字的回调数据前缀，其余按更新类型
+
+    Args:
+        update: 更新对象
+
+    Returns:
+        str: 标签值（取值有限，避免标签基数过大；未注册的命令统一为 command:other）
+    """
+    if not isinstance(update, Update):
+        return 'other'
+    if update.callback_query is not None:
+        data = update.callback_query.data or ''
+        return 'callback:' + _DIGITS.sub('', data.split(':', 1)[0]).rstrip('_')[:32]
+    message = update.effective_message
+    if message is not None and message.text and message.text.startswith('/'):
+        command = message.text.split(maxsplit=1)[0].split('@', 1)[0][1:].lower()
+        return f'/{command}' if command in _commands else UNKNOWN_COMMAND_LABEL
+    if update.channel_post is not None or update.edited_channel_post is not None:
+        return 'channel_post'
+    if update.inline_query is not None:
+        return 'inline_query'
+    if message is not None:
+        if message.text:
+            return 'text'
+        return 'media' if message.effective_attachment else 'message'
+    return 'other'
+
+
+class InstrumentedApplication(Application):
+    """
+    记录每个更新处理耗时的 Application（通过 Application.builder().application_class(...) 使用）
+
+    每个更新同时开启一个 trace，注册的处理器回调记录为其中的 span
+    """
+
+    def add_handler(self, handler, group: int = 0) -> None:
+        tracing.wrap_handler_callbacks(handler)
+        register_commands(handler)
+        super().add_handler(handler, group)
+
+    async def process_update(self, update: object) -> None:
+        label = update_label(update)
+        started = time.perf_counter()
+        try:
+            with tracing.trace('update', handler=label, update_id=getattr(update, 'update_id', None)):
+                await super().process_update(update)
+        except Exception:
+            UPDATE_ERRORS.labels(label).inc()
+            raise
+        finally:
+            UPDATE_SECONDS.labels(label).observe(time.perf_counter() - started)
+
+
+def timed_job(func):
+    """
+    装饰器：记录定时任务耗时和异常（任务名取函数名），每次运行开启一个 trace
+
+    Args:
+        func: 定时任务函数（协程函数或普通函数，包装后均为协程函数）
+    """
+    name = getattr(func, '__name__', 'job')
+    seconds = JOB_SECONDS.labels(name)
+    is_coroutine = asyncio.iscoroutinefunction(func)
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            with tracing.trace('job', job=name):
+                if is_coroutine:
+                    return await func(*args, **kwargs)
+                return func(*args, **kwargs)
+        except Exception:
+            JOB_ERRORS.labels(name).inc()
+            raise
+        finally:
+            seconds.observe(time.perf_counter() - started)
+    return wrapper
+
+
+def register_runtime_gauges(application):
+    """
+    注册在抓取时计算的运行状态指标：内存、更新处理并发、API 限流排队、Webhook 排队
+
+    Args:
+        application: telegram.ext.Application 实例
+    """
+    try:
+        import psutil
+        process = psutil.Process()
+        gauge('telesubmit_process_resident_memory_bytes', '进程常驻内存（字节）').set_function(
+            lambda: process.memory_info().rss
+        )
+    except ImportError:
+        pass
+
+    from utils.update_processor import OrderedUpdateProcessor
+    processor = application.update_processor
+    if isinstance(processor, OrderedUpdateProcessor):
+        updates = gauge('telesubmit_updates', '正在处理和排队中的更新数', ('state',))
+        updates.labels('in_flight').set_function(lambda: processor.get_stats()['in_flight'])
+        updates.labels('queued').set_function(lambda: processor.get_stats()['queued'])
+        updates.labels('blocked').set_function(lambda: processor.get_stats()['blocked'])
+
+    from utils.rate_limiter import ApiRateLimiter
+    limiter = getattr(application.bot, 'rate_limiter', None)
+    if isinstance(limiter, ApiRateLimiter):
+        gauge('telesubmit_telegram_api_queued', '等待限流放行的 API 请求数').set_function(
+            lambda: limiter.get_stats()['queued']
+        )
+
+    from utils.webhook_server import get_webhook_server
+
+    def webhook_queued():
+        server = get_webhook_server()
+        if server is None:
+            return 0
+        stats = server.get_stats()
+        return stats['queued'] + stats['update_queue']
+
+    gauge('telesubmit_webhook_queued', 'Webhook 已接收、待处理的更新数').set_function(webhook_queued)
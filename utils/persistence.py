@@ -0,0 +1,244 @@
+"""
+基于 SQLite 的 PTB 持久化
+
+投稿会话（ConversationHandler）状态、user_data / chat_data 和 bot_data 保存到数据库，
+重启或更新后用户可以继续未完成的投稿。与 PicklePersistence 每次整体重写文件不同：
+
+- PTB 每 SESSION_PERSISTENCE_INTERVAL 秒把本周期内用到的条目交给持久化，这里只把数据序列化后
+  与上次写入的摘要比较，未变化的条目不写入（PTB 会把每个发来更新的用户都标记为待写入）
+- 同一周期内的变更合并为一个事务写入，只写变化的行
+- user_data / chat_data 与会话数据溢出共用 session_data 表，启动时只载入最近
+  SESSION_IDLE_TTL 秒内写入的条目，其余条目在用户再次发来更新时按需读回（见 utils/session_store.py）
+"""
+import asyncio
+import collections
+import logging
+import pickle
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+from config.settings import SESSION_PERSISTENCE_INTERVAL, SESSION_IDLE_TTL
+from database import ptb_state, session_data
+from database.db_manager import get_db
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+PERSISTENCE_WRITES = metrics.counter('telesubmit_persistence_writes_total', '持久化写入的条目数', ('kind',))
+PERSISTENCE_SKIPPED = metrics.counter(
+    'telesubmit_persistence_skipped_total', '未变化、跳过写入的条目数', ('kind',)
+)
+PERSISTENCE_FLUSH_SECONDS = metrics.histogram('telesubmit_persistence_flush_seconds', '一次持久化写入事务的耗时（秒）')
+
+# 收到第一个变更后等待多久再写入（合并同一周期内的其他变更）
+WRITE_DELAY = 0.1
+# 保留写入摘要的条目数（超出时最久未写入的条目下次总是写入）
+DIGEST_CACHE_SIZE = 10000
+
+KIND_BOT = 'bot'
+KIND_CONVERSATION = 'conversation'
+
+
+class SqlitePersistence(BasePersistence):
+    """
+    基于 SQLite 的持久化（通过 Application.builder().persistence(...) 使用）
+
+    Args:
+        update_interval: PTB 提交变更的间隔（秒）
+        load_window: 启动时载入 user_data / chat_data 的时间范围（秒）
+    """
+
+    def __init__(self, update_interval: float = SESSION_PERSISTENCE_INTERVAL, load_window: float = SESSION_IDLE_TTL):
+        super().__init__(store_data=PersistenceInput(callback_data=False), update_interval=update_interval)
+        self.load_window = load_window
+        # 待写入的变更：(类型, ID) -> 序列化的数据（None 表示删除）
+        self._pending_sessions: Dict[Tuple[str, int], Optional[bytes]] = {}
+        # 会话处理器名称 -> {会话键: 状态（None 表示删除）}
+        self._pending_conversations: Dict[str, Dict[Tuple, Any]] = {}
+        self._pending_data: Dict[str, bytes] = {}
+        # 上次写入内容的摘要：(类型, ID) -> hash
+        self._digests: 'collections.OrderedDict[Tuple[str, Any], int]' = collections.OrderedDict()
+        self._write_task: Optional[asyncio.Task] = None
+        self._write_lock = asyncio.Lock()
+
+    # 读取（Application.initialize() 时调用一次）
+
+    async def _load_sessions(self, kind: str) -> Dict[int, Any]:
+        async with get_db() as conn:
+            rows = await session_data.load_recent(conn, kind, time.time() - self.load_window)
+        result = {}
+        for key, data in rows:
+            try:
+                result[key] = pickle.loads(data)
+            except Exception as e:
+                logger.warning(f"读取持久化数据失败（{kind} {key}）: {e}")
+                continue
+            self._remember((kind, key), hash(data))
+        return result
+
+    async def get_user_data(self) -> Dict[int, Any]:
+        return await self._load_sessions(session_data.KIND_USER)
+
+    async def get_chat_data(self) -> Dict[int, Any]:
+        return await self._load_sessions(session_data.KIND_CHAT)
+
+    async def get_bot_data(self) -> dict:
+        async with get_db() as conn:
+            data = await ptb_state.load_data(conn, ptb_state.BOT_DATA)
+        if data is None:
+            return {}
+        self._remember((KIND_BOT, ptb_state.BOT_DATA), hash(data))
+        return pickle.loads(data)
+
+    async def get_callback_data(self):
+        return None
+
+    async def get_conversations(self, name: str) -> Dict[Tuple, Any]:
+        async with get_db() as conn:
+            states = await ptb_state.load_conversations(conn, name)
+        if states:
+            logger.info(f"已恢复 {len(states)} 个未完成的会话（{name}）")
+        return states
+
+    # 变更（只记录，由后台任务合并写入）
+
+    def _remember(self, slot: Tuple[str, Any], digest: int):
+        self._digests[slot] = digest
+        self._digests.move_to_end(slot)
+        if len(self._digests) > DIGEST_CACHE_SIZE:
+            self._digests.popitem(last=False)
+
+    def _changed(self, slot: Tuple[str, Any], data: Optional[bytes]) -> bool:
+        digest = hash(data)
+        if self._digests.get(slot) == digest:
+            PERSISTENCE_SKIPPED.labels(slot[0]).inc()
+            return False
+        self._remember(slot, digest)
+        return True
+
+    def _dumps(self, slot: Tuple[str, Any], data) -> Tuple[bool, Optional[bytes]]:
+        try:
+            return True, pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception as e:
+            logger.warning(f"数据无法序列化，跳过持久化（{slot[0]} {slot[1]}）: {e}")
+            return False, None
+
+    def _update_session(self, kind: str, key: int, data):
+        slot = (kind, key)
+        blob = None
+        if data:
+            ok, blob = self._dumps(slot, data)
+            if not ok:
+                return
+        # 空条目删除对应的行
+        if self._changed(slot, blob):
+            self._pending_sessions[slot] = blob
+            self._schedule_write()
+
+    async def update_user_data(self, user_id: int, data) -> None:
+        self._update_session(session_data.KIND_USER, user_id, data)
+
+    async def update_chat_data(self, chat_id: int, data) -> None:
+        self._update_session(session_data.KIND_CHAT, chat_id, data)
+
+    async def update_bot_data(self, data) -> None:
+        slot = (KIND_BOT, ptb_state.BOT_DATA)
+        ok, blob = self._dumps(slot, data)
+        if ok and self._changed(slot, blob):
+            self._pending_data[ptb_state.BOT_DATA] = blob
+            self._schedule_write()
+
+    async def update_callback_data(self, data) -> None:
+        pass
+
+    async def update_conversation(self, name: str, key: Tuple, new_state: Optional[object]) -> None:
+        self._pending_conversations.setdefault(name, {})[key] = new_state
+        self._schedule_write()
+
+    async def _drop_session(self, kind: str, key: int):
+        self._digests.pop((kind, key), None)
+        self._pending_sessions[(kind, key)] = None
+        self._schedule_write()
+
+    async def drop_user_data(self, user_id: int) -> None:
+        await self._drop_session(session_data.KIND_USER, user_id)
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        await self._drop_session(session_data.KIND_CHAT, chat_id)
+
+    # 内存中的数据始终是最新的，无需从数据库刷新
+
+    async def refresh_user_data(self, user_id: int, user_data) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data) -> None:
+        pass
+
+    # 写入
+
+    def _schedule_write(self):
+        if self._write_task is None or self._write_task.done():
+            self._write_task = asyncio.get_running_loop().create_task(self._write_later())
+
+    async def _write_later(self):
+        while True:
+            await asyncio.sleep(WRITE_DELAY)
+            # 写入期间产生的变更在下一轮写入；写入失败时等下次变更或关闭时重试
+            if await self._write() is None or not self._has_pending():
+                return
+
+    def _has_pending(self) -> bool:
+        return bool(self._pending_sessions or self._pending_conversations or self._pending_data)
+
+    async def _write(self) -> Optional[int]:
+        """写入待写入的变更，返回写入的条目数（失败时返回 None）"""
+        async with self._write_lock:
+            sessions, self._pending_sessions = self._pending_sessions, {}
+            conversations, self._pending_conversations = self._pending_conversations, {}
+            data, self._pending_data = self._pending_data, {}
+            if not (sessions or conversations or data):
+                return 0
+            started = time.perf_counter()
+            try:
+                async with get_db() as conn:
+                    for kind in (session_data.KIND_USER, session_data.KIND_CHAT):
+                        await session_data.save_many(conn, kind, [
+                            (key, blob) for (k, key), blob in sessions.items() if k == kind and blob is not None
+                        ])
+                        await session_data.delete_many(conn, kind, [
+                            key for (k, key), blob in sessions.items() if k == kind and blob is None
+                        ])
+                    for name, states in conversations.items():
+                        await ptb_state.save_conversations(conn, name, states)
+                    await ptb_state.save_data(conn, data.items())
+            except Exception as e:
+                logger.error(f"持久化写入失败（下次重试）: {e}")
+                # 放回待写入（期间产生的新变更优先），随下次变更或关闭时一起写入
+                for slot, blob in sessions.items():
+                    self._pending_sessions.setdefault(slot, blob)
+                for name, states in conversations.items():
+                    pending = self._pending_conversations.setdefault(name, {})
+                    for key, state in states.items():
+                        pending.setdefault(key, state)
+                for name, blob in data.items():
+                    self._pending_data.setdefault(name, blob)
+                return None
+            PERSISTENCE_FLUSH_SECONDS.observe(time.perf_counter() - started)
+            for kind, count in collections.Counter(kind for kind, _ in sessions).items():
+                PERSISTENCE_WRITES.labels(kind).inc(count)
+            if conversations:
+                PERSISTENCE_WRITES.labels(KIND_CONVERSATION).inc(sum(len(s) for s in conversations.values()))
+            if data:
+                PERSISTENCE_WRITES.labels(KIND_BOT).inc(len(data))
+            return len(sessions) + sum(len(s) for s in conversations.values()) + len(data)
+
+    async def flush(self) -> None:
+        """写入所有待写入的变更（Application.shutdown() 时调用）"""
+        if self._write_task is not None and not self._write_task.done():
+            await self._write_task
+        await self._write()
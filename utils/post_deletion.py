@@ -0,0 +1,173 @@
+"""
+帖子批量删除模块
+
+/delete_posts 和帖子详情中的删除按钮共用的删除流程，按批处理而不是逐个帖子处理：
+
+- 一次查询解析关联消息、读取帖子状态和全部关联消息
+- 频道消息通过 deleteMessages 每次最多删除 100 条；某一批失败时才逐条删除，
+  以便区分哪些消息无法删除
+- 搜索索引一个写入器、一次提交；数据库一个事务标记删除（保留历史数据）
+
+返回每个请求ID的删除结果。
+"""
+import logging
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set
+
+from telegram.constants import BulkRequestLimit
+
+from config.settings import CHANNEL_ID
+from database.db_manager import get_db
+from database import post_messages
+from utils.leaderboard import get_leaderboards
+from utils.search_engine import get_search_engine
+
+logger = logging.getLogger(__name__)
+
+# 删除结果状态
+STATUS_DELETED = 'deleted'
+STATUS_ALREADY_DELETED = 'already_deleted'
+STATUS_NOT_FOUND = 'not_found'
+
+# 每次 deleteMessages 最多删除的消息数
+DELETE_CHUNK_SIZE = BulkRequestLimit.MAX_LIMIT
+
+# 视为已删除的错误（消息已不存在，或超过 48 小时无法再删除）
+GONE_ERRORS = ("message to delete not found", "message can't be deleted")
+
+
+class PostDeleteResult(NamedTuple):
+    """单个请求ID的删除结果"""
+    requested_id: int
+    message_id: Optional[int]  # 所属帖子的主消息ID（未找到时为 None）
+    status: str
+    related_count: int = 0
+    channel_deleted: bool = False  # 频道中的全部消息已删除（或已不存在）
+    index_deleted: bool = False
+
+
+async def _load_posts(message_ids: List[int]):
+    """一次查询解析关联消息，读取帖子状态和关联消息"""
+    async with get_db() as conn:
+        main_of: Dict[int, int] = {}
+        for start in range(0, len(message_ids), 500):
+            chunk = message_ids[start:start + 500]
+            cursor = await conn.execute(
+                f"SELECT message_id, main_id FROM post_messages WHERE message_id IN ({','.join('?' * len(chunk))})",
+                chunk
+            )
+            main_of.update({row[0]: row[1] for row in await cursor.fetchall()})
+        resolved = {mid: main_of.get(mid, mid) for mid in message_ids}
+
+        targets = list(dict.fromkeys(resolved.values()))
+        is_deleted: Dict[int, int] = {}
+        for start in range(0, len(targets), 500):
+            chunk = targets[start:start + 500]
+            cursor = await conn.execute(
+                f"SELECT message_id, is_deleted FROM published_posts WHERE message_id IN ({','.join('?' * len(chunk))})",
+                chunk
+            )
+            is_deleted.update({row[0]: row[1] for row in await cursor.fetchall()})
+        related = await post_messages.get_related_map(conn, [mid for mid, flag in is_deleted.items() if not flag])
+    return resolved, is_deleted, related
+
+
+def _is_gone(error: Exception) -> bool:
+    error_msg = str(error).lower()
+    return any(text in error_msg for text in GONE_ERRORS)
+
+
+async def delete_channel_messages(bot, message_ids: List[int]) -> Set[int]:
+    """
+    批量删除频道消息
+
+    Args:
+        bot: Bot 实例
+        message_ids: 频道消息ID列表
+
+    Returns:
+        Set[int]: 删除失败的消息ID（已不存在的消息视为删除成功）
+    """
+    failed: Set[int] = set()
+    for start in range(0, len(message_ids), DELETE_CHUNK_SIZE):
+        chunk = message_ids[start:start + DELETE_CHUNK_SIZE]
+        try:
+            # 找不到的消息会被跳过，整批只在无权限等情况下失败
+            await bot.delete_messages(chat_id=CHANNEL_ID, message_ids=chunk)
+            continue
+        except Exception as e:
+            logger.warning(f"批量删除 {len(chunk)} 条频道消息失败，改为逐条删除: {e}")
+        for message_id in chunk:
+            try:
+                await bot.delete_message(chat_id=CHANNEL_ID, message_id=message_id)
+            except Exception as e:
+                if _is_gone(e):
+                    logger.debug(f"频道消息 {message_id} 已不存在或无法删除: {e}")
+                else:
+                    logger.warning(f"删除频道消息 {message_id} 失败: {e}")
+                    failed.add(message_id)
+    return failed
+
+
+async def delete_posts(bot, message_ids: Iterable[int]) -> List[PostDeleteResult]:
+    """
+    删除帖子：频道消息、搜索索引，并在数据库中标记为已删除
+
+    传入关联消息ID时删除其所属的帖子。
+
+    Args:
+        bot: Bot 实例
+        message_ids: 帖子（或关联消息）的消息ID
+
+    Returns:
+        List[PostDeleteResult]: 按请求顺序排列的每个ID的结果
+    """
+    requested = [int(mid) for mid in dict.fromkeys(message_ids)]
+    if not requested:
+        return []
+    resolved, is_deleted, related = await _load_posts(requested)
+    live = [mid for mid in dict.fromkeys(resolved.values()) if is_deleted.get(mid) == 0]
+
+    # 频道消息：主消息和关联消息一起按批删除
+    channel_ids = []
+    for mid in live:
+        channel_ids.append(mid)
+        channel_ids.extend(related.get(mid, []))
+    failed = await delete_channel_messages(bot, channel_ids) if channel_ids else set()
+
+    # 搜索索引：一次提交
+    index_deleted = False
+    if live:
+        try:
+            search_engine = get_search_engine()
+            if search_engine:
+                search_engine.delete_posts(channel_ids)
+                index_deleted = True
+        except Exception as e:
+            logger.error(f"从搜索索引删除 {len(live)} 个帖子失败: {e}")
+
+        # 数据库：一个事务标记删除（保留历史数据）
+        async with get_db() as conn:
+            await conn.executemany(
+                "UPDATE published_posts SET is_deleted = 1 WHERE message_id = ?", [(mid,) for mid in live]
+            )
+        leaderboards = get_leaderboards()
+        for mid in live:
+            leaderboards.remove_post(mid)
+        logger.info(f"已删除 {len(live)} 个帖子（频道消息 {len(channel_ids)} 条，失败 {len(failed)} 条）")
+
+    results = []
+    for requested_id in requested:
+        mid = resolved[requested_id]
+        if mid not in is_deleted:
+            results.append(PostDeleteResult(requested_id, None, STATUS_NOT_FOUND))
+        elif is_deleted[mid]:
+            results.append(PostDeleteResult(requested_id, mid, STATUS_ALREADY_DELETED))
+        else:
+            post_ids = [mid] + related.get(mid, [])
+            results.append(PostDeleteResult(
+                requested_id, mid, STATUS_DELETED,
+                related_count=len(post_ids) - 1,
+                channel_deleted=not failed.intersection(post_ids),
+                index_deleted=index_deleted,
+            ))
+    return results
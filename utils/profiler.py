@@ -0,0 +1,213 @@
+"""
+采样分析器（/profile 命令使用）
+
+后台线程按固定间隔读取所有线程（事件循环线程、aiosqlite 连接线程、线程池等）当前的调用栈并计数，
+不修改被分析代码，也不使用 sys.setprofile，开销只和采样频率有关，分析期间机器人照常处理请求。
+
+结果包括：
+- 按函数汇总的自身采样数（栈顶）和累计采样数（出现在栈中），不含空闲等待
+- 折叠栈格式（collapsed stacks，每行 "线程;外层函数;...;内层函数 次数"），
+  可直接用 flamegraph.pl、speedscope、inferno 等工具生成火焰图
+"""
+import asyncio
+import collections
+import os
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Counter, Dict, List, Optional, Tuple
+
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_INTERVAL = 0.01  # 100 Hz
+MAX_SECONDS = 300
+
+# 栈顶是这些函数时视为空闲等待（事件循环 select、线程等待队列/条件变量）
+_IDLE_LEAVES = {
+    ('selectors.py', 'select'),
+    ('threading.py', 'wait'),
+    ('queue.py', 'get'),
+    ('thread.py', '_worker'),
+    ('socketserver.py', 'serve_forever'),
+}
+
+
+def _short_path(filename: str) -> str:
+    """项目内文件取相对路径，第三方库取包内路径，标准库取文件名"""
+    if filename.startswith(_PROJECT_ROOT) and 'site-packages' not in filename:
+        return os.path.relpath(filename, _PROJECT_ROOT)
+    marker = 'site-packages' + os.sep
+    if marker in filename:
+        return filename.split(marker, 1)[1]
+    return os.path.basename(filename)
+
+
+def _label(code) -> str:
+    # 折叠栈格式用 ; 分隔帧，用空格分隔次数，标签中不能出现这两个字符
+    return f"{code.co_name}({_short_path(code.co_filename)}:{code.co_firstlineno})".replace(';', ':').replace(' ', '_')
+
+
+def _is_idle(code) -> bool:
+    return (os.path.basename(code.co_filename), code.co_name) in _IDLE_LEAVES
+
+
+@dataclass
+class ProfileResult:
+    """一次采样分析的结果"""
+
+    duration: float
+    interval: float
+    samples: int = 0
+    idle_samples: int = 0
+    # (线程名, 外层到内层的帧标签) -> 采样数
+    stacks: Counter = field(default_factory=collections.Counter)
+    # 空闲等待函数的标签（统计函数排行时排除）
+    idle_labels: frozenset = frozenset()
+
+    def collapsed(self) -> str:
+        """折叠栈文本（flamegraph.pl / speedscope 可直接读取）"""
+        lines = [
+            ';'.join((thread.replace(';', ':').replace(' ', '_'),) + frames) + f" {count}"
+            for (thread, frames), count in self.stacks.most_common()
+        ]
+        return '\n'.join(lines) + '\n'
+
+    def top_functions(self, limit: int = 20, include_idle: bool = False) -> List[Tuple[str, int, int]]:
+        """
+        按自身采样数排序的函数
+
+        Returns:
+            List[Tuple[str, int, int]]: (函数, 自身采样数, 累计采样数)
+        """
+        own: Counter = collections.Counter()
+        total: Counter = collections.Counter()
+        for (_, frames), count in self.stacks.items():
+            if not frames or (not include_idle and frames[-1] in self.idle_labels):
+                continue
+            own[frames[-1]] += count
+            for label in set(frames):
+                total[label] += count
+        return [(label, count, total[label]) for label, count in own.most_common(limit)]
+
+    def summary(self, limit: int = 15) -> str:
+        """文本摘要（发送给管理员）"""
+        busy = self.samples - self.idle_samples
+        lines = [
+            f"采样 {self.duration:.1f} 秒，间隔 {self.interval * 1000:.0f} ms，"
+            f"共 {self.samples} 个线程样本（忙碌 {busy}，空闲等待 {self.idle_samples}）",
+            "",
+            "自身% 累计%  函数",
+        ]
+        for label, own, total in self.top_functions(limit):
+            lines.append(f"{own / max(busy, 1):5.1%} {total / max(busy, 1):5.1%}  {label}")
+        if busy == 0:
+            lines.append("（采样期间所有线程都在空闲等待）")
+        return '\n'.join(lines)
+
+
+class SamplingProfiler:
+    """
+    采样分析器
+
+    Args:
+        interval: 采样间隔（秒）
+    """
+
+    def __init__(self, interval: float = DEFAULT_INTERVAL):
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._labels: Dict[object, str] = {}
+        self._idle_labels: set = set()
+        self._thread_names: Dict[int, str] = {}
+        self._stacks: Counter = collections.Counter()
+        self._samples = 0
+        self._idle_samples = 0
+        self._started = 0.0
+        self._stopped = 0.0
+
+    def start(self):
+        """开始采样"""
+        self._started = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> ProfileResult:
+        """停止采样并返回结果"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        self._stopped = time.monotonic()
+        stacks: Counter = collections.Counter()
+        for (thread_id, codes), count in self._stacks.items():
+            frames = tuple(self._label(code) for code in codes)
+            stacks[(self._thread_names[thread_id], frames)] += count
+        return ProfileResult(
+            duration=self._stopped - self._started,
+            interval=self.interval,
+            samples=self._samples,
+            idle_samples=self._idle_samples,
+            stacks=stacks,
+            idle_labels=frozenset(self._idle_labels),
+        )
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = _label(code)
+            if _is_idle(code):
+                self._idle_labels.add(label)
+        return label
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                if thread_id not in self._thread_names:
+                    # 采样时记录线程名（分析结束时线程可能已退出）
+                    self._thread_names.update((t.ident, t.name) for t in threading.enumerate())
+                    self._thread_names.setdefault(thread_id, f"thread-{thread_id}")
+                codes = []
+                while frame is not None:
+                    codes.append(frame.f_code)
+                    frame = frame.f_back
+                if not codes:
+                    continue
+                codes.reverse()
+                self._stacks[(thread_id, tuple(codes))] += 1
+                self._samples += 1
+                if _is_idle(codes[-1]):
+                    self._idle_samples += 1
+            # 不持有帧引用，避免延长局部变量的生命周期
+            frame = None
+
+
+_running: Optional[SamplingProfiler] = None
+
+
+def is_running() -> bool:
+    """是否有分析正在进行"""
+    return _running is not None
+
+
+async def profile(seconds: float, interval: float = DEFAULT_INTERVAL) -> ProfileResult:
+    """
+    采样 seconds 秒（期间事件循环照常运行）
+
+    Raises:
+        RuntimeError: 已有分析正在进行
+    """
+    global _running
+    if _running is not None:
+        raise RuntimeError("已有分析正在进行")
+    _running = SamplingProfiler(interval)
+    try:
+        _running.start()
+        await asyncio.sleep(min(seconds, MAX_SECONDS))
+    finally:
+        profiler, _running = _running, None
+        result = profiler.stop()
+    return result
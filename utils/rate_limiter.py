@@ -0,0 +1,325 @@
+"""
+Telegram API 全局限流模块
+
+所有经过 Bot 的请求由 ApiRateLimiter（python-telegram-bot 的 BaseRateLimiter 扩展点）统一调度：
+
+- 全局令牌桶（默认每秒 30 个请求）和按会话的令牌桶（私聊每秒 1 条，群组/频道每分钟 20 条，
+  只对发送、转发、编辑类请求生效）
+- 请求按优先级排队：交互回复 > 发布 > 后台任务，令牌不足时优先放行高优先级请求，
+  后台统计任务不会挤占用户交互
+- 集中处理 RetryAfter：暂停对应会话（没有会话时暂停全部请求）后自动重试
+- 记录各优先级的排队延迟，供 /debug 查看；按接口记录请求数和耗时指标
+
+优先级默认取自上下文（api_priority），后台任务和发布队列在各自的协程中设置一次即可；
+单个请求也可以通过 rate_limit_args 参数指定。
+"""
+import asyncio
+import contextlib
+import functools
+import itertools
+import logging
+import time
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Union
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from utils import metrics, tracing
+
+logger = logging.getLogger(__name__)
+
+API_REQUESTS = metrics.counter(
+    'telesubmit_telegram_api_requests_total', 'Telegram API 请求数，按接口和结果', ('method', 'result')
+)
+API_SECONDS = metrics.histogram('telesubmit_telegram_api_seconds', 'Telegram API 请求耗时（秒，不含排队）', ('method',))
+API_QUEUE_SECONDS = metrics.histogram('telesubmit_telegram_api_queue_seconds', '限流排队耗时（秒）', ('priority',))
+
+# 请求优先级（数值越小越优先；不使用 0，因为 rate_limit_args 为假值时会被忽略）
+PRIORITY_INTERACTIVE = 1
+PRIORITY_PUBLISH = 2
+PRIORITY_BACKGROUND = 3
+
+PRIORITY_NAMES = {
+    PRIORITY_INTERACTIVE: 'interactive',
+    PRIORITY_PUBLISH: 'publish',
+    PRIORITY_BACKGROUND: 'background',
+}
+
+# 受会话限流约束的接口前缀（读取类接口只受全局限流）
+CHAT_LIMITED_PREFIXES = ('send', 'forward', 'copy', 'edit')
+# 私聊允许的短时突发条数
+CHAT_BURST = 3
+# 会话令牌桶超过该数量时清理已回满的桶
+MAX_CHAT_BUCKETS = 1024
+
+_current_priority: ContextVar[int] = ContextVar('api_priority', default=PRIORITY_INTERACTIVE)
+
+
+@contextlib.contextmanager
+def api_priority(priority: int):
+    """
+    在当前上下文（及其创建的任务）中设置 API 请求优先级
+
+    Args:
+        priority: PRIORITY_* 常量
+    """
+    token = _current_priority.set(priority)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+
+def with_api_priority(priority: int):
+    """
+    装饰器：协程函数内发出的 API 请求使用指定优先级（用于后台定时任务）
+
+    Args:
+        priority: PRIORITY_* 常量
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with api_priority(priority):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class TokenBucket:
+    """令牌桶：每秒补充 rate 个令牌，最多积攒 capacity 个"""
+
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        """距下一个令牌可用的秒数（0 表示现在可用）"""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now: float):
+        self._refill(now)
+        self.tokens -= 1
+
+    def is_full(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+def _retry_seconds(error: RetryAfter) -> float:
+    retry_after = error.retry_after
+    if hasattr(retry_after, 'total_seconds'):
+        retry_after = retry_after.total_seconds()
+    return float(retry_after)
+
+
+class ApiRateLimiter(BaseRateLimiter[int]):
+    """
+    按优先级调度的全局 + 按会话令牌桶限流器
+
+    通过 Application.builder().rate_limiter(...) 安装后对该 Bot 的全部请求生效。
+    """
+
+    def __init__(self, global_rate: float = 30, chat_rate: float = 1, group_per_minute: float = 20,
+                 max_retries: int = 3):
+        """
+        Args:
+            global_rate: 全局每秒请求数
+            chat_rate: 私聊每秒消息数
+            group_per_minute: 群组/频道每分钟消息数
+            max_retries: 遇到 RetryAfter 时的最大重试次数
+        """
+        self.global_rate = global_rate
+        self.chat_rate = chat_rate
+        self.group_per_minute = group_per_minute
+        self.max_retries = max_retries
+        self._global: Optional[TokenBucket] = None
+        self._chat_buckets: Dict[Union[int, str], TokenBucket] = {}
+        # RetryAfter 暂停截止时间：会话 -> loop 时间（None 表示全部请求）
+        self._paused_until: Dict[Optional[Union[int, str]], float] = {}
+        self._waiters: List[tuple] = []
+        self._seq = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._stats = {
+            name: {'requests': 0, 'wait_total': 0.0, 'wait_max': 0.0} for name in PRIORITY_NAMES.values()
+        }
+        self._retry_after = {'count': 0, 'seconds': 0.0}
+
+    async def initialize(self) -> None:
+        """调度协程在第一个请求时启动"""
+
+    async def shutdown(self) -> None:
+        """停止调度协程"""
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._dispatcher
+            self._dispatcher = None
+
+    @staticmethod
+    def _chat_key(endpoint: str, data: Dict[str, Any]):
+        if not endpoint.startswith(CHAT_LIMITED_PREFIXES):
+            return None
+        chat_id = data.get('chat_id')
+        with contextlib.suppress(ValueError, TypeError):
+            chat_id = int(chat_id)
+        return chat_id
+
+    def _chat_bucket(self, chat_key, now: float) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_key)
+        if bucket is None:
+            if len(self._chat_buckets) > MAX_CHAT_BUCKETS:
+                for key in [key for key, b in self._chat_buckets.items() if b.is_full(now)]:
+                    del self._chat_buckets[key]
+            # 负数ID和 @username 为群组/频道
+            if isinstance(chat_key, str) or chat_key < 0:
+                bucket = TokenBucket(self.group_per_minute / 60, self.group_per_minute, now)
+            else:
+                bucket = TokenBucket(self.chat_rate, CHAT_BURST, now)
+            self._chat_buckets[chat_key] = bucket
+        return bucket
+
+    def _global_wait(self, now: float) -> float:
+        paused = self._paused_until.get(None, 0) - now
+        return max(self._global.wait_time(now), paused, 0.0)
+
+    def _chat_wait(self, chat_key, now: float) -> float:
+        if chat_key is None:
+            return 0.0
+        paused = self._paused_until.get(chat_key, 0) - now
+        return max(self._chat_bucket(chat_key, now).wait_time(now), paused, 0.0)
+
+    async def _dispatch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            now = loop.time()
+            delay = None
+            pending = []
+            for waiter in sorted(self._waiters):
+                _, _, chat_key, future = waiter
+                if future.done():
+                    continue
+                global_wait = self._global_wait(now)
+                if global_wait > 0:
+                    # 全局令牌不足：后面的（更低优先级的）请求也不能放行
+                    delay = global_wait if delay is None else min(delay, global_wait)
+                    pending.append(waiter)
+                    continue
+                chat_wait = self._chat_wait(chat_key, now)
+                if chat_wait > 0:
+                    delay = chat_wait if delay is None else min(delay, chat_wait)
+                    pending.append(waiter)
+                    continue
+                self._global.take(now)
+                if chat_key is not None:
+                    self._chat_bucket(chat_key, now).take(now)
+                future.set_result(None)
+            self._waiters = pending
+
+            self._wakeup.clear()
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+
+    async def _acquire(self, priority: int, chat_key):
+        loop = asyncio.get_running_loop()
+        if self._dispatcher is None:
+            self._global = TokenBucket(self.global_rate, self.global_rate, loop.time())
+            self._wakeup = asyncio.Event()
+            self._dispatcher = loop.create_task(self._dispatch(), name='api-rate-limiter')
+        started = loop.time()
+        future = loop.create_future()
+        self._waiters.append((priority, next(self._seq), chat_key, future))
+        self._wakeup.set()
+        await future
+
+        waited = loop.time() - started
+        name = PRIORITY_NAMES.get(priority, 'interactive')
+        API_QUEUE_SECONDS.labels(name).observe(waited)
+        stats = self._stats[name]
+        stats['requests'] += 1
+        stats['wait_total'] += waited
+        stats['wait_max'] = max(stats['wait_max'], waited)
+
+    def _pause(self, chat_key, seconds: float):
+        until = asyncio.get_running_loop().time() + seconds
+        self._paused_until[chat_key] = max(self._paused_until.get(chat_key, 0), until)
+        self._retry_after['count'] += 1
+        self._retry_after['seconds'] += seconds
+
+    async def process_request(self, callback, args: Any, kwargs: Dict[str, Any], endpoint: str,
+                              data: Dict[str, Any], rate_limit_args: Optional[int]):
+        """
+        按优先级和令牌桶放行请求，遇到 RetryAfter 时暂停后重试
+
+        Args:
+            rate_limit_args: 请求优先级（PRIORITY_*），未指定时使用上下文中的优先级
+        """
+        priority = rate_limit_args or _current_priority.get()
+        chat_key = self._chat_key(endpoint, data)
+        with tracing.span(f'api.{endpoint}', priority=priority):
+            for attempt in range(self.max_retries + 1):
+                await self._acquire(priority, chat_key)
+                started = time.perf_counter()
+                try:
+                    result = await callback(*args, **kwargs)
+                except RetryAfter as e:
+                    API_REQUESTS.labels(endpoint, 'retry_after').inc()
+                    seconds = _retry_seconds(e) + 0.1
+                    self._pause(chat_key, seconds)
+                    if attempt == self.max_retries:
+                        logger.warning(f"{endpoint} 触发限流，已重试 {self.max_retries} 次，放弃")
+                        raise
+                    logger.info(f"{endpoint} 触发限流（会话: {chat_key or '全部'}），{seconds:.1f} 秒后重试")
+                    continue
+                except Exception:
+                    API_REQUESTS.labels(endpoint, 'error').inc()
+                    raise
+                finally:
+                    API_SECONDS.labels(endpoint).observe(time.perf_counter() - started)
+                API_REQUESTS.labels(endpoint, 'ok').inc()
+                return result
+            return None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        各优先级的请求数和排队延迟、RetryAfter 次数、当前排队数
+
+        Returns:
+            Dict[str, Any]: 统计数据（延迟单位为秒）
+        """
+        priorities = {}
+        for name, stats in self._stats.items():
+            requests = stats['requests']
+            priorities[name] = {
+                'requests': requests,
+                'wait_avg': stats['wait_total'] / requests if requests else 0.0,
+                'wait_max': stats['wait_max'],
+            }
+        return {
+            'priorities': priorities,
+            'retry_after': dict(self._retry_after),
+            'queued': sum(1 for *_, future in self._waiters if not future.done()),
+        }
+
+
+async def pace(bot, seconds: float):
+    """
+    未启用全局限流器时按固定间隔休眠（启用时由限流器按令牌桶调度，无需休眠）
+
+    Args:
+        bot: Bot 实例
+        seconds: 休眠秒数
+    """
+    if not isinstance(getattr(bot, 'rate_limiter', None), ApiRateLimiter):
+        await asyncio.sleep(seconds)
@@ -3,22 +3,54 @@
 改编自 tg_searcher 项目，用于 TeleSubmit-v2
 """
 import logging
+from contextlib import contextmanager
 from pathlib import Path
 from datetime import datetime
-from typing import Optional, List
+from typing import Optional, List, Dict, Iterable
 import shutil
 
 from whoosh import index
-from whoosh.fields import Schema, TEXT, ID, DATETIME, NUMERIC
+from whoosh.columns import VarBytesListColumn
+from whoosh.fields import Schema, TEXT, ID, DATETIME, NUMERIC, KEYWORD
+from whoosh import sorting
+from whoosh.sorting import FieldFacet
 from whoosh.qparser import QueryParser, MultifieldParser
 from whoosh.writing import IndexWriter
 from whoosh.query import Term, Or, DateRange, NumericRange, And, Wildcard, FuzzyTerm
 import whoosh.highlight as highlight
 from config.settings import SEARCH_ANALYZER, SEARCH_HIGHLIGHT
+from database.post_tags import parse_tags
+from utils import metrics, tracing
 import re
 
 logger = logging.getLogger(__name__)
 
+SEARCH_SECONDS = metrics.histogram('telesubmit_search_seconds', '全文搜索耗时（秒）')
+INDEX_WRITE_SECONDS = metrics.histogram(
+    'telesubmit_index_write_seconds', '搜索索引写入（含提交）耗时（秒）', ('op',)
+)
+
+
+class TagField(KEYWORD):
+    """
+    精确匹配的标签字段
+    
+    每个规范化标签（小写、不含 #，逗号分隔）是一个独立的词项，按标签过滤是一次
+    倒排表查找；同时把标签列表写入列存储，用于统计结果集中各标签的数量（分面）。
+    """
+    
+    def __init__(self):
+        super().__init__(stored=False, lowercase=True, commas=True, scorable=False)
+        self.column_type = VarBytesListColumn()
+    
+    def to_column_value(self, value):
+        if not value:
+            return []
+        return [token.encode('utf-8') for token in self.process_text(value, mode='index')]
+    
+    def from_column_value(self, value):
+        return [item.decode('utf-8') for item in value]
+
 
 class PostDocument:
     """搜索文档数据结构"""
@@ -45,6 +77,7 @@ class PostDocument:
             title=TEXT(stored=True, analyzer=analyzer),
             description=TEXT(stored=False, analyzer=analyzer),  # 仅用于检索，不存储
             tags=TEXT(stored=True, analyzer=analyzer),
+            tag=TagField(),  # 规范化标签，精确匹配和分面统计
             filename=TEXT(stored=True, analyzer=analyzer),
             link=TEXT(stored=False),      # 不展示，不存储
             user_id=ID(stored=True),
@@ -79,6 +112,7 @@ class PostDocument:
             'title': self.title,
             'description': self.description,
             'tags': self.tags,
+            'tag': ','.join(name.replace(',', ' ') for name in parse_tags(self.tags)),
             'filename': self.filename,
             'link': self.link,
             'user_id': str(self.user_id),  # 转换为字符串以支持大整数
@@ -118,11 +152,14 @@ class SearchResult:
     """搜索结果集"""
     
     def __init__(self, hits: List[SearchHit], total_results: int, 
-                 is_last_page: bool, page_num: int):
+                 is_last_page: bool, page_num: int,
+                 tag_counts: Optional[Dict[str, int]] = None):
         self.hits = hits
         self.total_results = total_results
         self.is_last_page = is_last_page
         self.page_num = page_num
+        # 整个匹配结果集（不仅是当前页）中各标签的帖子数，按数量降序
+        self.tag_counts = tag_counts or {}
 
 
 class PostSearchEngine:
@@ -214,6 +251,15 @@ class PostSearchEngine:
                     logger.warning(f"Schema 字段不匹配: 当前={current_fields}, 索引={index_fields}")
                     return False
                 
+                # 比较字段类型（字段改为其他类型时需要重建）
+                changed = [
+                    name for name in current_fields
+                    if type(current_schema[name]) is not type(index_schema[name])
+                ]
+                if changed:
+                    logger.warning(f"Schema 字段类型不匹配: {changed}")
+                    return False
+                
                 # 检查分词器类型（通过尝试搜索来验证）
                 try:
                     searcher.search(Term("title", "test"), limit=1)
@@ -274,6 +320,12 @@ class PostSearchEngine:
             # 不抛出异常，允许程序继续运行（搜索功能降级）
             logger.warning("索引重建失败，搜索功能可能不可用")
     
+    @contextmanager
+    def _writer(self, op: str):
+        """索引写入器（退出时提交），记录写入和提交耗时"""
+        with tracing.span(f'index.{op}'), INDEX_WRITE_SECONDS.labels(op).time(), self.ix.writer() as writer:
+            yield writer
+    
     def add_post(self, post: PostDocument, writer: Optional[IndexWriter] = None):
         """
         添加帖子到索引
@@ -285,7 +337,7 @@ class PostSearchEngine:
         if writer is not None:
             writer.add_document(**post.as_dict())
         else:
-            with self.ix.writer() as writer:
+            with self._writer('add') as writer:
                 writer.add_document(**post.as_dict())
         logger.debug(f"添加帖子到索引: {post.message_id}")
     
@@ -296,7 +348,7 @@ class PostSearchEngine:
         Args:
             post: 帖子文档
         """
-        with self.ix.writer() as writer:
+        with self._writer('update') as writer:
             writer.update_document(**post.as_dict())
         logger.debug(f"更新帖子索引: {post.message_id}")
     
@@ -307,15 +359,33 @@ class PostSearchEngine:
         Args:
             message_id: 消息 ID
         """
-        with self.ix.writer() as writer:
+        with self._writer('delete') as writer:
             writer.delete_by_term('message_id', str(message_id))
         logger.debug(f"从索引删除帖子: {message_id}")
     
+    def delete_posts(self, message_ids: Iterable[int]) -> int:
+        """
+        批量从索引中删除帖子（一个写入器、一次提交）
+        
+        Args:
+            message_ids: 消息 ID 列表
+        
+        Returns:
+            int: 删除的文档数
+        """
+        deleted = 0
+        with self._writer('delete') as writer:
+            for message_id in message_ids:
+                deleted += writer.delete_by_term('message_id', str(message_id))
+        logger.debug(f"从索引批量删除帖子: {deleted} 个文档")
+        return deleted
+    
     def search(self, query_str: str, page_num: int = 1, page_len: int = 10,
                time_filter: Optional[DateRange] = None,
                user_filter: Optional[int] = None,
                tag_filter: Optional[str] = None,
-               sort_by: str = "publish_time") -> SearchResult:
+               sort_by: str = "publish_time",
+               tag_counts: bool = True) -> SearchResult:
         """
         搜索帖子
         
@@ -325,15 +395,27 @@ class PostSearchEngine:
             page_len: 每页结果数量
             time_filter: 时间过滤器
             user_filter: 用户ID过滤
-            tag_filter: 标签过滤
+            tag_filter: 标签过滤（精确匹配规范化标签）
             sort_by: 排序字段（publish_time 或 heat_score）
+            tag_counts: 是否统计匹配结果集中各标签的数量
         
         Returns:
             SearchResult: 搜索结果
         """
         try:
+            # 标签精确匹配（规范化后的 tag 字段词项）
+            tag_term = None
+            if tag_filter:
+                tag_names = parse_tags(tag_filter)
+                if tag_names:
+                    tag_term = Term('tag', tag_names[0])
+            
             # 解析查询
-            if query_str.strip():
+            if not query_str.strip() and tag_term is not None:
+                # 纯标签搜索：直接用标签词项的倒排表作为查询
+                q = tag_term
+                tag_term = None
+            elif query_str.strip():
                 # 检测是否包含中文字符，且使用 SimpleAnalyzer
                 # SimpleAnalyzer 将中文作为整体索引，需要特殊处理以支持部分匹配
                 has_chinese = bool(re.search(r'[\u4e00-\u9fff]', query_str))
@@ -365,9 +447,8 @@ class PostSearchEngine:
             if user_filter is not None:
                 filters.append(Term('user_id', str(user_filter)))  # 转换为字符串
             
-            if tag_filter:
-                # 标签精确匹配
-                filters.append(Term('tags', tag_filter))
+            if tag_term is not None:
+                filters.append(tag_term)
             
             # 合并过滤条件
             q_filter = None
@@ -377,17 +458,33 @@ class PostSearchEngine:
                 else:
                     q_filter = And(filters)
             
+            # 按标签分面统计（旧索引没有 tag 字段时跳过）
+            facet_kwargs = {}
+            if tag_counts and 'tag' in self.ix.schema:
+                facet_kwargs['groupedby'] = {'tag': FieldFacet('tag', allow_overlap=True)}
+                facet_kwargs['maptype'] = sorting.Count
+            
             # 执行搜索
-            with self.ix.searcher() as searcher:
+            with tracing.span('search', page=page_num), SEARCH_SECONDS.time(), self.ix.searcher() as searcher:
                 result_page = searcher.search_page(
                     q, 
                     page_num, 
                     page_len,
                     filter=q_filter,
                     sortedby=sort_by,
-                    reverse=True
+                    reverse=True,
+                    **facet_kwargs
                 )
                 
+                counts = {}
+                if facet_kwargs:
+                    for key, count in result_page.results.groups('tag').items():
+                        if key is None:
+                            continue
+                        name = key.decode('utf-8') if isinstance(key, bytes) else str(key)
+                        counts[name] = count
+                    counts = dict(sorted(counts.items(), key=lambda kv: kv[1], reverse=True))
+                
                 # 构建结果
                 hits = []
                 for hit in result_page:
@@ -435,7 +532,8 @@ class PostSearchEngine:
                     hits=hits,
                     total_results=result_page.total,
                     is_last_page=result_page.is_last_page(),
-                    page_num=page_num
+                    page_num=page_num,
+                    tag_counts=counts
                 )
         
         except Exception as e:
@@ -474,8 +572,9 @@ class PostSearchEngine:
         与历史脚本向后兼容，供 upgrade/检查脚本调用。
         """
         try:
-            writer = self.ix.writer()
-            writer.commit(optimize=True)
+            with INDEX_WRITE_SECONDS.labels('optimize').time():
+                writer = self.ix.writer()
+                writer.commit(optimize=True)
             logger.info("索引优化完成")
         except Exception as e:
             logger.error(f"索引优化失败: {e}", exc_info=True)
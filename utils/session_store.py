@@ -0,0 +1,352 @@
+"""
+有界的会话数据存储（PTB user_data / chat_data）
+
+PTB 为每个交互过的用户和会话在内存中保留一个 dict，且从不释放；公开频道的机器人会无限增长。
+install() 把 Application 的 user_data / chat_data 替换为 BoundedDataStore：
+
+- 条目按最近访问排序（LRU），空闲超过 SESSION_IDLE_TTL 或超出 SESSION_MAX_ENTRIES 时
+  序列化后写入 session_data 表并从内存移除（空条目直接丢弃）
+- 内存调控进入软/硬限制时按比例提前溢出（见 utils/memory_governor.py）
+- 已溢出的条目在对应用户/会话的下一个更新到达时，由最先执行的处理器组读回，处理器看到的数据不变
+- 最近 MIN_IDLE_SECONDS 秒内访问过的条目不会溢出，避免处理器仍持有引用时数据被拆成两份
+- 启用持久化（utils/persistence.py）时，读回后保留数据库中的数据，最近访问的条目至少保留
+  两个持久化周期，确保 PTB 提交变更时条目仍在内存中
+"""
+import asyncio
+import collections
+import logging
+import pickle
+import time
+from types import MappingProxyType
+from typing import Any, Callable, Dict, Optional, Set
+
+from telegram import Update
+from telegram.ext import TypeHandler
+
+from config.settings import SESSION_MAX_ENTRIES, SESSION_IDLE_TTL, SESSION_RETENTION_DAYS
+from database import session_data
+from database.db_manager import get_db
+from utils import memory_governor, metrics
+
+logger = logging.getLogger(__name__)
+
+SESSION_ENTRIES = metrics.gauge('telesubmit_session_entries', '内存中的会话数据条目数', ('kind',))
+SESSION_SPILLED = metrics.gauge('telesubmit_session_spilled_entries', '已溢出到数据库的会话数据条目数', ('kind',))
+SESSION_EVICTIONS = metrics.counter(
+    'telesubmit_session_evictions_total', '从内存移出的会话数据条目数', ('kind', 'reason')
+)
+SESSION_RESTORES = metrics.counter('telesubmit_session_restores_total', '从数据库读回的会话数据条目数', ('kind',))
+
+# 溢出原因
+REASON_IDLE = 'idle'
+REASON_SIZE = 'size'
+REASON_MEMORY = 'memory'
+
+# 最近访问过的条目不溢出（秒）
+MIN_IDLE_SECONDS = 60
+# 溢出检查间隔（秒）
+EVICT_INTERVAL = 60
+# 读回处理器所在的组（早于所有其他处理器）
+RESTORE_GROUP = -1000
+
+
+class BoundedDataStore(collections.OrderedDict):
+    """
+    按最近访问排序、可溢出到数据库的 user_data / chat_data 存储
+
+    与 PTB 默认的 defaultdict 一样，读取不存在的条目时创建空条目。
+
+    Args:
+        kind: 条目类型（session_data.KIND_USER / KIND_CHAT）
+        factory: 新条目的工厂（ContextTypes.user_data / chat_data）
+        max_entries: 内存中最多保留的条目数
+        idle_ttl: 空闲多久（秒）后溢出
+    """
+
+    def __init__(self, kind: str, factory: Callable[[], Any], max_entries: int, idle_ttl: float):
+        super().__init__()
+        self.kind = kind
+        self.factory = factory
+        self.max_entries = max_entries
+        self.idle_ttl = idle_ttl
+        # 最近访问过多久内的条目不溢出（秒）
+        self.min_idle = MIN_IDLE_SECONDS
+        # 读回后是否保留数据库中的数据（启用持久化时）
+        self.keep_rows = False
+        self._touched: Dict[int, float] = {}
+        # 尚未写入数据库的变更：ID -> 序列化的数据（None 表示删除）
+        self._pending: Dict[int, Optional[bytes]] = {}
+        # 最新数据在数据库中（或待写入）的 ID
+        self._spilled: Set[int] = set()
+        self._flush_lock = asyncio.Lock()
+        self._flush_task: Optional[asyncio.Task] = None
+        self._evictions = {
+            reason: SESSION_EVICTIONS.labels(kind, reason) for reason in (REASON_IDLE, REASON_SIZE, REASON_MEMORY)
+        }
+        self._restores = SESSION_RESTORES.labels(kind)
+
+    def __getitem__(self, key):
+        value = super().__getitem__(key)
+        self.move_to_end(key)
+        self._touched[key] = time.monotonic()
+        return value
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.move_to_end(key)
+        self._touched[key] = time.monotonic()
+
+    def __missing__(self, key):
+        data = self._pending.get(key)
+        value = None
+        if key in self._spilled and data is not None:
+            # 已溢出但尚未写入数据库，直接从内存读回
+            value = self._loads(key, data)
+        if value is None:
+            value = self.factory()
+        else:
+            self._take_back(key)
+        self[key] = value
+        return value
+
+    def pop(self, key, *default):
+        """删除条目（PTB drop_user_data / drop_chat_data），数据库中的数据一并删除"""
+        value = super().pop(key, *default)
+        self._touched.pop(key, None)
+        if key in self._spilled:
+            self._spilled.discard(key)
+            self._pending[key] = None
+        return value
+
+    def _take_back(self, key):
+        # 条目回到内存后以内存为准，删除数据库中的旧数据（启用持久化时由持久化覆盖）
+        self._spilled.discard(key)
+        if not self.keep_rows:
+            self._pending[key] = None
+        self._restores.inc()
+
+    def _loads(self, key, data: bytes):
+        try:
+            return pickle.loads(data)
+        except Exception as e:
+            logger.warning(f"读回会话数据失败（{self.kind} {key}）: {e}")
+            return None
+
+    async def restore(self, key: int) -> bool:
+        """
+        条目已溢出到数据库时读回内存（更新处理前调用）
+
+        Returns:
+            bool: 是否从数据库读回
+        """
+        if key in self or key not in self._spilled or self._pending.get(key) is not None:
+            return False
+        async with get_db() as conn:
+            data = await session_data.load(conn, self.kind, key)
+        # 等待期间条目可能已被创建或删除
+        if key in self or key not in self._spilled:
+            return False
+        value = self._loads(key, data) if data is not None else None
+        if value is None:
+            self._spilled.discard(key)
+            return False
+        self._take_back(key)
+        self[key] = value
+        return True
+
+    def _evict(self, keys, reason: str) -> int:
+        evicted = 0
+        for key in keys:
+            value = super().pop(key)
+            self._touched.pop(key, None)
+            if value:
+                try:
+                    data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+                except Exception as e:
+                    # 无法序列化的条目留在内存（放在最近访问的位置，避免每次检查都重试）
+                    logger.warning(f"会话数据无法序列化，保留在内存（{self.kind} {key}）: {e}")
+                    self[key] = value
+                    continue
+                self._pending[key] = data
+                self._spilled.add(key)
+            # 空条目直接丢弃（数据库中有未经读回的旧数据时保留，由保留期清理）
+            evicted += 1
+        if evicted:
+            self._evictions[reason].inc(evicted)
+        return evicted
+
+    def evict_idle(self, now: Optional[float] = None) -> int:
+        """
+        溢出空闲超时和超出条目上限的条目（写入由 flush() 完成）
+
+        Returns:
+            int: 溢出的条目数
+        """
+        now = time.monotonic() if now is None else now
+        idle, overflow = [], []
+        excess = len(self) - self.max_entries
+        for key in self:
+            idle_for = now - self._touched.get(key, 0.0)
+            if idle_for >= self.idle_ttl:
+                idle.append(key)
+            elif len(idle) + len(overflow) < excess and idle_for >= self.min_idle:
+                overflow.append(key)
+            else:
+                # 按访问时间排序，后面的条目都更新
+                break
+        return self._evict(idle, REASON_IDLE) + self._evict(overflow, REASON_SIZE)
+
+    async def flush(self) -> int:
+        """
+        把待写入的变更写入数据库
+
+        Returns:
+            int: 写入（或删除）的条目数
+        """
+        async with self._flush_lock:
+            pending = dict(self._pending)
+            if not pending:
+                return 0
+            try:
+                async with get_db() as conn:
+                    await session_data.save_many(
+                        conn, self.kind, [(key, data) for key, data in pending.items() if data is not None]
+                    )
+                    await session_data.delete_many(
+                        conn, self.kind, [key for key, data in pending.items() if data is None]
+                    )
+            except Exception as e:
+                logger.error(f"写入会话数据失败（{self.kind}，{len(pending)} 条，下次重试）: {e}")
+                return 0
+            # 写入期间被读回或再次溢出的条目保留，等待下次写入
+            for key, data in pending.items():
+                if key in self._pending and self._pending[key] is data:
+                    del self._pending[key]
+            return len(pending)
+
+    def forget(self, keys):
+        """数据库中的条目已按保留期删除"""
+        for key in keys:
+            if self._pending.get(key) is None:
+                self._spilled.discard(key)
+
+    # 内存调控接口
+
+    def memory_size(self) -> int:
+        return len(self)
+
+    def shrink(self, fraction: float) -> int:
+        """按比例溢出最久未访问的条目，并在后台写入数据库"""
+        count = int(len(self) * fraction + 0.5)
+        now = time.monotonic()
+        keys = []
+        for key in self:
+            if len(keys) >= count or now - self._touched.get(key, 0.0) < self.min_idle:
+                break
+            keys.append(key)
+        evicted = self._evict(keys, REASON_MEMORY)
+        if self._pending and (self._flush_task is None or self._flush_task.done()):
+            try:
+                self._flush_task = asyncio.get_running_loop().create_task(self.flush())
+            except RuntimeError:
+                # 不在事件循环中调用时由定时任务写入
+                pass
+        return evicted
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            'entries': len(self),
+            'spilled': len(self._spilled),
+            'pending': len(self._pending),
+        }
+
+
+_stores: Dict[str, BoundedDataStore] = {}
+
+
+def install(application, max_entries: int = SESSION_MAX_ENTRIES, idle_ttl: float = SESSION_IDLE_TTL):
+    """
+    把 Application 的 user_data / chat_data 替换为 BoundedDataStore，并注册读回处理器
+
+    需在添加其他处理器之前、application.initialize() 之前调用。启用了持久化时，
+    读回的条目保留数据库中的数据，且最近访问的条目至少保留两个持久化周期。
+
+    Args:
+        application: telegram.ext.Application 实例
+        max_entries: 每类条目在内存中最多保留的条目数
+        idle_ttl: 空闲多久（秒）后溢出
+    """
+    persistence = application.persistence
+    for kind, attr, factory in (
+        (session_data.KIND_USER, 'user_data', application.context_types.user_data),
+        (session_data.KIND_CHAT, 'chat_data', application.context_types.chat_data),
+    ):
+        store = BoundedDataStore(kind, factory, max_entries, idle_ttl)
+        if persistence is not None and getattr(persistence.store_data, attr):
+            store.keep_rows = True
+            store.min_idle = max(MIN_IDLE_SECONDS, 2 * persistence.update_interval)
+        store.update(getattr(application, '_' + attr))
+        setattr(application, '_' + attr, store)
+        setattr(application, attr, MappingProxyType(store))
+        SESSION_ENTRIES.labels(kind).set_function(store.__len__)
+        SESSION_SPILLED.labels(kind).set_function(lambda store=store: len(store._spilled))
+        memory_governor.register(f"session:{kind}", store)
+        _stores[kind] = store
+    application.add_handler(TypeHandler(Update, restore_session_data), group=RESTORE_GROUP)
+
+
+async def restore_session_data(update: Update, context) -> None:
+    """读回本次更新的用户和会话已溢出的数据（在所有其他处理器之前执行）"""
+    user_store = _stores.get(session_data.KIND_USER)
+    chat_store = _stores.get(session_data.KIND_CHAT)
+    try:
+        if user_store is not None and update.effective_user is not None:
+            await user_store.restore(update.effective_user.id)
+        if chat_store is not None and update.effective_chat is not None:
+            await chat_store.restore(update.effective_chat.id)
+    except Exception as e:
+        logger.error(f"读回会话数据失败: {e}")
+
+
+async def load_spilled():
+    """启动时读取已溢出条目的 ID（之后只有这些 ID 的更新需要查询数据库）"""
+    if not _stores:
+        return
+    async with get_db() as conn:
+        for kind, store in _stores.items():
+            store._spilled.update(await session_data.load_ids(conn, kind))
+            # 持久化已在启动时载入的条目不算溢出
+            store._spilled.difference_update(store.keys())
+    logger.info(
+        "已溢出的会话数据: " + "，".join(f"{kind} {len(store._spilled)} 条" for kind, store in _stores.items())
+    )
+
+
+async def evict_and_flush(retention: float = SESSION_RETENTION_DAYS * 86400) -> Dict[str, int]:
+    """
+    溢出空闲和超出上限的条目，写入数据库，并删除超过保留期的条目（定时任务调用）
+
+    Returns:
+        Dict[str, int]: 各类条目本次溢出的数量
+    """
+    evicted = {}
+    for kind, store in _stores.items():
+        evicted[kind] = store.evict_idle()
+        await store.flush()
+    if _stores:
+        async with get_db() as conn:
+            expired = await session_data.purge_expired(conn, retention=retention)
+        for kind, store in _stores.items():
+            store.forget(key for expired_kind, key in expired if expired_kind == kind)
+    return evicted
+
+
+async def flush_all():
+    """写入所有待写入的变更（关闭前调用）"""
+    for store in _stores.values():
+        await store.flush()
+
+
+def get_stats() -> Dict[str, Dict[str, int]]:
+    """各类条目在内存中、已溢出和待写入的数量"""
+    return {kind: store.get_stats() for kind, store in _stores.items()}
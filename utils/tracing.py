@@ -0,0 +1,282 @@
+"""
+轻量级链路追踪模块
+
+每个更新（以及定时任务、发布任务）开启一个 trace，其中嵌套记录数据库会话、索引写入、搜索、
+Bot API 请求和各处理器的耗时 span；trace ID 通过 TraceIdFilter 写入日志行。
+
+- 所有 trace 都在内存中记录（span 数有上限），结束时按 TRACE_SAMPLE_RATE 抽样导出；
+  耗时超过 TRACE_SLOW_THRESHOLD 的 trace 总是导出
+- 导出为本地 JSONL 文件（每行一个 trace），由后台线程写入，不阻塞事件循环
+- 用 analyze_traces.py 查看最慢的 trace 及其耗时分解
+
+用法：
+    with tracing.trace('update', handler='/search'):
+        with tracing.span('db'):
+            ...
+
+    @tracing.traced('publish.media')
+    async def handle_media_publish(...):
+        ...
+"""
+import asyncio
+import contextlib
+import functools
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+from config.settings import (
+    TRACING_ENABLED, TRACE_SAMPLE_RATE, TRACE_SLOW_THRESHOLD, TRACE_FILE, TRACE_FILE_MAX_MB
+)
+
+logger = logging.getLogger(__name__)
+
+# 单个 trace 最多记录的 span 数（批量任务中的循环不会无限增长）
+MAX_SPANS = 200
+
+
+class Span:
+    """一次计时操作"""
+
+    __slots__ = ('span_id', 'parent_id', 'name', 'attrs', 'start', 'duration', 'error')
+
+    def __init__(self, span_id: int, parent_id: Optional[int], name: str, attrs: Dict[str, Any]):
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.name = name
+        self.attrs = attrs
+        self.start = time.perf_counter()
+        self.duration: Optional[float] = None
+        self.error: Optional[str] = None
+
+
+class Trace:
+    """一个更新（或任务）内的全部 span"""
+
+    __slots__ = ('trace_id', 'started_at', 'spans', 'dropped', 'finished')
+
+    def __init__(self):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.started_at = time.time()
+        self.spans: List[Span] = []
+        self.dropped = 0
+        self.finished = False
+
+    def new_span(self, parent: Optional[Span], name: str, attrs: Dict[str, Any]) -> Optional[Span]:
+        if self.finished:
+            return None
+        if len(self.spans) >= MAX_SPANS:
+            self.dropped += 1
+            return None
+        span = Span(len(self.spans), parent.span_id if parent else None, name, attrs)
+        self.spans.append(span)
+        return span
+
+    def to_dict(self) -> Dict[str, Any]:
+        root = self.spans[0]
+        return {
+            'trace_id': self.trace_id,
+            'name': root.name,
+            'start': round(self.started_at, 3),
+            'duration_ms': round(root.duration * 1000, 2),
+            'attrs': root.attrs,
+            'error': root.error,
+            'dropped_spans': self.dropped,
+            'spans': [
+                {
+                    'id': span.span_id,
+                    'parent': span.parent_id,
+                    'name': span.name,
+                    'offset_ms': round((span.start - root.start) * 1000, 2),
+                    # 未结束的 span（例如 trace 结束后仍在运行的后台任务）记为 None
+                    'duration_ms': round(span.duration * 1000, 2) if span.duration is not None else None,
+                    'attrs': span.attrs,
+                    'error': span.error,
+                }
+                for span in self.spans[1:]
+            ],
+        }
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar('trace', default=None)
+_current_span: ContextVar[Optional[Span]] = ContextVar('span', default=None)
+
+
+class _FileExporter:
+    """后台线程把 trace 追加写入 JSONL 文件，超过大小上限时轮转为 .1"""
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+        self.exported = 0
+
+    def export(self, record: Dict[str, Any]):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='trace-exporter', daemon=True)
+            self._thread.start()
+        self._queue.put(record)
+
+    def _run(self):
+        while True:
+            record = self._queue.get()
+            try:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                if os.path.exists(self.path) and os.path.getsize(self.path) > self.max_bytes:
+                    os.replace(self.path, self.path + '.1')
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(record, ensure_ascii=False, default=str) + '\n')
+                self.exported += 1
+            except Exception as e:
+                logger.warning(f"写入 trace 失败: {e}")
+
+
+_exporter = _FileExporter(TRACE_FILE, int(TRACE_FILE_MAX_MB * 1024 * 1024))
+
+
+def _should_export(duration: float) -> bool:
+    return duration >= TRACE_SLOW_THRESHOLD or random.random() < TRACE_SAMPLE_RATE
+
+
+@contextlib.contextmanager
+def trace(name: str, **attrs):
+    """
+    开启一个 trace（根 span）；已在 trace 中时等同于 span()
+
+    Args:
+        name: trace 名称（update、job、publish 等）
+        **attrs: 附加属性
+    """
+    if not TRACING_ENABLED or _current_trace.get() is not None:
+        with span(name, **attrs):
+            yield
+        return
+
+    current = Trace()
+    root = current.new_span(None, name, attrs)
+    trace_token = _current_trace.set(current)
+    span_token = _current_span.set(root)
+    try:
+        yield
+    except BaseException as e:
+        root.error = f"{type(e).__name__}: {e}"[:200]
+        raise
+    finally:
+        root.duration = time.perf_counter() - root.start
+        current.finished = True
+        _current_span.reset(span_token)
+        _current_trace.reset(trace_token)
+        if _should_export(root.duration):
+            _exporter.export(current.to_dict())
+
+
+@contextlib.contextmanager
+def span(name: str, **attrs):
+    """
+    在当前 trace 中记录一个嵌套 span（不在 trace 中时不做任何事）
+
+    Args:
+        name: span 名称（db、index.add、api.sendMessage 等）
+        **attrs: 附加属性
+    """
+    current = _current_trace.get()
+    if current is None:
+        yield
+        return
+    new = current.new_span(_current_span.get(), name, attrs)
+    if new is None:
+        yield
+        return
+    token = _current_span.set(new)
+    try:
+        yield
+    except BaseException as e:
+        new.error = f"{type(e).__name__}: {e}"[:200]
+        raise
+    finally:
+        new.duration = time.perf_counter() - new.start
+        _current_span.reset(token)
+
+
+def traced(name: Optional[str] = None):
+    """
+    装饰器：函数调用记录为 span（支持协程函数和普通函数）
+
+    Args:
+        name: span 名称，默认取函数名
+    """
+    def decorator(func):
+        span_name = name or func.__name__
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(span_name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def current_trace_id() -> Optional[str]:
+    """当前 trace ID（不在 trace 中时为 None）"""
+    current = _current_trace.get()
+    return current.trace_id if current else None
+
+
+class TraceIdFilter(logging.Filter):
+    """在日志记录上设置 trace_id 字段（不在 trace 中时为 -）"""
+
+    def filter(self, record):
+        record.trace_id = current_trace_id() or '-'
+        return True
+
+
+def wrap_handler_callbacks(handler):
+    """
+    把处理器（包括 ConversationHandler 内的各处理器）的回调包装为以回调名命名的 span
+
+    Args:
+        handler: telegram.ext.BaseHandler 实例
+    """
+    from telegram.ext import ConversationHandler
+
+    if isinstance(handler, ConversationHandler):
+        nested = list(handler.entry_points) + list(handler.fallbacks)
+        for handlers in handler.states.values():
+            nested.extend(handlers)
+        for child in nested:
+            wrap_handler_callbacks(child)
+        return
+    callback = getattr(handler, 'callback', None)
+    if callback is None or getattr(callback, '__traced__', False):
+        return
+    name = getattr(callback, '__name__', type(handler).__name__)
+    wrapped = traced(f"handler.{name}")(callback)
+    wrapped.__traced__ = True
+    handler.callback = wrapped
+
+
+def get_stats() -> Dict[str, Any]:
+    """导出统计（供 /debug 使用）"""
+    return {
+        'enabled': TRACING_ENABLED,
+        'sample_rate': TRACE_SAMPLE_RATE,
+        'slow_threshold': TRACE_SLOW_THRESHOLD,
+        'exported': _exporter.exported,
+        'file': TRACE_FILE,
+    }
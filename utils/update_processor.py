@@ -0,0 +1,210 @@
+"""
+按用户有序的并发更新处理模块
+
+python-telegram-bot 默认逐个处理更新，一个用户的慢请求（发布、搜索）会拖慢所有人的按钮响应；
+直接开启 concurrent_updates 又会打乱同一用户的更新顺序，破坏 ConversationHandler 的状态流转。
+
+OrderedUpdateProcessor（BaseUpdateProcessor 扩展点）按分区处理更新：
+
+- 分区键为用户ID（没有用户时为会话ID），不同分区的更新并发处理，同一分区严格按到达顺序串行处理
+- 同时处理的分区数不超过 max_concurrent_updates；同一分区的后续更新在分区内排队，
+  不占用并发名额，单个用户的连续点击不会挤占其他用户
+- 排队和处理中的更新总数不超过 max_pending_updates，达到上限后新到达的更新等待名额
+  （Webhook 模式下接收端随即返回 503），单个用户的大量更新不会无限堆积
+- 记录各分区的排队深度和等待时间，供 /debug 查看
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Deque, Dict, Optional, Tuple, Union
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+logger = logging.getLogger(__name__)
+
+# /debug 中展示的最繁忙分区数
+BUSIEST_PARTITIONS = 5
+# 默认的排队和处理中更新总数上限
+DEFAULT_MAX_PENDING = 1000
+
+
+class _Partition:
+    """单个分区：正在处理的更新之后排队的更新"""
+
+    __slots__ = ('queue', 'running_since', 'processed', 'wait_max')
+
+    def __init__(self):
+        self.queue: Deque[Tuple[Awaitable[Any], float]] = deque()
+        self.running_since: Optional[float] = None
+        self.processed = 0
+        self.wait_max = 0.0
+
+
+def partition_key(update: object) -> Optional[Union[int, str]]:
+    """
+    更新所属的分区（用户ID，没有用户时为会话ID）
+
+    Args:
+        update: 更新对象
+
+    Returns:
+        分区键，无法确定时返回 None（不排序，直接处理）
+    """
+    if not isinstance(update, Update):
+        return None
+    if update.effective_user:
+        return update.effective_user.id
+    if update.effective_chat:
+        return update.effective_chat.id
+    return None
+
+
+class OrderedUpdateProcessor(BaseUpdateProcessor):
+    """
+    跨用户并发、同一用户串行的更新处理器
+
+    通过 Application.builder().concurrent_updates(...) 安装。
+    """
+
+    def __init__(self, max_concurrent_updates: int, max_pending_updates: int = DEFAULT_MAX_PENDING):
+        """
+        Args:
+            max_concurrent_updates: 同时处理的分区数上限
+            max_pending_updates: 排队和处理中的更新总数上限（不小于 max_concurrent_updates）
+        """
+        super().__init__(max_concurrent_updates)
+        self.max_pending_updates = max(max_pending_updates, max_concurrent_updates)
+        self._pending_slots = asyncio.Semaphore(self.max_pending_updates)
+        self._partitions: Dict[Union[int, str], _Partition] = {}
+        self._pending = 0
+        self._blocked = 0
+        self._in_flight = 0
+        self._processed = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    async def initialize(self) -> None:
+        """无需初始化"""
+
+    async def shutdown(self) -> None:
+        """丢弃停止时仍在排队的更新"""
+        dropped = 0
+        for partition in self._partitions.values():
+            dropped += self._drop_queued(partition)
+        self._partitions.clear()
+        if dropped:
+            logger.warning(f"停止时丢弃了 {dropped} 个排队中的更新")
+
+    def _release(self):
+        self._pending -= 1
+        self._pending_slots.release()
+
+    def _drop_queued(self, partition: _Partition) -> int:
+        dropped = 0
+        while partition.queue:
+            coroutine, _ = partition.queue.popleft()
+            coroutine.close()
+            self._release()
+            dropped += 1
+        return dropped
+
+    def is_saturated(self) -> bool:
+        """排队和处理中的更新数是否已达上限"""
+        return self._pending >= self.max_pending_updates
+
+    def _record_wait(self, partition: Optional[_Partition], waited: float):
+        self._processed += 1
+        self._wait_total += waited
+        self._wait_max = max(self._wait_max, waited)
+        if partition is not None:
+            partition.processed += 1
+            partition.wait_max = max(partition.wait_max, waited)
+
+    async def _run(self, coroutine: Awaitable[Any]):
+        self._in_flight += 1
+        try:
+            await coroutine
+        except Exception as e:
+            # Application.process_update 自行处理异常，这里只防止异常中断分区内的后续更新
+            logger.error(f"处理更新时出错: {e}", exc_info=True)
+        finally:
+            self._in_flight -= 1
+            self._release()
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        """
+        处理更新：分区空闲时立即处理，并依次处理处理期间到达的同一分区的更新；
+        分区忙时加入分区队列后立即返回（释放并发名额）。
+        排队和处理中的更新达到上限时，先等待已有更新处理完成
+
+        Args:
+            update: 更新对象
+            coroutine: 处理该更新的协程
+        """
+        self._blocked += 1
+        try:
+            await self._pending_slots.acquire()
+        finally:
+            self._blocked -= 1
+        self._pending += 1
+
+        key = partition_key(update)
+        if key is None:
+            self._record_wait(None, 0.0)
+            await self._run(coroutine)
+            return
+
+        partition = self._partitions.get(key)
+        if partition is not None:
+            partition.queue.append((coroutine, time.monotonic()))
+            return
+
+        partition = self._partitions[key] = _Partition()
+        try:
+            self._record_wait(partition, 0.0)
+            partition.running_since = time.monotonic()
+            await self._run(coroutine)
+            while partition.queue:
+                coroutine, enqueued_at = partition.queue.popleft()
+                partition.running_since = time.monotonic()
+                self._record_wait(partition, partition.running_since - enqueued_at)
+                await self._run(coroutine)
+        finally:
+            self._partitions.pop(key, None)
+            # 处理被取消时，分区内剩余的更新不再有人处理
+            self._drop_queued(partition)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        并发处理统计：正在处理的更新数、排队数、等待名额的更新数、等待时间和最繁忙的分区
+
+        Returns:
+            Dict[str, Any]: 统计数据（时间单位为秒）
+        """
+        now = time.monotonic()
+        partitions = []
+        for key, partition in self._partitions.items():
+            oldest = now - partition.queue[0][1] if partition.queue else 0.0
+            partitions.append({
+                'key': key,
+                'queued': len(partition.queue),
+                'oldest_wait': oldest,
+                'wait_max': max(partition.wait_max, oldest),
+                'running': now - partition.running_since if partition.running_since else 0.0,
+            })
+        partitions.sort(key=lambda p: (p['queued'], p['oldest_wait']), reverse=True)
+        return {
+            'max_concurrent': self.max_concurrent_updates,
+            'in_flight': self._in_flight,
+            'active_partitions': len(partitions),
+            'queued': sum(p['queued'] for p in partitions),
+            'pending': self._pending,
+            'max_pending': self.max_pending_updates,
+            'blocked': self._blocked,
+            'processed': self._processed,
+            'wait_avg': self._wait_total / self._processed if self._processed else 0.0,
+            'wait_max': self._wait_max,
+            'busiest': partitions[:BUSIEST_PARTITIONS],
+        }
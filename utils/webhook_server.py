@@ -1,20 +1,58 @@
 """
 Webhook 服务器模块
 用于接收 Telegram 的 Webhook 推送
+
+接收路径只做最少的工作后立即应答：
+- 常量时间比较 Secret Token
+- 使用 orjson（未安装时回退到标准库 json）解析请求体
+- 按 update_id 丢弃 Telegram 重复投递的更新（最近 DEDUP_WINDOW 个）
+- 放入有界队列后应答，由转发协程构造 Update 对象并交给 Application；
+  队列饱和或更新处理器的待处理数达到上限时返回 503，Telegram 会稍后重新投递
 """
-import os
+import asyncio
+import contextlib
+import hmac
 import logging
 import secrets
+from collections import deque
+from typing import Any, Dict, Optional
+
 from aiohttp import web
 from telegram import Update
 
+from utils import metrics
+from utils.update_processor import OrderedUpdateProcessor
+
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    import json
+    _json_loads = json.loads
+
 logger = logging.getLogger(__name__)
 
+WEBHOOK_REQUESTS = metrics.counter('telesubmit_webhook_requests_total', 'Webhook 请求数，按处理结果', ('result',))
+
+SECRET_TOKEN_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+# 记住最近多少个 update_id 用于去重
+DEDUP_WINDOW = 2048
+# 默认的待处理更新上限（接收队列和 Application 更新队列合计）
+DEFAULT_MAX_QUEUE = 1000
+
+_webhook_server: Optional['WebhookServer'] = None
+
+
+def get_webhook_server() -> Optional['WebhookServer']:
+    """获取正在运行的 Webhook 服务器（Polling 模式下为 None）"""
+    return _webhook_server
+
 
 class WebhookServer:
     """Webhook 服务器类"""
     
-    def __init__(self, application, port: int, path: str, secret_token: str = None):
+    def __init__(self, application, port: int, path: str, secret_token: str = None,
+                 max_queue: int = DEFAULT_MAX_QUEUE):
         """
         初始化 Webhook 服务器
         
@@ -23,80 +61,131 @@ class WebhookServer:
             port: 监听端口
             path: Webhook 路径
             secret_token: 可选的密钥 token，用于验证请求来源
+            max_queue: 待处理更新上限，超过时返回 503
         """
         self.application = application
         self.port = port
         self.path = path
         self.secret_token = secret_token or secrets.token_urlsafe(32)
+        self.max_queue = max_queue
         self.web_app = None
         self.runner = None
+        self._secret = self.secret_token.encode()
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._forwarder: Optional[asyncio.Task] = None
+        self._recent_ids: deque = deque(maxlen=DEDUP_WINDOW)
+        self._recent_set = set()
+        self._stats = {
+            'accepted': 0, 'duplicates': 0, 'unauthorized': 0, 'invalid': 0, 'rejected': 0, 'errors': 0,
+        }
         
         logger.info(f"Webhook 服务器初始化: 端口={port}, 路径={path}")
         if not secret_token:
             logger.info(f"已自动生成 Secret Token: {self.secret_token}")
     
+    def _count(self, result: str):
+        self._stats[result] += 1
+        WEBHOOK_REQUESTS.labels(result).inc()
+    
+    def _saturated(self) -> bool:
+        if self._queue.full() or self.application.update_queue.qsize() >= self.max_queue:
+            return True
+        # Application 逐个取出更新交给处理器，积压体现在处理器的待处理数上
+        processor = getattr(self.application, 'update_processor', None)
+        return isinstance(processor, OrderedUpdateProcessor) and processor.is_saturated()
+    
+    def _remember(self, update_id):
+        """记录已入队的 update_id"""
+        if len(self._recent_ids) == DEDUP_WINDOW:
+            self._recent_set.discard(self._recent_ids[0])
+        self._recent_ids.append(update_id)
+        self._recent_set.add(update_id)
+    
+    def _busy(self) -> web.Response:
+        self._count('rejected')
+        return web.Response(status=503, text="Busy", headers={'Retry-After': '1'})
+    
     async def webhook_handler(self, request: web.Request) -> web.Response:
         """
-        处理 Webhook 请求
+        处理 Webhook 请求：校验、去重、入队后立即应答
         
         Args:
             request: aiohttp Request 对象
             
         Returns:
-            web.Response: HTTP 响应
+            web.Response: HTTP 响应（队列饱和时为 503）
         """
-        # 验证 Secret Token（如果设置）
-        if self.secret_token:
-            request_token = request.headers.get('X-Telegram-Bot-Api-Secret-Token', '')
-            if request_token != self.secret_token:
-                logger.warning(f"收到未授权的 Webhook 请求，Token 不匹配")
-                return web.Response(status=401, text="Unauthorized")
+        request_token = request.headers.get(SECRET_TOKEN_HEADER, '').encode()
+        if not hmac.compare_digest(request_token, self._secret):
+            self._count('unauthorized')
+            logger.warning("收到未授权的 Webhook 请求，Token 不匹配")
+            return web.Response(status=401, text="Unauthorized")
+        
+        if self._saturated():
+            return self._busy()
         
         try:
-            # 获取请求体
-            data = await request.json()
-            
-            # 创建 Update 对象
-            update = Update.de_json(data, self.application.bot)
-            
-            if update:
-                # 记录更新类型（特别是频道消息）
-                update_types = []
-                if update.message:
-                    update_types.append("message")
-                if update.edited_message:
-                    update_types.append("edited_message")
-                if update.channel_post:
-                    update_types.append("channel_post")
-                if update.edited_channel_post:
-                    update_types.append("edited_channel_post")
-                if update.callback_query:
-                    update_types.append("callback_query")
-                if update.inline_query:
-                    update_types.append("inline_query")
-                
-                update_type_str = ", ".join(update_types) if update_types else "unknown"
-                
-                # 如果是频道消息，使用info级别日志
-                if update.channel_post or update.edited_channel_post:
-                    logger.info(f"📢 收到频道消息更新: update_id={update.update_id}, type={update_type_str}")
-                    if update.channel_post:
-                        logger.info(f"   频道消息ID: {update.channel_post.message_id}, chat_id: {update.channel_post.chat.id if update.channel_post.chat else 'unknown'}")
-                    if update.edited_channel_post:
-                        logger.info(f"   编辑的频道消息ID: {update.edited_channel_post.message_id}, chat_id: {update.edited_channel_post.chat.id if update.edited_channel_post.chat else 'unknown'}")
-                else:
-                    logger.debug(f"收到 Webhook 更新: update_id={update.update_id}, type={update_type_str}")
-                
-                # 将 update 放入队列处理
-                await self.application.update_queue.put(update)
-            else:
-                logger.warning(f"无法解析 Webhook 数据: {data}")
-            
+            data = _json_loads(await request.read())
+            update_id = data['update_id']
+        except (ValueError, KeyError, TypeError) as e:
+            self._count('invalid')
+            logger.warning(f"无法解析 Webhook 数据: {e}")
+            return web.Response(status=400, text="Bad Request")
+        
+        if update_id in self._recent_set:
+            self._count('duplicates')
             return web.Response(status=200, text="OK")
+        
+        # 读取请求体期间并发请求可能已占满队列；入队成功后才记录 update_id，
+        # 否则 Telegram 重新投递时会被当作重复更新丢弃
+        try:
+            self._queue.put_nowait(data)
+        except asyncio.QueueFull:
+            return self._busy()
+        self._remember(update_id)
+        self._count('accepted')
+        return web.Response(status=200, text="OK")
+    
+    async def _forward_updates(self):
+        """把接收队列中的更新构造为 Update 对象并交给 Application 处理"""
+        while True:
+            data = await self._queue.get()
+            try:
+                update = Update.de_json(data, self.application.bot)
+                await self.application.update_queue.put(update)
+            except Exception as e:
+                self._count('errors')
+                logger.error(f"处理 Webhook 更新 {data.get('update_id')} 失败: {e}", exc_info=True)
+            finally:
+                self._queue.task_done()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        接收统计：已接收、重复、未授权、无效、因饱和拒绝的请求数和当前排队数
+        
+        Returns:
+            Dict[str, Any]: 统计数据
+        """
+        return {
+            **self._stats,
+            'queued': self._queue.qsize(),
+            'update_queue': self.application.update_queue.qsize(),
+            'max_queue': self.max_queue,
+        }
+    
+    async def metrics_handler(self, request: web.Request) -> web.Response:
+        """
+        指标端点（Prometheus 文本格式）
+        
+        Args:
+            request: aiohttp Request 对象
             
-        except Exception as e:
-            logger.error(f"处理 Webhook 请求失败: {e}", exc_info=True)
-            return web.Response(status=500, text="Internal Server Error")
+        Returns:
+            web.Response: HTTP 响应
+        """
+        if not metrics.is_authorized(request.headers.get('Authorization')):
+            return web.Response(status=401, text="Unauthorized")
+        return web.Response(body=metrics.render().encode(), headers={'Content-Type': metrics.CONTENT_TYPE})
     
     async def health_handler(self, request: web.Request) -> web.Response:
         """
@@ -117,22 +206,40 @@ class WebhookServer:
         # 注册路由
         self.web_app.router.add_post(self.path, self.webhook_handler)
         self.web_app.router.add_get('/health', self.health_handler)
+        if metrics.METRICS_ENABLED:
+            self.web_app.router.add_get('/metrics', self.metrics_handler)
         
         # 创建并启动 runner
-        self.runner = web.AppRunner(self.web_app)
+        # 不记录每个请求的访问日志（高频推送时占用接收路径）
+        self.runner = web.AppRunner(self.web_app, access_log=None)
         await self.runner.setup()
         
+        self._forwarder = asyncio.create_task(self._forward_updates(), name='webhook-forwarder')
         site = web.TCPSite(self.runner, '0.0.0.0', self.port)
         await site.start()
         
+        global _webhook_server
+        _webhook_server = self
+        
         logger.info(f"✅ Webhook 服务器已启动: http://0.0.0.0:{self.port}{self.path}")
         logger.info(f"✅ 健康检查端点: http://0.0.0.0:{self.port}/health")
     
     async def stop(self):
         """停止 Webhook 服务器"""
+        global _webhook_server
         if self.runner:
             await self.runner.cleanup()
             logger.info("Webhook 服务器已停止")
+        if self._forwarder:
+            # 已应答的更新交给 Application 后再停止转发
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._queue.join(), timeout=5)
+            self._forwarder.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._forwarder
+            self._forwarder = None
+        if _webhook_server is self:
+            _webhook_server = None
 
 
 async def setup_webhook(application, webhook_url: str, webhook_path: str, secret_token: str):